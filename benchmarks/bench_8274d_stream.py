@@ -0,0 +1,62 @@
+"""Packets per second streamed from a simulated 8274D, against the 1024 packets per second it sends at its highest
+sample rate.
+
+The simulated device is run with ``realtime=0``, so it sends packets as fast as they are read and the numbers are
+the host's: reading and framing packets from the port, timestamping them, and writing them to each sink. The lean
+engine is run in this process, without a ``DataFlow`` worker, so nothing else competes for the packets. Streaming from
+an 8274D is experimental, since the layout of its data packets is unverified, so it is opened with
+``experimental_streaming=True``.
+
+Usage: python benchmarks/bench_8274d_stream.py [seconds per run]
+"""
+
+import os
+import sys
+import tempfile
+from multiprocessing import Event
+
+from Morelia.Devices import Pod8274D
+from Morelia.Stream.source import get_data
+from Morelia.Stream.sink import CSVSink, EDFSink, RawArchiveSink
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+class CountingSink:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        self.count += 1
+
+    def flush_batch(self, batch) -> None:
+        self.count += len(batch)
+
+def packets_per_second(name: str, seconds: float, sinks_factory) -> float:
+    pod = Pod8274D(f'sim://8274d/bench-{name}?realtime=0', experimental_streaming=True)
+    counter = CountingSink()
+    get_data(seconds, Event(), pod, [counter] + sinks_factory(pod), chunk_size=256)
+    return counter.count / seconds
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    with tempfile.TemporaryDirectory() as directory:
+        runs = {
+            'no sinks'    : lambda pod: [],
+            'CSV'         : lambda pod: [CSVSink(os.path.join(directory, 'rec.csv'), pod)],
+            'EDF'         : lambda pod: [EDFSink(os.path.join(directory, 'rec.edf'), pod)],
+            'raw archive' : lambda pod: [RawArchiveSink(os.path.join(directory, 'rec.mraw'), pod, codec='predictive')],
+        }
+
+        print(f'\n{seconds:.0f} seconds per run, the 8274D sends at most 1024 packets per second\n')
+        print(f'{"sinks":<12} {"packets/s":>10} {"headroom":>9}')
+        for name, sinks_factory in runs.items():
+            rate = packets_per_second(name.replace(' ', '-'), seconds, sinks_factory)
+            print(f'{name:<12} {rate:10,.0f} {rate/1024:8.0f}x')
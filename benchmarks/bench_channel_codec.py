@@ -0,0 +1,90 @@
+"""Compression ratio and speed of ``Morelia.Stream.sink.channel_codec`` against zlib and lzma.
+
+Data packets are compressed whole, as ``RawArchiveSink`` does, from three sources:
+
+* the simulators, whose channels are clean sine waves;
+* the simulators with noise added to the channels (a random walk plus white noise, a few bits of each, roughly
+  what a real EEG channel looks like), and TTL inputs that toggle now and then;
+* a recording replayed from a raw archive, if one is given (e.g. one written by ``RawArchiveSink``).
+
+Speeds are in MB/s of raw packets.
+
+Usage: python benchmarks/bench_channel_codec.py [raw archive to replay]
+"""
+
+import lzma
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from Morelia.testing.protocol_sim import SimulatedPod, Simulated8206HR, Simulated8401HR
+from Morelia.Stream.sink import RawArchive
+from Morelia.Stream.sink.channel_codec import encode_frames, decode_frames, encode_samples, decode_samples
+
+PACKETS = 200_000
+
+CODECS = (
+    ('predictive', lambda data, device: encode_frames(data, device), decode_frames),
+    ('zlib 1',     lambda data, device: zlib.compress(data, 1), lambda data, device: zlib.decompress(data)),
+    ('zlib 6',     lambda data, device: zlib.compress(data, 6), lambda data, device: zlib.decompress(data)),
+    ('lzma 0',     lambda data, device: lzma.compress(data, preset=0), lambda data, device: lzma.decompress(data)),
+)
+
+def noisy(simulator: type[SimulatedPod], device: str) -> bytes:
+    rng = np.random.default_rng(0)
+    packets = np.frombuffer(simulator(2000).data_packets(0, PACKETS), dtype=np.uint8).reshape(PACKETS, -1).copy()
+    drift = np.cumsum(rng.normal(0, 4, PACKETS)) + rng.normal(0, 8, PACKETS)
+    if device == '8206HR':
+        channels = packets[:, 7:13].view('<u2')
+        channels[:] = np.clip(channels + drift[:, None].astype(np.int64), 0, 2**16 - 1)
+    else:
+        #the low bytes of the two lowest channels, which is as much noise as fits without repacking.
+        packets[:, 13:16:2] ^= (np.abs(drift[:, None]).astype(np.int64) & 0xFF).astype(np.uint8)
+    packets[:, 6] = np.where((np.arange(PACKETS) // 5000) % 2, 0x80, 0)
+    return SimulatedPod._finish_packets(packets, bytes(packets[0, 1:5]))
+
+def bench(label: str, raw: bytes, device: str) -> None:
+    print(f'\n{label}: {device}, {len(raw)/2**20:.1f} MiB\n')
+    print(f'{"":<12} {"ratio":>6} {"encode (MB/s)":>14} {"decode (MB/s)":>14}')
+    for name, encode, decode in CODECS:
+        start = time.perf_counter()
+        encoded = encode(raw, device)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decoded = decode(encoded, device)
+        decode_time = time.perf_counter() - start
+        assert decoded == raw
+
+        print(f'{name:<12} {len(raw)/len(encoded):6.2f} {len(raw)/encode_time/1e6:14.1f} {len(raw)/decode_time/1e6:14.1f}')
+
+def bench_samples() -> None:
+    """A single 18 bit channel, by prediction order."""
+    rng = np.random.default_rng(0)
+    samples = (2**17 + np.cumsum(rng.normal(0, 4, PACKETS)) + rng.normal(0, 8, PACKETS)).astype(np.int32)
+
+    print(f'\none noisy 18 bit channel, stored as 32 bit integers\n')
+    print(f'{"":<12} {"bits/sample":>11} {"encode (MS/s)":>14} {"decode (MS/s)":>14}')
+    for order in (0, 1, 2):
+        start = time.perf_counter()
+        encoded = encode_samples(samples, order=order)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assert np.array_equal(decode_samples(encoded), samples)
+        decode_time = time.perf_counter() - start
+
+        print(f'order {order:<6} {len(encoded)*8/len(samples):11.2f} {len(samples)/encode_time/1e6:14.1f} {len(samples)/decode_time/1e6:14.1f}')
+
+if __name__ == '__main__':
+    for device, simulator in (('8206HR', Simulated8206HR), ('8401HR', Simulated8401HR)):
+        bench('simulator', simulator(2000).data_packets(0, PACKETS), device)
+        bench('noisy simulator', noisy(simulator, device), device)
+
+    if len(sys.argv) > 1:
+        with RawArchive(sys.argv[1]) as archive:
+            bench(f'replay of {sys.argv[1]}', archive.read().raw().tobytes(), archive.metadata['device'])
+
+    bench_samples()
@@ -0,0 +1,55 @@
+"""Latency of closed-loop triggers on a simulated 8206-HR streaming at 2 kHz, for a few chunk sizes.
+
+A threshold detector on one channel sets a TTL output on the streaming device itself, and another on a second
+channel runs a stimulus on a simulated 8480-SC. Latency is measured from the chunk holding each event being read to
+the trigger's command being written, so it covers decoding, detection and the write. On top of that, an event can be
+up to a chunk old by the time its chunk has been read, so smaller chunks respond sooner.
+
+Usage: python benchmarks/bench_closed_loop.py [seconds per run]
+"""
+
+import sys
+
+from Morelia.Devices import Pod8206HR, Pod8480SC
+from Morelia.Stream.closed_loop import ThresholdDetector, Trigger
+from Morelia.Stream.data_flow import DataFlow
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 2000
+
+class NullSink:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def flush(self, timestamp, packet) -> None:
+        pass
+
+    def flush_batch(self, batch) -> None:
+        pass
+
+def run(chunk_size: int, seconds: float) -> dict[str, dict]:
+    pod = Pod8206HR(f'sim://8206hr/bench-closed-loop-{chunk_size}?sample_rate={SAMPLE_RATE}', 10)
+    stimulator = Pod8480SC(f'sim://8480sc/bench-closed-loop-{chunk_size}')
+
+    #the simulated channels are 5, 10 and 15 Hz sine waves, so these fire 5 and 10 times a second.
+    triggers = [ Trigger(pod, ThresholdDetector('EEG1', 0), pod, 'SET TTL OUT', (0, 1), name='ttl', log_size=100_000),
+                 Trigger(pod, ThresholdDetector('EEG2', 0), stimulator, 'RUN STIMULUS', 0, name='stimulus', log_size=100_000) ]
+
+    flowgraph = DataFlow([(pod, [NullSink()])], chunk_size=chunk_size, triggers=triggers)
+    flowgraph.collect_for_seconds(seconds)
+    return flowgraph.triggers()
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    print(f'\ntrigger latency at {SAMPLE_RATE} Hz, {seconds:g} seconds per run\n')
+    print(f'{"chunk (ms)":>10} {"trigger":>9} {"count":>6} {"p50 (us)":>9} {"p90 (us)":>9} {"p99 (us)":>9} {"max (us)":>9}')
+    for chunk_size in (1, 4, 20, 200):
+        for name, summary in run(chunk_size, seconds).items():
+            print(f'{chunk_size*1000/SAMPLE_RATE:10.1f} {name:>9} {summary["count"]:6} ' +
+                  ' '.join(f'{summary[key]*10**6:9.1f}' for key in ('p50_seconds', 'p90_seconds', 'p99_seconds', 'max_seconds')))
@@ -0,0 +1,77 @@
+"""Rows per second written by ``CSVSink``, at 10 kHz with 10 channels (an 8401-HR).
+
+Batches of packets from a simulated device are written as fast as possible, so the numbers only include decoding,
+formatting and writing, not serial reads. The per-packet path is the original way of writing, for comparison:
+one ``csv.writer.writerow`` per sample, with each channel decoded one packet at a time.
+
+Usage: python benchmarks/bench_csv_sink.py [seconds of data to write]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from Morelia.Devices import Pod8401HR, Preamp
+from Morelia.testing.protocol_sim import Simulated8401HR
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataPacket8401HR, DataBatch
+from Morelia.Stream.sink import CSVSink
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 10_000
+PRIMARY = (PrimaryChannelMode.EEG_EMG,)*4
+SECONDARY = (SecondaryChannelMode.DIGITAL,)*6
+GAIN = (10, 10, 10, 10)
+
+def build_batches(count: int, batch_size: int) -> list[DataBatch]:
+    raw: bytes = Simulated8401HR(SAMPLE_RATE).data_packets(0, count*batch_size)
+    packets = [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, raw[i:i+31]) for i in range(0, len(raw), 31) ]
+    timestamps = np.arange(len(packets), dtype=np.int64) * (10**9 // SAMPLE_RATE) + time.time_ns()
+    return [ DataBatch(timestamps[i:i+batch_size], packets[i:i+batch_size]) for i in range(0, len(packets), batch_size) ]
+
+def fresh(batches: list[DataBatch]):
+    #batches cache their raw bytes and packets cache decoded values, so each run starts from new ones.
+    for batch in batches:
+        yield DataBatch(batch.timestamps, [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, packet.raw_packet) for packet in batch.packets ])
+
+def per_packet_write(file_path: str, batches: list[DataBatch]) -> None:
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        for batch in batches:
+            for timestamp, packet in batch:
+                writer.writerow((timestamp, packet.ch0, packet.ch1, packet.ch2, packet.ch3, packet.ext0, packet.ext1, packet.ttl1, packet.ttl2, packet.ttl3, packet.ttl4))
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    batch_size = SAMPLE_RATE//10
+    batches = build_batches(max(1, round(seconds*10)), batch_size)
+    rows = len(batches) * batch_size
+
+    pod = Pod8401HR(f'sim://8401hr/bench-csv?sample_rate={SAMPLE_RATE}', Preamp.Preamp8407_SE, PRIMARY, SECONDARY, (1, 1, 1, 1), GAIN)
+
+    def report(name: str, elapsed: float, file_path: str) -> None:
+        print(f'{name:<30} {rows/elapsed:12,.0f} rows/s  ({rows/elapsed/SAMPLE_RATE:6.1f}x realtime, {os.path.getsize(file_path)/rows:5.1f} bytes/row)')
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f'\n{SAMPLE_RATE} Hz x 10 channels, {rows:,} rows in batches of {batch_size}')
+
+        for float_format in ('%.6f', '%.3f', '%r'):
+            file_path = os.path.join(directory, 'bench.csv')
+            data = list(fresh(batches))
+            start = time.perf_counter()
+            with CSVSink(file_path, pod, float_format=float_format) as sink:
+                for batch in data:
+                    sink.flush_batch(batch)
+            report(f'CSVSink, {float_format}', time.perf_counter() - start, file_path)
+
+        file_path = os.path.join(directory, 'per_packet.csv')
+        data = list(fresh(batches))
+        start = time.perf_counter()
+        per_packet_write(file_path, data)
+        report('per-packet (original)', time.perf_counter() - start, file_path)
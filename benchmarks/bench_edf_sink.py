@@ -0,0 +1,101 @@
+"""Throughput and memory use of ``EDFSink``, at 10 kHz with 10 channels (an 8401-HR).
+
+Batches of packets from a simulated device are written as fast as possible, so the numbers only include decoding
+and writing, not serial reads. The per-packet path is the original way of writing, for comparison: each channel
+is decoded one packet at a time and handed to pyedflib as physical values once a second.
+
+Memory is measured with tracemalloc over the whole run, after the first minute of data; it should not grow with the
+length of the recording.
+
+Usage: python benchmarks/bench_edf_sink.py [minutes of data to write]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from pyedflib import EdfWriter
+
+from Morelia.Devices import Pod8401HR, Preamp
+from Morelia.testing.protocol_sim import Simulated8401HR
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataPacket8401HR, DataBatch
+from Morelia.Stream.sink import EDFSink
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 10_000
+PRIMARY = (PrimaryChannelMode.EEG_EMG,)*4
+SECONDARY = (SecondaryChannelMode.DIGITAL,)*6
+GAIN = (10, 10, 10, 10)
+
+def build_batches(count: int, batch_size: int) -> list[DataBatch]:
+    raw: bytes = Simulated8401HR(SAMPLE_RATE).data_packets(0, count*batch_size)
+    packets = [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, raw[i:i+31]) for i in range(0, len(raw), 31) ]
+    return [ DataBatch(np.arange(batch_size), packets[i:i+batch_size]) for i in range(0, len(packets), batch_size) ]
+
+def per_packet_write(file_path: str, batches: list[DataBatch]) -> None:
+    writer = EdfWriter(file_path, 10)
+    for idx in range(10):
+        writer.setSignalHeader(idx, { 'label' : str(idx), 'dimension' : 'uV', 'sample_frequency' : SAMPLE_RATE, 'physical_max' : 2046, 'physical_min' : -2046,
+                                      'digital_max' : 32767, 'digital_min' : -32768, 'transducer' : '', 'prefilter' : '' })
+    buffer = [ [] for _ in range(10) ]
+    for batch in batches:
+        for packet in batch.packets:
+            for channel, value in zip(buffer, (packet.ch0, packet.ch1, packet.ch2, packet.ch3, float(packet.ext0), float(packet.ext1),
+                                               float(packet.ttl1), float(packet.ttl2), float(packet.ttl3), float(packet.ttl4))):
+                channel.append(value)
+            if len(buffer[0]) >= SAMPLE_RATE:
+                writer.writeSamples(list(map(np.array, buffer)))
+                buffer = [ [] for _ in range(10) ]
+    writer.close()
+
+def fresh(batches: list[DataBatch]):
+    #batches cache their raw bytes, so each run gets its own, which are dropped once written.
+    for batch in batches:
+        yield DataBatch(batch.timestamps, batch.packets)
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    batch_size = SAMPLE_RATE//10
+
+    #one minute of distinct data, replayed for as long as asked.
+    batches = build_batches(600, batch_size)
+    repeats = max(1, round(minutes))
+    pod = Pod8401HR(f'sim://8401hr/bench-edf?sample_rate={SAMPLE_RATE}', Preamp.Preamp8407_SE, PRIMARY, SECONDARY, (1, 1, 1, 1), GAIN)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f'\n{SAMPLE_RATE} Hz x 10 channels, batches of {batch_size} samples')
+
+        for record_duration in (1, 0.1):
+            for bdf in (False, True):
+                file_path = os.path.join(directory, 'bench.bdf' if bdf else 'bench.edf')
+                start = time.perf_counter()
+                with EDFSink(file_path, pod, record_duration=record_duration, bdf=bdf) as sink:
+                    for batch in fresh(batches):
+                        sink.flush_batch(batch)
+                elapsed = time.perf_counter() - start
+                name = f'EDFSink {"BDF" if bdf else "EDF"}, {record_duration} s records'
+                print(f'{name:<35} {len(batches)*batch_size/elapsed:12,.0f} samples/s  ({len(batches)*batch_size/elapsed/SAMPLE_RATE:6.1f}x realtime)')
+
+        start = time.perf_counter()
+        per_packet_write(os.path.join(directory, 'per_packet.edf'), batches[:100])
+        elapsed = time.perf_counter() - start
+        print(f'{"per-packet (original)":<35} {100*batch_size/elapsed:12,.0f} samples/s  ({100*batch_size/elapsed/SAMPLE_RATE:6.1f}x realtime)')
+
+        #memory over a longer recording.
+        with EDFSink(os.path.join(directory, 'long.edf'), pod) as sink:
+            for batch in fresh(batches):
+                sink.flush_batch(batch)
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            for _ in range(repeats):
+                for batch in fresh(batches):
+                    sink.flush_batch(batch)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        print(f'\nafter {repeats+1} minutes of data: {(current-baseline)/1024:.1f} KiB more allocated than after 1 minute (peak {(peak-baseline)/1024:.1f} KiB while writing)')
@@ -0,0 +1,64 @@
+"""Time to bring up a rig of simulated 8206-HR devices, one at a time and with ``Fleet``.
+
+Each simulated device takes 10 ms to answer every command, about what a real device over USB serial takes. Bringing
+up a device opens its port, sets its sample rate and its three low-pass filters, and pings it. Last, the same
+parameters are applied to the rig again, which the state cache makes about as cheap as pinging every device, against
+sending every setting again.
+
+Usage: python benchmarks/bench_fleet.py [largest number of devices]
+"""
+
+import sys
+import time
+
+from Morelia.Devices import Fleet, Pod8206HR
+from Morelia.Parameters import Params8206HR
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+LATENCY = 0.01
+
+def params(run: str, count: int) -> list[Params8206HR]:
+    return [ Params8206HR(f'sim://8206hr/{run}-{i}?latency={LATENCY}', 2000, 10, (40, 40, 40), checkForValidParams=False) for i in range(count) ]
+
+def sequential(count: int) -> float:
+    start = time.perf_counter()
+    pods = []
+    for p in params(f'sequential-{count}', count):
+        pod = Pod8206HR(p.port, p.preamplifierGain)
+        pod.WriteRead('SET SAMPLE RATE', p.sampleRate)
+        for channel, low_pass in enumerate(p.lowPass):
+            pod.WriteRead('SET LOWPASS', (channel, low_pass))
+        pod.WriteRead('PING')
+        pods.append(pod)
+    elapsed = time.perf_counter() - start
+
+    for pod in pods:
+        pod.ClosePort()
+    return elapsed
+
+def fleet(count: int) -> tuple[float, float, float, float]:
+    """Seconds to bring up every device, to ping them all, and to apply their parameters again with and without
+    sending settings they already have."""
+    rig = params(f'fleet-{count}', count)
+    with Fleet() as fleet:
+        times = []
+        for operation in (lambda: fleet.Open(rig, raise_errors=True), fleet.PingAll,
+                          lambda: fleet.Configure(rig, raise_errors=True), lambda: fleet.Configure(rig, raise_errors=True, force=True)):
+            start = time.perf_counter()
+            assert all(result.ok for result in operation().values())
+            times.append(time.perf_counter() - start)
+        return tuple(times)
+
+if __name__ == '__main__':
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+
+    print(f'\n{LATENCY*1000:.0f} ms per command\n')
+    print(f'{"devices":>8} {"sequential (s)":>15} {"fleet (s)":>10} {"speedup":>8} {"ping all (ms)":>14} {"re-apply (ms)":>14} {"forced (ms)":>12}')
+    count = 1
+    while count <= largest:
+        one_at_a_time = sequential(count)
+        opened, pinged, reapplied, forced = fleet(count)
+        print(f'{count:8} {one_at_a_time:15.2f} {opened:10.2f} {one_at_a_time/opened:8.1f} {pinged*1000:14.1f} {reapplied*1000:14.1f} {forced*1000:12.1f}')
+        count *= 2
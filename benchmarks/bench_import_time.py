@@ -0,0 +1,54 @@
+"""Import time of Morelia, measured with ``python -X importtime``.
+
+Each statement is run in a fresh interpreter several times, and the median time spent importing is reported, with
+the modules that took longest the last time round. "every sink" imports all of ``Morelia.Stream.sink``, which is
+what ``import Morelia`` used to cost before packages were imported lazily.
+
+Usage: python benchmarks/bench_import_time.py [runs]
+"""
+
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = (
+    ('import Morelia',           'import Morelia'),
+    ('8229 device',              'from Morelia.Devices import Pod8229'),
+    ('8206-HR device',           'from Morelia.Devices import Pod8206HR'),
+    ('DataFlow',                 'from Morelia.Stream.data_flow import DataFlow'),
+    ('CSVSink',                  'from Morelia.Stream.sink import CSVSink'),
+    ('PVFS container',           'import Morelia.Stream.sink.pvfs'),
+    ('InfluxSink',               'from Morelia.Stream.sink import InfluxSink'),
+    ('every sink',               'from Morelia.Stream.sink import *'),
+)
+
+def import_times(statement: str) -> dict[str, int]:
+    """Microseconds spent importing each top-level module (cumulative, so including what it imports)."""
+    stderr: str = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, check=True).stderr
+
+    times: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        #top-level imports are the ones not indented beneath another.
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative)
+    return times
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    #interpreter startup, imported before the statement runs.
+    baseline = set(import_times('pass'))
+
+    print(f'\nmedian of {runs} runs, excluding interpreter startup\n')
+    print(f'{"":<16} {"import (ms)":>12}   slowest modules')
+
+    for label, statement in STATEMENTS:
+        totals: list[float] = []
+        for _ in range(runs):
+            times = { name : time for name, time in import_times(statement).items() if name not in baseline }
+            totals.append(sum(times.values()) / 1000)
+
+        slowest = ', '.join(f'{name} {time/1000:.0f}' for name, time in sorted(times.items(), key=lambda item: -item[1])[:3])
+        print(f'{label:<16} {statistics.median(totals):12.1f}   {slowest}')
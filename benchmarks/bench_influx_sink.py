@@ -0,0 +1,73 @@
+"""Lines per second and bytes on the wire for ``InfluxSink``, at 10 kHz with 10 channels (an 8401-HR).
+
+Data from a simulated device is sent, as fast as possible, to a local stand-in for InfluxDB that accepts writes
+on the same endpoint and counts what it receives. The original encoding (one line per channel per sample, built
+one packet at a time) is timed and sized as well, for comparison.
+
+Usage: python benchmarks/bench_influx_sink.py [seconds of data to send]
+"""
+
+import gzip
+import sys
+import time
+
+import numpy as np
+
+from Morelia.Devices import Pod8401HR, Preamp
+from Morelia.testing.protocol_sim import Simulated8401HR
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataPacket8401HR, DataBatch
+from Morelia.Stream.sink import InfluxSink
+from Morelia.testing.influx_sim import InfluxStandIn
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 10_000
+PRIMARY = (PrimaryChannelMode.EEG_EMG,)*4
+SECONDARY = (SecondaryChannelMode.DIGITAL,)*6
+GAIN = (10, 10, 10, 10)
+
+def build_batches(count: int, batch_size: int) -> list[DataBatch]:
+    raw: bytes = Simulated8401HR(SAMPLE_RATE).data_packets(0, count*batch_size)
+    packets = [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, raw[i:i+31]) for i in range(0, len(raw), 31) ]
+    timestamps = np.arange(len(packets), dtype=np.int64) * (10**9 // SAMPLE_RATE) + time.time_ns()
+    return [ DataBatch(timestamps[i:i+batch_size], packets[i:i+batch_size]) for i in range(0, len(packets), batch_size) ]
+
+def fresh(batches: list[DataBatch]) -> list[DataBatch]:
+    #packets cache decoded values, so each run starts from new ones.
+    return [ DataBatch(batch.timestamps, [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, packet.raw_packet) for packet in batch.packets ]) for batch in batches ]
+
+def original_lines(timestamp: int, packet: DataPacket8401HR, name: str) -> str:
+    channels = (('CHA', packet.ch0), ('CHB', packet.ch1), ('CHC', packet.ch2), ('CHD', packet.ch3), ('aEXT0', packet.ext0), ('aEXT1', packet.ext1),
+                ('TTL1', packet.ttl1), ('TTL2', packet.ttl2), ('TTL3', packet.ttl3), ('TTL4', packet.ttl4))
+    return '\n'.join(f'eeg,channel={channel},name={name} value={value} {timestamp}' for channel, value in channels)
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    batch_size = SAMPLE_RATE//10
+    batches = build_batches(max(1, round(seconds*10)), batch_size)
+    samples = len(batches) * batch_size
+
+    pod = Pod8401HR(f'sim://8401hr/bench-influx?sample_rate={SAMPLE_RATE}', Preamp.Preamp8407_SE, PRIMARY, SECONDARY, (1, 1, 1, 1), GAIN, device_name='rig1')
+
+    print(f'\n{SAMPLE_RATE} Hz x 10 channels, {samples:,} samples in batches of {batch_size}\n')
+
+    data = fresh(batches)
+    start = time.perf_counter()
+    text = '\n'.join(original_lines(timestamp, packet, 'rig1') for batch in data for timestamp, packet in batch).encode()
+    elapsed = time.perf_counter() - start
+    print(f'{"original, encoding only":<28} {samples/elapsed:12,.0f} samples/s {10*samples/elapsed:12,.0f} lines/s  {len(text)/samples:6.1f} bytes/sample ({len(gzip.compress(text))/samples:5.1f} gzipped)')
+
+    for compress in (True, False):
+        data = fresh(batches)
+        with InfluxStandIn() as server:
+            start = time.perf_counter()
+            with InfluxSink(server.url, 'token', 'org', 'bucket', 'eeg', pod, gzip=compress) as sink:
+                for batch in data:
+                    sink.flush_batch(batch)
+            elapsed = time.perf_counter() - start
+
+        assert len(server.lines) == samples
+        name = f'InfluxSink, {"gzip" if compress else "no gzip"}'
+        print(f'{name:<28} {samples/elapsed:12,.0f} samples/s {samples/elapsed:12,.0f} lines/s  {server.bytes_received/samples:6.1f} bytes/sample on the wire, {server.requests} requests')
@@ -0,0 +1,83 @@
+"""Time to load a recording into pandas, for each file format Morelia writes, at 10 kHz with 10 channels (an 8401-HR).
+
+The same recording, from a simulated device, is written with ``CSVSink``, ``EDFSink`` (as BDF), ``ParquetSink``
+(Parquet and Feather) and ``NumpySink``, then each file is loaded into a ``pandas.DataFrame`` with one column per
+channel. Writing time and file size are reported too. The simulated signals repeat every second, so they compress
+far better than real recordings do; compare sizes between formats, not against real data.
+
+Usage: python benchmarks/bench_parquet_sink.py [minutes of data]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyedflib
+
+from Morelia.Devices import Pod8401HR, Preamp
+from Morelia.testing.protocol_sim import Simulated8401HR
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataPacket8401HR, DataBatch
+from Morelia.Stream.sink import CSVSink, EDFSink, NumpySink, ParquetSink
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 10_000
+PRIMARY = (PrimaryChannelMode.EEG_EMG,)*4
+SECONDARY = (SecondaryChannelMode.DIGITAL,)*6
+GAIN = (10, 10, 10, 10)
+
+def build_batches(count: int, batch_size: int) -> list[DataBatch]:
+    raw: bytes = Simulated8401HR(SAMPLE_RATE).data_packets(0, count*batch_size)
+    packets = [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, raw[i:i+31]) for i in range(0, len(raw), 31) ]
+    timestamps = np.arange(len(packets), dtype=np.int64) * (10**9 // SAMPLE_RATE) + time.time_ns()
+    return [ DataBatch(timestamps[i:i+batch_size], packets[i:i+batch_size]) for i in range(0, len(packets), batch_size) ]
+
+def load_edf(file_path: str) -> pd.DataFrame:
+    with pyedflib.EdfReader(file_path) as reader:
+        return pd.DataFrame({ reader.getLabel(idx) : reader.readSignal(idx) for idx in range(reader.signals_in_file) })
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    batch_size = SAMPLE_RATE//10
+    #one minute of distinct data, replayed for as long as asked.
+    minute = build_batches(600, batch_size)
+    batches = minute * max(1, round(minutes))
+    rows = len(batches) * batch_size
+
+    pod = Pod8401HR(f'sim://8401hr/bench-parquet?sample_rate={SAMPLE_RATE}', Preamp.Preamp8407_SE, PRIMARY, SECONDARY, (1, 1, 1, 1), GAIN)
+
+    formats = (
+        ('CSV',               'rec.csv',     lambda path: CSVSink(path, pod),                             pd.read_csv),
+        ('BDF',               'rec.bdf',     lambda path: EDFSink(path, pod),                             load_edf),
+        ('Parquet, zstd',     'rec.parquet', lambda path: ParquetSink(path, pod),                         pd.read_parquet),
+        ('Parquet, snappy',   'rec.parquet', lambda path: ParquetSink(path, pod, compression='snappy'),   pd.read_parquet),
+        ('Feather, lz4',      'rec.feather', lambda path: ParquetSink(path, pod, compression='lz4'),      pd.read_feather),
+        ('Feather, none',     'rec.feather', lambda path: ParquetSink(path, pod, compression=None),       pd.read_feather),
+        ('NumPy',             'rec.npy',     lambda path: NumpySink(path, pod),                           lambda path: pd.DataFrame(np.load(path))),
+    )
+
+    print(f'\n{SAMPLE_RATE} Hz x 10 channels, {rows:,} samples ({rows/SAMPLE_RATE/60:.0f} minutes)\n')
+    print(f'{"format":<18} {"write (s)":>10} {"size (MiB)":>11} {"load (s)":>9}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, file_name, sink_factory, load in formats:
+            file_path = os.path.join(directory, file_name)
+
+            start = time.perf_counter()
+            with sink_factory(file_path) as sink:
+                for batch in batches:
+                    sink.flush_batch(batch)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            frame = load(file_path)
+            load_time = time.perf_counter() - start
+            assert len(frame) >= rows
+
+            print(f'{name:<18} {write_time:10.2f} {os.path.getsize(file_path)/2**20:11.1f} {load_time:9.3f}')
+            os.remove(file_path)
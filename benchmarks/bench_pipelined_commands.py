@@ -0,0 +1,46 @@
+"""Commands per second to a simulated 8206-HR, one round trip at a time with ``WriteRead`` and pipelined with
+``WriteReadMany`` at a few window sizes.
+
+The commands set and get the low-pass filters, and the state cache is bypassed so every command reaches the device.
+The simulated device is run with no latency, where the cost is the host's, and with a few milliseconds of latency per
+command, about what a USB serial adapter or the 8274D's Bluetooth link adds.
+
+Usage: python benchmarks/bench_pipelined_commands.py [commands per run]
+"""
+
+import sys
+import time
+
+from Morelia.Devices import Pod8206HR
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+def commands(count: int) -> list[tuple]:
+    return [ ('SET LOWPASS', (i % 3, 20 + i % 400)) if i % 2 else ('GET LOWPASS', i % 3) for i in range(count) ]
+
+def one_at_a_time(pod: Pod8206HR, count: int) -> float:
+    start = time.perf_counter()
+    for cmd, payload in commands(count):
+        pod.WriteRead(cmd, payload, useCache=False)
+    return count / (time.perf_counter() - start)
+
+def pipelined(pod: Pod8206HR, count: int, window: int) -> float:
+    start = time.perf_counter()
+    responses = pod.WriteReadMany(commands(count), window=window, useCache=False)
+    elapsed = time.perf_counter() - start
+    assert not any(isinstance(response, TimeoutError) for response in responses)
+    return count / elapsed
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    windows = (1, 8, 32, 128)
+
+    print(f'\ncommands per second, {count} commands per run\n')
+    print(f'{"latency":>8} {"WriteRead":>10} ' + ' '.join(f'{f"window {window}":>11}' for window in windows))
+    for latency in (0, 0.002, 0.01):
+        pod = Pod8206HR(f'sim://8206hr/bench-pipelined-{latency}?latency={latency}', 10)
+        #fewer one at a time, which would take a while with latency.
+        sequential = one_at_a_time(pod, count if latency == 0 else max(10, int(1 / latency)))
+        rates = [ pipelined(pod, count, window) for window in windows ]
+        print(f'{latency*1000:6.0f}ms {sequential:10,.0f} ' + ' '.join(f'{rate:11,.0f}' for rate in rates))
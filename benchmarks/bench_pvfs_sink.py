@@ -0,0 +1,96 @@
+"""Throughput of the PVFS container and of ``PVFSSink``.
+
+First, raw files are written to and read back from a PVFS file in chunks of a few sizes. Then a recording from a
+simulated 8401-HR (10 channels) is written with ``PVFSSink`` and read back with ``PvfsRecording``, reporting samples
+per second against the device's 10 kHz top rate.
+
+Usage: python benchmarks/bench_pvfs_sink.py [minutes of data]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from Morelia.Devices import Pod8401HR, Preamp
+from Morelia.testing.protocol_sim import Simulated8401HR
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataPacket8401HR, DataBatch
+from Morelia.Stream.sink import PVFSSink, PvfsRecording
+from Morelia.Stream.sink.pvfs import PvfsFile
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 10_000
+PRIMARY = (PrimaryChannelMode.EEG_EMG,)*4
+SECONDARY = (SecondaryChannelMode.DIGITAL,)*6
+GAIN = (10, 10, 10, 10)
+
+def build_batches(count: int, batch_size: int) -> list[DataBatch]:
+    raw: bytes = Simulated8401HR(SAMPLE_RATE).data_packets(0, count*batch_size)
+    packets = [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, raw[i:i+31]) for i in range(0, len(raw), 31) ]
+    timestamps = np.arange(len(packets), dtype=np.int64) * (10**9 // SAMPLE_RATE) + time.time_ns()
+    return [ DataBatch(timestamps[i:i+batch_size], packets[i:i+batch_size]) for i in range(0, len(packets), batch_size) ]
+
+def bench_container(directory: str, total: int = 256 * 2**20) -> None:
+    print(f'\nraw files, {total/2**20:.0f} MiB over 8 files\n')
+    print(f'{"chunk":>9} {"write (MiB/s)":>14} {"read (MiB/s)":>13}')
+
+    file_path = os.path.join(directory, 'raw.pvfs')
+    for chunk_size in (4 << 10, 64 << 10, 1 << 20):
+        chunk = os.urandom(chunk_size)
+        chunks = total // chunk_size // 8
+
+        start = time.perf_counter()
+        with PvfsFile.create(file_path) as vfs:
+            handles = [ vfs.fcreate(f'file{idx}.dat') for idx in range(8) ]
+            for _ in range(chunks):
+                for handle in handles:
+                    handle.write(chunk)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with PvfsFile.open(file_path, readonly=True) as vfs:
+            for idx in range(8):
+                with vfs.fopen(f'file{idx}.dat') as handle:
+                    while handle.read(chunk_size):
+                        pass
+        read_time = time.perf_counter() - start
+
+        print(f'{chunk_size >> 10:>7} K {total/2**20/write_time:14.0f} {total/2**20/read_time:13.0f}')
+        os.remove(file_path)
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_container(directory)
+
+        batch_size = SAMPLE_RATE//10
+        #one minute of distinct data, replayed for as long as asked.
+        batches = build_batches(600, batch_size) * max(1, round(minutes))
+        rows = len(batches) * batch_size
+
+        pod = Pod8401HR(f'sim://8401hr/bench-pvfs?sample_rate={SAMPLE_RATE}', Preamp.Preamp8407_SE, PRIMARY, SECONDARY, (1, 1, 1, 1), GAIN)
+        file_path = os.path.join(directory, 'rec.pvfs')
+
+        start = time.perf_counter()
+        with PVFSSink(file_path, pod) as sink:
+            for batch in batches:
+                sink.flush_batch(batch)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with PvfsRecording(file_path) as recording:
+            columns = { channel : recording[channel] for channel in recording.channels }
+            times = recording.times(recording.channels[0])
+        read_time = time.perf_counter() - start
+        assert len(times) == rows and all(len(values) == rows for values in columns.values())
+
+        print(f'\nPVFSSink, {SAMPLE_RATE} Hz x 10 channels, {rows:,} samples ({rows/SAMPLE_RATE/60:.0f} minutes), '
+              f'{os.path.getsize(file_path)/2**20:.1f} MiB\n')
+        print(f'write: {write_time:6.2f} s  {rows/write_time:12,.0f} samples/s  ({rows/write_time/SAMPLE_RATE:,.0f}x real time)')
+        print(f'read:  {read_time:6.2f} s  {rows/read_time:12,.0f} samples/s')
@@ -0,0 +1,83 @@
+"""Time to pull short epochs out of a long PVFS recording with ``PvfsRecording.time_range``.
+
+A single channel recording (a week at 500 Hz by default, about 1.2 GB) is written straight into a PVFS file in the
+layout ``PVFSSink`` uses: an .idat file of 32 bit floats, and an .index file with an entry per second. Then 10 second
+epochs are read from random points in it, first from the file (cold) and then again with the blocks they need
+already cached (warm), alongside the time taken to open the file and load the channel's index.
+
+Usage: python benchmarks/bench_pvfs_time_range.py [days] [sample rate]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from Morelia.Stream.sink import PvfsRecording
+from Morelia.Stream.sink.pvfs import PvfsFile, PvfsIndexHeader, HighTime, PVFS_INDEX_HEADER_SIZE, PVFS_INDEX_ENTRY_SIZE
+
+EPOCH_SEC = 10
+QUERIES = 200
+
+def write_recording(file_path: str, seconds: int, sample_rate: int, start: int) -> None:
+    chunk_sec = max(1, 2**20 // sample_rate)
+    with PvfsFile.create(file_path) as vfs:
+        index = vfs.fcreate('EEG1.index')
+        data = vfs.fcreate('EEG1.idat')
+        index.write_index_header(PvfsIndexHeader(sample_rate, HighTime.from_ns(start),
+                                                 HighTime.from_ns(start + seconds * 10**9 - 10**9 // sample_rate), 1))
+
+        for first in range(0, seconds, chunk_sec):
+            count = min(chunk_sec, seconds - first)
+            second = np.arange(first, first + count, dtype=np.int64)
+
+            data.write(np.sin(np.arange(first * sample_rate, (first + count) * sample_rate) / 100).astype('<f4').tobytes())
+
+            entries = np.zeros((count, 6), dtype='<i8')
+            entries[:, 0] = start // 10**9 + second
+            entries[:, 2] = start // 10**9 + second
+            entries[:, 3] = np.full(count, (sample_rate - 1) / sample_rate).view('<i8')
+            entries[:, 4] = PVFS_INDEX_HEADER_SIZE + second * PVFS_INDEX_ENTRY_SIZE
+            entries[:, 5] = second * sample_rate * 4
+            index.write(entries.tobytes())
+
+if __name__ == '__main__':
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 7
+    sample_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    seconds = int(days * 86_400)
+    start = 1_700_000_000 * 10**9
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'week.pvfs')
+
+        began = time.perf_counter()
+        write_recording(file_path, seconds, sample_rate, start)
+        print(f'\n{days:g} days at {sample_rate} Hz: {seconds * sample_rate:,} samples, {os.path.getsize(file_path)/2**30:.2f} GiB '
+              f'(written in {time.perf_counter() - began:.1f} s)\n')
+
+        began = time.perf_counter()
+        recording = PvfsRecording(file_path)
+        recording.index('EEG1')
+        print(f'open and load index ({seconds:,} entries): {(time.perf_counter() - began)*1000:8.2f} ms')
+
+        random.seed(0)
+        epochs = [ start + random.randrange(seconds - EPOCH_SEC) * 10**9 + random.randrange(10**9) for _ in range(QUERIES) ]
+
+        for label in ('cold', 'warm'):
+            durations = []
+            for epoch in epochs:
+                began = time.perf_counter()
+                times, values = recording.time_range('EEG1', epoch, epoch + EPOCH_SEC * 10**9)
+                durations.append(time.perf_counter() - began)
+                assert len(values) == EPOCH_SEC * sample_rate and times[0] >= epoch
+
+            durations = np.array(durations) * 1000
+            print(f'{EPOCH_SEC} s epoch, {label}: median {np.median(durations):6.2f} ms, p99 {np.percentile(durations, 99):6.2f} ms')
+            if label == 'cold':
+                #keep the last few epochs' blocks in the cache for the warm run.
+                epochs = epochs[-8:] * (QUERIES // 8)
+
+        recording.close()
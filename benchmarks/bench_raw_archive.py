@@ -0,0 +1,91 @@
+"""Acquisition cost and size of ``RawArchiveSink``, against the sinks that decode as they record.
+
+A recording from a simulated 8401-HR (10 channels) is written with each sink, reporting the CPU time spent per sample
+and the size on disk. ``RawArchiveSink`` is run with each codec at a few compression levels, with its compression
+ratio against the raw packets. Last, the archive is decoded back to columns with ``RawArchive.decode``.
+
+Usage: python benchmarks/bench_raw_archive.py [minutes of data]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from Morelia.Devices import Pod8401HR, Preamp
+from Morelia.testing.protocol_sim import Simulated8401HR
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataPacket8401HR, DataBatch
+from Morelia.Stream.sink import RawArchiveSink, RawArchive, CSVSink, PVFSSink, ParquetSink
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 10_000
+PRIMARY = (PrimaryChannelMode.EEG_EMG,)*4
+SECONDARY = (SecondaryChannelMode.DIGITAL,)*6
+GAIN = (10, 10, 10, 10)
+
+def build_batches(count: int, batch_size: int) -> list[DataBatch]:
+    raw: bytes = Simulated8401HR(SAMPLE_RATE).data_packets(0, count*batch_size)
+    packets = [ DataPacket8401HR(GAIN, (1, 1, 1, 1), PRIMARY, SECONDARY, raw[i:i+31]) for i in range(0, len(raw), 31) ]
+    timestamps = np.arange(len(packets), dtype=np.int64) * (10**9 // SAMPLE_RATE) + time.time_ns()
+    return [ DataBatch(timestamps[i:i+batch_size], packets[i:i+batch_size]) for i in range(0, len(packets), batch_size) ]
+
+def record(sink, batches: list[DataBatch]) -> float:
+    """CPU seconds spent writing every batch to a sink."""
+    #each sink builds its own raw bytes, as it would straight off the device.
+    for batch in batches:
+        batch._raw = None
+
+    start = time.process_time()
+    with sink:
+        for batch in batches:
+            sink.flush_batch(batch)
+    return time.process_time() - start
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+
+    batch_size = SAMPLE_RATE//10
+    #one minute of distinct data, replayed for as long as asked.
+    batches = build_batches(600, batch_size) * max(1, round(minutes))
+    rows = len(batches) * batch_size
+    raw_size = rows * 31
+
+    pod = Pod8401HR(f'sim://8401hr/bench-raw-archive?sample_rate={SAMPLE_RATE}', Preamp.Preamp8407_SE, PRIMARY, SECONDARY, (1, 1, 1, 1), GAIN)
+
+    sinks = [
+        ('CSVSink',             'rec.csv',     lambda path: CSVSink(path, pod)),
+        ('PVFSSink',            'rec.pvfs',    lambda path: PVFSSink(path, pod)),
+        ('ParquetSink',         'rec.parquet', lambda path: ParquetSink(path, pod)),
+    ] + [
+        (f'RawArchive {codec} {level}', f'rec-{codec}-{level}.mraw', lambda path, codec=codec, level=level: RawArchiveSink(path, pod, codec=codec, level=level))
+        for codec, levels in (('zlib', (1, 6, 9)), ('lzma', (0, 6))) for level in levels
+    ]
+
+    print(f'\n{SAMPLE_RATE} Hz x 10 channels, {rows:,} samples ({rows/SAMPLE_RATE/60:.0f} minutes), {raw_size/2**20:.1f} MiB of raw packets\n')
+    print(f'{"":<18} {"CPU (us/sample)":>16} {"size (MiB)":>11} {"ratio":>6}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, file_name, make_sink in sinks:
+            file_path = os.path.join(directory, file_name)
+            try:
+                sink = make_sink(file_path)
+            except ImportError as error:
+                print(f'{label:<18} skipped ({error})')
+                continue
+
+            cpu = record(sink, batches)
+            size = os.path.getsize(file_path)
+            print(f'{label:<18} {cpu/rows*1e6:16.2f} {size/2**20:11.1f} {raw_size/size:6.2f}')
+
+        for file_name in ('rec-zlib-6.mraw', 'rec-lzma-6.mraw'):
+            with RawArchive(os.path.join(directory, file_name)) as archive:
+                start = time.perf_counter()
+                columns = archive.decode()
+                decode_time = time.perf_counter() - start
+            assert all(len(values) == rows for values in columns.values())
+            print(f'\ndecode {file_name}: {decode_time:6.2f} s  {rows/decode_time:12,.0f} samples/s')
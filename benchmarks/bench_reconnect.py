@@ -0,0 +1,60 @@
+"""Time-to-recover of supervised streaming (see ``Morelia.Stream.reconnect``), using simulated devices.
+
+Each run streams from a simulated 8206-HR that is unplugged or stops responding partway through. The recovery
+time is measured from the moment the worker notices the fault to the moment the device is streaming again;
+the gap is the total time without data, which for a stall also includes the time it takes to notice it.
+
+Usage: python benchmarks/bench_reconnect.py [number of runs per fault]
+"""
+
+import statistics
+import sys
+from multiprocessing import Event
+
+from Morelia.Devices import Pod8206HR
+from Morelia.Stream.source import get_data
+from Morelia.Stream.reconnect import ReconnectPolicy
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+class GapSink:
+    def __init__(self) -> None:
+        self.gaps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        pass
+
+    def flush_batch(self, batch) -> None:
+        pass
+
+    def flush_gap(self, gap) -> None:
+        self.gaps.append(gap)
+
+def run(url: str, policy: ReconnectPolicy) -> list:
+    sink = GapSink()
+    get_data(2.5, Event(), Pod8206HR(url, 10), [sink], reconnect_policy=policy)
+    return sink.gaps
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    policy = ReconnectPolicy(stall_periods=200, poll_interval_sec=0.05)
+
+    print(f'\n{runs} runs per fault, 2000 Hz, stall timeout {policy.stall_timeout(2000)*1000:.0f} ms, poll interval {policy.poll_interval_sec*1000:.0f} ms')
+    print(f'{"fault":<25}{"recover (ms)":>15}{"gap (ms)":>12}{"lost samples":>15}')
+
+    for fault, seconds in (('unplug', 0.3), ('unplug', 1.0), ('stall', 0.3), ('stall', 1.0)):
+        gaps = []
+        for idx in range(runs):
+            gaps += run(f'sim://8206hr/bench-{fault}-{seconds}-{idx}?{fault}_at=0.5&{fault}_for={seconds}', policy)
+
+        name = f'{fault} for {seconds} s'
+        print(f'{name:<25}{statistics.median(gap.recovery_time for gap in gaps)*1000:>15.1f}'
+              f'{statistics.median(gap.duration for gap in gaps)/10**6:>12.1f}'
+              f'{statistics.median(gap.sample_count for gap in gaps):>15.0f}')
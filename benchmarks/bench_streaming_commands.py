@@ -0,0 +1,59 @@
+"""Response time of commands sent to a simulated 8206-HR while it streams through a ``DataFlow``, for a few chunk sizes.
+
+Commands are written by the streaming worker between chunks, so the response time is about one chunk of data on top of
+the device's own response time. The cache is bypassed so every command reaches the device.
+
+Usage: python benchmarks/bench_streaming_commands.py [commands per run]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from Morelia.Devices import Pod8206HR
+from Morelia.Stream.data_flow import DataFlow
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+SAMPLE_RATE = 2000
+
+class NullSink:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def flush(self, timestamp, packet) -> None:
+        pass
+
+    def flush_batch(self, batch) -> None:
+        pass
+
+def response_times(chunk_size: int, count: int) -> np.ndarray:
+    pod = Pod8206HR(f'sim://8206hr/bench-streaming-commands-{chunk_size}?sample_rate={SAMPLE_RATE}', 10)
+    flowgraph = DataFlow([(pod, [NullSink()])], chunk_size=chunk_size)
+
+    flowgraph.collect()
+    times: list[float] = []
+    try:
+        time.sleep(0.2)
+        for i in range(count):
+            start = time.perf_counter()
+            flowgraph.send_command(pod, 'GET LOWPASS', i % 3, use_cache=False).result(5)
+            times.append(time.perf_counter() - start)
+    finally:
+        flowgraph.stop_collection()
+
+    return np.array(times)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    print(f'\nresponse time while streaming at {SAMPLE_RATE} Hz, {count} commands per run\n')
+    print(f'{"chunk (ms)":>10} {"p50 (ms)":>9} {"p99 (ms)":>9}')
+    for chunk_size in (10, 50, 200):
+        times = response_times(chunk_size, count) * 1000
+        print(f'{chunk_size*1000/SAMPLE_RATE:10.0f} {np.percentile(times, 50):9.1f} {np.percentile(times, 99):9.1f}')
@@ -0,0 +1,52 @@
+"""Start skew across several simulated 8206-HRs streamed by one ``DataFlow``, with the devices started together and
+with each started as soon as its worker is ready.
+
+The skew is the spread of the times ``STREAM 1`` was written to each device, as recorded by the workers on the shared
+time base (see ``DataFlow.start_offsets``). Workers sharing a CPU write one after another, so the skew with many more
+devices than CPUs is about the number of devices times the cost of starting one.
+
+Usage: python benchmarks/bench_synchronized_start.py [runs per size]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from Morelia.Devices import Pod8206HR
+from Morelia.Stream.data_flow import DataFlow
+from Morelia.testing import enable_simulated_devices
+
+enable_simulated_devices()
+
+class NullSink:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        pass
+
+    def flush_batch(self, batch) -> None:
+        pass
+
+def skew_ms(count: int, synchronized: bool, run: int) -> float:
+    pods = [ Pod8206HR(f'sim://8206hr/bench-sync-{synchronized}-{count}-{run}-{i}', 10) for i in range(count) ]
+    flowgraph = DataFlow([ (pod, [NullSink()]) for pod in pods ], synchronized_start=synchronized)
+    flowgraph.collect_for_seconds(0.2)
+    offsets = list(flowgraph.start_offsets().values())
+    return (max(offsets) - min(offsets)) * 1000
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f'\nstart skew in ms, median (max) of {runs} runs, {os.cpu_count()} CPUs\n')
+    print(f'{"devices":>7} {"together":>16} {"when ready":>16}')
+    for count in (1, 2, 4, 8, 16):
+        columns = []
+        for synchronized in (True, False):
+            skews = [ skew_ms(count, synchronized, run) for run in range(runs) ]
+            columns.append(f'{np.median(skews):7.3f} ({max(skews):6.3f})')
+        print(f'{count:>7} ' + ' '.join(f'{column:>16}' for column in columns))
@@ -5,7 +5,10 @@ from Morelia.packet import ControlPacket, PodPacket
 from Morelia.packet.data import DataPacket
 import Morelia.packet.conversion as conv
 
+from collections import deque
 from functools import partial
+from typing import Callable, NamedTuple
+import time
 
 # authorship
 __author__      = "Thresa Kelly"
@@ -15,6 +18,23 @@ __license__     = "New BSD License"
 __copyright__   = "Copyright (c) 2023, Thresa Kelly"
 __email__       = "sales@pinnaclet.com"
 
+class ChecksumError(Exception) :
+    """Raised when a packet read from a POD device has a checksum that does not match its contents."""
+
+class UnexpectedResponseError(Exception) :
+    """Raised when a POD device answers a command with a response to another command, such as a late response \
+    to a command sent before it."""
+
+
+class _Setting(NamedTuple) :
+    """A setting of a POD device kept by its state cache. See Pod._AddSetting."""
+    get_number: int|None
+    set_number: int
+    key_chars: int
+    echoes_key: bool
+    keys: tuple[bytes]|None
+
+
 class Pod : 
     """
     POD_Basics handles basic communication with a generic POD device, including reading and writing 
@@ -48,6 +68,16 @@ class Pod :
 
         self._control_packet_factory = partial(ControlPacket, self._commands)
 
+        # settings the device is known to have, as the raw value arguments of the command that sets them, by that \
+        # command's number and its raw key arguments (e.g. the channel). Filled in by WriteRead as settings are set \
+        # or read, and used to answer commands that get them without asking the device.
+        self._state : dict[tuple[int,bytes],bytes] = {}
+        self._settings : dict[int,_Setting] = {}
+        self._setting_getters : dict[int,_Setting] = {}
+        # packets the device sends by itself that change its settings, and which settings (by set command number) \
+        # they change. None means all of them: a device sends RESET when it boots.
+        self._forgotten_by : dict[int,list[int]|None] = { 3 : None }
+
     # ============ STATIC METHODS ============      ========================================================================================================================
     
 
@@ -233,6 +263,51 @@ class Pod :
         return(self._port.Flush())
     
     
+    def GetBytesWaiting(self) -> int : 
+        """Gets the number of bytes that have arrived from the device but have not been read yet.
+
+        Returns:
+            int: Number of bytes in the serial port's input buffer.
+        """
+        return(self._port.GetBytesWaiting())
+
+
+    def DiscardWaiting(self) -> int : 
+        """Reads and throws away every byte that has arrived from the device but has not been read yet. Unlike \
+        FlushPort, packets still being written to the device are left alone.
+
+        Returns:
+            int: Number of bytes thrown away.
+        """
+        waiting: int = self._port.GetBytesWaiting()
+        if(waiting) :
+            self._port.Read(waiting)
+        return(waiting)
+
+
+    def GetPort(self) -> str|int : 
+        """Gets the port the device was opened on, as it was given (e.g. 'COM3', 3 or a 'sim://' URL).
+
+        Returns:
+            str|int: The port.
+        """
+        return(self._port.GetPort())
+
+
+    def GetPortName(self) -> str|None : 
+        """Gets the name of the device's serial port.
+
+        Returns:
+            str|None: Name of the port, or None if it is closed.
+        """
+        return(self._port.GetPortName())
+
+
+    def ClosePort(self) -> None : 
+        """Closes the device's serial port, if it is open."""
+        self._port.CloseSerialPort()
+
+
     def SetBaudrateOfDevice(self, baudrate: int) -> bool : 
         """If the port is open, it will change the baud rate to the parameter's value.
 
@@ -261,6 +336,178 @@ class Pod :
         return(self._commands.GetCommands())
     
 
+    # ------------ STATE CACHE ------------ ------------------------------------------------------------------------------------------------------------------------
+
+
+    def InvalidateCache(self) -> None :
+        """Forgets every setting the device is known to have, so that they are read from the device the next \
+        time they are needed. This happens by itself when the device is reset or reconnected.
+        """
+        self._state.clear()
+
+
+    def IsCached(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None) -> bool :
+        """Checks if a command that gets a setting would be answered from the state cache.
+
+        Args:
+            cmd (str | int): Command name or number.
+            payload (int | bytes | tuple[int | bytes], optional): Command's arguments. Defaults to None.
+
+        Returns:
+            bool: True if the setting is known, False otherwise or if the command does not get a setting.
+        """
+        return(self.CachedResponse(cmd, payload) is not None)
+
+
+    def IsSettingCurrent(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None) -> bool :
+        """Checks if the device is known to already have the setting a command would set.
+
+        Args:
+            cmd (str | int): Command name or number of a command that sets a setting.
+            payload (int | bytes | tuple[int | bytes], optional): Command's arguments. Defaults to None.
+
+        Returns:
+            bool: True if the device has that setting, False if it differs, is not known or the command \
+                does not set a setting.
+        """
+        setting: _Setting|None = self._settings.get(self._CommandNumber(cmd))
+        if(setting is None) :
+            return(False)
+        raw: bytes = self.GetPODpacket(cmd, payload)[5:-3]
+        return(self._state.get((setting.set_number, raw[:setting.key_chars])) == raw[setting.key_chars:])
+
+
+    def ApplySetting(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None, force:bool=False) -> PodPacket|None :
+        """Sends a command that sets a setting, unless the device is known to already have that setting.
+
+        Args:
+            cmd (str | int): Command name or number.
+            payload (int | bytes | tuple[int | bytes], optional): Command's arguments. Defaults to None.
+            force (bool, optional): Send the command even if the setting is current. Defaults to False.
+
+        Returns:
+            PodPacket|None: The device's response, or None if the command was not sent.
+        """
+        if(not force and self.IsSettingCurrent(cmd, payload)) :
+            return(None)
+        return(self.WriteRead(cmd, payload))
+
+
+    def CachedResponse(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None) -> ControlPacket|None :
+        """Builds the response the device would send to a command that gets a setting, from the state cache.
+
+        Args:
+            cmd (str | int): Command name or number.
+            payload (int | bytes | tuple[int | bytes], optional): Command's arguments. Defaults to None.
+
+        Returns:
+            ControlPacket|None: The response, or None if the setting is not known or the command does not \
+                get a setting.
+        """
+        number: int|None = self._CommandNumber(cmd)
+        setting: _Setting|None = self._setting_getters.get(number)
+        if(setting is None) :
+            return(None)
+        if(setting.keys is not None) :
+            values: list[bytes|None] = [ self._state.get((setting.set_number, key)) for key in setting.keys ]
+            if(None in values) :
+                return(None)
+            raw: bytes = b''.join(values)
+        else :
+            key: bytes = self.GetPODpacket(number, payload)[5:-3]
+            value: bytes|None = self._state.get((setting.set_number, key))
+            if(value is None) :
+                return(None)
+            raw: bytes = key + value if setting.echoes_key else value
+        return(self._control_packet_factory(Pod.BuildPODpacket_Standard(number, raw)))
+
+
+    def RecordResponse(self, written: ControlPacket, response: PodPacket|None) -> None :
+        """Records what a command and the device's response to it say about the device's settings. Call this \
+        for commands written with WritePacket, whose responses are read some other way than by WriteRead.
+
+        Args:
+            written (ControlPacket): Packet that was written to the device.
+            response (PodPacket | None): The device's response, or None if it did not respond, so a setting \
+                the command may or may not have changed is forgotten.
+        """
+        number: int = written.command_number
+        setting: _Setting|None = self._settings.get(number) or self._setting_getters.get(number)
+        if(setting is None) :
+            return
+        sent: bytes = written.raw_packet[5:-3]
+        confirmed: bool = isinstance(response, ControlPacket) and response.command_number == number
+
+        if(number == setting.set_number) :
+            key: bytes = sent[:setting.key_chars]
+            # without a confirmation, the setting may or may not have changed.
+            if(confirmed) :
+                self._state[(number, key)] = sent[setting.key_chars:]
+            else :
+                self._state.pop((number, key), None)
+            return
+
+        if(not confirmed) :
+            return
+        received: bytes = response.raw_packet[5:-3]
+        if(len(received) != sum(self._commands.ReturnHexChar(number))) :
+            return
+        if(setting.keys is not None) :
+            width: int = len(received) // len(setting.keys)
+            for i, key in enumerate(setting.keys) :
+                self._state[(setting.set_number, key)] = received[i*width:(i+1)*width]
+        else :
+            self._state[(setting.set_number, sent)] = received[len(sent):] if setting.echoes_key else received
+
+
+    def _AddSetting(self, getCmd: str|int|None, setCmd: str|int, keyLength: int = 0, echoesKey: bool = False,
+                    allKeys: bool = False, changedBy: tuple[str|int] = ()) -> None :
+        """Declares a setting of the device, so that it is kept by the state cache. Once the setting has \
+        been set with `setCmd` or read with `getCmd`, reading it again with `getCmd` is answered without \
+        asking the device.
+
+        Args:
+            getCmd (str | int | None): Command that gets the setting, or None if it can only be set. Its \
+                arguments must be the key arguments of `setCmd`, and its response the remaining arguments.
+            setCmd (str | int): Command that sets the setting.
+            keyLength (int, optional): Number of leading arguments of `setCmd` that say which of several \
+                settings of the same kind is set, such as a channel. Defaults to 0.
+            echoesKey (bool, optional): `getCmd` responds with the key arguments before the value. \
+                Defaults to False.
+            allKeys (bool, optional): `getCmd` takes no arguments and responds with the value of every key \
+                in turn, starting from 0. `keyLength` must be 1. Defaults to False.
+            changedBy (tuple[str | int], optional): Packets that the device sends by itself when the setting \
+                changes, such as when it is changed from the device's display. Defaults to ().
+        """
+        setNumber: int = self._CommandNumber(setCmd)
+        getNumber: int|None = None if getCmd is None else self._CommandNumber(getCmd)
+        keyChars: int = sum(self._commands.ArgumentHexChar(setNumber)[:keyLength])
+        keys: tuple[bytes]|None = None
+        if(allKeys) :
+            count: int = len(self._commands.ReturnHexChar(getNumber)) // (len(self._commands.ArgumentHexChar(setNumber)) - 1)
+            keys = tuple( conv.int_to_ascii_bytes(key, keyChars) for key in range(count) )
+
+        setting = _Setting(getNumber, setNumber, keyChars, echoesKey, keys)
+        self._settings[setNumber] = setting
+        if(getNumber is not None) :
+            self._setting_getters[getNumber] = setting
+        for cmd in changedBy :
+            self._forgotten_by.setdefault(self._CommandNumber(cmd), []).append(setNumber)
+
+
+    def _CommandNumber(self, cmd: str|int) -> int|None :
+        return(self._commands.CommandNumberFromName(cmd) if isinstance(cmd, str) else cmd)
+
+
+    def _ForgetSettings(self, setNumbers: list[int]|None) -> None :
+        """Forgets the settings set by some commands, or all settings if None."""
+        if(setNumbers is None) :
+            self._state.clear()
+        else :
+            for key in [ key for key in self._state if key[0] in setNumbers ] :
+                del self._state[key]
+
+
     # ------------ POD COMMUNICATION ------------   ------------------------------------------------------------------------------------------------------------------------
 
 
@@ -329,8 +576,10 @@ class Pod :
         # return complete packet 
         return(packet)
     
-    def WriteRead(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None, validateChecksum:bool=True) -> PodPacket :
-        """Writes a command with optional payload to POD device, then reads (once) the device response.
+    def WriteRead(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None, validateChecksum:bool=True, useCache:bool=True) -> PodPacket :
+        """Writes a command with optional payload to POD device, then reads (once) the device response. \
+        Commands that get a setting the device is known to have are answered from the state cache instead, \
+        without a round trip to the device.
 
         Args:
             cmd (str | int): Command number. 
@@ -338,16 +587,112 @@ class Pod :
                 is a payload, set to an integer value or a bytes string. Defaults to None.
             validateChecksum (bool, optional): Set to True to validate the checksum. Set to False to skip \
                     validation. Defaults to True.
+            useCache (bool, optional): Set to False to always ask the device. Defaults to True.
 
         Returns:
             Packet: POD packet beginning with STX and ending with ETX. This may \
                 be a standard packet, binary packet, or an unformatted packet (STX+something+ETX). 
         """
-        self.WritePacket(cmd, payload)
+        if(useCache) :
+            cached: ControlPacket|None = self.CachedResponse(cmd, payload)
+            if(cached is not None) :
+                return(cached)
+        w = self.WritePacket(cmd, payload)
         r = self.ReadPODpacket(validateChecksum)
+        self.RecordResponse(w, r)
         return(r)
 
 
+    def WriteReadMany(self, commands: list[str|int|tuple], timeout_sec: int|float = 5, window: int = 32, 
+                      onUnsolicited: Callable[[PodPacket],None]|None = None, useCache: bool = True) -> list[PodPacket|TimeoutError] :
+        """Writes many commands to the POD device back to back, without waiting for the response to each \
+        before writing the next, then matches the device's responses to them by command number. Commands \
+        with the same number are answered in the order they were written. A NACK answers the oldest \
+        command still waiting. This takes about one round trip to the device, where calling WriteRead for \
+        each command takes one round trip per command.
+
+        Args:
+            commands (list[str | int | tuple]): Commands to write, in order. Each is a command name or \
+                number, or a tuple of (command, payload) or (command, payload, timeout_sec).
+            timeout_sec (int | float, optional): Time in seconds to wait for the response to each command \
+                that does not give its own, from when it is written. Defaults to 5.
+            window (int, optional): Most commands to have written and waiting for a response at once, so \
+                the device's input buffer is not overrun. Defaults to 32.
+            onUnsolicited (Callable[[PodPacket],None] | None, optional): Called with every packet read that \
+                does not answer a command, such as data packets, events, or the 8274D's 211 PROCEDURE \
+                COMPLETE. Defaults to None, which discards them.
+            useCache (bool, optional): Set to False to always ask the device, rather than answering \
+                commands that get a known setting from the state cache. Defaults to True.
+
+        Returns:
+            list[PodPacket|TimeoutError]: The response to each command, in the order the commands were \
+                given, or a TimeoutError for those that were not answered in time.
+        """
+        requests: list[tuple] = []
+        for command in commands :
+            cmd, payload, timeout = ((command if isinstance(command, tuple) else (command,)) + (None, None))[:3]
+            requests.append( (cmd, payload, timeout_sec if timeout is None else timeout) )
+
+        results: list[PodPacket|TimeoutError|None] = [None]*len(requests)
+        written: dict[int,ControlPacket] = {}
+        # commands still waiting, by index: when to give up on them, and in order written by command number. 
+        deadlines: dict[int,float] = {}
+        waiting: dict[int,deque[int]] = {}
+        nack: int = 1
+        following: int = 0
+
+        while(following < len(requests) or deadlines) :
+            # keep the window full
+            while(following < len(requests) and len(deadlines) < window) :
+                cmd, payload, timeout = requests[following]
+                cached: ControlPacket|None = self.CachedResponse(cmd, payload) if useCache else None
+                if(cached is not None) :
+                    results[following] = cached
+                else :
+                    packet: ControlPacket = self.WritePacket(cmd, payload)
+                    written[following] = packet
+                    deadlines[following] = time.perf_counter() + timeout
+                    waiting.setdefault(packet.command_number, deque()).append(following)
+                following += 1
+
+            if(not deadlines) :
+                continue
+
+            # give up on commands whose time has run out
+            now: float = time.perf_counter()
+            soonest: float = min(deadlines.values())
+            if(soonest <= now) :
+                for index in [ index for index, deadline in deadlines.items() if deadline <= now ] :
+                    number: int = written[index].command_number
+                    results[index] = TimeoutError(f'[!] No response to command {number} within {requests[index][2]} seconds.')
+                    del deadlines[index]
+                    waiting[number].remove(index)
+                    self.RecordResponse(written[index], None)
+                continue
+
+            try :
+                packet: PodPacket = self.ReadPODpacket(timeout_sec=soonest - now)
+            except (TimeoutError, ChecksumError) :
+                # a garbled response leaves its command waiting until it times out.
+                continue
+
+            number: int|None = packet.command_number if isinstance(packet, ControlPacket) else None
+            if(waiting.get(number)) :
+                index: int = waiting[number].popleft()
+            elif(number == nack) :
+                index: int = min(deadlines)
+                waiting[written[index].command_number].remove(index)
+            else :
+                if(onUnsolicited is not None) :
+                    onUnsolicited(packet)
+                continue
+            results[index] = packet
+            del deadlines[index]
+            self.RecordResponse(written[index], packet)
+
+        return(results)
+
+
     def WritePacket(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None) -> ControlPacket:
         """Builds a POD packet and writes it to the POD device. 
 
@@ -363,10 +708,36 @@ class Pod :
         packet = self.GetPODpacket(cmd, payload)
         # write packet to serial port 
         self._port.Write(packet)
+        # a reset device forgets its settings.
+        if(packet[1:5] == b'0003') :
+            self.InvalidateCache()
         # returns packet that was written
         return ControlPacket(self._commands, packet)
 
 
+    def WriteRawPacket(self, packet: bytes) -> None :
+        """Writes a packet that was already built with GetPODpacket to the POD device, such as one built \
+        ahead of time so that sending it takes as little time as possible. The state cache is not updated.
+
+        Args:
+            packet (bytes): The packet.
+        """
+        self._port.Write(packet)
+
+
+    def ParseControlPacket(self, raw: bytes) -> ControlPacket :
+        """Makes a control packet, which decodes its payload as this device does, from a packet's bytes, such \
+        as those of a packet built with GetPODpacket or read by another process.
+
+        Args:
+            raw (bytes): The packet, beginning with STX and ending with ETX.
+
+        Returns:
+            ControlPacket: The packet.
+        """
+        return(self._control_packet_factory(raw))
+
+
     def ReadPODpacket(self, validateChecksum:bool=True, timeout_sec: int|float = 5) -> PodPacket :
         """Reads a complete POD packet, either in standard or binary format, beginning with STX and \
         ending with ETX. Reads first STX and then starts recursion. 
@@ -391,6 +762,31 @@ class Pod :
         return(packet)
 
 
+    def ReadPODpacketTimed(self, validateChecksum:bool=True, timeout_sec: int|float = 5) -> tuple[PodPacket,int,int] :
+        """Same as ReadPODpacket, but also reports when the packet was read. Used to trace streaming \
+        latency; the times are from time.perf_counter_ns().
+
+        Args:
+            validateChecksum (bool, optional): Set to True to validate the checksum. Set to False to \
+                skip validation. Defaults to True.
+            timeout_sec (int|float, optional): Time in seconds to wait for serial data. \
+                Defaults to 5. 
+
+        Returns:
+            tuple[Packet,int,int]: POD packet, the time its STX byte was read from the serial port, \
+                and the time the rest of the packet was read and validated. 
+        """
+        # read until STX is found
+        b = None
+        while(b != PodPacket.STX) :
+            b = self._port.Read(1,timeout_sec)     # read next byte  
+        arrived: int = time.perf_counter_ns()
+        # continue reading packet  
+        packet = self._ReadPODpacket_Recursive(validateChecksum=validateChecksum)
+        # return final packet with times 
+        return(packet, arrived, time.perf_counter_ns())
+
+
     # ============ PROTECTED METHODS ============      ========================================================================================================================
 
 
@@ -510,7 +906,7 @@ class Pod :
                 skip validation. Defaults to True.
 
         Raises:
-            Exception: An exception is raised if the checksum is invalid (only if validateChecksum=True).
+            ChecksumError: An exception is raised if the checksum is invalid (only if validateChecksum=True).
 
         Returns:
             Packet_Standard: Complete standard POD packet.
@@ -520,9 +916,13 @@ class Pod :
         # check for valid  
         if(validateChecksum) :
             if( not self._ValidateChecksum(packet) ) :
-                raise Exception('Bad checksum for standard POD packet read.')
+                raise ChecksumError('Bad checksum for standard POD packet read.')
+        packet = self._control_packet_factory(packet)
+        # the device changed some of its settings by itself.
+        if(packet.command_number in self._forgotten_by) :
+            self._ForgetSettings(self._forgotten_by[packet.command_number])
         # return packet
-        return self._control_packet_factory(packet)
+        return packet
 
 
     def _Read_Binary(self, prePacket: bytes, validateChecksum:bool=True) -> DataPacket :
@@ -538,7 +938,7 @@ class Pod :
                 skip validation. Defaults to True.
 
         Raises:
-            Exception: An exception is raised if the checksum is invalid (only if validateChecksum=True).
+            ChecksumError: An exception is raised if the checksum is invalid (only if validateChecksum=True).
 
         Returns:
             PacketBinary: Variable-length binary POD packet.
@@ -561,6 +961,6 @@ class Pod :
             csmCalc = Pod.Checksum(binaryMsg)
             csm = binaryEnd[0:2]
             if(csm != csmCalc) : 
-                raise Exception('Bad checksum for binary POD packet read.')
+                raise ChecksumError('Bad checksum for binary POD packet read.')
         # return complete variable length binary packet
         return DataPacket(packet)
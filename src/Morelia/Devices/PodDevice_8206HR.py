@@ -1,5 +1,5 @@
 # local imports 
-from Morelia.Devices import AquisitionDevice, Pod
+from Morelia.Devices import AquisitionDevice, Pod, ChecksumError
 from Morelia.packet.data import DataPacket8206HR
 from Morelia.packet import ControlPacket
 from Morelia.Commands import CommandSet
@@ -59,6 +59,8 @@ class Pod8206HR(AquisitionDevice) :
         self._commands.AddCommand(106, 'GET TTL PORT',         (0,),       (U8,),     False,   'Gets the value of the entire TTL port as a byte. Does not modify pin direction.')
         self._commands.AddCommand(107, 'GET FILTER CONFIG',    (0,),       (U8,),     False,   'Gets the hardware filter configuration. 0=SL, 1=SE (Both 40/40/100Hz lowpass), 2 = SE3 (40/40/40Hz lowpas).')
         self._commands.AddCommand(180, 'BINARY4 DATA ',        (0,),       (B4,),     True,    'Binary4 data packets, enabled by using the STREAM command with a \'1\' argument.') # see _Read_Binary()
+        # settings kept by the state cache 
+        self._AddSetting('GET LOWPASS', 'SET LOWPASS', keyLength=1)
         # preamplifier gain (should be 10x or 100x)
         if(preampGain != 10 and preampGain != 100):
             raise Exception('[!] Preamplifier gain must be 10 or 100.')
@@ -72,6 +74,11 @@ class Pod8206HR(AquisitionDevice) :
 
         self._control_packet_factory = partial(ControlPacket, decode_packet)
 
+    @property
+    def preamp_gain(self) -> int :
+        """Preamplifier gain, 10 or 100."""
+        return(self._preampGain)
+
     # ------------ CONVERSIONS ------------           ------------------------------------------------------------------------------------------------------------------------
 
 
@@ -107,7 +114,7 @@ class Pod8206HR(AquisitionDevice) :
                 skip validation. Defaults to True.
 
         Raises:
-            Exception: Bad checksum for binary POD packet read.
+            ChecksumError: Bad checksum for binary POD packet read.
 
         Returns:
             Packet_Binary4: Binary4 POD packet.
@@ -141,6 +148,6 @@ class Pod8206HR(AquisitionDevice) :
         # check if checksum is correct 
         if(validateChecksum):
             if(not self._ValidateChecksum(packet) ) :
-                raise Exception('Bad checksum for binary POD packet read.')
+                raise ChecksumError('Bad checksum for binary POD packet read.')
         # return complete variable length binary packet
         return DataPacket8206HR(packet, self._preampGain)
@@ -70,6 +70,13 @@ class Pod8229(Pod) :
         self._commands.AddCommand(201, 'LCD SET MOTOR SPEED',   (NOVALUE,),             (U16,),                 False, 'Indicates the motor speed has been changed by the LCD.  0-100 as a percentage.')
         self._commands.AddCommand(202, 'LCD SET DAY SCHEDULE',  (NOVALUE,),             (U8,U8,U8,U8),          False, 'Indicates the LCD has changed the day schedule.  Byte 3 is weekday, Byte 2 is hours 0-7, Byte 3 is hours 8-15, and byte is hours 16-23.  Each bit represents the motor state in that hour, 1 for on and 0 for off.  Speed is whatever the current motor speed is.')
         self._commands.AddCommand(204, 'LCD SET MODE',          (NOVALUE,),             (U16,),                 False, 'Indicates the mode has been changed by the display.  0 = Manual, 1 = PC Control, 2 = Internal Schedule.')
+        # settings kept by the state cache. The motor state and speed are left out, since the internal schedule changes them.
+        self._AddSetting('GET MOTOR DIRECTION', 'SET MOTOR DIRECTION')
+        self._AddSetting('GET MODE',            'SET MODE',            changedBy=('LCD SET MODE',))
+        self._AddSetting('GET DAY SCHEDULE',    'SET DAY SCHEDULE',    keyLength=1, changedBy=('LCD SET DAY SCHEDULE',))
+        self._AddSetting('GET REVERSE PARAMS',  'SET REVERSE PARAMS')
+        self._AddSetting('GET RANDOM REVERSE',  'SET RANDOM REVERSE')
+        self._AddSetting(None,                  'SET ID')
 
         def decode_payload(cmd_number: int, payload: bytes) -> tuple:
             match cmd_number:
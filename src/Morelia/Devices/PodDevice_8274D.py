@@ -1,10 +1,9 @@
 # local imports 
 import time
-from Morelia.Devices import Pod, AquisitionDevice
+from Morelia.Devices import Pod, AquisitionDevice, ChecksumError
 
-from Morelia.packet.legacy import PacketBinary, Packet
-
-from Morelia.packet import ControlPacket
+from Morelia.packet import ControlPacket, PodPacket
+from Morelia.packet.data import DataPacket8274D
 import Morelia.packet.conversion as conv
 
 from functools import partial
@@ -19,12 +18,22 @@ __email__       = "sales@pinnaclet.com"
 
 class Pod8274D(AquisitionDevice) : 
     """POD_8274D handles communication using an 8274D POD device.
+
+    Streaming data from an 8274D is experimental: the layout of its data packets is unverified (see \
+    DataPacket8274D), so it is only streamed from when opened with experimental_streaming=True.
     """
 
+    SAMPLE_RATES: tuple[int] = (1024, 512, 256, 128)
+    """Sample rates of the remote device, in Hz, by the code used by 'SET SAMPLE RATE' and 'GET SAMPLE RATE REPLY'."""
+
+    # replies sent by the remote device, by the command that asks for them. The receiver first answers \
+    # the command itself with an SL_STATUS_T, then sends 211 PROCEDURE COMPLETE, then the reply.
+    _REPLIES: dict[str,str] = { 'GET SAMPLE RATE' : 'GET SAMPLE RATE REPLY', 'GET NAME' : 'GET NAME REPLY' }
+
     # ============ DUNDER METHODS ============      ========================================================================================================================
 
 
-    def __init__(self, port: str|int, baudrate:int=921600, device_name: str | None = None) -> None :
+    def __init__(self, port: str|int, baudrate:int=921600, device_name: str | None = None, experimental_streaming: bool = False) -> None :
         """Runs when an instance is constructed. It runs the parent's initialization. Then it updates \
         the _commands to contain the appropriate command set for an 8274 POD device. 
 
@@ -32,7 +41,11 @@ class Pod8274D(AquisitionDevice) :
             port (str | int): Serial port to be opened. Used when initializing the COM_io instance.
             baudrate (int, optional): Integer baud rate of the opened serial port. Used when initializing \
                 the COM_io instance. Defaults to 921600.
+            experimental_streaming (bool, optional): Allow streaming data from the device with DataFlow or \
+                get_data, although the layout of its data packets is unverified and the data may be wrong. \
+                Defaults to False.
         """
+        self.experimental_streaming: bool = experimental_streaming
         # initialize POD_Basics
         super().__init__(port, 1024, baudrate=baudrate, device_name=device_name, get_sample_rate_cmd_no=208, set_sample_rate_cmd_no=210) 
         # get constants for adding commands 
@@ -40,6 +53,10 @@ class Pod8274D(AquisitionDevice) :
         U16 = Pod.GetU(16)
         U32 = Pod.GetU(32)
         NOVALUE = Pod.GetU(0)
+        B4  = 8
+        # the remote device's sample rate is set by code, not in Hz, and the receiver answers with a status
+        self._commands.RemoveCommand(210)
+        self._commands.AddCommand(210, 'SET SAMPLE RATE',          (U8,),                   (U16,),              False, 'Requires 0,1,2,3 sample rate, returns SL_STATUS_T')
         # add device specific commands
         self._commands.AddCommand(100, 'LOCAL SCAN',               (U8,),                   (U16,),              False, 'Enables or disables scan.  1 enables, 0 disables.  Returns SL_STATUS_T status code, 0x0000 is success, all others are error codes.')
         self._commands.AddCommand(101, 'DEVICE LIST INFO',         (U8,),                   tuple([U8]*24),      False, 'Information string about a scanned device - includes advertising index, bluetooth address, and device name.')
@@ -57,6 +74,7 @@ class Pod8274D(AquisitionDevice) :
         # self._commands.AddCommand(134, 'GET STIMULUS',           (0,),                    (U16,),              False, 'Requests to read the stimulus config from the remote device.  Reply is SL_STATUS_T')
         # self._commands.AddCommand(135, 'GET STIMULUS REPLY',     (0,),                    (NOVALUE,),          False, 'Sends the period to the remote device.  Reply is SL_STATUS_T')
         # self._commands.AddCommand(136, 'SET STIMULUS',           (U32, U32, U32, U32,),   (0,),                False, 'Sends a  stimulus command to the remote device.  This will initiate the requested stimulus at the next waveform start.  See below for details.')
+        self._commands.AddCommand(180, 'BINARY DATA',              (0,),                    (B4,),               True,  'Data packets from the remote device, enabled by using the STREAM command with a \'1\' argument.') # see _Read_Binary()
         self._commands.AddCommand(200, 'CONNECT',                  (U8,),                   (U16,),              False, 'Requests a connection to the given advertising slot.  Returns connection status. ')
         self._commands.AddCommand(201, 'CONNECT REPLY',            (0,),                    (0,),                False, 'Indicates a connection completed successfully.')
         self._commands.AddCommand(202, 'DISCONNECT',               (U8,),                   (U16,),              False, 'Requests to disconnect from a given connection slot.  Returns a disconnect status.')
@@ -81,6 +99,10 @@ class Pod8274D(AquisitionDevice) :
         self._commands.AddCommand(221, 'GET NAME REPLY',           (0,),                    tuple([U8]*13),      False, 'The name in characters.')
         self._commands.AddCommand(222, 'CONNECT BY ADDRESS',       tuple([U8]*6),           (U16,),              False, 'Requires a BT address to connect to directly, returns SL_STATUS_T ')
         # self._commands.AddCommand(223, 'SERVICE DISCOVERY',      (0,),                    (U16,),              False, 'Returns SL_STATUS_T, and then will start generating characteristic responses.  Those are currently unhandled. Likely this command wont be exposed in the long run ')
+        # settings kept by the state cache. the receiver's own answer to GET SAMPLE RATE is a status, so the \
+        # sample rate is kept from the remote device's reply.
+        self._setting_getters.pop(self._CommandNumber('GET SAMPLE RATE'))
+        self._AddSetting('GET SAMPLE RATE REPLY', 'SET SAMPLE RATE')
 
         def decode_payload(cmd_number: int, payload: bytes) -> tuple:
             if cmd_number == 12:
@@ -106,9 +128,20 @@ class Pod8274D(AquisitionDevice) :
         self._control_packet_factory = partial(ControlPacket, decode_payload)
 
     
+    @property
+    def sample_rate(self) -> int :
+        """Sample rate of the remote device, in Hz. Only asks the device the first time."""
+        return(Pod8274D.SAMPLE_RATES[self.WriteRead('GET SAMPLE RATE').payload[0]])
+
+    @sample_rate.setter
+    def sample_rate(self, rate: int) -> None :
+        if(rate not in Pod8274D.SAMPLE_RATES) :
+            raise ValueError(f'The sample rate must be one of {", ".join(map(str, Pod8274D.SAMPLE_RATES))} Hz.')
+        self.WriteRead('SET SAMPLE RATE', Pod8274D.SAMPLE_RATES.index(rate))
+
     #------------------------OVERWRITE---------------------------------------------#
     
-    def WriteRead(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None, validateChecksum:bool=True) -> Packet:
+    def WriteRead(self, cmd: str|int, payload:int|bytes|tuple[int|bytes]=None, validateChecksum:bool=True, useCache:bool=True) -> PodPacket:
         """Writes a command with optional payload to POD device, then reads (once) the device response.
         8274D works differently compared to other devices as it is bluetooth based. Some commands require a re-read from the
         Pod Device, in order to get the right payload back. Each Get and Set Command will generate a Procedure Complete (command 211) indicating a successful write/read.
@@ -119,16 +152,21 @@ class Pod8274D(AquisitionDevice) :
                 is a payload, set to an integer value or a bytes string. Defaults to None.
             validateChecksum (bool, optional): Set to True to validate the checksum. Set to False to skip \
                     validation. Defaults to True.
+            useCache (bool, optional): Set to False to always ask the device. Defaults to True.
 
         Returns:
-            Packet: POD packet beginning with STX and ending with ETX. This may \
+            PodPacket: POD packet beginning with STX and ending with ETX. This may \
                 be a standard packet, binary packet, or an unformatted packet (STX+something+ETX). 
                 There are some conditions for some commands. For example, if cmd is Local Scan, it returns Payload[1:7]
                 because that will be the bluetooth address that can be used to connect to the device.
+                'GET SAMPLE RATE' returns the remote device's 'GET SAMPLE RATE REPLY'.
         """
-        #print(cmd)
-        self.WritePacket(cmd, payload)
-        r = self.ReadPODpacket()
+        if(cmd == 'GET SAMPLE RATE' and useCache) :
+            cached: ControlPacket|None = self.CachedResponse('GET SAMPLE RATE REPLY')
+            if(cached is not None) :
+                return(cached)
+        w = self.WritePacket(cmd, payload)
+        r = self.ReadPODpacket(validateChecksum)
         if cmd in ['LOCAL SCAN'] :
             max_retries = 3  # Maximum number of retries
             retries = 0
@@ -141,17 +179,84 @@ class Pod8274D(AquisitionDevice) :
                     continue
                 if r.command_number == 101 and len(r.payload) > 1:
                     return r  
-        if cmd in ['CONNECT BY ADDRESS', 'GET NAME', 'SET SAMPLE RATE', 'GET SAMPLE RATE', 'SET PERIOD']:
-            read: Packet = self.ReadPODpacket()
+        if cmd in ['CONNECT BY ADDRESS', 'SET SAMPLE RATE', 'SET PERIOD']:
+            if cmd == 'SET SAMPLE RATE':
+                # a status other than 0 means the remote device was not changed.
+                self.RecordResponse(w, r if r.payload[0] == 0 else None)
+            # procedure complete
+            self.ReadPODpacket(validateChecksum)
+        elif cmd in Pod8274D._REPLIES:
+            reply: ControlPacket = self._ReadReply(Pod8274D._REPLIES[cmd], validateChecksum)
             if cmd == 'GET NAME':
-                read: Packet = self.ReadPODpacket()
-                name = read.payload
-                return name
-            if cmd == 'GET SAMPLE RATE':
-                read.payload[0]
-                return data['Payload'][0]
-        elif cmd == 'STREAM':
-            while True:
-                x = self.ReadPODpacket(validateChecksum)
-                data: dict = x.TranslateAll()
+                return reply.payload
+            self.RecordResponse(self.ParseControlPacket(self.GetPODpacket(Pod8274D._REPLIES[cmd])), reply)
+            return reply
         return r
+
+    def _ReadReply(self, cmd: str, validateChecksum:bool=True) -> ControlPacket :
+        """Reads packets until the remote device's reply arrives, skipping the 211 PROCEDURE COMPLETE before it.
+
+        Args:
+            cmd (str): Name of the reply command.
+            validateChecksum (bool, optional): Set to True to validate the checksum. Set to False to skip \
+                    validation. Defaults to True.
+
+        Returns:
+            ControlPacket: The reply.
+        """
+        number: int = self._CommandNumber(cmd)
+        while True :
+            packet: PodPacket = self.ReadPODpacket(validateChecksum)
+            if(packet.command_number == number) :
+                return(packet)
+
+    def _Read_Binary(self, prePacket: bytes, validateChecksum:bool=True) -> DataPacket8274D :
+        """After receiving the prePacket, it reads the 8 bytes (packet number, connection and channels) \
+        and then reads to ETX (checksum+ETX). The layout is an unverified placeholder, see DataPacket8274D. 
+
+        Args:
+            prePacket (bytes): Bytes string containing the beginning of a POD packet: STX (1 byte) \
+                + command number (4 bytes).
+            validateChecksum (bool, optional): Set to True to validate the checksum. Set to False to \
+                skip validation. Defaults to True.
+
+        Raises:
+            ChecksumError: Bad checksum for binary POD packet read.
+
+        Returns:
+            DataPacket8274D: Binary data packet.
+        """
+
+        # ------------------------------------------------------------		
+        # 8274D Binary Data Format
+        # ------------------------------------------------------------		
+        # UNVERIFIED: there is no spec of this packet to check against, so this layout is a placeholder \
+        # borrowed from the 8206-HR's Binary4 packet. see DataPacket8274D, which holds the same offsets.
+        # ------------------------------------------------------------		
+        # Byte    Value	        Format      Description 
+        # ------------------------------------------------------------		
+        # 0	    0x02	        Binary		STX
+        # 1	    0	            ASCII		Command Number Byte 0
+        # 2	    0	            ASCII		Command Number Byte 1
+        # 3	    B	            ASCII		Command Number Byte 2
+        # 4	    4	            ASCII		Command Number Byte 3
+        # 5	    Packet Number 	Binary		A rolling value that increases with each packet, and rolls over to 0 after it hits 255
+        # 6	    Connection      Binary		Connection slot (0-3) of the remote device the data came from
+        # 7	    Ch0 LSB	        Binary		Least significant byte of the Channel 0 (EEG1) value
+        # 8	    Ch0 MSB	        Binary		Most significant byte of the Channel 0 (EEG1) value
+        # 9	    Ch1 LSB	        Binary		Channel 1 / EEG2 LSB
+        # 10    Ch1 MSB	        Binary		Channel 1 / EEG2 MSB
+        # 11    Ch2 LSB	        Binary		Channel 2 / EMG LSB
+        # 12    Ch2 MSB	        Binary		Channel 2 / EMG MSB
+        # 13    Checksum MSB	ASCII		MSB of checksum
+        # 14    Checksum LSB	ASCII		LSB of checkxum
+        # 15    0x03	        Binary		ETX
+        # ------------------------------------------------------------
+
+        # the binary part is fixed length, so it is read in one go rather than searched for STX/ETX
+        packet = prePacket + self._port.Read(8) + self._Read_ToETX(validateChecksum=validateChecksum)
+        # check if checksum is correct 
+        if(validateChecksum):
+            if(not self._ValidateChecksum(packet) ) :
+                raise ChecksumError('Bad checksum for binary POD packet read.')
+        return DataPacket8274D(packet)
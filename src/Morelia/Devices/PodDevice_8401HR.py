@@ -1,5 +1,5 @@
 # local imports 
-from Morelia.Devices import AquisitionDevice, Pod, Preamp
+from Morelia.Devices import AquisitionDevice, Pod, ChecksumError, Preamp
 from Morelia.packet import ControlPacket
 from Morelia.packet.data import DataPacket8401HR
 
@@ -114,6 +114,11 @@ class Pod8401HR(AquisitionDevice) :
         self._commands.AddCommand( 133,	'GET MUX MODE',	    (0,),	    (U8,),      False,  'Gets the state of mux mode. See SET MUX MODE.')
         self._commands.AddCommand( 134,	'GET TTL ANALOG',   (U8,),	    (U16,),     False,  'Reads a TTL input as an analog signal. Requires a channel to read, returns a 10-bit analog value. Same caveats and restrictions as GET EXTX VALUE commands. Normally you would just enable an extra channel in Sirenia for this.')
         self._commands.AddCommand( 181, 'BINARY5 DATA',     (0,),	    (B5,),      True,   'Binary5 data packets, enabled by using the STREAM command with a \'1\' argument.')
+        # settings kept by the state cache 
+        for name in ('HIGHPASS', 'LOWPASS', 'DC MODE', 'BIAS', 'SS CONFIG') :
+            self._AddSetting('GET '+name, 'SET '+name, keyLength=1)
+        for name in ('INPUT GROUND', 'TTL CONFIG', 'MUX MODE') :
+            self._AddSetting('GET '+name, 'SET '+name)
         # second stage gain
         ssGain_dict = self._FixABCDtype(ssGain, thisIs='ssGain ')
         self._ValidateSsGain(ssGain_dict)
@@ -129,7 +134,7 @@ class Pod8401HR(AquisitionDevice) :
         self._stream_packet_factory = partial(DataPacket8401HR, preampGain, ssGain, self._primary_channel_modes, self._secondary_channel_modes)
 
         def decode_payload(command_number: int, payload: bytes) -> tuple:
-            if command_number in 127 | 128 | 129:
+            if command_number in (127, 128, 129):
                 return Pod8401HR.DecodeTTLPayload(payload)
             return ControlPacket.decode_payload_from_cmd_set(self._commands, command_number, payload)
 
@@ -140,6 +145,24 @@ class Pod8401HR(AquisitionDevice) :
     def preamp(self) -> Preamp:
         return self._preamp
 
+    @property
+    def preamp_gain(self) -> tuple[int|None] :
+        """Preamplifier gain of channels A, B, C, and D (None for no-connect)."""
+        return(tuple(self._preampGain.values()))
+
+    @property
+    def ss_gain(self) -> tuple[int|None] :
+        """Second stage gain of channels A, B, C, and D (None for no-connect)."""
+        return(tuple(self._ssGain.values()))
+
+    @property
+    def primary_channel_modes(self) -> tuple :
+        return(tuple(self._primary_channel_modes))
+
+    @property
+    def secondary_channel_modes(self) -> tuple :
+        return(tuple(self._secondary_channel_modes))
+
     @staticmethod
     def _FixABCDtype(info: tuple|list|dict, thisIs: str = '') -> dict : 
         """Converts the info argument into a dictionary with A, B, C, and D as keys.
@@ -434,7 +457,7 @@ class Pod8401HR(AquisitionDevice) :
                 skip validation. Defaults to True.
 
         Raises:
-            Exception: Bad checksum for binary POD packet read.
+            ChecksumError: Bad checksum for binary POD packet read.
         """
         
         # -----------------------------------------------------------------------------
@@ -480,7 +503,7 @@ class Pod8401HR(AquisitionDevice) :
         # check if checksum is correct 
         if(validateChecksum):
             if(not self._ValidateChecksum(packet) ) :
-                raise Exception('Bad checksum for binary POD packet read.')
+                raise ChecksumError('Bad checksum for binary POD packet read.')
         # return complete variable length binary packet
         return self._stream_packet_factory(packet)
  
@@ -1,8 +1,10 @@
 # local imports 
 from Morelia.Devices import Pod
-from Morelia.packet import ControlPacket
+from Morelia.packet import ControlPacket, PodPacket
+import Morelia.packet.conversion as conv
 
 from functools import partial
+from typing import Self
 
 # authorship
 __author__      = "Sree Kondi"
@@ -17,6 +19,9 @@ class Pod8480SC(Pod) :
     POD_8480SC handles communication using an 8480-SC POD device. 
     """
 
+    # event packets, which the device sends on its own whenever something happens.
+    EVENT_COMMANDS: tuple[int] = (132, 133, 134, 135)
+
     # ============ DUNDER METHODS ============      ========================================================================================================================
     
 
@@ -62,6 +67,13 @@ class Pod8480SC(Pod) :
         self._commands.AddCommand( 133,	'EVENT STIM START',	    (0,),	                            (U8,),                               False  , 'Indicates the start of a stimulus.  Returns U8 channel.')
         self._commands.AddCommand( 134,	'EVENT STIM STOP',	    (0,),	                            (U8,),                               False  ,'Indicates the end of a stimulus. Returns U8 channel.')
         self._commands.AddCommand( 135,	'EVENT LOW CURRENT',	(0,),	                            (U8,),                               False  , 'Indicates a low current status on one or more of the LED channels.  U8 bitmask indication which channesl have low current.  Bit 0 = Ch0, Bit 1 = Ch1.')
+        # settings kept by the state cache 
+        self._AddSetting('GET STIMULUS',      'SET STIMULUS',      keyLength=1, echoesKey=True)
+        self._AddSetting('GET TTL SETUP',     'SET TTL SETUP',     keyLength=1)
+        self._AddSetting('GET LED CURRENT',   'SET LED CURRENT',   keyLength=1, allKeys=True)
+        self._AddSetting('GET ESTIM CURRENT', 'SET ESTIM CURRENT', keyLength=1, allKeys=True)
+        for name in ('TTL PULLUPS', 'PREAMP TYPE', 'SYNC CONFIG') :
+            self._AddSetting('GET '+name, 'SET '+name)
 
         def decode_payload(cmd_number: int, payload: bytes) -> tuple:
             match cmd_number:
@@ -83,6 +95,38 @@ class Pod8480SC(Pod) :
         self._control_packet_factory = partial(ControlPacket, decode_payload)
 
 
+    def __enter__(self) -> Self :
+        """Starts listening for events, such as when the device is used as a source in a DataFlow. Events \
+        that arrived earlier are thrown away.
+
+        Returns:
+            Pod8480SC: This device.
+        """
+        self.FlushPort()
+        return(self)
+
+
+    def __exit__(self, *args, **kwargs) -> bool :
+        # propagate exceptions
+        return(False)
+
+
+    # ------------ EVENTS ------------           ------------------------------------------------------------------------------------------------------------------------
+
+
+    @staticmethod
+    def IsEvent(packet: PodPacket) -> bool :
+        """Checks if a packet read from the device is an event (132 EVENT TTL, 133 EVENT STIM START, \
+        134 EVENT STIM STOP, or 135 EVENT LOW CURRENT) rather than the response to a command.
+
+        Args:
+            packet (PodPacket): Packet read from the device.
+
+        Returns:
+            bool: True if the packet is an event, False otherwise.
+        """
+        return(isinstance(packet, ControlPacket) and packet.command_number in Pod8480SC.EVENT_COMMANDS)
+
 
     # ------------ BITMASKING ------------           ------------------------------------------------------------------------------------------------------------------------
 
@@ -26,14 +26,23 @@ class PortIO :
         a set baudrate.
 
         Args:
-            port (str | int): String of the serial port to be opened. 
+            port (str | int): String of the serial port to be opened. 'TEST' opens a loopback port, \
+                and 'sim://...' opens a simulated device, once \
+                Morelia.testing.enable_simulated_devices() has been called.
             baudrate (int, optional): Integer baud rate of the opened serial port. Defaults to 9600.
         """
+        # remember the port so it can be reopened 
+        self._port : str|int = port
+        self._baudrate : int = baudrate
 
         if (port == 'TEST') :
 
             self.__serialInst : Serial = serial_for_url('loop://')
 
+        elif (PortIO.IsSimulatedPort(port)) :
+
+            self.__serialInst : Serial = serial_for_url(port, baudrate=baudrate)
+
         else:
 
             # initialize port 
@@ -85,6 +94,18 @@ class PortIO :
 
     # ----- BOOL CHECKS -----
 
+    @staticmethod
+    def IsSimulatedPort(port: str|int) -> bool : 
+        """Returns True if the port is the URL of a simulated device.
+
+        Args:
+            port (str | int): Name of a serial port.
+
+        Returns:
+            bool: True if the port starts with 'sim://', False otherwise.
+        """
+        return(isinstance(port, str) and port.startswith('sim://'))
+
     def IsSerialOpen(self) -> bool : 
         """Returns True if the serial instance port is open, false otherwise.
 
@@ -137,6 +158,25 @@ class PortIO :
             # throw an error 
             raise Exception('Port does not exist.')
 
+    def Reopen(self) -> None : 
+        """Closes the serial port, if it is still open, and opens the same port again. Used to reconnect \
+        to a device that was unplugged or stopped responding. 
+
+        Raises:
+            SerialException: The port could not be opened (for example, the device is still unplugged).
+        """
+        # closing a port whose device has gone away can fail, but the port is closed either way 
+        try : 
+            self.CloseSerialPort()
+        except OSError : 
+            pass
+        if (self._port == 'TEST') :
+            self.__serialInst = serial_for_url('loop://')
+        elif (PortIO.IsSimulatedPort(self._port)) :
+            self.__serialInst.open()
+        else :
+            self.OpenSerialPort(self._port, baudrate=self._baudrate)
+
     def SetBaudrate(self, baudrate: int) -> bool :
         """Sets the baud rate of the serial port
 
@@ -183,8 +223,38 @@ class PortIO :
         else :
             return(None)
 
+    def GetPort(self) -> str|int : 
+        """Gets the port as it was given when this was constructed, such as 'COM3', 3 or a 'sim://' URL.
+
+        Returns:
+            str|int: The port, whether or not it is open.
+        """
+        return(self._port)
+
+    def GetBytesWaiting(self) -> int : 
+        """Gets the number of bytes received by the serial port that have not been read yet.
+
+        Returns:
+            int: Number of bytes in the input buffer. Always 0 if the port is closed.
+        """
+        if(self.IsSerialOpen()) : 
+            return(self.__serialInst.in_waiting)
+        else :
+            return(0)
+
     # ----- INPUT/OUTPUT -----
 
+    def __SetTimeout(self, timeout_sec: int|float|None) -> None :
+        """Sets how long the port's reads wait for data. Each read method sets the timeout it needs, since \
+        the port keeps it between reads.
+
+        Args:
+            timeout_sec (int|float|None): Time in seconds to wait, or None to wait until the data arrives.
+        """
+        # setting the timeout reconfigures the port, so only do so when it changes.
+        if(self.__serialInst.timeout != timeout_sec) :
+            self.__serialInst.timeout = timeout_sec
+
     def Read(self, numBytes: int, timeout_sec: int|float = 5) -> bytes|None :
         """Reads a specified number of bytes from the open serial port.
 
@@ -194,7 +264,7 @@ class PortIO :
                 Defaults to 5. 
         
         Raises:
-            Exception: Timeout for serial read.
+            TimeoutError: Fewer than numBytes bytes arrived within timeout_sec.
 
         Returns:
             bytes|None: If the serial port is open, it will return a set number of read bytes. \
@@ -203,15 +273,12 @@ class PortIO :
         # do not continue of serial is not open 
         if(self.IsSerialClosed()) :
             return(None)
-        # wait until port is in waiting, then read 
-        t = 0.0
-        while (t < timeout_sec) :
-            ti = (round(time.time(),9)) # initial time (sec)          
-            if self.__serialInst.in_waiting : 
-                # read packet
-                return(self.__serialInst.read(numBytes) )
-            t += (round(time.time(),9)) - ti
-        raise TimeoutError('[!] Timeout for serial read after '+str(timeout_sec)+' seconds.')
+        # block in the port until the bytes arrive, rather than polling, so other threads can run while this one waits.
+        self.__SetTimeout(timeout_sec)
+        data = self.__serialInst.read(numBytes)
+        if(len(data) < numBytes) :
+            raise TimeoutError('[!] Timeout for serial read after '+str(timeout_sec)+' seconds.')
+        return(data)
 
 
     def ReadLine(self) -> bytes|None :
@@ -224,6 +291,8 @@ class PortIO :
         # do not continue of serial is not open 
         if(self.IsSerialClosed()) :
             return(None)
+        # wait for the whole line, however long an earlier Read's timeout was.
+        self.__SetTimeout(None)
         # wait until port is in waiting, then read line 
         while True :
             if self.__serialInst.in_waiting : 
@@ -243,6 +312,8 @@ class PortIO :
         # do not continue of serial is not open 
         if(self.IsSerialClosed()) :
             return(None)
+        # wait for the whole line, however long an earlier Read's timeout was.
+        self.__SetTimeout(None)
         # wait until port is in waiting, then read 
         while True :
             if self.__serialInst.in_waiting : 
@@ -1,11 +1,20 @@
-# module access
-from Morelia.Devices.BasicPodProtocol    import Pod
-from Morelia.Devices.preamp              import Preamp
-from Morelia.Devices.aquisition_device   import AquisitionDevice
-from Morelia.Devices.PodDevice_8206HR    import Pod8206HR
-from Morelia.Devices.PodDevice_8401HR    import Pod8401HR
-from Morelia.Devices.PodDevice_8229      import Pod8229
-from Morelia.Devices.PodDevice_8480SC    import Pod8480SC
-from Morelia.Devices.PodDevice_8274D     import Pod8274D
-# sub-package access
-from Morelia.Devices import SerialPorts
+# module access, imported on first use (see Morelia._lazy).
+from Morelia._lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'Pod'              : 'Morelia.Devices.BasicPodProtocol',
+    'ChecksumError'    : 'Morelia.Devices.BasicPodProtocol',
+    'UnexpectedResponseError' : 'Morelia.Devices.BasicPodProtocol',
+    'Preamp'           : 'Morelia.Devices.preamp',
+    'AquisitionDevice' : 'Morelia.Devices.aquisition_device',
+    'Pod8206HR'        : 'Morelia.Devices.PodDevice_8206HR',
+    'Pod8401HR'        : 'Morelia.Devices.PodDevice_8401HR',
+    'Pod8229'          : 'Morelia.Devices.PodDevice_8229',
+    'Pod8480SC'        : 'Morelia.Devices.PodDevice_8480SC',
+    'Pod8274D'         : 'Morelia.Devices.PodDevice_8274D',
+    'Fleet'            : 'Morelia.Devices.fleet',
+    'FleetResult'      : 'Morelia.Devices.fleet',
+    'FleetError'       : 'Morelia.Devices.fleet',
+    # sub-package access
+    'SerialPorts'      : None,
+})
@@ -7,9 +7,10 @@ __license__     = 'New BSD License'
 __copyright__   = 'Copyright (c) 2023, James Hurd'
 __email__       = 'sales@pinnaclet.com'
 
+import time
 from typing import Self
 
-from Morelia.Devices import Pod
+from Morelia.Devices import Pod, ChecksumError
 
 class AquisitionDevice(Pod):
 
@@ -22,9 +23,7 @@ class AquisitionDevice(Pod):
         
         self._commands.AddCommand(get_sample_rate_cmd_no, 'GET SAMPLE RATE',      (0,),       (U16,),    False,   'Gets the current sample rate of the system, in Hz.')
         self._commands.AddCommand(set_sample_rate_cmd_no, 'SET SAMPLE RATE',      (U16,),     (0,),      False,   'Sets the sample rate of the system, in Hz. Valid values are 100 - 2000 currently.')
-        
-        #initialize as none so that when we ask for the sample rate later, it uses the overidden WriteRead.
-        self._sample_rate: int = None
+        self._AddSetting('GET SAMPLE RATE', 'SET SAMPLE RATE')
 
         self._max_sample_rate: int = max_sample_rate
 
@@ -34,9 +33,8 @@ class AquisitionDevice(Pod):
 
     @property
     def sample_rate(self) -> int:
-        if self._sample_rate is None:
-            self._sample_rate = self.WriteRead('GET SAMPLE RATE').payload
-        return self._sample_rate
+        #only asks the device the first time, after that the state cache knows it.
+        return self.WriteRead('GET SAMPLE RATE').payload[0]
 
     @sample_rate.setter
     def sample_rate(self, rate: int) -> None:
@@ -44,8 +42,44 @@ class AquisitionDevice(Pod):
             raise ValueError(f'The maximum allowable sample rate is {self.max_sample_rate} Hz.')
 
         self.WriteRead('SET SAMPLE RATE', rate)
-        self._sample_rate: int = rate
     
+    def Reconnect(self, timeout_sec: float = 1) -> None:
+        """Reopen the serial port and start streaming again, after the device was unplugged or stopped
+        responding. Streaming is stopped first in case the device never stopped, and the sample rate is set
+        again in case the device was reset and forgot it.
+
+        Args:
+            timeout_sec (float, optional): Time in seconds to wait for each response from the device. Defaults to 1.
+
+        Raises:
+            SerialException: The port could not be reopened.
+            TimeoutError: The device did not respond.
+        """
+        sample_rate: int | None = self.sample_rate if self.IsCached('GET SAMPLE RATE') else None
+
+        self._port.Reopen()
+
+        #skip over any data still being sent until the device confirms it has stopped streaming.
+        stream_command: int = self._commands.CommandNumberFromName('STREAM')
+        self.WritePacket('STREAM', 0)
+        deadline: float = time.perf_counter() + timeout_sec
+        while True:
+            try:
+                if self.ReadPODpacket(timeout_sec=timeout_sec).command_number == stream_command:
+                    break
+            except ChecksumError:
+                pass
+            #the command may have been lost while the device kept streaming.
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f'Device did not stop streaming within {timeout_sec} seconds.')
+
+        #the device may have lost power, and every setting with it.
+        self.InvalidateCache()
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+        self.WritePacket('STREAM', 1)
+
     def __enter__(self) -> Self:
 
         #no WriteRead, because the confirmation packet may arrive
@@ -58,16 +92,27 @@ class AquisitionDevice(Pod):
 
     def __exit__(self, *args, **kwargs) -> bool:
 
-        self.WritePacket('STREAM', 0)
-        
-        #get any packets that may have arrived between the user ending stream
-        #and the command being received from the device + plus the response
-        #packet from earlier.
-        while True:
-            try:
-                self.ReadPODpacket(timeout_sec=1)
-            except TimeoutError:
-                break
+        #nothing to clean up if the connection to the device was lost.
+        if self._port.IsSerialClosed():
+            return False
+
+        try:
+            self.WritePacket('STREAM', 0)
+            
+            #get any packets that may have arrived between the user ending stream
+            #and the command being received from the device + plus the response
+            #packet from earlier.
+            while True:
+                try:
+                    self.ReadPODpacket(timeout_sec=1)
+                except TimeoutError:
+                    break
+                except ChecksumError:
+                    continue
+
+        #the device went away while stopping.
+        except OSError:
+            pass
         
         #explicitly tell the context manager to propagate execptions.
         return False
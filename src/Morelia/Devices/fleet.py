@@ -0,0 +1,386 @@
+"""Opening, configuring and commanding many POD devices at once."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple, Self
+
+from Morelia.Devices import Pod, ChecksumError, UnexpectedResponseError, Preamp, Pod8206HR, Pod8401HR, Pod8229, Pod8480SC
+from Morelia.Parameters import Params, Params8206HR, Params8401HR, Params8229, Params8480SC
+from Morelia.packet import ControlPacket, PrimaryChannelMode, SecondaryChannelMode
+
+#errors worth trying a command again for: a garbled, lost or late response, or a port that hiccuped.
+RETRY_ERRORS: tuple[type[Exception]] = (ChecksumError, UnexpectedResponseError, TimeoutError, OSError)
+
+class FleetResult(NamedTuple):
+    """Outcome of an operation on one device of a fleet.
+
+    Attributes:
+        value (Any): What the operation returned, or None if it failed.
+        error (Exception | None): Why the operation failed, or None if it succeeded.
+        retries (int): Number of commands that had to be sent again.
+        seconds (float): Time the operation took on this device.
+    """
+    value: Any
+    error: Exception | None
+    retries: int
+    seconds: float
+
+    @property
+    def ok(self) -> bool:
+        """True if the operation succeeded."""
+        return self.error is None
+
+class FleetError(Exception):
+    """One or more devices of a fleet failed an operation.
+
+    Attributes:
+        results (dict[str, FleetResult]): Result for every device, by name, including those that succeeded.
+    """
+
+    def __init__(self, results: dict[str, FleetResult]) -> None:
+        self.results: dict[str, FleetResult] = results
+        failed: list[str] = [ f'{name} ({result.error!r})' for name, result in results.items() if not result.ok ]
+        super().__init__(f'{len(failed)} of {len(results)} devices failed: {", ".join(failed)}')
+
+class Fleet:
+    """A group of POD devices that are opened, configured and commanded concurrently.
+
+    Talking to a device is mostly waiting for it to answer, so doing so one device at a time makes bringing up a
+    large rig slow: each command is a round trip over a serial port. A fleet talks to every device at once, from a
+    pool of threads, so bringing up 40 devices takes about as long as bringing up one.
+
+    Devices are opened and configured from their parameters (``Params8206HR``, ``Params8401HR``, ``Params8229`` or
+    ``Params8480SC``) with ``Open``, or added already open with ``Add``. Every operation returns a ``FleetResult`` for
+    each device rather than stopping at the first failure, and each command is retried when its response is lost,
+    late or garbled.
+
+    Example::
+
+        with Fleet() as fleet:
+            results = fleet.Open([ Params8206HR(port, 2000, 10, (40, 40, 40)) for port in ports ])
+            fleet.PingAll()
+
+    Args:
+        max_workers (int, optional): Most devices to talk to at once. Defaults to 32.
+        retries (int, optional): Times to resend a command that failed. Defaults to 2.
+        timeout_sec (float, optional): Seconds to wait for each response. Defaults to 1.
+        retry_delay_sec (float, optional): Seconds to wait before resending a command, so late responses arrive and
+            are flushed first. Defaults to 0.05.
+    """
+
+    def __init__(self, max_workers: int = 32, retries: int = 2, timeout_sec: float = 1, retry_delay_sec: float = 0.05) -> None:
+        if retries < 0:
+            raise ValueError('`retries` must not be negative.')
+
+        self._max_workers: int = max_workers
+        self._retries: int = retries
+        self._timeout_sec: float = timeout_sec
+        self._retry_delay_sec: float = retry_delay_sec
+        self._devices: dict[str, Pod] = {}
+        #commands resent by the operation running in each thread.
+        self._local = threading.local()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.Close()
+        return False
+
+    @property
+    def devices(self) -> dict[str, Pod]:
+        """Devices in the fleet, by name."""
+        return dict(self._devices)
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __getitem__(self, name: str) -> Pod:
+        return self._devices[name]
+
+    def Add(self, pod: Pod) -> None:
+        """Add a device that is already open to the fleet.
+
+        Args:
+            pod (Pod): The device. Its name (``device_name``) must not already be in the fleet.
+        """
+        if pod.device_name in self._devices:
+            raise ValueError(f'A device named "{pod.device_name}" is already in the fleet.')
+        self._devices[pod.device_name] = pod
+
+    def Close(self) -> None:
+        """Close every device's serial port, and empty the fleet."""
+        for pod in self._devices.values():
+            pod.ClosePort()
+        self._devices.clear()
+
+    # ------------ CONCURRENCY ------------
+
+    def Run(self, operation: Callable[[Pod], Any], names: list[str] | None = None) -> dict[str, FleetResult]:
+        """Run an operation on many devices at once.
+
+        Args:
+            operation (Callable[[Pod], Any]): Called with each device, in its own thread. Use ``Command`` within it
+                to send commands with retries.
+            names (list[str] | None, optional): Names of the devices to run it on. Defaults to None (all of them).
+
+        Returns:
+            dict[str, FleetResult]: Result for each device, by name.
+        """
+        pods: dict[str, Pod] = self._devices if names is None else { name : self._devices[name] for name in names }
+        return self._Map({ name : (lambda pod=pod: operation(pod)) for name, pod in pods.items() })
+
+    def _Map(self, operations: dict[str, Callable[[], Any]]) -> dict[str, FleetResult]:
+        def attempt(operation: Callable[[], Any]) -> FleetResult:
+            self._local.retries = 0
+            start: float = time.perf_counter()
+            try:
+                return FleetResult(operation(), None, self._local.retries, time.perf_counter() - start)
+            except Exception as error:
+                return FleetResult(None, error, self._local.retries, time.perf_counter() - start)
+
+        if not operations:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(operations))) as executor:
+            futures = { name : executor.submit(attempt, operation) for name, operation in operations.items() }
+            return { name : future.result() for name, future in futures.items() }
+
+    def Command(self, pod: Pod, cmd: str | int, payload: int | bytes | tuple[int | bytes] | None = None,
+                use_cache: bool = True, only_if_changed: bool = False) -> ControlPacket | None:
+        """Send a command to a device and wait for its response, retrying if the response is lost, late, garbled or
+        for another command. Like ``Pod.WriteRead``, commands that get a setting the device is known to have are
+        answered from its state cache.
+
+        Args:
+            pod (Pod): Device to command.
+            cmd (str | int): Command name or number.
+            payload (int | bytes | tuple[int | bytes] | None, optional): Command's arguments. Defaults to None.
+            use_cache (bool, optional): Set to False to always ask the device. Defaults to True.
+            only_if_changed (bool, optional): Skip a command that sets a setting the device is known to already
+                have. Defaults to False.
+
+        Raises:
+            Exception: The command failed every attempt; the last error is raised.
+
+        Returns:
+            ControlPacket | None: The device's response, or None if the command was skipped.
+        """
+        if only_if_changed and pod.IsSettingCurrent(cmd, payload):
+            return None
+        if use_cache and (cached := pod.CachedResponse(cmd, payload)) is not None:
+            return cached
+
+        command_number: int = pod._commands.CommandNumberFromName(cmd) if isinstance(cmd, str) else cmd
+        for attempt in range(1, self._retries + 2):
+            written: ControlPacket | None = None
+            try:
+                written = pod.WritePacket(cmd, payload)
+                response = pod.ReadPODpacket(timeout_sec=self._timeout_sec)
+                pod.RecordResponse(written, response)
+                if response.command_number != command_number:
+                    raise UnexpectedResponseError(f'Expected a response to command {command_number}, got one to {response.command_number}.')
+                return response
+            except RETRY_ERRORS:
+                #the device may or may not have taken a setting it did not confirm.
+                if written is not None:
+                    pod.RecordResponse(written, None)
+                if attempt > self._retries:
+                    raise
+                #let any late response arrive, and throw it away.
+                time.sleep(self._retry_delay_sec)
+                pod.FlushPort()
+                self._local.retries = getattr(self._local, 'retries', 0) + 1
+
+    # ------------ CONFIGURATION ------------
+
+    def Open(self, params: list[Params], raise_errors: bool = False) -> dict[str, FleetResult]:
+        """Open and configure many devices at once, from their parameters, and add those that succeeded to the fleet.
+
+        Each device is opened on its parameters' port, sent the commands that apply every parameter, and pinged.
+        8401-HR channels are taken to be biosensors or EEG/EMG from the preamplifier's channel map, and its TTL and
+        AEXT inputs to be digital.
+
+        Args:
+            params (list[Params]): Parameters of each device, as ``Params8206HR``, ``Params8401HR``, ``Params8229``
+                or ``Params8480SC``.
+            raise_errors (bool, optional): Raise a ``FleetError`` if any device failed. Defaults to False.
+
+        Raises:
+            FleetError: A device failed, and `raise_errors` is True.
+
+        Returns:
+            dict[str, FleetResult]: Result for each device, by port, with the opened device as its value.
+        """
+        results: dict[str, FleetResult] = self._Map({ p.port : (lambda p=p: self._OpenDevice(p)) for p in params })
+        for result in results.values():
+            if result.ok:
+                self.Add(result.value)
+
+        if raise_errors and not all(result.ok for result in results.values()):
+            raise FleetError(results)
+        return results
+
+    def Configure(self, params: list[Params], raise_errors: bool = False, force: bool = False) -> dict[str, FleetResult]:
+        """Apply parameters to devices already in the fleet, at once. Each device is found by its parameters' port.
+        Only settings that differ from what each device is known to have are sent, so applying the same parameters
+        again costs one ping per device.
+
+        Args:
+            params (list[Params]): Parameters of each device.
+            raise_errors (bool, optional): Raise a ``FleetError`` if any device failed. Defaults to False.
+            force (bool, optional): Send every setting, even those the device already has. Defaults to False.
+
+        Raises:
+            FleetError: A device failed, and `raise_errors` is True.
+
+        Returns:
+            dict[str, FleetResult]: Result for each device, by port.
+        """
+        results = self._Map({ p.port : (lambda p=p: self._ApplyParams(self._DeviceOnPort(p.port), p, force)) for p in params })
+        if raise_errors and not all(result.ok for result in results.values()):
+            raise FleetError(results)
+        return results
+
+    def _DeviceOnPort(self, port: str | int) -> Pod:
+        """The device in the fleet on a port, given as it was when the device was opened or as the serial port's name."""
+        for pod in self._devices.values():
+            if port in (pod.GetPort(), pod.GetPortName()):
+                return pod
+        raise KeyError(f'No device in the fleet is on port "{port}".')
+
+    def _OpenDevice(self, params: Params) -> Pod:
+        match params:
+            case Params8206HR():
+                pod = Pod8206HR(params.port, params.preamplifierGain)
+            case Params8401HR():
+                preamp: Preamp = self._Preamp(params.preampDevice)
+                channels: dict[str, str] = Pod8401HR.GetChannelMapForPreampDevice(preamp)
+                primary = tuple(PrimaryChannelMode.BIOSENSOR if channels[c].startswith('Bio') else PrimaryChannelMode.EEG_EMG for c in 'ABCD')
+                pod = Pod8401HR(params.port, preamp, primary, (SecondaryChannelMode.DIGITAL,)*6, params.ssGain, params.preampGain)
+            case Params8229():
+                pod = Pod8229(params.port)
+            case Params8480SC():
+                pod = Pod8480SC(params.port)
+            case _:
+                raise TypeError(f'Devices can not be opened from {type(params).__name__}.')
+
+        try:
+            self._ApplyParams(pod, params)
+        except Exception:
+            pod.ClosePort()
+            raise
+        return pod
+
+    @staticmethod
+    def _Preamp(name: str) -> Preamp:
+        """The preamplifier named like ``'8407-SE'``, ``'Preamp8407_SE'`` or ``'Preamp.Preamp8407_SE'``."""
+        try:
+            return Preamp['Preamp' + name.split('.')[-1].removeprefix('Preamp').replace('-', '_')]
+        except KeyError:
+            raise ValueError(f'"{name}" is not a preamplifier.') from None
+
+    def _ApplyParams(self, pod: Pod, params: Params, force: bool = False) -> ControlPacket:
+        """Send every command needed to apply parameters to a device, then ping it. Settings the device is known to
+        already have are skipped, unless forced."""
+        def apply(cmd: str, payload: int | tuple[int] | None = None) -> None:
+            self.Command(pod, cmd, payload, only_if_changed=not force)
+
+        match params:
+            case Params8206HR():
+                apply('SET SAMPLE RATE', params.sampleRate)
+                for channel, low_pass in enumerate(params.lowPass):
+                    apply('SET LOWPASS', (channel, low_pass))
+
+            case Params8401HR():
+                apply('SET SAMPLE RATE', params.sampleRate)
+                apply('SET MUX MODE', int(params.muxMode))
+                high_pass_codes: dict[float, int] = { 0.5 : 0, 1.0 : 1, 10.0 : 2, 0.0 : 3 }
+                for channel in range(4):
+                    #channels set to None are not connected.
+                    if params.highPass[channel] is not None:
+                        apply('SET HIGHPASS', (channel, high_pass_codes[params.highPass[channel]]))
+                    if params.lowPass[channel] is not None:
+                        apply('SET LOWPASS', (channel, params.lowPass[channel]))
+                    if params.dcMode[channel] is not None:
+                        apply('SET DC MODE', (channel, 0 if params.dcMode[channel] == 'VBIAS' else 1))
+                    if params.bias[channel] is not None:
+                        apply('SET BIAS', (channel, Pod8401HR.CalculateBiasDAC_GetDACValue(params.bias[channel])))
+                    if params.ssGain[channel] is not None:
+                        apply('SET SS CONFIG', (channel, Pod8401HR.GetSSConfigBitmask(params.ssGain[channel], params.highPass[channel])))
+
+            case Params8229():
+                apply('SET ID', params.systemID)
+                self.Command(pod, 'SET TIME', Pod8229.GetCurrentTime())
+                apply('SET MOTOR DIRECTION', int(params.motorDirection))
+                apply('SET MOTOR SPEED', params.motorSpeed)
+                apply('SET RANDOM REVERSE', int(params.randomReverse))
+                if params.randomReverse:
+                    apply('SET REVERSE PARAMS', (params.reverseBaseTime, params.reverseVarTime))
+                for day, hours in (params.schedule or {}).items():
+                    apply('SET DAY SCHEDULE', Pod8229.BuildSetDayScheduleArgument(day, hours, params.motorSpeed))
+                apply('SET MODE', params.mode)
+
+            case Params8480SC():
+                apply('SET STIMULUS', params.stimulus)
+                apply('SET PREAMP TYPE', params.preamp)
+                for channel in range(2):
+                    apply('SET LED CURRENT', (channel, params.ledCurrent[channel]))
+                    apply('SET ESTIM CURRENT', (channel, params.estimCurrent[channel]))
+                apply('SET TTL PULLUPS', params.ttlPullups)
+                apply('SET SYNC CONFIG', params.syncConfig)
+                apply('SET TTL SETUP', params.ttlSetup)
+
+            case _:
+                raise TypeError(f'Devices can not be configured from {type(params).__name__}.')
+
+        return self.Command(pod, 'PING')
+
+    # ------------ BULK OPERATIONS ------------
+
+    def PingAll(self) -> dict[str, FleetResult]:
+        """Ping every device at once.
+
+        Returns:
+            dict[str, FleetResult]: Result for each device, by name, with the time (in seconds) it took to answer as its value.
+        """
+        def ping(pod: Pod) -> float:
+            start: float = time.perf_counter()
+            self.Command(pod, 'PING')
+            return time.perf_counter() - start
+        return self.Run(ping)
+
+    def FirmwareVersionAll(self) -> dict[str, FleetResult]:
+        """Get the firmware version of every device at once.
+
+        Returns:
+            dict[str, FleetResult]: Result for each device, by name, with its firmware version as its value.
+        """
+        return self.Run(lambda pod: self.Command(pod, 'FIRMWARE VERSION').payload)
+
+    def SampleRateAll(self, rate: int | None = None) -> dict[str, FleetResult]:
+        """Get, or set, the sample rate of every device that streams data, at once. Other devices are left out.
+
+        Args:
+            rate (int | None, optional): Sample rate to set, in Hz, or None to get each device's sample rate.
+                Defaults to None.
+
+        Returns:
+            dict[str, FleetResult]: Result for each device, by name, with its sample rate as its value.
+        """
+        def sample_rate(pod: Pod) -> int:
+            if rate is None:
+                return self.Command(pod, 'GET SAMPLE RATE').payload[0]
+            if rate > pod.max_sample_rate:
+                raise ValueError(f'The maximum allowable sample rate is {pod.max_sample_rate} Hz.')
+            self.Command(pod, 'SET SAMPLE RATE', rate)
+            return rate
+
+        return self.Run(sample_rate, [ name for name, pod in self._devices.items() if isinstance(pod, (Pod8206HR, Pod8401HR)) ])
@@ -1,2 +1,9 @@
-import Morelia.Stream.data_flow
-import Morelia.Stream.sink
+# sub-module and sub-package access, imported on first use (see Morelia._lazy).
+from Morelia._lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'closed_loop' : None,
+    'data_flow'   : None,
+    'sink'        : None,
+    'sync'        : None,
+})
@@ -0,0 +1,289 @@
+"""Closed-loop control: detectors that watch the data streamed from a device, and triggers that send a command to a
+device (e.g. ``SET TTL OUT`` on an 8206-HR, or ``RUN STIMULUS`` on an 8480-SC) the moment a detector fires. Triggers
+run in the streaming worker, on each chunk right after it is read and timestamped and before it is handed to any sink,
+and write a packet built ahead of time straight to a port that is already open.
+
+Every trigger is logged in shared memory, with the latency from the chunk holding the event being read to the
+command being written, so the parent process can read the log at any time.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+#environment imports
+import abc
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+#local imports
+from Morelia.Devices import AquisitionDevice, Pod
+from Morelia.packet.data import DataBatch
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+
+class Detector(metaclass=abc.ABCMeta):
+    """Finds events in one channel of a device's data, a chunk at a time. Detectors work on whole chunks with numpy,
+    and keep whatever they need from earlier chunks themselves, so events that straddle two chunks are found.
+
+    :param channel: Name of the channel to watch, as in ``ChannelSchema.names`` (e.g. ``'EEG1'``).
+    :type channel: str
+    """
+
+    def __init__(self, channel: str) -> None:
+        self._channel: str = channel
+
+    @property
+    def channel(self) -> str:
+        return self._channel
+
+    def start(self, sample_rate: int) -> None:
+        """Called by the worker before streaming starts, to forget anything kept from an earlier stream.
+
+        :param sample_rate: Sample rate of the device, in Hz.
+        :type sample_rate: int
+        """
+        pass
+
+    @abc.abstractmethod
+    def detect(self, values: np.ndarray) -> np.ndarray:
+        """Find events in the next chunk of the channel.
+
+        :param values: The channel's values, in microvolts for analog channels and 0 or 1 for digital ones.
+        :type values: numpy.ndarray
+
+        :return: Index in `values` of the sample each event was detected at, in order.
+        :rtype: numpy.ndarray[numpy.intp]
+        """
+        raise NotImplementedError
+
+class ThresholdDetector(Detector):
+    """Detects a channel crossing a threshold.
+
+    :param channel: Name of the channel to watch.
+    :type channel: str
+    :param threshold: Value to detect crossings of, in microvolts for analog channels (use 0.5 for digital ones).
+    :type threshold: float
+    :param rising: Detect the channel rising to or above the threshold if True, or falling below it if False. Defaults to True.
+    :type rising: bool, optional
+    """
+
+    def __init__(self, channel: str, threshold: float, rising: bool = True) -> None:
+        super().__init__(channel)
+        self._threshold: float = threshold
+        self._rising: bool = rising
+        self._last: float | None = None
+
+    def start(self, sample_rate: int) -> None:
+        self._last = None
+
+    def detect(self, values: np.ndarray) -> np.ndarray:
+        if not len(values):
+            return np.empty(0, dtype=np.intp)
+
+        above: np.ndarray = values >= self._threshold
+        if not self._rising:
+            above = ~above
+
+        #the sample before each one, starting with the last sample of the chunk before.
+        was_above: np.ndarray = np.empty_like(above)
+        was_above[0] = above[0] if self._last is None else (self._last >= self._threshold) == self._rising
+        was_above[1:] = above[:-1]
+        self._last = values[-1]
+
+        return np.flatnonzero(above & ~was_above)
+
+class BandPowerDetector(Detector):
+    """Detects the power of a channel in a frequency band rising above a threshold, such as the start of a spindle or
+    of a theta burst. The power is the mean of the periodogram over the band, for the most recent `window_sec` of the
+    channel, worked out once per chunk. An event is detected at the last sample of the chunk in which the power first
+    rises above the threshold, and again only once it has dropped below the threshold.
+
+    :param channel: Name of the channel to watch.
+    :type channel: str
+    :param band: Lowest and highest frequency of the band, in Hz.
+    :type band: tuple[float, float]
+    :param threshold: Power to detect, in microvolts squared per Hz.
+    :type threshold: float
+    :param window_sec: Length of the data the power is worked out from, in seconds. Defaults to 0.5.
+    :type window_sec: float, optional
+    """
+
+    def __init__(self, channel: str, band: tuple[float, float], threshold: float, window_sec: float = 0.5) -> None:
+        super().__init__(channel)
+        if band[0] >= band[1]:
+            raise ValueError('The low end of the band must be below its high end.')
+
+        self._band: tuple[float, float] = band
+        self._threshold: float = threshold
+        self._window_sec: float = window_sec
+
+    def start(self, sample_rate: int) -> None:
+        self._window: int = max(2, int(self._window_sec * sample_rate))
+        self._history: np.ndarray = np.empty(0)
+        self._above: bool = False
+
+        #the window and the frequencies of the periodogram are the same for every chunk.
+        self._taper: np.ndarray = np.hanning(self._window)
+        self._scale: float = 1 / (sample_rate * np.sum(self._taper**2))
+        frequencies: np.ndarray = np.fft.rfftfreq(self._window, 1/sample_rate)
+        self._in_band: np.ndarray = (frequencies >= self._band[0]) & (frequencies <= self._band[1])
+        if not self._in_band.any():
+            raise ValueError(f'No frequencies between {self._band[0]} and {self._band[1]} Hz can be resolved from {self._window_sec} seconds of data.')
+
+    def power(self, values: np.ndarray) -> float:
+        """Band power of the most recent window of the channel. Only meaningful once a full window has been seen."""
+        window: np.ndarray = values[-self._window:]
+        spectrum: np.ndarray = np.fft.rfft((window - window.mean()) * self._taper)
+        return float(np.mean(np.abs(spectrum[self._in_band])**2) * self._scale)
+
+    def detect(self, values: np.ndarray) -> np.ndarray:
+        self._history = np.concatenate((self._history, values))[-self._window:]
+        if len(self._history) < self._window:
+            return np.empty(0, dtype=np.intp)
+
+        above: bool = self.power(self._history) >= self._threshold
+        rose: bool = above and not self._above
+        self._above = above
+
+        return np.array([len(values)-1], dtype=np.intp) if rose else np.empty(0, dtype=np.intp)
+
+class Trigger:
+    """Sends a command to a device whenever a detector finds an event in the data streamed from another (or the same)
+    device. Pass triggers to ``DataFlow`` to run them in the streaming worker of the device they watch.
+
+    The command's packet is built once, up front, and written straight to the output device's port, without waiting
+    for a response. The output device must be open, and nothing else may use it while data is being collected, since
+    the worker owns its port from then on. If it is a different device from the one streaming, its responses are
+    read and thrown away, so it cannot be another source in the same ``DataFlow`` (such as an 8480-SC streaming events).
+
+    :param source: Device (or name of the device) whose data to watch. Must be part of the ``DataFlow``'s network.
+    :type source: :class: AquisitionDevice | str
+    :param detector: Finds the events to trigger on.
+    :type detector: :class: Detector
+    :param device: Device to send the command to, such as the streaming device itself or an 8480-SC.
+    :type device: :class: Pod
+    :param cmd: Command name or number.
+    :type cmd: str | int
+    :param payload: Command payload, if the command takes one. Defaults to None.
+    :type payload: int | bytes | tuple[int | bytes] | None, optional
+    :param refractory_sec: Least time between two triggers, by the timestamps of the samples they were detected at.
+        Events found sooner are ignored. Defaults to 0.
+    :type refractory_sec: float, optional
+    :param name: Name to log the trigger under. Defaults to the name of the command.
+    :type name: str | None, optional
+    :param log_size: Number of the most recent triggers kept in the log. Defaults to 4096.
+    :type log_size: int, optional
+    """
+
+    def __init__(self, source: AquisitionDevice | str, detector: Detector, device: Pod, cmd: str | int,
+                 payload: int | bytes | tuple[int | bytes] | None = None, refractory_sec: float = 0, name: str | None = None,
+                 log_size: int = 4096) -> None:
+        if log_size < 1:
+            raise ValueError('`log_size` must be at least 1.')
+
+        self.source: AquisitionDevice | str = source
+        self.detector: Detector = detector
+        self.device: Pod = device
+        self.name: str = name or str(cmd)
+
+        #raises here, rather than in the worker, if the command or payload is wrong.
+        self._packet: bytes = device.GetPODpacket(cmd, payload)
+        self._refractory_ns: int = int(refractory_sec * 10**9)
+
+        #no lock: there is exactly one writer. the number of triggers, then a ring of (sample timestamp, latency in ns).
+        self._log_size: int = log_size
+        self._log = mp.RawArray('q', 1 + 2*log_size)
+
+    # ------------ WORKER SIDE ------------
+
+    def start(self, pod: AquisitionDevice) -> None:
+        """Called by the worker streaming from `pod` before streaming starts.
+
+        :param pod: The worker's copy of the device being watched.
+        :type pod: :class: AquisitionDevice
+        """
+        schema: ChannelSchema = ChannelSchema(pod)
+        if self.detector.channel not in schema.names:
+            raise ValueError(f'Device "{pod.device_name}" has no channel "{self.detector.channel}", only {", ".join(schema.names)}.')
+
+        self._decode = schema.decode_channel
+        self._channel: int = schema.names.index(self.detector.channel)
+        self._write = self.device.WriteRawPacket
+        #the streaming device's responses are read (and dropped) by the worker along with its data.
+        self._discard_responses: bool = self.device is not pod
+        self._last_fired: int | None = None
+        self.detector.start(pod.sample_rate)
+
+    def process(self, batch: DataBatch, read_at: int) -> None:
+        """Look for events in a chunk, and send the command for each one.
+
+        :param batch: The chunk, timestamped.
+        :type batch: DataBatch
+        :param read_at: When the chunk finished being read, from ``time.perf_counter_ns``.
+        :type read_at: int
+        """
+        if self._discard_responses:
+            self.device.DiscardWaiting()
+
+        events: np.ndarray = self.detector.detect(self._decode(batch, self._channel))
+        if not len(events):
+            return
+
+        timestamps: np.ndarray = batch.timestamps
+        for event in events.tolist():
+            timestamp: int = int(timestamps[event])
+            if self._last_fired is not None and timestamp - self._last_fired < self._refractory_ns:
+                continue
+
+            self._write(self._packet)
+            self._record(timestamp, time.perf_counter_ns() - read_at)
+            self._last_fired = timestamp
+
+    def _record(self, timestamp: int, latency_ns: int) -> None:
+        log = self._log
+        offset: int = 1 + 2*(log[0] % self._log_size)
+        log[offset] = timestamp
+        log[offset+1] = latency_ns
+        log[0] += 1
+
+    # ------------ READER SIDE ------------
+
+    def log(self) -> list[tuple[int, float]]:
+        """The most recent triggers, oldest first.
+
+        :return: For each trigger, the timestamp (in nanoseconds since the epoch) of the sample the event was detected
+            at, and the latency in seconds from the chunk holding it being read to the command being written.
+        :rtype: list[tuple[int, float]]
+        """
+        values: list[int] = list(self._log)
+        count: int = values[0]
+        kept: int = min(count, self._log_size)
+        entries: list[tuple[int, float]] = []
+        for index in range(count-kept, count):
+            offset: int = 1 + 2*(index % self._log_size)
+            entries.append((values[offset], values[offset+1] / 10**9))
+        return entries
+
+    def snapshot(self) -> dict:
+        """Summarize the log.
+
+        :return: The number of triggers so far, and the 50th, 90th and 99th percentile and max latency in seconds of the
+            most recent ones (zero before the first trigger).
+        :rtype: dict
+        """
+        count: int = self._log[0]
+        latencies: np.ndarray = np.array([ latency for _, latency in self.log() ])
+        percentiles: list[float] = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else [0.0]*3
+
+        return {
+            'count'       : count,
+            'p50_seconds' : percentiles[0],
+            'p90_seconds' : percentiles[1],
+            'p99_seconds' : percentiles[2],
+            'max_seconds' : float(latencies.max()) if len(latencies) else 0.0,
+        }
@@ -0,0 +1,305 @@
+"""Control channel between a ``DataFlow`` and its streaming workers, used to attach and detach sinks and to send
+commands to a device while its worker is streaming. Requests are applied by the worker between chunks, so every chunk
+goes to exactly the set of sinks attached when it was read. The worker owns the device's port, so it writes device
+commands itself and picks their responses out from the data packets as it reads them.
+
+Requests are sent as ``(kind, request id, *arguments)``, and answered with ``(request id, error, result)``.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+#environment imports
+import io
+import itertools
+import pickle
+import threading
+import time
+from concurrent.futures import Future, wait
+from multiprocessing.connection import Connection
+from typing import Callable
+
+#local imports
+from Morelia.Devices import AquisitionDevice
+from Morelia.packet import ControlPacket
+
+ATTACH = 'attach'
+DETACH = 'detach'
+COMMAND = 'command'
+
+#sinks usually hold on to the device they stream from, which can't be pickled (it owns an open serial port).
+#the worker already has its own copy of the device, so the device is sent as a reference to that copy.
+_DEVICE_ID = 'device'
+
+class _DevicePickler(pickle.Pickler):
+    def __init__(self, file, device: AquisitionDevice) -> None:
+        super().__init__(file)
+        self._device = device
+
+    def persistent_id(self, obj) -> str | None:
+        return _DEVICE_ID if obj is self._device else None
+
+class _DeviceUnpickler(pickle.Unpickler):
+    def __init__(self, file, device: AquisitionDevice) -> None:
+        super().__init__(file)
+        self._device = device
+
+    def persistent_load(self, pid: str) -> AquisitionDevice:
+        if pid != _DEVICE_ID:
+            raise pickle.UnpicklingError(f'Unknown persistent id "{pid}".')
+        return self._device
+
+def dump_sink(sink, device: AquisitionDevice) -> bytes:
+    """Serialize a sink to send to the worker streaming from `device`.
+
+    :param sink: Sink to send. Must not have been entered yet.
+    :type sink: :class: SinkInterface
+    :param device: Device the worker streams from. References to it are replaced by the worker's own copy.
+    :type device: :class: AquisitionDevice
+
+    :return: The serialized sink.
+    :rtype: bytes
+    """
+    buffer = io.BytesIO()
+    _DevicePickler(buffer, device).dump(sink)
+    return buffer.getvalue()
+
+def load_sink(data: bytes, device: AquisitionDevice):
+    """Deserialize a sink sent by ``dump_sink``, in the worker.
+
+    :param data: The serialized sink.
+    :type data: bytes
+    :param device: The worker's copy of the device.
+    :type device: :class: AquisitionDevice
+
+    :return: The sink.
+    :rtype: :class: SinkInterface
+    """
+    return _DeviceUnpickler(io.BytesIO(data), device).load()
+
+
+def _reply(connection: Connection, request_id: int, error: Exception | None, value=None) -> None:
+    """Answer a request, in the worker. The error is raised again in the parent, as long as it can make the trip."""
+    try:
+        connection.send((request_id, error, value))
+    except Exception:
+        connection.send((request_id, RuntimeError(repr(error)), None))
+
+class ControlChannel:
+    """Parent's end of a worker's control channel. Requests can be made from any thread, and each is answered
+    through a future, so a slow command does not hold up the others.
+
+    :param connection: Parent's end of the pipe to the worker.
+    :type connection: multiprocessing.connection.Connection
+    """
+
+    def __init__(self, connection: Connection) -> None:
+        self._connection = connection
+        self._send_lock = threading.Lock()
+        self._pending: dict[int, tuple[Future, Callable | None]] = {}
+        self._request_ids = itertools.count()
+        self._stopped: bool = False
+
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+
+    def submit(self, request: tuple, convert: Callable | None = None) -> Future:
+        """Send a request to the worker without waiting for it to be answered.
+
+        :param request: ``(ATTACH, slot, serialized sink)``, ``(DETACH, slot)``, or ``(COMMAND, cmd, payload, timeout_sec)``.
+        :type request: tuple
+        :param convert: Called on the worker's answer, in the parent, to get the future's result. Defaults to None,
+            which leaves the answer as is.
+        :type convert: Callable | None, optional
+
+        :return: Future for the worker's answer, or for what it raised.
+        :rtype: concurrent.futures.Future
+
+        :raises RuntimeError: The worker has stopped.
+        """
+        future: Future = Future()
+        #answered futures can't be cancelled, so the worker's answer can always be set.
+        future.set_running_or_notify_cancel()
+
+        with self._send_lock:
+            if self._stopped:
+                raise RuntimeError('Streaming worker has stopped.')
+            request_id: int = next(self._request_ids)
+            self._pending[request_id] = (future, convert)
+            self._connection.send((request[0], request_id, *request[1:]))
+
+        return future
+
+    def request(self, request: tuple, timeout: float):
+        """Send a request to the worker and wait for it to be answered.
+
+        :param request: See ``submit``.
+        :type request: tuple
+        :param timeout: How long to wait for the worker, in seconds.
+        :type timeout: float
+
+        :return: The worker's answer.
+
+        :raises TimeoutError: The worker did not answer in time.
+        :raises RuntimeError: The worker has stopped.
+        :raises Exception: Whatever the worker raised while applying the request, such as an error entering a sink.
+        """
+        future: Future = self.submit(request)
+
+        if not wait([future], timeout).done:
+            raise TimeoutError(f'Streaming worker did not respond to "{request[0]}" within {timeout} seconds.')
+
+        return future.result()
+
+    def close(self) -> None:
+        """Close the channel, once the worker has exited. Requests still waiting fail with a RuntimeError."""
+        self._reader.join()
+        self._connection.close()
+
+    def _read_replies(self) -> None:
+        while True:
+            try:
+                request_id, error, value = self._connection.recv()
+            except (EOFError, OSError):
+                break
+
+            future, convert = self._pending.pop(request_id)
+            if error is not None:
+                future.set_exception(error)
+                continue
+
+            try:
+                future.set_result(value if convert is None else convert(value))
+            except Exception as e:
+                future.set_exception(e)
+
+        #the worker is gone, so nothing else will be answered.
+        with self._send_lock:
+            self._stopped = True
+            pending, self._pending = self._pending, {}
+
+        for future, _ in pending.values():
+            future.set_exception(RuntimeError('Streaming worker has stopped.'))
+
+class PendingCommands:
+    """Device commands written by a worker that are waiting for the device to respond. The worker owns the
+    device's port, so it writes the commands between chunks and hands every control packet it reads to ``resolve``.
+
+    :param connection: Worker's end of the control channel, where responses are sent.
+    :type connection: multiprocessing.connection.Connection
+    :param device: The worker's copy of the device.
+    :type device: :class: AquisitionDevice
+    """
+
+    #number of the NACK command, sent by devices in place of the response to a command they did not understand.
+    _NACK = 1
+
+    def __init__(self, connection: Connection, device: AquisitionDevice) -> None:
+        self._connection = connection
+        self._device = device
+        #oldest first: request id, packet written, and when to give up on it.
+        self._waiting: list[tuple[int, ControlPacket, float]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self._waiting)
+
+    def write(self, request_id: int, cmd: str | int, payload, timeout_sec: float) -> None:
+        """Write a command to the device.
+
+        :param request_id: Request to answer with the device's response.
+        :type request_id: int
+        :param cmd: Command name or number.
+        :type cmd: str | int
+        :param payload: Command payload, or None.
+        :type payload: int | bytes | tuple[int | bytes] | None
+        :param timeout_sec: How long to wait for the response, in seconds.
+        :type timeout_sec: float
+        """
+        try:
+            written: ControlPacket = self._device.WritePacket(cmd, payload)
+        except Exception as e:
+            _reply(self._connection, request_id, e)
+            return
+
+        self._waiting.append((request_id, written, time.perf_counter() + timeout_sec))
+
+    def resolve(self, packet: ControlPacket) -> None:
+        """Answer the oldest command with the same number as a control packet read from the device. A NACK answers
+        the oldest command. Packets that answer nothing, like the response to starting the stream, are dropped.
+
+        :param packet: Control packet read from the device.
+        :type packet: :class: ControlPacket
+        """
+        number: int = packet.command_number
+        for index, (request_id, written, _) in enumerate(self._waiting):
+            if written.command_number == number or number == self._NACK:
+                del self._waiting[index]
+                self._device.RecordResponse(written, packet)
+                #control packets hold on to their decoder, which can't be pickled, so only their bytes are sent.
+                _reply(self._connection, request_id, None, packet.raw_packet)
+                return
+
+    def expire(self) -> None:
+        """Give up on commands that have been waiting too long, answering them with a TimeoutError."""
+        now: float = time.perf_counter()
+        for request_id, written, deadline in [ waiting for waiting in self._waiting if waiting[2] <= now ]:
+            self._waiting.remove((request_id, written, deadline))
+            self._device.RecordResponse(written, None)
+            _reply(self._connection, request_id, TimeoutError(f'[!] No response to command {written.command_number} while streaming.'))
+
+    def fail(self, error: Exception) -> None:
+        """Give up on every command still waiting, answering them with `error`.
+
+        :param error: Why the commands won't be answered, such as the device being lost.
+        :type error: Exception
+        """
+        waiting, self._waiting = self._waiting, []
+        for request_id, written, _ in waiting:
+            self._device.RecordResponse(written, None)
+            _reply(self._connection, request_id, error)
+
+def serve(connection: Connection, device: AquisitionDevice, attach: Callable, detach: Callable, commands: PendingCommands) -> bool:
+    """Apply every pending request, in the worker. Called between chunks.
+
+    :param connection: Worker's end of the control channel.
+    :type connection: multiprocessing.connection.Connection
+    :param device: The worker's copy of the device.
+    :type device: :class: AquisitionDevice
+    :param attach: Called with a slot and a sink to start streaming to the sink.
+    :type attach: Callable[[int, SinkInterface], None]
+    :param detach: Called with a slot to stop streaming to the sink in it.
+    :type detach: Callable[[int], None]
+    :param commands: Where device commands are written, to be answered once the device responds.
+    :type commands: :class: PendingCommands
+
+    :return: Whether any sinks were attached or detached.
+    :rtype: bool
+    """
+    changed: bool = False
+
+    while connection.poll():
+        kind, request_id, *args = connection.recv()
+
+        if kind == COMMAND:
+            commands.write(request_id, *args)
+            continue
+
+        error: Exception | None = None
+        try:
+            if kind == ATTACH:
+                attach(args[0], load_sink(args[1], device))
+            elif kind == DETACH:
+                detach(args[0])
+            else:
+                raise ValueError(f'Unknown control request "{kind}".')
+        except Exception as e:
+            error = e
+
+        _reply(connection, request_id, error)
+        changed = True
+
+    return changed
@@ -11,20 +11,34 @@ __email__       = 'sales@pinnaclet.com'
 
 # environment imports
 import multiprocessing as mp
+from multiprocessing.connection import Connection
 from functools import partial
+from concurrent.futures import Future
 
 # local imports
-from Morelia.Devices import AquisitionDevice
-from Morelia.Stream.source import get_data
+from Morelia.Devices import AquisitionDevice, Pod8480SC
+from Morelia.packet import ControlPacket
+from Morelia.Stream.source import get_data, check_streamable
+from Morelia.Stream.metrics import StreamMetrics, MetricsServer
+from Morelia.Stream.tracing import StageTracer, format_trace_report
+from Morelia.Stream.reconnect import ReconnectPolicy
+from Morelia.Stream.closed_loop import Trigger
+from Morelia.Stream.sync import StreamStart
+import Morelia.Stream.control as control
 import Morelia.Stream.sink as pod_sink
 
 import time
 
+#room for sinks attached while streaming, on top of the ones a device starts with.
+_SPARE_SINK_SLOTS = 8
+
 class DataFlow:
     """Class that use multiprocessing to efficiently collect data from many devices at once.
 
-    :param network: A mapping of data sources (POD devices) to one or more data sinks.
-    :type network: list[tuple[:class: Pod8206HR | :class: Pod8401HR | :class: Pod8274D, list[ :class: SinkInterface]]]
+    :param network: A mapping of data sources (POD devices) to one or more data sinks. An 8480-SC is an event source,
+        whose sinks get each event (TTL input, stimulus start and stop, low current) as it happens. Streaming from an
+        8274D is experimental, and it must be opened with ``experimental_streaming=True``.
+    :type network: list[tuple[:class: Pod8206HR | :class: Pod8401HR | :class: Pod8274D | :class: Pod8480SC, list[ :class: SinkInterface]]]
 
     :param filter_method: Method to use to clean curropted data. Defaults to TAKE_PAST.
     :type filter_method: FilterMethod, optional
@@ -34,14 +48,77 @@ class DataFlow:
     
     :param fail_tolerance: How many times in a row to fail reading before giving up on reading a "chunk" of data ("chunk" here is approximately 1 second of samples). Defaults to 3.
     :type fail_tolerance: int, optional
+
+    :param engine: Streaming pipeline each worker runs, either ``'lean'`` or ``'rx'``. See ``Morelia.Stream.source.get_data``. Defaults to ``'lean'``.
+    :type engine: str, optional
+
+    :param chunk_size: Number of packets the lean engine reads per chunk. Defaults to about a tenth of a second of samples.
+    :type chunk_size: int | None, optional
+
+    :param trace_every: Turns on latency tracing, where one out of every `trace_every` chunks is timed at each stage of the lean engine's pipeline.
+        Tracing is off by default. See ``trace_report``.
+    :type trace_every: int | None, optional
+
+    :param reconnect: Turns on supervised streaming, where a worker whose device stops sending data or whose port fails reconnects to the
+        device and keeps streaming into the same sinks. Off by default, in which case losing a device ends its worker with an error.
+    :type reconnect: :class: ReconnectPolicy | None, optional
+
+    :param triggers: Closed-loop triggers, each run in the worker of the device it watches, on every chunk before it is sent
+        to the sinks. See ``Morelia.Stream.closed_loop``. No triggers by default.
+    :type triggers: list[:class: Trigger] | None, optional
+
+    :param synchronized_start: Start streaming from every device together: each worker gets ready, waits for the others,
+        and then they all send ``STREAM 1`` at the same moment. Every worker timestamps its data from one shared reference
+        epoch either way, and when each device started is recorded (see ``start_offsets``). Only the lean engine and event
+        sources take part. Defaults to False, in which case each device starts as soon as its worker is ready.
+    :type synchronized_start: bool, optional
     """
 
-    def __init__(self, network: list[tuple[AquisitionDevice, list[pod_sink.SinkInterface]]]) -> None:
+    def __init__(self, network: list[tuple[AquisitionDevice | Pod8480SC, list[pod_sink.SinkInterface]]], engine: str = 'lean', chunk_size: int | None = None,
+                 trace_every: int | None = None, reconnect: ReconnectPolicy | None = None, triggers: list[Trigger] | None = None,
+                 synchronized_start: bool = False) -> None:
         """Set class instance variables."""
 
+        if engine not in ('lean', 'rx'):
+            raise ValueError(f'Unknown streaming engine "{engine}", must be "lean" or "rx".')
+
+        if trace_every is not None and trace_every < 1:
+            raise ValueError('`trace_every` must be at least 1.')
+
+        if reconnect is not None and engine != 'lean':
+            raise ValueError('Only the "lean" engine can reconnect to devices.')
+
+        for source, _ in network:
+            check_streamable(source)
+
         self._manual_stop_events: list[mp.Event] = [] #events that stop collection stored here.
-        self._network = network
+        self._network = [ (source, list(sinks)) for source, sinks in network ]
         self._workers: list[mp.Process] = []
+        self._controls: list[control.ControlChannel | None] = [] #parent's end of each worker's control channel.
+        self._sink_slots: list[list[pod_sink.SinkInterface | None]] = [] #which sink each worker has in each slot.
+        self._engine: str = engine
+        self._chunk_size: int | None = chunk_size
+        self._metrics: list[StreamMetrics] = []
+        self._trace_every: int | None = trace_every
+        self._tracers: list[StageTracer] = []
+        self._reconnect: ReconnectPolicy | None = reconnect
+        self._synchronized_start: bool = synchronized_start
+        self._starts: list[StreamStart | None] = []
+
+        if triggers and engine != 'lean':
+            raise ValueError('Only the "lean" engine can run triggers.')
+
+        #triggers watching each device in the network.
+        self._triggers: list[list[Trigger]] = [ [] for _ in self._network ]
+        for trigger in triggers or []:
+            idx: int = self._find_source(trigger.source)
+
+            #a trigger drains its output device's responses, which would take the data of another device's worker.
+            for other, (source, _) in enumerate(self._network):
+                if source is trigger.device and other != idx:
+                    raise ValueError(f'Trigger "{trigger.name}" cannot send commands to "{source.device_name}", which is streamed by its own worker.')
+
+            self._triggers[idx].append(trigger)
 
     def stop_collection(self) -> None:
         """Stop collecting data."""
@@ -50,11 +127,94 @@ class DataFlow:
 
         self._manual_stop_events = []
 
-        for worker in self._workers:
-            worker.join()
-            worker.close()
+        self._join_workers()
 
-        self._workers = []
+    def metrics(self) -> dict[str, dict]:
+        """Get runtime metrics for every device in the most recent (or current) collection. Metrics are
+        only recorded by the lean engine.
+
+        :return: A snapshot of each device's metrics, keyed by device name. See ``StreamMetrics.snapshot``. Sinks that
+            send through a ``Spool`` also have the spool's metrics, under ``'spool'``. See ``Spool.metrics``.
+        :rtype: dict[str, dict]
+        """
+        snapshots: dict[str, dict] = {}
+
+        for idx, metrics in enumerate(self._metrics):
+            snapshot: dict = metrics.snapshot()
+
+            #spools keep their metrics in shared memory of their own.
+            sinks = self._sink_slots[idx] if self._sink_slots else self._network[idx][1]
+            for name, sink in zip(metrics.sink_names, sinks):
+                spool = getattr(sink, 'spool', None)
+                if spool is not None and name in snapshot['sinks']:
+                    snapshot['sinks'][name]['spool'] = spool.metrics()
+
+            snapshots[metrics.device_name] = snapshot
+
+        return snapshots
+
+    def serve_metrics(self, port: int, host: str = '127.0.0.1') -> MetricsServer:
+        """Serve metrics over HTTP in the Prometheus text format, for scraping by Prometheus or similar tools.
+
+        :param port: Port to listen on. Pass 0 to have the OS pick a free port.
+        :type port: int
+        :param host: Address to listen on. Defaults to only accepting local connections.
+        :type host: str, optional
+
+        :return: The running server. Call its ``close`` method to stop serving.
+        :rtype: :class: MetricsServer
+        """
+        return MetricsServer(self.metrics, port, host)
+
+    def traces(self) -> dict[str, dict[str, dict]]:
+        """Get the latency histograms for every device in the most recent (or current) collection. Empty unless
+        tracing was turned on with `trace_every`.
+
+        :return: A snapshot of each device's latencies per stage, keyed by device name. See ``StageTracer.snapshot``.
+        :rtype: dict[str, dict[str, dict]]
+        """
+        return { tracer.device_name : tracer.snapshot() for tracer in self._tracers }
+
+    def triggers(self) -> dict[str, dict]:
+        """Get a summary of every closed-loop trigger's log: how many times it has fired, and the latency from the chunk
+        holding each event being read to the command being written. See ``Trigger.snapshot``, and ``Trigger.log`` for
+        every trigger's timing.
+
+        :return: A snapshot of each trigger's log, keyed by trigger name.
+        :rtype: dict[str, dict]
+        """
+        return { trigger.name : trigger.snapshot() for triggers in self._triggers for trigger in triggers }
+
+    def start_time(self) -> int | None:
+        """Get when the most recent (or current) collection started: the moment every device was to start streaming, or
+        without a synchronized start, when the first device did. Every device's timestamps count from the same epoch.
+
+        :return: Start time in nanoseconds since the epoch, or None until it is known (or with the rx engine).
+        :rtype: int | None
+        """
+        start: StreamStart | None = next(( start for start in self._starts if start is not None ), None)
+        return None if start is None else start.start_time()
+
+    def start_offsets(self) -> dict[str, float | None]:
+        """Get how long after ``start_time`` each device in the most recent (or current) collection was sent ``STREAM 1``.
+        The spread of the offsets is the start skew between devices, and data from a device starts about its offset (plus
+        one sample) after ``start_time``, which is what to line recordings from several devices up by.
+
+        :return: Each device's offset in seconds, or None if it has not started yet (or with the rx engine), keyed by device name.
+        :rtype: dict[str, float | None]
+        """
+        start: StreamStart | None = next(( start for start in self._starts if start is not None ), None)
+        offsets: list[float | None] = [None]*len(self._starts) if start is None else start.offsets()
+        return { source.device_name : offset for (source, _), offset in zip(self._network, offsets) }
+
+    def trace_report(self) -> str:
+        """Get a plain text report of the latency from data arriving at each device to the end of each stage of
+        streaming, up to each sink being flushed.
+
+        :return: The report.
+        :rtype: str
+        """
+        return format_trace_report(self.traces())
 
     def collect_for_seconds(self, duration_sec: float) -> None:
         """Collect data for `duration_sec` seconds.
@@ -64,9 +224,7 @@ class DataFlow:
         """
         self._start_collecting(duration_sec)
 
-        for worker in self._workers:
-            worker.join()
-            worker.close()
+        self._join_workers()
 
         #clear out manual stop events.
         self._manual_stop_events = []
@@ -75,21 +233,213 @@ class DataFlow:
         """Collect until `stop_collection` is called."""
         self._start_collecting()
 
+    def add_sink(self, source: AquisitionDevice | str, sink: pod_sink.SinkInterface, timeout_sec: float = 10) -> None:
+        """Start streaming data from a device to another sink. If data is being collected, the sink is attached
+        to the running worker between two chunks of data, so no samples are lost and the sink gets every sample
+        from then on. Otherwise, the sink is used from the next collection on.
+
+        :param source: Device (or name of the device) to stream from. Must be part of the network.
+        :type source: :class: AquisitionDevice | str
+        :param sink: Sink to add. It is entered in the worker process, so it must not have been entered already.
+        :type sink: :class: SinkInterface
+        :param timeout_sec: How long to wait for a running worker to attach the sink. Defaults to 10.
+        :type timeout_sec: float, optional
+
+        :raises ValueError: The device is not part of the network, or it has no room for more sinks while collecting.
+        :raises RuntimeError: Sinks cannot be changed while collecting with the rx engine.
+        :raises TimeoutError: The worker did not attach the sink in time.
+        """
+        idx: int = self._find_source(source)
+        source, sinks = self._network[idx]
+
+        if self._workers:
+            if self._engine != 'lean':
+                raise RuntimeError('Only the lean engine can change sinks while collecting.')
+
+            slots: list[pod_sink.SinkInterface | None] = self._sink_slots[idx]
+            if None not in slots:
+                raise ValueError(f'Device "{source.device_name}" already has the maximum number of sinks.')
+            slot: int = slots.index(None)
+
+            #raises if the worker could not enter the sink.
+            self._controls[idx].request((control.ATTACH, slot, control.dump_sink(sink, source)), timeout_sec)
+
+            slots[slot] = sink
+            self._name_sink(idx, slot, sink)
+
+        sinks.append(sink)
+
+    def remove_sink(self, sink: pod_sink.SinkInterface, timeout_sec: float = 10) -> None:
+        """Stop streaming data to a sink. If data is being collected, the sink is detached from the running worker
+        between two chunks of data and exited, while streaming to every other sink carries on.
+
+        :param sink: Sink to remove. Must be part of the network.
+        :type sink: :class: SinkInterface
+        :param timeout_sec: How long to wait for a running worker to detach the sink. Defaults to 10.
+        :type timeout_sec: float, optional
+
+        :raises ValueError: The sink is not part of the network.
+        :raises RuntimeError: Sinks cannot be changed while collecting with the rx engine.
+        :raises TimeoutError: The worker did not detach the sink in time.
+        """
+        for idx, (source, sinks) in enumerate(self._network):
+            if any(candidate is sink for candidate in sinks):
+                break
+        else:
+            raise ValueError('Sink is not part of the network.')
+
+        if self._workers:
+            if self._engine != 'lean':
+                raise RuntimeError('Only the lean engine can change sinks while collecting.')
+
+            slots: list[pod_sink.SinkInterface | None] = self._sink_slots[idx]
+            slot: int = next(slot for slot, candidate in enumerate(slots) if candidate is sink)
+
+            self._controls[idx].request((control.DETACH, slot), timeout_sec)
+
+            slots[slot] = None
+            self._name_sink(idx, slot, None)
+
+        sinks.remove(next(candidate for candidate in sinks if candidate is sink))
+
+    def send_command(self, source: AquisitionDevice | str, cmd: str | int, payload: int | bytes | tuple[int | bytes] | None = None,
+                     timeout_sec: float = 1, use_cache: bool = True) -> Future:
+        """Send a command to a device, such as to read its TTL inputs or change a filter, without stopping the stream. If data is
+        being collected, the command is written by the device's worker between two chunks of data, and its response is picked out
+        from the data packets that follow, so every sample still reaches the sinks. The response takes up to about a chunk of data
+        to arrive, on top of the device's own response time. Otherwise, the command is written and read right away.
+
+        :param source: Device (or name of the device) to send the command to. Must be part of the network.
+        :type source: :class: AquisitionDevice | str
+        :param cmd: Command name or number.
+        :type cmd: str | int
+        :param payload: Command payload, if the command takes one. Defaults to None.
+        :type payload: int | bytes | tuple[int | bytes] | None, optional
+        :param timeout_sec: How long to wait for the device to respond, from when the command is written. Defaults to 1.
+        :type timeout_sec: float, optional
+        :param use_cache: Set to False to always ask the device, rather than answering commands that get a known setting from the
+            device's state cache. Defaults to True.
+        :type use_cache: bool, optional
+
+        :return: Future for the device's response, which raises a TimeoutError if the device does not respond in time, or a
+            RuntimeError if streaming stops first.
+        :rtype: concurrent.futures.Future[:class: ControlPacket]
+
+        :raises ValueError: The device is not part of the network.
+        :raises RuntimeError: Commands cannot be sent while collecting with the rx engine.
+        """
+        idx: int = self._find_source(source)
+        source = self._network[idx][0]
+
+        future: Future = Future()
+
+        cached: ControlPacket | None = source.CachedResponse(cmd, payload) if use_cache else None
+        if cached is not None:
+            future.set_result(cached)
+            return future
+
+        if not self._workers:
+            try:
+                future.set_result(source.WriteRead(cmd, payload))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if self._engine != 'lean':
+            raise RuntimeError('Only the lean engine can send commands while collecting.')
+
+        #the worker has its own copy of the device, so ours learns about its settings from the response too.
+        written: ControlPacket = source.ParseControlPacket(source.GetPODpacket(cmd, payload))
+
+        def response(raw_packet: bytes) -> ControlPacket:
+            packet: ControlPacket = source.ParseControlPacket(raw_packet)
+            source.RecordResponse(written, packet)
+            return packet
+
+        def forget_unconfirmed(future: Future) -> None:
+            if future.exception() is not None:
+                source.RecordResponse(written, None)
+
+        future = self._controls[idx].submit((control.COMMAND, cmd, payload, timeout_sec), response)
+        future.add_done_callback(forget_unconfirmed)
+        return future
+
+    def _find_source(self, source: AquisitionDevice | str) -> int:
+        """Get the position of a device in the network, by the device or its name."""
+        for idx, (candidate, _) in enumerate(self._network):
+            if candidate is source or candidate.device_name == source:
+                return idx
+        raise ValueError(f'Device "{source if isinstance(source, str) else source.device_name}" is not part of the network.')
+
+    def _name_sink(self, idx: int, slot: int, sink: pod_sink.SinkInterface | None) -> None:
+        """Label a sink slot in the metrics (and latency traces) of the device at `idx` in the network."""
+        name: str | None = None if sink is None else f'{type(sink).__name__}#{slot}'
+
+        self._metrics[idx].name_sink(slot, name)
+        if self._tracers:
+            self._tracers[idx].name_sink(slot, name)
+
+    def _join_workers(self) -> None:
+        """Wait for every worker to finish, then clean up after them."""
+        for worker in self._workers:
+            worker.join()
+            worker.close()
+
+        for channel in self._controls:
+            if channel is not None:
+                channel.close()
+
+        self._workers = []
+        self._controls = []
+        self._sink_slots = []
+
     def _start_collecting(self, duration_sec: float = float('inf')) -> None:
         """Collect data from all sources and all sinks for `duration_sec` seconds.
 
         :raises ValueError: Raise an error for invalid combinations of sink and filter method.
         """
         
+        self._metrics = []
+        self._tracers = []
+
+        #the rx engine starts as soon as it subscribes, so it can't wait for the other devices.
+        self._starts = [None]*len(self._network)
+        if self._engine == 'lean':
+            self._starts = StreamStart.create(len(self._network), self._synchronized_start)
+
+        parent_connections: list[Connection | None] = []
+        worker_connections: list[Connection] = []
+
         #to begin, create all the process objects necessary for each source, sinks pair.
-        for source, sinks in self._network:
+        for (source, sinks), triggers, start in zip(self._network, self._triggers, self._starts):
+
+            #sinks start out in the first slots, the rest are for sinks added while collecting.
+            sink_names: list[str] = [ f'{type(sink).__name__}#{idx}' for idx, sink in enumerate(sinks) ]
+            sink_slots: int = len(sinks) + _SPARE_SINK_SLOTS
+            self._sink_slots.append(list(sinks) + [None]*_SPARE_SINK_SLOTS)
+
+            #shared memory the worker records metrics to.
+            metrics: StreamMetrics = StreamMetrics(source.device_name, sink_names, sink_slots)
+            self._metrics.append(metrics)
+
+            #shared memory the worker records latencies to, only if tracing.
+            tracer: StageTracer | None = None
+            if self._trace_every is not None:
+                tracer = StageTracer(source.device_name, sink_names, self._trace_every, sink_slots)
+                self._tracers.append(tracer)
+
+            #channel used to change the worker's sinks and command its device while it is running.
+            parent_connection, worker_connection = mp.Pipe() if self._engine == 'lean' else (None, None)
+            parent_connections.append(parent_connection)
+            if worker_connection is not None:
+                worker_connections.append(worker_connection)
 
             #event that signals the stream has been stopped by `stop_collecting`.
             manual_stop_event: mp.Event = mp.Event()
             self._manual_stop_events.append(manual_stop_event)
             
             #create worker process.
-            worker: mp.Process = mp.Process(target=get_data, args=(duration_sec, manual_stop_event, source, sinks))
+            worker: mp.Process = mp.Process(target=get_data, args=(duration_sec, manual_stop_event, source, sinks, self._engine, self._chunk_size, metrics, tracer, worker_connection, self._reconnect, triggers, start))
 
             self._workers.append(worker)
 
@@ -97,6 +447,13 @@ class DataFlow:
         for worker in self._workers:
             worker.start()
 
+        #the workers have their own copies now, and closing ours lets us notice if a worker dies.
+        for connection in worker_connections:
+            connection.close()
+
+        #only once every worker is started, since the channels read from their own threads.
+        self._controls = [ None if connection is None else control.ControlChannel(connection) for connection in parent_connections ]
+
     def __enter__(self) -> None:
         self.collect()
 
@@ -0,0 +1,349 @@
+"""Runtime metrics for streaming workers. Each worker writes its counters into a small block of shared memory,
+so the parent process can read them at any time without any messages being passed between processes.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+#environment imports
+import multiprocessing as mp
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from typing import Callable, Self
+
+import numpy as np
+
+#local imports
+from Morelia.packet.data import DataBatch, DataGap
+
+#index of each device-level value in the shared array.
+_SAMPLES            = 0
+_BYTES              = 1
+_CHECKSUM_FAILURES  = 2
+_PACKET_GAPS        = 3
+_QUEUE_DEPTH        = 4
+_CPU_TIME           = 5
+_SAMPLES_PER_SECOND = 6
+_BYTES_PER_SECOND   = 7
+_LAST_UPDATE        = 8
+_RECONNECTS         = 9
+_DOWNTIME           = 10
+_LOST_SAMPLES       = 11
+_HEADER_SIZE        = 12
+
+#upper bounds of the latency histogram buckets, in seconds: 1us, 2us, 4us, ..., ~0.5s, then everything slower.
+LATENCY_BUCKETS: tuple[float] = tuple(2**k / 10**6 for k in range(20)) + (float('inf'),)
+
+#each sink gets a count, a sum (in ns), and one slot per bucket.
+_SINK_SIZE = 2 + len(LATENCY_BUCKETS)
+
+def _latency_bucket(latency_ns: int) -> int:
+    """Index of the ``LATENCY_BUCKETS`` bucket a latency falls in. Bucket k holds latencies in (2^(k-1), 2^k] microseconds."""
+    return min(len(LATENCY_BUCKETS)-1, max(0, (latency_ns + 999)//1000 - 1).bit_length())
+
+class StreamMetrics:
+    """Metrics for a single device being streamed from, kept in shared memory. The worker streaming from the
+    device is the only writer; any process holding this object can take a ``snapshot`` at any time.
+
+    Rates (samples and bytes per second) are re-computed by the worker about once a second.
+
+    :param device_name: Name of the device being streamed from.
+    :type device_name: str
+
+    :param sink_names: Names of the sinks the device streams to, used to label flush latencies.
+    :type sink_names: list[str]
+
+    :param sink_slots: Number of sinks to make room for, so sinks can be attached while streaming. Defaults to one slot per sink in `sink_names`.
+    :type sink_slots: int | None, optional
+    """
+
+    def __init__(self, device_name: str, sink_names: list[str], sink_slots: int | None = None) -> None:
+        sink_slots = max(len(sink_names), sink_slots or 0)
+
+        self._device_name: str = device_name
+        #None marks a free slot.
+        self._sink_names: list[str | None] = list(sink_names) + [None]*(sink_slots-len(sink_names))
+
+        #no lock: there is exactly one writer, and readers tolerate a value being a chunk out of date.
+        self._values = mp.RawArray('d', _HEADER_SIZE + _SINK_SIZE*sink_slots)
+
+        #worker-local state used to compute rates and packet number gaps.
+        self._last_packet_number: int | None = None
+        self._rate_time: float | None = None
+        self._rate_samples: float = 0
+        self._rate_bytes: float = 0
+
+    @property
+    def device_name(self) -> str:
+        return self._device_name
+
+    @property
+    def sink_names(self) -> list[str | None]:
+        """Name of the sink in each slot, None for free slots."""
+        return self._sink_names
+
+    def name_sink(self, slot: int, name: str | None) -> None:
+        """Label a sink slot in this process's view of the metrics. Pass None to free the slot.
+
+        :param slot: Slot of the sink.
+        :type slot: int
+        :param name: Name to report the sink's flush latencies under.
+        :type name: str | None
+        """
+        self._sink_names[slot] = name
+
+    # ------------ WORKER SIDE ------------
+
+    def record_chunk(self, batch: DataBatch | None, checksum_failures: int = 0) -> None:
+        """Count the samples, bytes, and dropped packets in a chunk of data.
+
+        :param batch: Data read in this chunk, if any.
+        :type batch: DataBatch | None
+        :param checksum_failures: Number of packets that were thrown away because of a bad checksum.
+        :type checksum_failures: int, optional
+        """
+        values = self._values
+
+        values[_CHECKSUM_FAILURES] += checksum_failures
+
+        if not batch:
+            return
+
+        raw_packets: list[bytes] = [ packet.raw_packet for packet in batch.packets ]
+
+        values[_SAMPLES] += len(raw_packets)
+        values[_BYTES] += sum(map(len, raw_packets))
+
+        #byte 5 of binary data packets is a rolling packet number (0-255), so any step other than one means packets were lost.
+        packet_numbers = np.fromiter((raw[5] for raw in raw_packets), dtype=np.int16, count=len(raw_packets))
+
+        if self._last_packet_number is not None:
+            packet_numbers = np.concatenate(([self._last_packet_number], packet_numbers))
+
+        values[_PACKET_GAPS] += int(((np.diff(packet_numbers) - 1) % 256).sum())
+        self._last_packet_number = int(packet_numbers[-1])
+
+    def record_flush(self, sink_index: int, latency_ns: int) -> None:
+        """Add a sink flush to that sink's latency histogram.
+
+        :param sink_index: Slot of the sink in ``sink_names``.
+        :type sink_index: int
+        :param latency_ns: How long the flush took, in nanoseconds.
+        :type latency_ns: int
+        """
+        offset: int = _HEADER_SIZE + sink_index*_SINK_SIZE
+        bucket: int = _latency_bucket(latency_ns)
+
+        self._values[offset] += 1
+        self._values[offset+1] += latency_ns
+        self._values[offset+2+bucket] += 1
+
+    def record_gap(self, gap: DataGap) -> None:
+        """Count a reconnect, and the data lost while the device was unreachable.
+
+        :param gap: The gap in the data.
+        :type gap: DataGap
+        """
+        values = self._values
+
+        values[_RECONNECTS] += 1
+        values[_DOWNTIME] += gap.duration / 10**9
+        values[_LOST_SAMPLES] += gap.sample_count
+
+        #packet numbers start over when the device does.
+        self._last_packet_number = None
+
+    def reset_sink(self, slot: int) -> None:
+        """Clear a sink slot's latency histogram, before a new sink starts using it.
+
+        :param slot: Slot of the sink.
+        :type slot: int
+        """
+        offset: int = _HEADER_SIZE + slot*_SINK_SIZE
+        self._values[offset:offset+_SINK_SIZE] = [0.0]*_SINK_SIZE
+
+    def update(self, queue_depth: int) -> None:
+        """Update gauges. Called by the worker once per chunk.
+
+        :param queue_depth: Number of bytes waiting to be read from the device.
+        :type queue_depth: int
+        """
+        values = self._values
+        now: float = time.perf_counter()
+
+        values[_QUEUE_DEPTH] = queue_depth
+        values[_LAST_UPDATE] = time.time()
+
+        if self._rate_time is None:
+            self._rate_time, self._rate_samples, self._rate_bytes = now, values[_SAMPLES], values[_BYTES]
+
+        elif now - self._rate_time >= 1:
+            elapsed: float = now - self._rate_time
+
+            values[_SAMPLES_PER_SECOND] = (values[_SAMPLES] - self._rate_samples)/elapsed
+            values[_BYTES_PER_SECOND] = (values[_BYTES] - self._rate_bytes)/elapsed
+            values[_CPU_TIME] = time.process_time()
+
+            self._rate_time, self._rate_samples, self._rate_bytes = now, values[_SAMPLES], values[_BYTES]
+
+    # ------------ READER SIDE ------------
+
+    def snapshot(self) -> dict:
+        """Read the current value of every metric.
+
+        :return: Metrics for this device. Flush latencies are reported per sink, with histogram buckets as
+            ``(upper bound in seconds, count)`` pairs.
+        :rtype: dict
+        """
+        values = list(self._values)
+
+        sinks: dict[str, dict] = {}
+        for idx, name in enumerate(self._sink_names):
+            if name is None:
+                continue
+            offset: int = _HEADER_SIZE + idx*_SINK_SIZE
+            sinks[name] = {
+                'flush_count'       : int(values[offset]),
+                'flush_seconds_sum' : values[offset+1] / 10**9,
+                'flush_buckets'     : [ (bound, int(count)) for bound, count in zip(LATENCY_BUCKETS, values[offset+2:offset+_SINK_SIZE]) ],
+            }
+
+        return {
+            'samples'            : int(values[_SAMPLES]),
+            'bytes'              : int(values[_BYTES]),
+            'samples_per_second' : values[_SAMPLES_PER_SECOND],
+            'bytes_per_second'   : values[_BYTES_PER_SECOND],
+            'checksum_failures'  : int(values[_CHECKSUM_FAILURES]),
+            'packet_gaps'        : int(values[_PACKET_GAPS]),
+            'reconnects'         : int(values[_RECONNECTS]),
+            'downtime_seconds'   : values[_DOWNTIME],
+            'lost_samples'       : int(values[_LOST_SAMPLES]),
+            'queue_depth'        : int(values[_QUEUE_DEPTH]),
+            'cpu_seconds'        : values[_CPU_TIME],
+            'last_update'        : values[_LAST_UPDATE],
+            'sinks'              : sinks,
+        }
+
+def format_prometheus(snapshots: dict[str, dict]) -> str:
+    """Format metric snapshots in the Prometheus text exposition format.
+
+    :param snapshots: Snapshots keyed by device name, as returned by ``DataFlow.metrics``.
+    :type snapshots: dict[str, dict]
+
+    :return: Metrics in Prometheus text format.
+    :rtype: str
+    """
+
+    #(metric name, snapshot key, type, help text)
+    device_metrics = (
+        ('morelia_samples_total',            'samples',            'counter', 'Samples received from the device.'),
+        ('morelia_bytes_total',              'bytes',              'counter', 'Bytes of data packets received from the device.'),
+        ('morelia_samples_per_second',       'samples_per_second', 'gauge',   'Samples received per second, over the last second.'),
+        ('morelia_bytes_per_second',         'bytes_per_second',   'gauge',   'Bytes received per second, over the last second.'),
+        ('morelia_checksum_failures_total',  'checksum_failures',  'counter', 'Packets dropped because of a bad checksum.'),
+        ('morelia_packet_gaps_total',        'packet_gaps',        'counter', 'Packets missing according to packet numbers.'),
+        ('morelia_reconnects_total',         'reconnects',         'counter', 'Times the connection to the device was lost and re-established.'),
+        ('morelia_downtime_seconds_total',   'downtime_seconds',   'counter', 'Time spent without data from the device while reconnecting.'),
+        ('morelia_lost_samples_total',       'lost_samples',       'counter', 'Samples estimated to be lost while reconnecting.'),
+        ('morelia_queue_depth_bytes',        'queue_depth',        'gauge',   'Bytes waiting in the serial input buffer.'),
+        ('morelia_worker_cpu_seconds_total', 'cpu_seconds',        'counter', 'CPU time used by the streaming worker.'),
+    )
+
+    escape = lambda label: label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    lines: list[str] = []
+
+    for metric, key, kind, help_text in device_metrics:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for device, snapshot in snapshots.items():
+            lines.append(f'{metric}{{device="{escape(device)}"}} {snapshot[key]}')
+
+    lines.append('# HELP morelia_sink_flush_seconds Time taken by a sink to flush a chunk of data.')
+    lines.append('# TYPE morelia_sink_flush_seconds histogram')
+    for device, snapshot in snapshots.items():
+        for sink, latencies in snapshot['sinks'].items():
+            labels: str = f'device="{escape(device)}",sink="{escape(sink)}"'
+            cumulative: int = 0
+            for bound, count in latencies['flush_buckets']:
+                cumulative += count
+                le: str = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'morelia_sink_flush_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'morelia_sink_flush_seconds_sum{{{labels}}} {latencies["flush_seconds_sum"]}')
+            lines.append(f'morelia_sink_flush_seconds_count{{{labels}}} {latencies["flush_count"]}')
+
+    #(metric name, spool metrics key, type, help text), for sinks that send through a spool.
+    spool_metrics = (
+        ('morelia_spool_lag_seconds',          'lag_seconds',     'gauge',   'How long the oldest unsent payload has been waiting in the spool.'),
+        ('morelia_spool_pending_bytes',        'pending_bytes',   'gauge',   'Bytes of payloads waiting in the spool to be sent.'),
+        ('morelia_spool_disk_bytes',           'disk_bytes',      'gauge',   'Size of the spool on disk.'),
+        ('morelia_spool_sent_bytes_total',     'sent_bytes',      'counter', 'Bytes of payloads sent from the spool.'),
+        ('morelia_spool_evicted_bytes_total',  'evicted_bytes',   'counter', 'Bytes of payloads dropped because the spool was full.'),
+        ('morelia_spool_send_failures_total',  'send_failures',   'counter', 'Failed attempts to send a payload from the spool.'),
+    )
+
+    spools = [ (f'device="{escape(device)}",sink="{escape(sink)}"', latencies['spool'])
+               for device, snapshot in snapshots.items() for sink, latencies in snapshot['sinks'].items() if 'spool' in latencies ]
+
+    if spools:
+        for metric, key, kind, help_text in spool_metrics:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for labels, spool in spools:
+                lines.append(f'{metric}{{{labels}}} {spool[key]}')
+
+    return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    """Serves metrics over HTTP in the Prometheus text format, from a background thread. Any path
+    returns the metrics. Usually created through ``DataFlow.serve_metrics``.
+
+    :param get_snapshots: Called on every request to get the current snapshots, keyed by device name.
+    :type get_snapshots: Callable[[], dict[str, dict]]
+
+    :param port: Port to listen on. Pass 0 to have the OS pick a free port.
+    :type port: int
+
+    :param host: Address to listen on. Defaults to only accepting local connections.
+    :type host: str, optional
+    """
+
+    def __init__(self, get_snapshots: Callable[[], dict[str, dict]], port: int, host: str = '127.0.0.1') -> None:
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body: bytes = format_prometheus(get_snapshots()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args, **kwargs) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def close(self) -> None:
+        """Stop serving metrics."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.close()
+        return False
@@ -0,0 +1,89 @@
+"""Supervised streaming: noticing when a device stops sending data, and reconnecting to it."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+#environment imports
+import time
+from multiprocessing import Event
+
+#local imports
+from Morelia.Devices import AquisitionDevice, ChecksumError
+
+#errors that mean the connection to a device was lost. pyserial's SerialException is an OSError, as is TimeoutError.
+CONNECTION_ERRORS: tuple[type[Exception]] = (TimeoutError, OSError)
+
+class ReconnectPolicy:
+    """When to give up on a device's connection, and how to get it back. Passing a policy to ``DataFlow`` turns on
+    supervised streaming: if a device stops sending data or its port fails, the worker reopens the port (polling
+    until it comes back), sets the sample rate again, and resumes streaming into the same sinks.
+
+    :param stall_periods: Number of sample periods without a packet after which the device is considered stalled.
+        Defaults to 1000 (half a second at 2 kHz).
+    :type stall_periods: int, optional
+
+    :param poll_interval_sec: Seconds between attempts to reconnect. Defaults to 0.25.
+    :type poll_interval_sec: float, optional
+
+    :param response_timeout_sec: Seconds to wait for the device to answer each command while reconnecting. Defaults to 0.5.
+    :type response_timeout_sec: float, optional
+
+    :param give_up_after_sec: Stop trying to reconnect after this many seconds, and end streaming with the
+        original error. Defaults to None (never give up).
+    :type give_up_after_sec: float | None, optional
+    """
+
+    def __init__(self, stall_periods: int = 1000, poll_interval_sec: float = 0.25, response_timeout_sec: float = 0.5, give_up_after_sec: float | None = None) -> None:
+        if stall_periods < 1:
+            raise ValueError('`stall_periods` must be at least 1.')
+
+        self.stall_periods: int = stall_periods
+        self.poll_interval_sec: float = poll_interval_sec
+        self.response_timeout_sec: float = response_timeout_sec
+        self.give_up_after_sec: float | None = give_up_after_sec
+
+    def stall_timeout(self, sample_rate: float) -> float:
+        """Seconds without a packet after which a device streaming at `sample_rate` is considered stalled.
+
+        :param sample_rate: Sample rate of the device, in Hz.
+        :type sample_rate: float
+
+        :return: The timeout, in seconds.
+        :rtype: float
+        """
+        return self.stall_periods / sample_rate
+
+def reconnect(pod: AquisitionDevice, policy: ReconnectPolicy, error: Exception, stop_event: Event) -> bool:
+    """Keep trying to reconnect to a device until it streams again.
+
+    :param pod: Device the connection was lost to.
+    :type pod: :class: AquisitionDevice
+    :param policy: How to reconnect.
+    :type policy: :class: ReconnectPolicy
+    :param error: Error that ended the connection, raised again if the policy gives up.
+    :type error: Exception
+    :param stop_event: Stops trying once set.
+    :type stop_event: multiprocessing.Event
+
+    :return: True once the device is streaming again, False if `stop_event` was set first.
+    :rtype: bool
+    """
+    started: float = time.perf_counter()
+
+    while not stop_event.is_set():
+        try:
+            pod.Reconnect(policy.response_timeout_sec)
+            return True
+        except CONNECTION_ERRORS + (ChecksumError,):
+            pass
+
+        if policy.give_up_after_sec is not None and time.perf_counter() - started > policy.give_up_after_sec:
+            raise error
+
+        stop_event.wait(policy.poll_interval_sec)
+
+    return False
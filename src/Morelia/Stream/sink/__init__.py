@@ -1,4 +1,20 @@
-from Morelia.Stream.sink.sink_interface import SinkInterface
-from Morelia.Stream.sink.influx_sink import InfluxSink
-from Morelia.Stream.sink.csv_sink import CSVSink
-from Morelia.Stream.sink.edf_sink import EDFSink
+# module access, imported on first use (see Morelia._lazy): each sink brings its own dependencies (InfluxDB's
+# client, pyEDFlib, pyarrow...), which are only imported when that sink is used.
+from Morelia._lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'SinkInterface'  : 'Morelia.Stream.sink.sink_interface',
+    'InfluxSink'     : 'Morelia.Stream.sink.influx_sink',
+    'CSVSink'        : 'Morelia.Stream.sink.csv_sink',
+    'EDFSink'        : 'Morelia.Stream.sink.edf_sink',
+    'SegmentedSink'  : 'Morelia.Stream.sink.segmented_sink',
+    'ChannelSchema'  : 'Morelia.Stream.sink.channel_schema',
+    'NumpySink'      : 'Morelia.Stream.sink.numpy_sink',
+    'NumpyRecording' : 'Morelia.Stream.sink.numpy_sink',
+    'ParquetSink'    : 'Morelia.Stream.sink.parquet_sink',
+    'Spool'          : 'Morelia.Stream.sink.spool',
+    'PVFSSink'       : 'Morelia.Stream.sink.pvfs_sink',
+    'PvfsRecording'  : 'Morelia.Stream.sink.pvfs_sink',
+    'RawArchiveSink' : 'Morelia.Stream.sink.raw_archive',
+    'RawArchive'     : 'Morelia.Stream.sink.raw_archive',
+})
@@ -0,0 +1,209 @@
+"""Channels in the data streamed from a device."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import numpy as np
+
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataPacket, DataPacket8206HR, DataPacket8401HR, DataPacket8274D, DataBatch
+from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
+
+class ChannelSchema:
+    """Name, unit and type of each channel a device streams, and how to decode a whole batch of its packets into
+    one array per channel. Analog channels are decoded to microvolts (as 64 bit floats), and TTL (digital) channels
+    to 0 or 1. The gain settings and channel modes are read from the device when the schema is built.
+
+    The 8274D's channels are the exception: its packet layout and gain are unverified (see ``DataPacket8274D``),
+    so they are decoded to their raw ADC codes, with the unit ``'ADC'``.
+
+    :param pod: POD device data is being streamed from.
+    :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D`
+    """
+
+    def __init__(self, pod: AquisitionDevice) -> None:
+        """Class constructor."""
+        if isinstance(pod, Pod8206HR):
+            settings = { 'device' : '8206HR', 'preamp_gain' : pod.preamp_gain }
+
+        elif isinstance(pod, Pod8401HR):
+            preamp_channel_names: list[str] = Pod8401HR.GetChannelMapForPreampDevice(pod.preamp).values() if not pod.preamp is None else ['A', 'B', 'C', 'D']
+            settings = {
+                'device'                  : '8401HR',
+                'channel_names'           : list(preamp_channel_names),
+                'primary_channel_modes'   : [ mode.name for mode in pod.primary_channel_modes ],
+                'secondary_channel_modes' : [ mode.name for mode in pod.secondary_channel_modes ],
+                'preamp_gain'             : list(pod.preamp_gain),
+                'ss_gain'                 : list(pod.ss_gain),
+            }
+
+        elif isinstance(pod, Pod8274D):
+            settings = { 'device' : '8274D' }
+
+        else:
+            raise ValueError(f'Device "{pod.device_name}" has no channel schema!')
+
+        self._configure(settings)
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> 'ChannelSchema':
+        """Rebuild a schema from its ``settings``, without the device, e.g. to decode data recorded earlier.
+
+        :param settings: Settings of the device the data came from, as given by ``ChannelSchema.settings``.
+        :type settings: dict
+
+        :return: The schema.
+        :rtype: ChannelSchema
+        """
+        schema = cls.__new__(cls)
+        schema._configure(settings)
+        return schema
+
+    def _configure(self, settings: dict) -> None:
+        self._settings = settings
+        self._device: str = settings['device']
+
+        #value in the channel's unit = raw value * scale + offset, for each analog channel.
+        if self._device == '8206HR':
+            self._names = ('EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTL2', 'TTL3', 'TTL4')
+            self._analog = (True,)*3 + (False,)*4
+            self._bits = (16,)*3 + (1,)*4
+            self._units = ('uV',)*3 + ('',)*4
+            scales = [DataPacket8206HR.channel_scale(settings['preamp_gain'])]*3 + [(1.0, 0.0)]*4
+
+        elif self._device == '8401HR':
+            primary_modes = tuple(PrimaryChannelMode[name] for name in settings['primary_channel_modes'])
+            secondary_modes = tuple(SecondaryChannelMode[name] for name in settings['secondary_channel_modes'])
+            self._packet_settings = (tuple(settings['preamp_gain']), tuple(settings['ss_gain']), primary_modes, secondary_modes)
+
+            self._names = tuple(settings['channel_names']) + ('EXT0', 'EXT1', 'TTL1', 'TTL2', 'TTL3', 'TTL4')
+            self._analog = (True,)*4 + tuple(mode is not SecondaryChannelMode.DIGITAL for mode in secondary_modes)
+            self._bits = (18,)*4 + tuple(16 if analog else 1 for analog in self._analog[4:])
+            self._units = tuple('uV' if analog else '' for analog in self._analog)
+
+            #no-connect channels have no gain.
+            scales = [ DataPacket8401HR.primary_channel_scale(mode, preamp_gain or 1, ss_gain or 1)
+                       for mode, preamp_gain, ss_gain in zip(primary_modes, settings['preamp_gain'], settings['ss_gain']) ]
+            scales += [ DataPacket8401HR.SECONDARY_CHANNEL_SCALE if analog else (1.0, 0.0) for analog in self._analog[4:] ]
+
+        elif self._device == '8274D':
+            self._names = ('EEG1', 'EEG2', 'EMG')
+            self._analog = (True,)*3
+            self._bits = (16,)*3
+            #uncalibrated until the layout and gain are confirmed.
+            self._units = ('ADC',)*3
+            scales = [(1.0, 0.0)]*3
+
+        else:
+            raise ValueError(f'Device "{self._device}" has no channel schema!')
+
+        self._scales = np.array([ scale for scale, _ in scales ])
+        self._offsets = np.array([ offset for _, offset in scales ])
+
+    @property
+    def settings(self) -> dict:
+        """Settings of the device that decide how its data is decoded (gains and channel modes), which can be
+        saved as JSON and passed to ``ChannelSchema.from_settings`` later."""
+        return self._settings
+
+    @property
+    def names(self) -> tuple[str]:
+        return self._names
+
+    @property
+    def packet_length(self) -> int:
+        """Length of each of the device's data packets, in bytes."""
+        return 31 if self._device == '8401HR' else 16
+
+    @property
+    def analog(self) -> tuple[bool]:
+        """Whether each channel is analog (in ``units``) rather than digital (0 or 1)."""
+        return self._analog
+
+    @property
+    def bits(self) -> tuple[int]:
+        """Width of each channel's raw values, in bits (1 for digital channels)."""
+        return self._bits
+
+    @property
+    def scales(self) -> tuple[tuple[float, float]]:
+        """Scale and offset of each channel, which turn its raw values into ``units``: ``raw value * scale + offset``.
+        Digital (and uncalibrated) channels have a scale of 1 and an offset of 0."""
+        return tuple(zip(self._scales.tolist(), self._offsets.tolist()))
+
+    @property
+    def units(self) -> tuple[str]:
+        return self._units
+
+    @property
+    def dtypes(self) -> tuple[np.dtype]:
+        """Type of each channel's values, as returned by ``decode``."""
+        return tuple(np.dtype(np.float64) if analog else np.dtype(np.uint8) for analog in self._analog)
+
+    def make_packet(self, raw: bytes) -> DataPacket:
+        """Parse one of the device's data packets from its raw bytes, e.g. for ``DataBatch.from_raw``.
+
+        :param raw: The packet.
+        :type raw: bytes
+
+        :return: The parsed packet.
+        :rtype: DataPacket8206HR | DataPacket8401HR | DataPacket8274D
+        """
+        if self._device == '8206HR':
+            return DataPacket8206HR(raw, self._settings['preamp_gain'])
+        if self._device == '8274D':
+            return DataPacket8274D(raw)
+        return DataPacket8401HR(*self._packet_settings, raw)
+
+    def raw_values(self, batch: DataBatch) -> np.ndarray:
+        """Raw value of every channel for every packet in a batch.
+
+        :param batch: Packets to decode.
+        :type batch: DataBatch
+
+        :return: One row per packet and one column per channel.
+        :rtype: numpy.ndarray[numpy.int32]
+        """
+        raw: np.ndarray = batch.raw()
+
+        if self._device == '8206HR':
+            return np.hstack((DataPacket8206HR.channel_codes(raw), DataPacket8206HR.ttl_bits(raw)), dtype=np.int32)
+
+        if self._device == '8274D':
+            return DataPacket8274D.channel_codes(raw).astype(np.int32)
+
+        secondary = np.where(self._analog[4:], DataPacket8401HR.secondary_codes(raw), DataPacket8401HR.secondary_bits(raw))
+        return np.hstack((DataPacket8401HR.channel_codes(raw), secondary), dtype=np.int32)
+
+    def decode(self, batch: DataBatch) -> list[np.ndarray]:
+        """Value of every channel for every packet in a batch.
+
+        :param batch: Packets to decode.
+        :type batch: DataBatch
+
+        :return: One array per channel, in the order of ``names``.
+        :rtype: list[numpy.ndarray]
+        """
+        raw_values: np.ndarray = self.raw_values(batch)
+        return [ raw_values[:, idx] * self._scales[idx] + self._offsets[idx] if analog else raw_values[:, idx].astype(np.uint8)
+                 for idx, analog in enumerate(self._analog) ]
+
+    def decode_channel(self, batch: DataBatch, channel: int) -> np.ndarray:
+        """Value of one channel for every packet in a batch.
+
+        :param batch: Packets to decode.
+        :type batch: DataBatch
+        :param channel: Index of the channel in ``names``.
+        :type channel: int
+
+        :return: The channel's values.
+        :rtype: numpy.ndarray
+        """
+        raw_values: np.ndarray = self.raw_values(batch)[:, channel]
+        if self._analog[channel]:
+            return raw_values * self._scales[channel] + self._offsets[channel]
+        return raw_values.astype(np.uint8)
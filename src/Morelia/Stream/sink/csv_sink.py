@@ -7,64 +7,104 @@ __license__     = 'New BSD License'
 __copyright__   = 'Copyright (c) 2024, Thresa Kelly'
 __email__       = 'sales@pinnaclet.com'
 
-import csv
 from typing import Self
 
+import numpy as np
+
 from Morelia.Stream.sink import SinkInterface
-from Morelia.Devices import AquisitionDevice, Pod8274D, Pod8206HR, Pod8401HR
-from Morelia.packet.data import DataPacket
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+from Morelia.Devices import AquisitionDevice, Pod8274D, Pod8206HR, Pod8401HR, Pod8480SC
+from Morelia.packet.data import DataPacket, DataBatch
+
+#8401-HR columns are named as they were before the sinks shared ``ChannelSchema``, so scripts reading older files still find them.
+_8401HR_COLUMN_NAMES: dict[str, str] = { 'EXT0' : 'aEXT0', 'EXT1' : 'aEXT1', 'TTL1' : 'aTTL1', 'TTL2' : 'aTTL2', 'TTL3' : 'aTTL3', 'TTL4' : 'aTTL4' }
 
 class CSVSink(SinkInterface):
     """Stream data to a CSV file, truncates the destination file each time.
-    
+
+    Each row holds a sample's timestamp (in nanoseconds since the epoch) followed by one column per channel.
+    Analog channels are written in microvolts, and TTL (digital) channels as 0 or 1. Columns are named as in
+    ``ChannelSchema``, except an 8401-HR's EXT0, EXT1 and TTL1-4, which are named aEXT0, aEXT1 and aTTL1-4. For an 8274D, whose packet
+    layout is unverified (see ``DataPacket8274D``), each row holds a packet's length in bytes and its bytes in
+    hexadecimal. For an 8480-SC, each row holds an event's timestamp, its name (e.g. ``EVENT STIM START``), and its
+    value: the TTL input or stimulus channel, or for low current events, a bitmask of the channels with low current.
+
+    Whole batches of data are decoded and formatted at once, then written through a large file buffer.
+
     :param file_path: Path to CSV file to write to.
     :type file_path: str
 
     :param pod: POD device data is being streamed from.
-    :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D`
+    :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D | Pod8480SC`
+
+    :param float_format: printf-style format of analog values, e.g. ``'%.3f'`` for 3 decimal places, or ``'%r'``
+        for the shortest text that reads back as exactly the same number. Defaults to ``'%.6f'``.
+    :type float_format: str, optional
+
+    :param buffer_size: Size of the file buffer, in bytes. Defaults to 1 MiB.
+    :type buffer_size: int, optional
     """
 
-    def __init__(self, file_path: str, pod: AquisitionDevice) -> None:
+    def __init__(self, file_path: str, pod: AquisitionDevice | Pod8480SC, float_format: str = '%.6f', buffer_size: int = 1 << 20) -> None:
         """Class constructor."""
         self._file_path = file_path
-        
         self._pod = pod
-   
-    def __enter__(self) -> Self:
-        self._file_handle = open(self._file_path, 'w', newline='') 
-        self._csv_writer = csv.writer(self._file_handle)
+        self._buffer_size = buffer_size
 
-        if isinstance(self._pod, Pod8206HR):
-                self._csv_writer.writerow(('time', 'EEG1', 'EEG2', 'EEG3/EMG'))
+        try:
+            float_format % 1.0
+        except (TypeError, ValueError):
+            raise ValueError(f'"{float_format}" is not a format for a single number.')
 
-        elif isinstance(self._pod, Pod8401HR):
+        self._float_format = float_format
 
-            preamp_channel_names: list[str] = Pod8401HR.GetChannelMapForPreampDevice(self._pod.preamp).values() if not self._pod.preamp is None else ['A', 'B', 'C', 'D']
+    def __enter__(self) -> Self:
+
+        if isinstance(self._pod, Pod8274D):
+            header: tuple[str] = ('time', 'length_in_bytes', 'data')
 
-            self._csv_writer.writerow(('time',) + tuple(preamp_channel_names) + ('aEXT0', 'aEXT1', 'aTTL1', 'aTTL2', 'aTTL3', 'aTTL4'))
+        elif isinstance(self._pod, Pod8480SC):
+            header = ('time', 'event', 'value')
+            self._event_names: dict[int, str] = { number : self._pod.GetDeviceCommands()[number][0] for number in Pod8480SC.EVENT_COMMANDS }
 
-        elif isinstance(self._pod, Pod8274D):
-                self._csv_writer.writerow(('time', 'length_in_bytes', 'data'))
+        elif isinstance(self._pod, (Pod8206HR, Pod8401HR)):
+            self._schema = ChannelSchema(self._pod)
+            header = ('time',) + self._schema.names
+            if isinstance(self._pod, Pod8401HR):
+                header = tuple( _8401HR_COLUMN_NAMES.get(name, name) for name in header )
+
+            #one row, formatted in a single operation.
+            self._row_format: str = ','.join(['%d'] + [ self._float_format if analog else '%d' for analog in self._schema.analog ]) + '\n'
 
         else:
             raise ValueError(f'Device "{self._pod.device_name}" cannot be streamed from!')
 
+        self._file_handle = open(self._file_path, 'w', newline='', buffering=self._buffer_size)
+        self._file_handle.write(','.join(header) + '\n')
+
+        return self
+
     def __exit__(self, *args, **kwargs) -> bool:
         self._file_handle.close()
-        del self._csv_writer
         del self._file_handle
         return False
 
     #TODO: check that sink is open
     def flush(self, timestamp: int, packet: DataPacket) -> None:
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+
+        #8274D packets are written as they are, until their layout is confirmed.
+        if isinstance(self._pod, Pod8274D):
+            self._file_handle.write(''.join([ f'{timestamp},{len(packet.raw_packet)},{packet.raw_packet.hex()}\n' for timestamp, packet in batch ]))
+            return
+
+        if isinstance(self._pod, Pod8480SC):
+            self._file_handle.write(''.join([ f'{timestamp},{self._event_names[packet.command_number]},{packet.payload[0]}\n' for timestamp, packet in batch ]))
+            return
 
-        if isinstance(self._pod, Pod8206HR):
-            self._csv_writer.writerow((timestamp,) + (packet.ch0, packet.ch1, packet.ch2, packet.ttl1, packet.ttl2, packet.ttl3, packet.ttl4))
+        #analog channels in microvolts, digital ones as they are.
+        columns: list[list] = [batch.timestamps.tolist()] + [ channel.tolist() for channel in self._schema.decode(batch) ]
 
-        elif isinstance(self._pod, Pod8401HR):
-            channel_data = (packet.ch0, packet.ch1, packet.ch2, packet.ch3)
-            aext_data = (packet.ext0, packet.ext1)
-            attl_data = (packet.ttl1, packet.ttl2, packet.ttl3, packet.ttl4)
-            self._csv_writer.writerow((timestamp,) + channel_data + aext_data + attl_data)
-        
-        #TODO: 8274D
+        self._file_handle.write(''.join(map(self._row_format.__mod__, zip(*columns))))
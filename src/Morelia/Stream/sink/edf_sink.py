@@ -7,111 +7,182 @@ __license__     = 'New BSD License'
 __copyright__   = 'Copyright (c) 2024, Thresa Kelly'
 __email__       = 'sales@pinnaclet.com'
 
-from pyedflib import EdfWriter
+from pyedflib import EdfWriter, FILETYPE_EDFPLUS, FILETYPE_BDFPLUS
 from typing import Self
+import warnings
 import numpy as np
-import functools as ft
 
 from Morelia.Stream.sink import SinkInterface
-from Morelia.packet.data import DataPacket
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+from Morelia.packet.data import DataPacket, DataBatch, DataGap
 from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
 
+def _header_number(value: float) -> float:
+    """Round a number to fit the 8 characters EDF headers store numbers in."""
+    for decimals in range(6, 0, -1):
+        text: str = f'{value:.{decimals}f}'
+        if len(text) <= 8:
+            return float(text)
+    return round(value)
+
+#8206-HR signals keep the labels they had before the sinks shared ``ChannelSchema``, so scripts reading older files still find them.
+_8206HR_LABELS: dict[str, str] = { 'TTL2' : 'TTl2', 'TTL4' : 'TTl4' }
+
 class EDFSink(SinkInterface):
-    """Stream data to an EDF file.
+    """Stream data to an EDF (or BDF) file.
+
+    Samples are written as the digital values read from the device's ADC, so nothing is lost to rounding. Each
+    channel's physical range in the file header is the range its ADC covers at the device's gain settings, which
+    lets any EDF reader convert the digital values back to microvolts. TTL channels are written as 0 or 1. The 8274D's
+    channels are uncalibrated (see ``ChannelSchema``), so their physical range is that of the raw ADC codes.
 
-    :param sample_rate: Sample rate of device being streamed from. Used in
-    setting up EDF file.
-    :type sample_rate: int
+    Incoming data is copied straight into a preallocated data record, which is written to the file once full,
+    so memory use does not grow with the length of a recording.
 
-    :param file_path: Path to CSV file to write to.
+    :param file_path: Path to EDF file to write to.
     :type file_path: str
 
     :param pod: POD device data is being streamed from.
     :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D`
+
+    :param record_duration: Length of each data record, in seconds. Data is written to the file one record
+        at a time, so this is how often the file is written to. ``sample rate * record_duration`` must be a whole
+        number. Defaults to 1.
+    :type record_duration: float, optional
+
+    :param bdf: Write a 24 bit BDF file instead of a 16 bit EDF file. 16 bits is enough for the 8206-HR, but the
+        8401-HR's 18 bit channels lose their 2 least significant bits in an EDF file. Defaults to BDF if `file_path`
+        ends in ".bdf".
+    :type bdf: bool | None, optional
     """
 
-    def __init__(self, file_path: str, pod: AquisitionDevice ) -> None:
+    def __init__(self, file_path: str, pod: AquisitionDevice, record_duration: float = 1, bdf: bool | None = None) -> None:
         """ Class constructor."""
         self._file_path = file_path
         self._pod = pod
+        self._record_duration = record_duration
+        self._bdf = file_path.lower().endswith('.bdf') if bdf is None else bdf
+
+        if not isinstance(self._pod, (Pod8206HR, Pod8401HR, Pod8274D)):
+            raise ValueError(f'Device "{self._pod.device_name}" cannot be streamed from!')
+
+    def _signal_headers(self) -> list[dict]:
+        """Header of each channel, and how to turn the channel's raw values into the file's digital values."""
+
+        #digital samples are a channel's raw ADC value, shifted down to fit the file's sample size and centered on 0.
+        sample_bits: int = 24 if self._bdf else 16
+        def adc_channel(label: str, unit: str, bits: int, scale: float, offset: float) -> dict:
+            shift: int = max(0, bits - sample_bits)
+            return {
+                'label'            : label,
+                'dimension'        : unit,
+                'physical_min'     : _header_number(offset),
+                'physical_max'     : _header_number(offset + scale * (((1 << (bits-shift)) - 1) << shift)),
+                'digital_min'      : -(1 << (bits-shift-1)),
+                'digital_max'      : (1 << (bits-shift-1)) - 1,
+                'shift'            : shift,
+            }
+
+        def ttl_channel(label: str) -> dict:
+            return { 'label' : label, 'dimension' : '', 'physical_min' : 0, 'physical_max' : 1, 'digital_min' : 0, 'digital_max' : 1, 'shift' : 0 }
+
+        schema: ChannelSchema = self._schema
+        labels: tuple[str] = tuple( _8206HR_LABELS.get(name, name) for name in schema.names ) if isinstance(self._pod, Pod8206HR) else schema.names
+        return [ adc_channel(label, unit, bits, scale, offset) if analog else ttl_channel(label)
+                 for label, analog, unit, bits, (scale, offset) in zip(labels, schema.analog, schema.units, schema.bits, schema.scales) ]
 
-        if isinstance(self._pod, Pod8206HR):
-                self._channels = ('EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTl2', 'TTL3', 'TTl4')
-
-        elif isinstance(self._pod, Pod8401HR):
-
-            preamp_channel_names: list[str] = Pod8401HR.GetChannelMapForPreampDevice(self._pod.preamp).values() if not self._pod.preamp is None else ['A', 'B', 'C', 'D']
-
-            self._channels = tuple(preamp_channel_names) + ('EXT0', 'EXT1', 'TTL1', 'TTL2', 'TTL3', 'TTL4')
+    def __enter__(self) -> Self:
 
-        elif isinstance(self._pod, Pod8274D):
-                self._channels('length_in_bytes', 'data')
+        sample_rate: int = self._pod.sample_rate
+        samples_per_record: float = sample_rate * self._record_duration
+        if samples_per_record != int(samples_per_record) or samples_per_record < 1:
+            raise ValueError(f'A data record of {self._record_duration} seconds must hold a whole number of samples at {sample_rate} Hz.')
 
+        self._schema = ChannelSchema(self._pod)
+        headers: list[dict] = self._signal_headers()
 
-        self._buffer = [ [] for _ in self._channels ]
+        self._edf_writer = EdfWriter(self._file_path, len(headers), file_type=FILETYPE_BDFPLUS if self._bdf else FILETYPE_EDFPLUS)
 
-    def __enter__(self) -> Self:
+        for idx, header in enumerate(headers):
+           self._edf_writer.setSignalHeader( idx, {
+                'label'            : header['label'],
+                'dimension'        : header['dimension'],
+                'sample_frequency' : sample_rate,
+                'physical_max'     : header['physical_max'],
+                'physical_min'     : header['physical_min'],
+                'digital_max'      : header['digital_max'],
+                'digital_min'      : header['digital_min'],
+                'transducer'       : '',
+                'prefilter'        : ''
+            } )
 
-        EDF_PHYSICAL_BOUND = 2046
-        EDF_DIGITAL_MAX = 32767
-        EDF_DIGITAL_MIN = -32768
+        #pyedflib warns that a fixed record duration can change sample frequencies, which can't happen here since they are all the same.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self._edf_writer.setDatarecordDuration(self._record_duration)
 
-        self._edf_writer = EdfWriter(self._file_path, len(self._channels))
+        #digital value = (raw value >> shift) - center, for each channel.
+        self._shifts = np.array([ header['shift'] for header in headers ])
+        self._centers = np.array([ -header['digital_min'] if header['digital_min'] < 0 else 0 for header in headers ])
 
-        for idx, channel in enumerate(self._channels):
-           self._edf_writer.setSignalHeader( idx, {
-                'label'         :  channel,
-                'dimension'     :  'uV',
-                'sample_frequency'   :  self._pod.sample_rate,
-                'physical_max'  :  EDF_PHYSICAL_BOUND,
-                'physical_min'  : -EDF_PHYSICAL_BOUND,
-                'digital_max'   :  EDF_DIGITAL_MAX,
-                'digital_min'   :  EDF_DIGITAL_MIN,
-                'transducer'    :  '',
-                'prefilter'     :  ''
-            } )
+        #one data record, laid out as edflib expects it: every sample of the first channel, then the second, ...
+        self._record = np.zeros((len(headers), int(samples_per_record)), dtype=np.int32 if self._bdf else np.int16)
+        self._write_record = self._edf_writer.blockWriteDigitalSamples if self._bdf else self._edf_writer.blockWriteDigitalShortSamples
+        self._filled: int = 0
+        self._records_written: int = 0
 
         return self
 
     def __exit__(self, *args, **kwargs) -> bool:
 
-        self._write_buffer_to_edf()
+        #the last record is padded out with zeros.
+        if self._filled:
+            self._record[:, self._filled:] = 0
+            self._write_buffer_to_edf()
 
         self._edf_writer.close()
         del self._edf_writer
 
         return False
 
-
     #we have a "useless" timestamp paramater here so we implement the same function "interface".
     #TODO: check if sink is open
-    #TODO: 8274
     def flush(self, timestamp: int, packet: DataPacket) -> None:
-        
-        if isinstance(self._pod, Pod8206HR):
-            self._buffer[0].append(packet.ch0)
-            self._buffer[1].append(packet.ch1)
-            self._buffer[2].append(packet.ch2)
-            self._buffer[3].append(float(packet.ttl1))
-            self._buffer[4].append(float(packet.ttl2))
-            self._buffer[5].append(float(packet.ttl3))
-            self._buffer[6].append(float(packet.ttl4))
-
-        elif isinstance(self._pod, Pod8401HR):
-            self._buffer[0].append(packet.ch0)
-            self._buffer[1].append(packet.ch1)
-            self._buffer[2].append(packet.ch2)
-            self._buffer[3].append(packet.ch3)
-            self._buffer[4].append(float(packet.ext0))
-            self._buffer[5].append(float(packet.ext1))
-            self._buffer[6].append(float(packet.ttl1))
-            self._buffer[7].append(float(packet.ttl2))
-            self._buffer[8].append(float(packet.ttl3))
-            self._buffer[9].append(float(packet.ttl4))
-
-        if len(self._buffer[0]) >= self._pod.sample_rate:
-            self._write_buffer_to_edf()
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        #(channels, samples), ready to be copied into the record.
+        digital: np.ndarray = ((self._schema.raw_values(batch) >> self._shifts) - self._centers).T
+
+        copied: int = 0
+        while copied < len(batch):
+            count: int = min(len(batch) - copied, self._record.shape[1] - self._filled)
+            self._record[:, self._filled:self._filled+count] = digital[:, copied:copied+count]
+            self._filled += count
+            copied += count
+
+            if self._filled == self._record.shape[1]:
+                self._write_buffer_to_edf()
+
+    def flush_gap(self, gap: DataGap) -> None:
+        """Mark the gap with an annotation, and fill it with zeros so the samples after it are written at the right time."""
+        sample_rate: int = self._record.shape[1] / self._record_duration
+        self._edf_writer.writeAnnotation(self._samples_written() / sample_rate, gap.duration / 10**9, 'Data gap')
+
+        remaining: int = gap.sample_count
+        while remaining:
+            count: int = min(remaining, self._record.shape[1] - self._filled)
+            self._record[:, self._filled:self._filled+count] = 0
+            self._filled += count
+            remaining -= count
+
+            if self._filled == self._record.shape[1]:
+                self._write_buffer_to_edf()
+
+    def _samples_written(self) -> int:
+        return self._records_written * self._record.shape[1] + self._filled
 
     def _write_buffer_to_edf(self) -> None:
-        self._edf_writer.writeSamples(list(map(np.array, self._buffer)))
-        self._buffer = [ [] for _ in self._channels ]
+        self._write_record(self._record.ravel())
+        self._records_written += 1
+        self._filled = 0
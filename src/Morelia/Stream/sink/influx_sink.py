@@ -6,20 +6,48 @@ __credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
 __license__     = 'New BSD License'
 __copyright__   = 'Copyright (c) 2024, Thresa Kelly'
 __email__       = 'sales@pinnaclet.com'
- 
-from influxdb_client import InfluxDBClient, WriteApi, WriteOptions
-import reactivex as rx
-import reactivex.operators as ops
+
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Self
 
+import numpy as np
+
 from Morelia.Stream.sink import SinkInterface
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+from Morelia.Stream.sink.spool import Spool
 from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
-from Morelia.packet.data import DataPacket
+from Morelia.packet.data import DataPacket, DataBatch
+
+#the InfluxDB client (which brings reactivex with it) is only needed to send data to InfluxDB, so it is an optional dependency.
+try:
+    from influxdb_client import InfluxDBClient, WriteApi, WritePrecision
+    from influxdb_client.client.write_api import SYNCHRONOUS
+except ImportError:
+    InfluxDBClient = None
 
+#writes waiting to be sent before streaming waits for the server to catch up.
+_MAX_PENDING_WRITES: int = 8
+
+def _escape(text: str, special: str) -> str:
+    """Escape characters with a special meaning in line protocol, and '%', since lines are built with %-formatting."""
+    for char in special:
+        text = text.replace(char, '\\' + char)
+    return text.replace('%', '%%')
 
 class InfluxSink(SinkInterface):
     """Stream data to InfluxDB for real-time monitoring.
 
+    Each sample is written as one point (line), tagged with the device's name, with one field per channel named after
+    the channel. Analog channels are written in microvolts as floats, and TTL (digital) channels as the integers 0 or 1.
+
+    Whole batches of data are encoded at once, and lines are sent to InfluxDB in gzip-compressed batches of at
+    least `batch_size` lines, or whatever has built up after `flush_interval_ms` (checked as data arrives). Batches
+    are sent from a background thread, so streaming does not wait for the network unless the server falls behind.
+
+    To keep data safe while the server is down, pass a ``Spool``: batches are then written to disk first and sent
+    from there, retrying until they get through, and streaming never waits for the server.
+
             :param url: URL that points to an InfluxDB server.
             :type url: str
             :param api_token: API token to authenticate to InfluxDB. Needs write permissions.
@@ -32,10 +60,24 @@ class InfluxSink(SinkInterface):
             :type measurement: str
             :param pod: 8206-HR/8401-HR/8274D POD device you are streaming data from.
             :type pod: :class: AquisitionDevice
+            :param batch_size: Number of lines to send in each request. Defaults to 5000.
+            :type batch_size: int, optional
+            :param flush_interval_ms: Longest time to hold on to lines before sending them, in milliseconds. Defaults to 1000.
+            :type flush_interval_ms: int, optional
+            :param gzip: Compress each request. Defaults to True.
+            :type gzip: bool, optional
+            :param float_format: printf-style format of analog values. Defaults to ``'%.6f'``.
+            :type float_format: str, optional
+            :param spool: Spool to send batches through, or None to send them straight to the server. Defaults to None.
+            :type spool: Spool | None, optional
     """
 
-    def __init__(self, url: str, api_token: str, org: str, bucket: str, measurement: str, pod: AquisitionDevice) -> None:
+    def __init__(self, url: str, api_token: str, org: str, bucket: str, measurement: str, pod: AquisitionDevice,
+                 batch_size: int = 5000, flush_interval_ms: int = 1000, gzip: bool = True, float_format: str = '%.6f',
+                 spool: Spool | None = None) -> None:
         """Set instance variables."""
+        if InfluxDBClient is None:
+            raise ImportError('InfluxSink requires influxdb-client to be installed (pip install influxdb-client).')
 
         self.__api_token: str = api_token
         self._url: str = url
@@ -45,85 +87,140 @@ class InfluxSink(SinkInterface):
         self._bucket: str = bucket
         self._measurement: str = measurement
 
-        if isinstance(self._pod, Pod8401HR):
-            def _line_protocol_factory(timestamp, packet) -> str:
-                return f"""{self._measurement},channel=CHA,name={self._pod.device_name} value={packet.ch0} {timestamp}
-                       {self._measurement},channel=CHB,name={self._pod.device_name} value={packet.ch1} {timestamp}
-                       {self._measurement},channel=CHC,name={self._pod.device_name} value={packet.ch2} {timestamp}
-                       {self._measurement},channel=CHD,name={self._pod.device_name} value={packet.ch3} {timestamp}
-                       {self._measurement},channel=aEXT0,name={self._pod.device_name} value={packet.ext0} {timestamp}
-                       {self._measurement},channel=aEXT1,name={self._pod.device_name} value={packet.ext1} {timestamp}
-                       {self._measurement},channel=TTL1,name={self._pod.device_name} value={packet.ttl1} {timestamp}
-                       {self._measurement},channel=TTL2,name={self._pod.device_name} value={packet.ttl2} {timestamp}
-                       {self._measurement},channel=TTL3,name={self._pod.device_name} value={packet.ttl3} {timestamp}
-                       {self._measurement},channel=TTL4,name={self._pod.device_name} value={packet.ttl4} {timestamp}""".encode('utf-8')
-
-        elif isinstance(self._pod, Pod8206HR):
-            def _line_protocol_factory(timestamp, packet) -> str:
-                return f"""{self._measurement},channel=CH0,name={self._pod.device_name} value={packet.ch0} {timestamp}
-                       {self._measurement},channel=CH1,name={self._pod.device_name} value={packet.ch1} {timestamp}
-                       {self._measurement},channel=CH2,name={self._pod.device_name} value={packet.ch2} {timestamp}
-                       {self._measurement},channel=TTL1,name={self._pod.device_name} value={packet.ttl1} {timestamp}
-                       {self._measurement},channel=TTL2,name={self._pod.device_name} value={packet.ttl2} {timestamp}
-                       {self._measurement},channel=TTL3,name={self._pod.device_name} value={packet.ttl3} {timestamp}
-                       {self._measurement},channel=TTL4,name={self._pod.device_name} value={packet.ttl4} {timestamp}""".encode('utf-8')
-
-        #self._line_protocol_factory = _line_protocol_factory
-
-        self._subject = rx.Subject()
-
-        self._data = self._subject.pipe(
-            ops.starmap(_line_protocol_factory),
-            ops.buffer_with_count(self._pod.sample_rate//2),
-            ops.map(lambda x: b'\n'.join(x))
-        )
-
-    
+        self._batch_size: int = batch_size
+        self._flush_interval_sec: float = flush_interval_ms / 1000
+        self._gzip: bool = gzip
+        self._float_format: str = float_format
+        self._spool: Spool | None = spool
+
+        if not isinstance(self._pod, (Pod8206HR, Pod8401HR, Pod8274D)):
+            raise ValueError(f'Device "{self._pod.device_name}" cannot be streamed from!')
+
+    def _line_format(self) -> str:
+        """Format of one line: ``measurement,name=<device> <channel>=<value>,... <timestamp>``."""
+        series: str = _escape(self._measurement, ', ')
+        if self._pod.device_name is not None:
+            series += ',name=' + _escape(str(self._pod.device_name), ',= ')
+
+        fields: list[str] = [ f'{_escape(name, ",= ")}={self._float_format if analog else "%di"}' for name, analog in zip(self._schema.names, self._schema.analog) ]
+
+        return f'{series} {",".join(fields)} %d\n'
+
     #the following two methods implement the context manager protocol to allow
     #this sink to work within a `with` block. To illuminate why these methods are the
     #they are, see the relevent section of the python manual:
     # https://docs.python.org/3/library/stdtypes.html#context-manager-types
 
     def __enter__(self) -> Self:
-        self._client: InfluxDBClient = InfluxDBClient(url=self._url, token=self.__api_token, org=self._org)
-        self._writer: WriteApi = self._client.write_api(write_options=WriteOptions(batch_size=1)) 
-        self._writer.write(bucket=self._bucket, org=self._org, record=self._data)
+        self._schema = ChannelSchema(self._pod)
+        self._format: str = self._line_format()
+
+        self._client: InfluxDBClient = InfluxDBClient(url=self._url, token=self.__api_token, org=self._org, enable_gzip=self._gzip)
+        self._writer: WriteApi = self._client.write_api(write_options=SYNCHRONOUS)
+
+        #one thread, so batches are sent in order.
+        self._sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix='influx-sender')
+        self._sending: list[Future] = []
+
+        self._pending: list[str] = []
+        self._pending_lines: int = 0
+        self._pending_since: float = 0.0
+
+        if self._spool is not None:
+            self._spool.open(lambda payload: self._writer.write(bucket=self._bucket, org=self._org, record=payload, write_precision=WritePrecision.NS))
 
         #bind the sink to the variable in the "as" part of the context manager.
         return self
 
     def __exit__(self, *args, **kwargs) -> bool:
-        self._writer.close()
+        if self._pending_lines:
+            self._send()
+
+        self._sender.shutdown(wait=True)
+        if self._spool is not None:
+            self._spool.close()
         self._client.close()
-        
-        #delete these entirely so that the sink is detected as closed by 
+
+        #delete these entirely so that the sink is detected as closed by
         #any later calls to `flush` if it isn't reopened prior.
         del self._writer
         del self._client
-       
+
+        self._raise_send_errors()
+
         #signal to the context manager to propagate exceptions upwards.
         #we technically don't need to return this, as if we return None python
-        #will interpreted it false-y (https://docs.python.org/3/library/stdtypes.html#truth-value-testing), 
-        #but it's good to be explicit ;) 
+        #will interpreted it false-y (https://docs.python.org/3/library/stdtypes.html#truth-value-testing),
+        #but it's good to be explicit ;)
         return False
 
+    @property
+    def spool(self) -> Spool | None:
+        return self._spool
+
     def open(self) -> None:
         """Wrapper around `self.__enter__` for use outside of a context manager."""
         self.__enter__()
-    
+
     def close(self) -> None:
         """Wrapper around `self.__exit__` for use outside of a context manager."""
         self.__exit__()
-    
+
+    def encode(self, batch: DataBatch) -> str:
+        """Line protocol for a batch of data, one line per sample.
+
+        :param batch: Data to encode.
+        :type batch: DataBatch
+
+        :return: The lines, each ending in a newline.
+        :rtype: str
+        """
+        columns: list[list] = [ values.tolist() for values in self._schema.decode(batch) ]
+        columns.append(batch.timestamps.tolist())
+        return ''.join(map(self._format.__mod__, zip(*columns)))
+
     def flush(self, timestamp: int, packet: DataPacket) -> None:
         """Write data to InfluxDB."""
-        #with Profile() as prof:         
-            #can't send data if no influx client/writer.
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        #can't send data if no influx client/writer.
         if not hasattr(self, '_client') or not hasattr(self, '_writer'):
             raise RuntimeError('Must open sink before using.')
 
-            #TODO: handle 8274D
-            #TODO: handle 8401 preamp channel names
-        #self._writer.write(bucket='pinnacle', org='pinnacle', record=self._line_protocol_factory(timestamp, packet))
-        self._subject.on_next((timestamp, packet))
-            #Stats(prof).strip_dirs().sort_stats('tottime').print_stats()
+        self._raise_send_errors()
+
+        if not self._pending_lines:
+            self._pending_since = time.monotonic()
+
+        self._pending.append(self.encode(batch))
+        self._pending_lines += len(batch)
+
+        if self._pending_lines >= self._batch_size or time.monotonic() - self._pending_since >= self._flush_interval_sec:
+            self._send()
+
+    def _send(self) -> None:
+        """Hand the lines built up so far to the sending thread."""
+        body: bytes = ''.join(self._pending).encode('utf-8')
+        self._pending = []
+        self._pending_lines = 0
+
+        if self._spool is not None:
+            self._spool.put(body)
+            return
+
+        #if the server has fallen behind, wait for it rather than holding on to more and more data.
+        if len(self._sending) >= _MAX_PENDING_WRITES:
+            self._sending[0].result()
+
+        self._sending.append(self._sender.submit(self._writer.write, bucket=self._bucket, org=self._org, record=body, write_precision=WritePrecision.NS))
+
+    def _raise_send_errors(self) -> None:
+        """Raise the first error hit while sending in the background, if any."""
+        still_sending: list[Future] = []
+        for future in self._sending:
+            if not future.done():
+                still_sending.append(future)
+            elif future.exception() is not None:
+                raise future.exception()
+        self._sending = still_sending
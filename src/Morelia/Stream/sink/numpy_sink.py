@@ -0,0 +1,276 @@
+"""Send data to a memory-mapped NumPy file, and read it back."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import bisect
+import json
+import os
+import struct
+import time
+from typing import Self
+
+import numpy as np
+
+from Morelia.Stream.sink import SinkInterface
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+from Morelia.packet.data import DataPacket, DataBatch, DataGap
+from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
+
+#space reserved for the .npy header, so the data starts on a page boundary and the header can be rewritten in place.
+_HEADER_SIZE: int = 4096
+
+def _npy_header(dtype: np.dtype, length: int) -> bytes:
+    """Version 1.0 .npy header for a 1 dimensional array, padded to ``_HEADER_SIZE`` bytes."""
+    text: str = repr({ 'descr' : np.lib.format.dtype_to_descr(dtype), 'fortran_order' : False, 'shape' : (length,) })
+    #magic string, version, length of the text, then the text, padded with spaces and ending in a newline.
+    prefix: bytes = b'\x93NUMPY\x01\x00' + struct.pack('<H', _HEADER_SIZE - 10)
+    return prefix + text.encode('latin1').ljust(_HEADER_SIZE - 11) + b'\n'
+
+def sidecar_path(file_path: str) -> str:
+    """Path of the JSON sidecar that describes a recording, e.g. ``rec.json`` for ``rec.npy``.
+
+    :param file_path: Path to the recording's .npy file.
+    :type file_path: str
+
+    :return: The path.
+    :rtype: str
+    """
+    return os.path.splitext(file_path)[0] + '.json'
+
+class NumpySink(SinkInterface):
+    """Stream data to a memory-mapped .npy file, with one row per sample.
+
+    Rows are a structured NumPy type: a ``time`` field holding the sample's timestamp (in nanoseconds since the
+    epoch), then one field per channel, named after the channel. Analog channels are stored in microvolts as 64 bit
+    floats, and TTL (digital) channels as 0 or 1. Once the sink is closed the file is an ordinary .npy file, which
+    ``numpy.load(file_path, mmap_mode='r')`` opens instantly.
+
+    The file is grown in extents of `extent_sec` seconds of samples, and samples are copied straight into the
+    memory-mapped file. A JSON sidecar next to the file (``rec.json`` for ``rec.npy``) holds the channel names and
+    units, the sample rate, the timestamp of the first sample, any gaps in the data, and how many samples have been
+    written so far. ``NumpyRecording`` uses the sidecar to read a recording while it is still being written.
+
+    :param file_path: Path to .npy file to write to.
+    :type file_path: str
+
+    :param pod: POD device data is being streamed from.
+    :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D`
+
+    :param extent_sec: How much the file grows by whenever it is full, in seconds of samples. Defaults to 60.
+    :type extent_sec: float, optional
+
+    :param commit_interval_sec: How often the sidecar is updated with the number of samples written, in seconds.
+        Readers see new samples this often. Defaults to 0.1.
+    :type commit_interval_sec: float, optional
+    """
+
+    def __init__(self, file_path: str, pod: AquisitionDevice, extent_sec: float = 60, commit_interval_sec: float = 0.1) -> None:
+        """Class constructor."""
+        self._file_path = file_path
+        self._pod = pod
+        self._extent_sec = extent_sec
+        self._commit_interval_sec = commit_interval_sec
+
+        if not isinstance(self._pod, (Pod8206HR, Pod8401HR, Pod8274D)):
+            raise ValueError(f'Device "{self._pod.device_name}" cannot be streamed from!')
+
+    def __enter__(self) -> Self:
+        self._sample_rate: int = self._pod.sample_rate
+        self._extent: int = max(1, int(self._sample_rate * self._extent_sec))
+
+        self._schema = ChannelSchema(self._pod)
+        self._dtype = np.dtype([('time', '<i8')] + list(zip(self._schema.names, self._schema.dtypes)))
+
+        #the header says the file is empty until it is closed; readers get the length from the sidecar instead.
+        self._file_handle = open(self._file_path, 'w+b')
+        self._file_handle.write(_npy_header(self._dtype, 0))
+
+        self._samples: int = 0
+        self._capacity: int = 0
+        self._data: np.memmap | None = None
+        self._grow(self._extent)
+
+        self._start_time: int | None = None
+        self._gaps: list[dict] = []
+        self._last_commit: float = 0.0
+        self._commit(complete=False)
+
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self._data.flush()
+        del self._data
+
+        #trim the unused end of the last extent, and record the final length in the header.
+        self._file_handle.truncate(_HEADER_SIZE + self._samples * self._dtype.itemsize)
+        self._file_handle.seek(0)
+        self._file_handle.write(_npy_header(self._dtype, self._samples))
+        self._file_handle.close()
+        del self._file_handle
+
+        self._commit(complete=True)
+
+        return False
+
+    def _grow(self, capacity: int) -> None:
+        """Extend the file to hold at least `capacity` samples, a whole number of extents at a time."""
+        capacity = -(-capacity // self._extent) * self._extent
+        if self._data is not None:
+            self._data.flush()
+
+        self._file_handle.truncate(_HEADER_SIZE + capacity * self._dtype.itemsize)
+        self._data = np.memmap(self._file_handle, dtype=self._dtype, mode='r+', offset=_HEADER_SIZE, shape=(capacity,))
+        self._capacity = capacity
+
+    def _commit(self, complete: bool) -> None:
+        """Update the sidecar, so readers can see the samples written so far."""
+        sidecar = {
+            'channels'    : [ { 'name' : name, 'unit' : unit } for name, unit in zip(self._schema.names, self._schema.units) ],
+            'sample_rate' : self._sample_rate,
+            'start_time'  : self._start_time,
+            'samples'     : self._samples,
+            'gaps'        : self._gaps,
+            'complete'    : complete,
+        }
+
+        #written to a temporary file first, so the sidecar on disk is always complete.
+        path: str = sidecar_path(self._file_path)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(sidecar, file, indent=1)
+        os.replace(path + '.tmp', path)
+
+        self._last_commit = time.monotonic()
+
+    #TODO: check that sink is open
+    def flush(self, timestamp: int, packet: DataPacket) -> None:
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        if not len(batch):
+            return
+
+        if self._samples + len(batch) > self._capacity:
+            self._grow(self._samples + len(batch))
+
+        if self._start_time is None:
+            self._start_time = int(batch.timestamps[0])
+
+        #the rows are written in place, in the memory-mapped file.
+        rows: np.ndarray = self._data[self._samples:self._samples+len(batch)]
+        rows['time'] = batch.timestamps
+        for name, values in zip(self._schema.names, self._schema.decode(batch)):
+            rows[name] = values
+
+        self._samples += len(batch)
+
+        if time.monotonic() - self._last_commit >= self._commit_interval_sec:
+            self._commit(complete=False)
+
+    def flush_gap(self, gap: DataGap) -> None:
+        """List the gap in the sidecar. No rows are written for the lost samples."""
+        self._gaps.append({ 'sample' : self._samples, 'start' : gap.start, 'duration' : gap.duration, 'lost_samples' : gap.sample_count, 'cause' : gap.cause })
+        self._commit(complete=False)
+
+class NumpyRecording:
+    """Read a recording written by ``NumpySink``, even while it is still being written.
+
+    Nothing is copied: samples are read straight out of the memory-mapped file, and every array returned is a view
+    of it. Call ``refresh`` to see samples written since the recording was opened (or last refreshed).
+
+    :param file_path: Path to the recording's .npy file.
+    :type file_path: str
+    """
+
+    def __init__(self, file_path: str) -> None:
+        """Class constructor."""
+        self._file_path = file_path
+
+        with open(file_path, 'rb') as file:
+            read_header = np.lib.format.read_array_header_1_0 if np.lib.format.read_magic(file) == (1, 0) else np.lib.format.read_array_header_2_0
+            _, _, dtype = read_header(file)
+            self._offset: int = file.tell()
+
+        self._dtype: np.dtype = dtype
+        self._map: np.memmap | None = None
+        self._data: np.ndarray = np.empty(0, dtype=dtype)
+        self.refresh()
+
+    def refresh(self) -> int:
+        """Pick up samples written since the last refresh.
+
+        :return: Number of samples in the recording.
+        :rtype: int
+        """
+        with open(sidecar_path(self._file_path)) as file:
+            self._sidecar: dict = json.load(file)
+
+        samples: int = self._sidecar['samples']
+
+        #the file only ever grows while recording, so it only needs to be mapped again once it has outgrown the map.
+        if samples and (self._map is None or len(self._map) < samples):
+            capacity: int = (os.path.getsize(self._file_path) - self._offset) // self._dtype.itemsize
+            self._map = np.memmap(self._file_path, dtype=self._dtype, mode='r', offset=self._offset, shape=(capacity,))
+
+        if samples:
+            self._data = self._map[:samples]
+
+        return samples
+
+    @property
+    def data(self) -> np.ndarray:
+        """Every sample, as a structured array with a ``time`` field and one field per channel."""
+        return self._data
+
+    @property
+    def channels(self) -> tuple[str]:
+        return tuple(channel['name'] for channel in self._sidecar['channels'])
+
+    @property
+    def units(self) -> dict[str, str]:
+        return { channel['name'] : channel['unit'] for channel in self._sidecar['channels'] }
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sidecar['sample_rate']
+
+    @property
+    def start_time(self) -> int | None:
+        """Timestamp of the first sample, in nanoseconds since the epoch."""
+        return self._sidecar['start_time']
+
+    @property
+    def gaps(self) -> list[dict]:
+        return self._sidecar['gaps']
+
+    @property
+    def complete(self) -> bool:
+        """Whether the recording has finished."""
+        return self._sidecar['complete']
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getitem__(self, index: str | slice) -> np.ndarray:
+        """A channel (e.g. ``recording['EEG1']``), or a range of samples (e.g. ``recording[1000:2000]``)."""
+        return self._data[index]
+
+    def time_range(self, start: int, end: int) -> np.ndarray:
+        """Samples timestamped in ``[start, end)``.
+
+        :param start: Timestamp to start from, in nanoseconds since the epoch.
+        :type start: int
+
+        :param end: Timestamp to stop before, in nanoseconds since the epoch.
+        :type end: int
+
+        :return: The samples, as a view of the file.
+        :rtype: numpy.ndarray
+        """
+        #bisect instead of numpy.searchsorted, which would copy the whole (strided) time column first.
+        times: np.ndarray = self._data['time']
+        return self._data[bisect.bisect_left(times, start):bisect.bisect_left(times, end)]
@@ -0,0 +1,136 @@
+"""Send data to a Parquet (or Feather) file."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import json
+from typing import Self
+
+import numpy as np
+
+from Morelia.Stream.sink import SinkInterface
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+from Morelia.packet.data import DataPacket, DataBatch
+from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
+
+#pyarrow is only needed to write Parquet and Feather files, so it is an optional dependency.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+class ParquetSink(SinkInterface):
+    """Stream data to a Parquet file (or a Feather file, Arrow's own format), which pandas loads in a fraction of the
+    time it takes to parse a CSV file: ``pandas.read_parquet(file_path)`` or ``pandas.read_feather(file_path)``.
+
+    The file has a ``time`` column holding each sample's timestamp (UTC, with nanosecond precision), then one column per
+    channel, named after the channel. Analog channels are written in microvolts as 64 bit floats, and TTL (digital)
+    channels as 0 or 1. The unit of each channel and the device's sample rate are stored in the file's metadata.
+
+    Data is buffered into a preallocated row group of `row_group_size` samples, which is compressed and written to the
+    file once full. Requires pyarrow (``pip install pyarrow``).
+
+    :param file_path: Path to the file to write to.
+    :type file_path: str
+
+    :param pod: POD device data is being streamed from.
+    :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D`
+
+    :param compression: Compression codec, such as ``'zstd'``, ``'lz4'``, ``'snappy'`` (Parquet only) or ``None``.
+        Defaults to ``'zstd'``.
+    :type compression: str | None, optional
+
+    :param compression_level: Compression level, or None for the codec's default. Defaults to None.
+    :type compression_level: int | None, optional
+
+    :param row_group_size: Number of samples in each row group (or record batch, for Feather files). Larger row
+        groups compress better, and the whole row group is held in memory until it is written. Defaults to 100,000.
+    :type row_group_size: int, optional
+
+    :param file_format: ``'parquet'`` or ``'feather'``. Defaults to Feather if `file_path` ends in ".feather" or
+        ".arrow", and Parquet otherwise.
+    :type file_format: str | None, optional
+    """
+
+    def __init__(self, file_path: str, pod: AquisitionDevice, compression: str | None = 'zstd', compression_level: int | None = None,
+                 row_group_size: int = 100_000, file_format: str | None = None) -> None:
+        """Class constructor."""
+        if pa is None:
+            raise ImportError('ParquetSink requires pyarrow to be installed (pip install pyarrow).')
+
+        if file_format is None:
+            file_format = 'feather' if file_path.lower().endswith(('.feather', '.arrow')) else 'parquet'
+        if file_format not in ('parquet', 'feather'):
+            raise ValueError(f'"{file_format}" is not a file format; use "parquet" or "feather".')
+        if row_group_size < 1:
+            raise ValueError('`row_group_size` must be positive.')
+
+        if not isinstance(pod, (Pod8206HR, Pod8401HR, Pod8274D)):
+            raise ValueError(f'Device "{pod.device_name}" cannot be streamed from!')
+
+        self._file_path = file_path
+        self._pod = pod
+        self._compression = compression
+        self._compression_level = compression_level
+        self._row_group_size = row_group_size
+        self._file_format = file_format
+
+    def __enter__(self) -> Self:
+        self._schema = ChannelSchema(self._pod)
+
+        fields = [ pa.field('time', pa.timestamp('ns', tz='UTC')) ]
+        fields += [ pa.field(name, pa.from_numpy_dtype(dtype), metadata={ 'unit' : unit })
+                    for name, dtype, unit in zip(self._schema.names, self._schema.dtypes, self._schema.units) ]
+        self._arrow_schema = pa.schema(fields, metadata={ 'morelia' : json.dumps({ 'sample_rate' : self._pod.sample_rate }) })
+
+        if self._file_format == 'parquet':
+            self._writer = pq.ParquetWriter(self._file_path, self._arrow_schema, compression=self._compression or 'none',
+                                            compression_level=self._compression_level)
+        else:
+            codec = None if self._compression is None else pa.Codec(self._compression, self._compression_level)
+            self._writer = pa.ipc.new_file(self._file_path, self._arrow_schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+
+        #one row group, filled as data comes in: a time column, then a column per channel.
+        self._columns: list[np.ndarray] = [ np.empty(self._row_group_size, dtype=np.int64) ]
+        self._columns += [ np.empty(self._row_group_size, dtype=dtype) for dtype in self._schema.dtypes ]
+        self._filled: int = 0
+
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        if self._filled:
+            self._write_row_group()
+
+        self._writer.close()
+        del self._writer
+        return False
+
+    #TODO: check that sink is open
+    def flush(self, timestamp: int, packet: DataPacket) -> None:
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        columns: list[np.ndarray] = [batch.timestamps] + self._schema.decode(batch)
+
+        copied: int = 0
+        while copied < len(batch):
+            count: int = min(len(batch) - copied, self._row_group_size - self._filled)
+            for buffer, column in zip(self._columns, columns):
+                buffer[self._filled:self._filled+count] = column[copied:copied+count]
+            self._filled += count
+            copied += count
+
+            if self._filled == self._row_group_size:
+                self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        #arrow wraps the buffers without copying them, and each batch is written to the file (as one row group) before
+        #this returns, so the buffers can be refilled straight away.
+        arrays = [ pa.array(column[:self._filled], type=field.type) for column, field in zip(self._columns, self._arrow_schema) ]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self._arrow_schema))
+        self._filled = 0
@@ -1,6 +1,29 @@
+"""Pinnacle Virtual File System (PVFS): an archive of files that lives inside one larger file.
+
+This is a pure Python implementation of the container described in ``Pvfs.h``, read and written through ``mmap``
+and ``struct``, so it runs anywhere Python does. A PVFS file is laid out as:
+
+* A 1 KiB header: the magic string ``PVFS``, the version (major, minor and revision), the block size, the location
+  of the first file block (the *table*) and the location of the next free block.
+* Blocks, each starting with a 29 byte block header (type, then the previous, self and next block locations, then
+  a count), followed by `block_size` bytes of content:
+
+  * **File** blocks list the files in the archive: each entry is the location of the file's first tree block, the
+    file's size in bytes and its name (256 bytes, zero padded).
+  * **Tree** blocks map offsets within a file to the data blocks holding them: the location of the parent tree
+    block, then pairs of (offset, data block location).
+  * **Data** blocks hold a file's contents: the location of the file's first tree block, then the data. Their count
+    is the number of bytes in use.
+
+Blocks of each kind are chained together through their previous and next locations. Integers are little endian.
+
+Recordings store each channel as two files: ``<channel>.index``, a header (``PvfsIndexHeader``) followed by
+``PvfsIndexEntry`` records giving the time span of each run of samples, and ``<channel>.idat``, the samples
+themselves. ``PVFSSink`` writes recordings, and ``PvfsRecording`` reads them.
+
+Note: These classes are not thread safe. Thread safety is up to the user, via ``PvfsFile.lock``.
+"""
 
-# Python Wrapper for Pvfs.h using cppyy Python-C++ binding.
- 
 __author__      = 'Sree Kondi'
 __maintainer__  = 'Sree Kondi'
 __credits__     = ['Sree Kondi', 'James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
@@ -8,504 +31,589 @@ __license__     = 'New BSD License'
 __copyright__   = 'Copyright (c) 2024, Sree Kondi'
 __email__       = 'sales@pinnaclet.com'
 
-from threading import Lock
-import cppyy
-from typing import Optional, List, Union
+import mmap
 import os
+import struct
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple, Self
+
+PVFS_VERSION_MAJOR: int = 2
+PVFS_VERSION_MINOR: int = 0
+PVFS_VERSION_REVISION: int = 2
+
+#                          type, prev, self, next, count
+_BLOCK_HEADER = struct.Struct('<Bqqqi')
+PVFS_BLOCK_HEADER_SIZE: int = _BLOCK_HEADER.size
+
+PVFS_HEADER_SIZE: int = 0x0400 # 1k
+PVFS_DEFAULT_BLOCK_SIZE: int = 0x4000 - PVFS_BLOCK_HEADER_SIZE # 16k default block size
+PVFS_MAX_FILENAME_LENGTH: int = 0x0100 # Max length of a filename.
+PVFS_MAX_HANDLES: int = 0xFF # Maximum number of files open at once.
+
+# Block types.
+PVFS_BLOCK_TYPE_UNKNOWN: int = 0
+PVFS_BLOCK_TYPE_DATA: int = 1
+PVFS_BLOCK_TYPE_TREE: int = 2
+PVFS_BLOCK_TYPE_FILE: int = 3
+PVFS_BLOCK_TYPE_EOF: int = 0xFF # Marks the end of the file.
+
+PVFS_INVALID_LOCATION: int = -1 # Represents either nothing beyond a block or an error.
+
+PVFS_INDEX_DATA_FILE_MAGIC_NUMBER: int = 0xFF01FF01
+PVFS_INDEX_DATA_FILE_VERSION: int = 2
+PVFS_INDEX_EXTENSION: str = '.index'
+PVFS_DATA_EXTENSION: str = '.idat'
+PVFS_INDEX_HEADER_SIZE: int = 0x0400 # 1k
+
+#samples in .idat files are 32 bit floats.
+PVFS_DATA_TYPE_FLOAT32: int = 0
+
+#                     magic, major, minor, revision, block size, table location, next block
+_HEADER = struct.Struct('<4sBBHiqq')
+_MAGIC: bytes = b'PVFS'
+
+#                         start block, size, filename
+_FILE_ENTRY = struct.Struct(f'<qq{PVFS_MAX_FILENAME_LENGTH}s')
+#                           address, block location
+_LOCATION_MAP = struct.Struct('<qq')
+#the extra field after the block header of data (tree) and tree (up) blocks.
+_LOCATION = struct.Struct('<q')
+
+#                           magic, version, data type, data rate, start time, end time, time stamp interval
+_INDEX_HEADER = struct.Struct('<IIIfqdqdI')
+#                          start time, end time, my location, data location
+_INDEX_ENTRY = struct.Struct('<qdqdqq')
+PVFS_INDEX_ENTRY_SIZE: int = _INDEX_ENTRY.size
+
+#smallest block that holds a file entry.
+_MIN_BLOCK_SIZE: int = _FILE_ENTRY.size
+
+class PvfsError(Exception):
+    """A PVFS file is corrupt, or was used incorrectly."""
+
+class HighTime(NamedTuple):
+    """A point in time: whole seconds since the epoch, and the fraction of a second after that."""
+    seconds: int = 0
+    subSeconds: float = 0.0
+
+    @classmethod
+    def from_ns(cls, timestamp: int) -> 'HighTime':
+        """Convert a timestamp in nanoseconds since the epoch."""
+        seconds, nanoseconds = divmod(int(timestamp), 10**9)
+        return cls(seconds, nanoseconds / 10**9)
+
+    def to_ns(self) -> int:
+        """Convert to nanoseconds since the epoch."""
+        return self.seconds * 10**9 + round(self.subSeconds * 10**9)
+
+class PvfsIndexHeader(NamedTuple):
+    """Header of a channel's .index file."""
+    datarate: float
+    startTime: HighTime
+    endTime: HighTime
+    timeStampIntervalSeconds: int
+    dataType: int = PVFS_DATA_TYPE_FLOAT32
+    magicNumber: int = PVFS_INDEX_DATA_FILE_MAGIC_NUMBER
+    version: int = PVFS_INDEX_DATA_FILE_VERSION
+
+    def pack(self) -> bytes:
+        """The header as stored in the file, padded to ``PVFS_INDEX_HEADER_SIZE`` bytes."""
+        return _INDEX_HEADER.pack(self.magicNumber, self.version, self.dataType, self.datarate, *self.startTime,
+                                  *self.endTime, self.timeStampIntervalSeconds).ljust(PVFS_INDEX_HEADER_SIZE, b'\0')
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'PvfsIndexHeader':
+        """Read a header from the start of an .index file."""
+        magic, version, data_type, datarate, start_s, start_sub, end_s, end_sub, interval = _INDEX_HEADER.unpack_from(data)
+        if magic != PVFS_INDEX_DATA_FILE_MAGIC_NUMBER:
+            raise PvfsError('Not an index file.')
+        return cls(datarate, HighTime(start_s, start_sub), HighTime(end_s, end_sub), interval, data_type, magic, version)
+
+class PvfsIndexEntry(NamedTuple):
+    """One run of evenly spaced samples in a channel: the times of its first and last samples, where this entry is
+    in the .index file, and where the run's first sample is in the .idat file (both in bytes)."""
+    startTime: HighTime
+    endTime: HighTime
+    myLocation: int = 0
+    dataLocation: int = 0
+
+    def pack(self) -> bytes:
+        return _INDEX_ENTRY.pack(*self.startTime, *self.endTime, self.myLocation, self.dataLocation)
+
+    @classmethod
+    def unpack(cls, data: bytes, offset: int = 0) -> 'PvfsIndexEntry':
+        start_s, start_sub, end_s, end_sub, my_location, data_location = _INDEX_ENTRY.unpack_from(data, offset)
+        return cls(HighTime(start_s, start_sub), HighTime(end_s, end_sub), my_location, data_location)
+
+class PvfsBlock(NamedTuple):
+    """Header shared by every kind of block."""
+    type: int
+    prev: int
+    self: int
+    next: int
+    count: int
+
+class PvfsFile:
+    """A PVFS file, opened with ``PvfsFile.create`` or ``PvfsFile.open``.
+
+    The whole file is memory-mapped, and files within it are read and written through ``PvfsFileHandle`` objects
+    returned by ``fcreate`` and ``fopen``. Block headers are kept in a cache of `cache_blocks` blocks (least recently
+    used blocks are dropped first), and the data blocks of every file opened are remembered, so seeking within a
+    file or opening it again does not walk its tree blocks a second time.
+
+    Files opened for writing grow by a quarter of their size (at least `grow_blocks` blocks) whenever they are full, and
+    are trimmed to the blocks in use when closed.
+
+    :param path: Path to the PVFS file.
+    :type path: str
+
+    :param mode: ``'r'`` to read, ``'r+'`` to read and write an existing file, or ``'w+'`` to create a new file.
+    :type mode: str
+
+    :param block_size: Size of the content of each block, in bytes, for new files. Defaults to
+        ``PVFS_DEFAULT_BLOCK_SIZE`` (16 KiB blocks, including their headers).
+    :type block_size: int, optional
+
+    :param cache_blocks: Number of block headers to cache. Defaults to 4096.
+    :type cache_blocks: int, optional
+
+    :param grow_blocks: Fewest blocks to grow the file by when it is full. Defaults to 64.
+    :type grow_blocks: int, optional
+    """
+
+    def __init__(self, path: str, mode: str = 'r', block_size: int = PVFS_DEFAULT_BLOCK_SIZE, cache_blocks: int = 4096,
+                 grow_blocks: int = 64) -> None:
+        """Class constructor."""
+        if mode not in ('r', 'r+', 'w+'):
+            raise ValueError(f'"{mode}" is not a mode; use "r", "r+" or "w+".')
+        if block_size < _MIN_BLOCK_SIZE:
+            raise ValueError(f'`block_size` must be at least {_MIN_BLOCK_SIZE} bytes.')
+
+        self._path = path
+        self._writable: bool = mode != 'r'
+        self._cache_blocks = cache_blocks
+        self._grow_blocks = grow_blocks
+        self.lock = Lock()
+
+        self._cache: OrderedDict[int, PvfsBlock] = OrderedDict()
+        #data block locations of each file, and the location of its last tree block, keyed by the location of the
+        #file's first tree block.
+        self._data_blocks: dict[int, list[int]] = {}
+        self._last_trees: dict[int, int] = {}
+        self._handles: list['PvfsFileHandle'] = []
+
+        self._size: int = 0
+        self._ready: bool = False
+        self._fd: int = os.open(path, (os.O_RDWR | os.O_CREAT | os.O_TRUNC if mode == 'w+' else os.O_RDWR if self._writable else os.O_RDONLY) | getattr(os, 'O_BINARY', 0))
+        self._map: mmap.mmap | None = None
 
-
-class Pvfs():
-    path = os.path.dirname(os.path.abspath(__file__))
-    #include the path to your pvfs.h
-    # cppyy mainly requires the .h file and the .dll file to call functions from the pvfs.cpp.
-    pvfs_h_path = os.path.join(path, 'Pvfs.h')
-    cppyy.include(pvfs_h_path)
-    #include the path to the libtest.dll, this .dll file can be generated by compiling pvfs.cpp
-    # g++ -shared -o libtest.dll -fPIC pvfs.cpp  --> this command can be used to generate the .dll file
-    libtest_h_path = os.path.join(path, 'libtest.dll')
-    cppyy.load_library(libtest_h_path)
-    print("Library loaded successfully")
-    # Put the path to the pvfs file 
-    file_path = '/mnt/c/Users/skondi/Desktop/test/test.pvfs'
-
-    PVFS_VERSION_MAJOR = 2
-    PVFS_VERSION_MINOR = 0
-    PVFS_VERSION_REVISION = 2
-
-    SIZE_UINT8_T = 1     # uint8_t is 1 byte
-    SIZE_INT32_T = 4     # int32_t is 4 bytes
-    SIZE_INT64_T = 8     # int64_t is 8 bytes
-
-    PVFS_BLOCK_HEADER_SIZE = (
-        SIZE_UINT8_T +    # sizeof(uint8_t)
-        3 * SIZE_INT64_T +  # 3 * sizeof(int64_t)
-        SIZE_INT32_T     # sizeof(int32_t)
-    )
-
-    PVFS_HEADER_SIZE = 0x0400
-    PVFS_DEFAULT_BLOCK_SIZE = 0x4000 - PVFS_BLOCK_HEADER_SIZE # 16 k default block size
-    PVFS_MAX_FILENAME_LENGTH = 0x0100 # Max length of a filename.
-    PVFS_MAX_HANDLES = 0xFF # Maximum number of file pointers allowed into the virtual file.
-    PVFS_TIMESTAMP_SIZE = 44
-
-    PVFS_BLOCK_TYPE_UNKNOWN = 0
-    PVFS_BLOCK_TYPE_DATA = 1
-    PVFS_BLOCK_TYPE_TREE = 2
-    PVFS_BLOCK_TYPE_FILE = 3
-    PVFS_BLOCK_TYPE_EOF = 0xFF
-
-    PVFS_INVALID_LOCATION = -1
-    PVFS_INVALID_FD = -1
-
-    PVFS_OK = 0
-    PVFS_ERROR = -1
-    PVFS_ARG_NULL = -2
-    PVFS_EOF = -3
-    PVFS_FILE_NOT_OPENED = -4
-    PVFS_CORRUPTION_DETECTED = -5
-
-    PVFS_DIRTY = 0
-    PVFS_CLEAN = 1
-
-    PVFS_INDEX_DATA_FILE_MAGIC_NUMBER = 0XFF01FF01
-    PVFS_INDEX_DATA_FILE_VERSION = 2
-    PVFS_INDEX_EXTENSION = ".index"
-    PVFS_DATA_EXTENSION = ".idat"
-    PVFS_INDEX_HEADER_SIZE = 0x4000
-
-    def __init__(self):
-        pass
-
-
-    # Define inner classes
-    # These classes represent the structs from the pvfs.h
-    class HighTime:
-        def __init__(self, seconds: int = 0, subSeconds: float = 0.0):
-            self.seconds = seconds
-            self.subSeconds = subSeconds
-
-    class PvfsIndexEntry:
-        def __init__(self, StartTime, endTime, myLocation=0, dataLocation=0):
-            self.StartTime = StartTime
-            self.endTime = endTime
-            self.myLocation = myLocation
-            self.dataLocation = dataLocation
-
-    class PvfsFileEntry:
-        def __init__(self, start_block=0, size=0, filename=""):
-            self.start_block = start_block
-            self.size = size
-            self.filename = filename[:Pvfs.PVFS_MAX_FILENAME_LENGTH].encode('utf-8')
-
-    class PvfsLocationMap:
-        def __init__(self, address=0, blockLoc=0):
-            self.address = address
-            self.blockLoc = blockLoc
-
-    class PvfsFileVersion:
-        def __init__(self, major=0, minor=0, revision=0):
-            self.major = major
-            self.minor = minor
-            self.revision = revision
-
-    class PvfsBlock:
-        def __init__(self, type=0, prev=0, self_value=0, next=0, count=0, size=0, data=b''):
-            self.type = type
-            self.prev = prev
-            self.self_value = self_value
-            self.next = next
-            self.count = count
-            self.data = b''
-            self.size = size
-
-    class PvfsBlockData:
-        def __init__(self, type=0, prev=0, self_value=0, next=0, count=0, tree=0, maxcount=0, data=b''):
-            self.type = type
-            self.prev = prev
-            self.self_value = self_value
-            self.next = next
-            self.count = count
-            self.tree = tree
-            self.data = b''
-            self.maxcount = maxcount
-
-    class PvfsBlockTree:
-        def __init__(self, self_value=0, type=0, prev=0, next=0, count=0, up=0, maxMappings=0, mappings=[]):
-            self.type = type
-            self.prev = prev
-            self.self_value = self_value
-            self.next = next
-            self.count = count
-            self.up = up
-            self.maxMappings = maxMappings
-            #self.mappings = mappings(Pvfs.PvfsLocationMap)
-            #self.mappings = [Pvfs.PvfsLocationMap(address, blockLoc) for address, blockLoc in mappings] if mappings is not None else []
-            self.mappings = mappings
-
-    class PvfsBlockFile:
-        def __init__(self, self_value=0, type=0, prev=0, next=0, count=0, maxFiles=0):
-            self.type = type
-            self.prev = prev
-            self.self_value = self_value
-            self.next = next
-            self.count = count
-            self.maxFiles = maxFiles
-            self.files = Pvfs.PvfsFileEntry()
-
-    class PvfsFileHandle:
-        def __init__(self, vfs, info, block, data, currentAddress=0, dirty=0, tableBlock=0, tableIndex=0, error=0):
-            self.vfs = vfs
-            self.info = info
-            self.block = block
-            self.currentAddress = currentAddress
-            self.dirty = dirty
-            self.data = data
-            self.tableBlock = tableBlock
-            self.tableIndex = tableIndex
-            self.error = error
-
-    class PvfsFile:
-        def __init__(self, fd=-1, blockSize=0, tableLoc=0, nextBlock=0, fileMaxCount=0, treeMaxCount=0):
-            self.fd = fd
-            self.version = Pvfs.PvfsFileVersion()
-            self.blockSize = blockSize
-            self.tableLoc = tableLoc
-            self.nextBlock = nextBlock
-            self.block: Optional[Pvfs.PvfsBlock] = None
-            self.fileBlock: Optional[Pvfs.PvfsBlockFile] = None
-            self.fileHandles: List[Optional[Pvfs.PvfsFileHandle]] = [None] * (Pvfs.PVFS_MAX_HANDLES)
-            self.fileMaxCount = fileMaxCount
-            self.treeMaxCount = treeMaxCount
-            self.fileBlockTemp: Optional[Pvfs.PvfsBlockFile] = None
-            self.treeBlockTemp: Optional[Pvfs.PvfsBlockTree] = None
-            self.dataBlockTemp: Optional[Pvfs.PvfsBlockData] = None
-            self.lock = Lock()
-
-    class PvfsIndexHeader:
-        def __init__(self, datarate, startTime, endTime, timeStampIntervalSeconds, magicNumber=0XFF01FF01, version=2, dataType=0):
-            self.magicNumber = magicNumber
-            self.version = version
-            self.dataType = dataType
-            self.datarate = datarate
-            self.startTime = startTime
-            self.endTime = endTime
-            self.timeStampIntervalSeconds = timeStampIntervalSeconds
-
-    #These functions call the functions from Pvfs.cpp
-    def createVFS(self, block_size):
-        try:
-            result = cppyy.gbl.pvfs.createVFS(block_size) 
-            return result
-        except MemoryError as e:
-            print(f"VFS Memory allocation failed: {e}")
-            return None
-
-    def create_PVFS_file_structure(self, block_size ):
-        try:
-            result = cppyy.gbl.pvfs.create_PVFS_file_structure(block_size) 
-            return result
-        except Exception as e:
-            print(f"create_PVFS_file_structure failed{e}")
-            return None
-        
-    
-    def PVFS_file_set_blockSize(self, vfs, block_size ):
-        try:
-            result = cppyy.gbl.pvfs.PVFS_file_set_blockSize(vfs, block_size) 
-            return result
-        except Exception as e:
-            print(f"PVFS_file_set_blockSize failed {e}")
-            return None
-        
-
-    def create_PVFS_block(self, vfs):
-        try:
-            result = cppyy.gbl.pvfs.create_PVFS_block(vfs) 
-            return result
-        except Exception as e:
-            print(f"create_PVFS_block failed {e}")
-            return None
-    
-    def PVFS_read_block(self, fd, address, block) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_read_block(fd, address, block) 
-            return result
-        except Exception as e:
-            print(f"PVFS_read_block failed {e}")
-            return None
-        
-    def PVFS_write_block(self, fd, address, block) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_write_block(fd, address, block) 
-            return result
-        except Exception as e:
-            print(f"PVFS_write_block failed {e}")
-            return None
-
-    def create_PVFS_block_data(self, vfs) :
-        try:
-            result = cppyy.gbl.pvfs.create_PVFS_block_data(vfs) 
-            return result
-        except Exception as e:
-            print(f"create_PVFS_block_data failed {e}")
-            return None
-    
-    def create_PVFS_block_tree(self, vfs) :
-        try:
-            result = cppyy.gbl.pvfs.create_PVFS_block_tree(vfs) 
-            return result
-        except Exception as e:
-            print(f"create_PVFS_block_tree failed {e}")
-            return None
-        
-    def create_PVFS_block_file(self, vfs) :
-        try:
-            result = cppyy.gbl.pvfs.create_PVFS_block_file(vfs) 
-            return result
-        except Exception as e:
-            print(f"create_PVFS_block_file failed {e}")
-            return None
-    
-    def PVFS_cast_block_to_data(self, block, block_data) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_cast_block_to_data(block, block_data) 
-            return result
-        except Exception as e:
-            print(f"PVFS_cast_block_to_data failed {e}")
-            return None
-    
-    def PVFS_cast_block_to_tree(self, block, block_tree) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_cast_block_to_tree(block, block_tree) 
-            return result
-        except Exception as e:
-            print(f"PVFS_cast_block_to_tree failed {e}")
-            return None
-    
-    def PVFS_cast_block_to_file(self, block, block_file) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_cast_block_to_file(block, block_file) 
-            return result
-        except Exception as e:
-            print(f"PVFS_cast_block_to_file failed {e}")
-            return None
-    
-    def PVFS_cast_data_to_block(self, block_data, block) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_cast_data_to_block(block_data, block) 
-            return result
-        except Exception as e:
-            print(f"PVFS_cast_data_to_block failed {e}")
-            return None
-    
-    def PVFS_cast_tree_to_block(self, block_tree, block) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_cast_tree_to_block(block_tree, block) 
-            return result
-        except Exception as e:
-            print(f"PVFS_cast_tree_to_block failed {e}")
-            return None
-    
-    def PVFS_cast_file_to_block(self, block_file, block) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_cast_file_to_block(block_file, block) 
-            return result
-        except Exception as e:
-            print(f"PVFS_cast_file_to_block failed {e}")
-            return None
-        
-    def PVFS_read_block_file (self, vfs, address, block_file) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_read_block_file(vfs, address, block_file) 
-            return result
-        except Exception as e:
-            print(f"PVFS_read_block_file failed {e}")
-            return None
-    
-    def PVFS_read_block_tree (self, vfs, address, block_tree) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_read_block_tree(vfs, address, block_tree) 
-            return result
-        except Exception as e:
-            print(f"PVFS_read_block_tree failed {e}")
-            return None
-        
-    def PVFS_read_block_data (self, vfs, address, block_data) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_read_block_data(vfs, address, block_data) 
-            return result
-        except Exception as e:
-            print(f"PVFS_read_block_data failed {e}")
-            return None
-    
-    def PVFS_write_block_file (self, vfs, address, block_file) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_write_block_file(vfs, address, block_file) 
-            return result
-        except Exception as e:
-            print(f"PVFS_write_block_file failed {e}")
-            return None
-        
-    def PVFS_write_block_tree (self, vfs, address, block_tree) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_write_block_tree(vfs, address, block_tree) 
-            return result
-        except Exception as e:
-            print(f"PVFS_write_block_tree failed {e}")
-            return None
-    
-    def PVFS_write_block_data (self, vfs, address, block_data) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_write_block_data(vfs, address, block_data) 
-            return result
-        except Exception as e:
-            print(f"PVFS_write_block_data failed {e}")
-            return None
-        
-    def create_PVFS_file_handle (self, vfs) :
-        try:
-            result = cppyy.gbl.pvfs.create_PVFS_file_handle(vfs) 
-            return result
-        except Exception as e:
-            print(f"create_PVFS_file_handle failed {e}")
-            return None
-    
-    def PVFS_create (self, filename) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_create(filename) 
-            return result
-        except Exception as e:
-            print(f"Unsuccesful file creation {e}")
-            return None
-        
-    def PVFS_create_size (self, filename, blocksize) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_create_size(filename, blocksize) 
-            return result
-        except Exception as e:
-            print(f"Unsuccesful file creation {e}")
-            return None
-        
-    def PVFS_open (self, filename) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_open(filename) 
-            return result
-        except Exception as e:
-            print(f"Unsuccesful attempt to open Pvfs file {e}")
-            return None
-    
-    def PVFS_open_readonly (self, filename) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_open_readonly(filename) 
-            return result
-        except Exception as e:
-            print(f"Unsuccesful attempt to open-readonly Pvfs file {e}")
-            return None
-
-    def PVFS_close (self, fd) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_close(fd) 
-            return result
-        except Exception as e:
-            print(f"Unsuccesful closing {e}")
-            return None
-    
-    def PVFS_allocate_block (self, vfs) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_allocate_block(vfs) 
-            return result
-        except Exception as e:
-            print(f"Unsuccesful allocating block {e}")
-            return None
-        
-    def PVFS_fcreate (self, vfs, filename) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_fcreate(vfs, filename) 
-            return result
-        except Exception as e:
-            print(f"fcreate failed {e}")
-            return None
-        
-    def PVFS_fopen (self, vfs, filename) :
         try:
-            result = cppyy.gbl.pvfs.PVFS_fopen(vfs, filename) 
-            return result
-        except Exception as e:
-            print(f"fopen failed {e}")
-            return None
-    
-    def PVFS_has_file (self, vfs, filename) :
-        try:
-            result = cppyy.gbl.pvfs.PVFS_has_file(vfs, filename) 
-            return result
-        except Exception as e:
-            print(f"fopen failed {e}")
-            return None
-    
-
-# # Create an instance of the Pvfs class
-pvfs_instance = Pvfs()
-
-#vfs here represents the instance of vfs that is referenced in function 'createVFS' from Pvfs.cpp
-# This instance will have all the attributes of the struct 'PvfsFile' from Pvfs.cpp
-vfs = pvfs_instance.createVFS(Pvfs.PVFS_DEFAULT_BLOCK_SIZE)
-
-vfs = pvfs_instance.create_PVFS_file_structure(Pvfs.PVFS_DEFAULT_BLOCK_SIZE)
-
-#doesn't return anything
-result = pvfs_instance.PVFS_file_set_blockSize(vfs,Pvfs.PVFS_DEFAULT_BLOCK_SIZE)
-
-block = pvfs_instance.create_PVFS_block(vfs) #returns an instance of create_PVFS_block
-
-
-# fd is an attribute to the vfs instance we created earlier. 
-file_descriptor = vfs.fd
-
-read_block = pvfs_instance.PVFS_read_block(file_descriptor, 0, block)
-
-
-write_block = pvfs_instance.PVFS_write_block(file_descriptor, 0, block)
-
-
-block_data = pvfs_instance.create_PVFS_block_data(vfs)
-block_tree = pvfs_instance.create_PVFS_block_tree(vfs)
-block_file = pvfs_instance.create_PVFS_block_file(vfs)
-
-
-pvfs_instance.PVFS_cast_block_to_data(block, block_data)
-pvfs_instance.PVFS_cast_block_to_tree(block, block_tree)
-pvfs_instance.PVFS_cast_block_to_file(block, block_file)
-pvfs_instance.PVFS_cast_data_to_block(block_data, block)
-pvfs_instance.PVFS_cast_tree_to_block(block_tree, block)
-pvfs_instance.PVFS_cast_file_to_block(block_file, block)
-
-pvfs_instance.PVFS_read_block_file(vfs, 0, block_file)
-pvfs_instance.PVFS_read_block_tree(vfs, 0, block_tree)
-pvfs_instance.PVFS_read_block_data(vfs, 0, block_data)
-pvfs_instance.PVFS_write_block_file(vfs, 0, block_file)
-pvfs_instance.PVFS_write_block_tree(vfs, 0, block_tree)
-pvfs_instance.PVFS_write_block_data(vfs, 0, block_data)
-
-
-file_handle = pvfs_instance.create_PVFS_file_handle(vfs)
-
-
-pvfs_instance.PVFS_create(Pvfs.file_path)
-
-pvfs_instance.PVFS_create_size(Pvfs.file_path, vfs.blockSize)
-pvfs_instance.PVFS_open(Pvfs.file_path)
-vfs = pvfs_instance.PVFS_open_readonly(Pvfs.file_path)
-
-
-pvfs_instance.PVFS_close(vfs.fd)
-
-pvfs_instance.PVFS_allocate_block(vfs)
-
-channel_name = 'EEG1.dat'
-file_handle = pvfs_instance.PVFS_fcreate(vfs, channel_name)
-file_handle = pvfs_instance.PVFS_fopen(vfs, channel_name)
-
-
-
-
-
+            if mode == 'w+':
+                self.blockSize: int = block_size
+                self.version: tuple[int, int, int] = (PVFS_VERSION_MAJOR, PVFS_VERSION_MINOR, PVFS_VERSION_REVISION)
+                self.tableLoc: int = PVFS_HEADER_SIZE
+                self.nextBlock: int = PVFS_HEADER_SIZE
+                self._remap(PVFS_HEADER_SIZE)
+                self._allocate_block(PVFS_BLOCK_TYPE_FILE, PVFS_INVALID_LOCATION)
+                self._write_header()
+            else:
+                self._remap(os.fstat(self._fd).st_size)
+                if self._size < PVFS_HEADER_SIZE:
+                    raise PvfsError(f'"{path}" is not a PVFS file.')
+                magic, major, minor, revision, self.blockSize, self.tableLoc, self.nextBlock = _HEADER.unpack_from(self._map)
+                if magic != _MAGIC:
+                    raise PvfsError(f'"{path}" is not a PVFS file.')
+                self.version = (major, minor, revision)
+            self._ready = True
+        except BaseException:
+            self.close()
+            raise
+
+    @classmethod
+    def create(cls, path: str, block_size: int = PVFS_DEFAULT_BLOCK_SIZE, **kwargs) -> Self:
+        """Create a new, empty PVFS file, replacing any file already at `path`."""
+        return cls(path, 'w+', block_size, **kwargs)
+
+    @classmethod
+    def open(cls, path: str, readonly: bool = False, **kwargs) -> Self:
+        """Open an existing PVFS file."""
+        return cls(path, 'r' if readonly else 'r+', **kwargs)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.close()
+        return False
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def closed(self) -> bool:
+        return self._fd < 0
+
+    def close(self) -> None:
+        """Close every open file handle, then the PVFS file itself."""
+        if self.closed:
+            return
+
+        for handle in list(self._handles):
+            handle.close()
+
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._writable and self._ready:
+            os.ftruncate(self._fd, self.nextBlock)
+
+        os.close(self._fd)
+        self._fd = -1
+
+    # -- blocks --
+
+    @property
+    def _block_stride(self) -> int:
+        """Space each block takes up in the file, header included."""
+        return PVFS_BLOCK_HEADER_SIZE + self.blockSize
+
+    def _remap(self, size: int) -> None:
+        """Resize the file (if writable) to `size` bytes and map all of it."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+        if self._writable:
+            os.ftruncate(self._fd, size)
+        self._size = size
+        if size:
+            self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_WRITE if self._writable else mmap.ACCESS_READ)
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(self._map, 0, _MAGIC, *self.version, self.blockSize, self.tableLoc, self.nextBlock)
+
+    def read_block(self, address: int) -> PvfsBlock:
+        """Header of the block at `address`."""
+        block: PvfsBlock | None = self._cache.get(address)
+        if block is not None:
+            self._cache.move_to_end(address)
+            return block
+
+        if address < PVFS_HEADER_SIZE or address + self._block_stride > self._size or (address - PVFS_HEADER_SIZE) % self._block_stride:
+            raise PvfsError(f'Block location {address} is out of range.')
+        block = PvfsBlock(*_BLOCK_HEADER.unpack_from(self._map, address))
+        if block.self != address or block.type not in (PVFS_BLOCK_TYPE_DATA, PVFS_BLOCK_TYPE_TREE, PVFS_BLOCK_TYPE_FILE):
+            raise PvfsError(f'Corruption detected in the block at {address}.')
+
+        self._cache_block(block)
+        return block
+
+    def _cache_block(self, block: PvfsBlock) -> None:
+        self._cache[block.self] = block
+        self._cache.move_to_end(block.self)
+        if len(self._cache) > self._cache_blocks:
+            self._cache.popitem(last=False)
+
+    def _write_block(self, block: PvfsBlock) -> None:
+        _BLOCK_HEADER.pack_into(self._map, block.self, *block)
+        self._cache_block(block)
+
+    def _allocate_block(self, block_type: int, prev: int, extra: int | None = None) -> int:
+        """Add a block to the end of the file, link it to the block before it (if any) and return its location."""
+        address: int = self.nextBlock
+        if address + self._block_stride > self._size:
+            #grow by a quarter of the file's size, so a long recording is remapped a handful of times, not thousands.
+            self._remap(self._size + max(self._grow_blocks, self._size // 4 // self._block_stride) * self._block_stride)
+
+        self.nextBlock += self._block_stride
+        self._write_header()
+
+        self._write_block(PvfsBlock(block_type, prev, address, PVFS_INVALID_LOCATION, 0))
+        if extra is not None:
+            _LOCATION.pack_into(self._map, address + PVFS_BLOCK_HEADER_SIZE, extra)
+        if prev != PVFS_INVALID_LOCATION:
+            self._write_block(self.read_block(prev)._replace(next=address))
+
+        return address
+
+    def _blocks(self, first: int):
+        """Iterate over a chain of blocks, starting at `first`."""
+        address: int = first
+        while address != PVFS_INVALID_LOCATION:
+            block: PvfsBlock = self.read_block(address)
+            yield block
+            address = block.next
+
+    # -- files --
+
+    @property
+    def _max_files(self) -> int:
+        return self.blockSize // _FILE_ENTRY.size
+
+    @property
+    def _max_mappings(self) -> int:
+        return (self.blockSize - _LOCATION.size) // _LOCATION_MAP.size
+
+    @property
+    def data_block_size(self) -> int:
+        """Bytes of file content each data block holds."""
+        return self.blockSize - _LOCATION.size
+
+    def _entries(self):
+        """Iterate over the entries in the file table, as (location of the entry, start block, size, filename)."""
+        for block in self._blocks(self.tableLoc):
+            for idx in range(block.count):
+                location: int = block.self + PVFS_BLOCK_HEADER_SIZE + idx * _FILE_ENTRY.size
+                start_block, size, filename = _FILE_ENTRY.unpack_from(self._map, location)
+                yield location, start_block, size, filename.rstrip(b'\0').decode('utf-8')
+
+    def _find(self, filename: str) -> tuple[int, int, int] | None:
+        for location, start_block, size, name in self._entries():
+            if name == filename:
+                return location, start_block, size
+        return None
+
+    def get_file_list(self) -> list[str]:
+        """Names of the files in the PVFS file (deleted files excluded)."""
+        return [ name for _, _, _, name in self._entries() if name ]
+
+    def get_channel_list(self) -> list[str]:
+        """Names of the channels in the PVFS file: the names of its .index files, without the extension."""
+        return [ name[:-len(PVFS_INDEX_EXTENSION)] for name in self.get_file_list() if name.endswith(PVFS_INDEX_EXTENSION) ]
+
+    def has_file(self, filename: str) -> bool:
+        return bool(filename) and self._find(filename) is not None
+
+    def fopen(self, filename: str) -> 'PvfsFileHandle':
+        """Open a file within the PVFS file.
+
+        :raises FileNotFoundError: If there is no such file.
+        """
+        found = self._find(filename) if filename else None
+        if found is None:
+            raise FileNotFoundError(f'"{filename}" is not in {self._path}.')
+        return self._open_handle(filename, *found)
+
+    def fcreate(self, filename: str) -> 'PvfsFileHandle':
+        """Create an empty file within the PVFS file, and open it. An existing file of the same name is replaced.
+
+        :raises PvfsError: If the name is too long.
+        """
+        self._check_writable()
+        encoded: bytes = filename.encode('utf-8')
+        if not encoded or len(encoded) >= PVFS_MAX_FILENAME_LENGTH:
+            raise PvfsError(f'Filenames must be between 1 and {PVFS_MAX_FILENAME_LENGTH - 1} bytes long.')
+        if self.has_file(filename):
+            self.delete_file(filename)
+
+        #the first file block with room, or a new one at the end of the table.
+        table: PvfsBlock = next(block for block in self._blocks(self.tableLoc) if block.count < self._max_files or block.next == PVFS_INVALID_LOCATION)
+        if table.count == self._max_files:
+            table = self.read_block(self._allocate_block(PVFS_BLOCK_TYPE_FILE, table.self))
+
+        tree: int = self._allocate_block(PVFS_BLOCK_TYPE_TREE, PVFS_INVALID_LOCATION, PVFS_INVALID_LOCATION)
+        location: int = table.self + PVFS_BLOCK_HEADER_SIZE + table.count * _FILE_ENTRY.size
+        _FILE_ENTRY.pack_into(self._map, location, tree, 0, encoded)
+        self._write_block(table._replace(count=table.count + 1))
+
+        self._data_blocks[tree] = []
+        self._last_trees[tree] = tree
+        return self._open_handle(filename, location, tree, 0)
+
+    def delete_file(self, filename: str) -> None:
+        """"Delete" a file, by clearing its name. The space it takes up is not freed."""
+        self._check_writable()
+        found = self._find(filename) if filename else None
+        if found is None:
+            raise FileNotFoundError(f'"{filename}" is not in {self._path}.')
+        _FILE_ENTRY.pack_into(self._map, found[0], found[1], found[2], b'')
+
+    def _open_handle(self, filename: str, entry_location: int, start_block: int, size: int) -> 'PvfsFileHandle':
+        if len(self._handles) >= PVFS_MAX_HANDLES:
+            raise PvfsError(f'No more than {PVFS_MAX_HANDLES} files can be open at once.')
+        handle = PvfsFileHandle(self, filename, entry_location, start_block, size)
+        self._handles.append(handle)
+        return handle
+
+    def _check_writable(self) -> None:
+        if self.closed:
+            raise PvfsError('The PVFS file is closed.')
+        if not self._writable:
+            raise PvfsError('The PVFS file is open read-only.')
+
+    def _file_data_blocks(self, start_block: int) -> list[int]:
+        """Locations of a file's data blocks, in order, from its tree blocks. Cached, and kept up to date as the
+        file grows."""
+        blocks: list[int] | None = self._data_blocks.get(start_block)
+        if blocks is None:
+            blocks = []
+            for tree in self._blocks(start_block):
+                if tree.type != PVFS_BLOCK_TYPE_TREE:
+                    raise PvfsError(f'Corruption detected in the block at {tree.self}.')
+                offset: int = tree.self + PVFS_BLOCK_HEADER_SIZE + _LOCATION.size
+                blocks += [ block for _, block in _LOCATION_MAP.iter_unpack(self._map[offset:offset + tree.count * _LOCATION_MAP.size]) ]
+            self._data_blocks[start_block] = blocks
+        return blocks
+
+    def _add_data_block(self, start_block: int) -> int:
+        """Add a data block to the end of a file, and map it in the file's last tree block."""
+        blocks: list[int] = self._file_data_blocks(start_block)
+        if start_block not in self._last_trees:
+            *_, last = self._blocks(start_block)
+            self._last_trees[start_block] = last.self
+
+        tree: PvfsBlock = self.read_block(self._last_trees[start_block])
+        if tree.count == self._max_mappings:
+            tree = self.read_block(self._allocate_block(PVFS_BLOCK_TYPE_TREE, tree.self, PVFS_INVALID_LOCATION))
+            self._last_trees[start_block] = tree.self
+
+        address: int = self._allocate_block(PVFS_BLOCK_TYPE_DATA, blocks[-1] if blocks else PVFS_INVALID_LOCATION, start_block)
+        _LOCATION_MAP.pack_into(self._map, tree.self + PVFS_BLOCK_HEADER_SIZE + _LOCATION.size + tree.count * _LOCATION_MAP.size,
+                                len(blocks) * self.data_block_size, address)
+        self._write_block(tree._replace(count=tree.count + 1))
+
+        blocks.append(address)
+        return address
+
+class PvfsFileHandle:
+    """A file within a PVFS file, which can be read, written and seeked within like an ordinary binary file.
+
+    Get one from ``PvfsFile.fcreate`` or ``PvfsFile.fopen``.
+    """
+
+    def __init__(self, vfs: PvfsFile, filename: str, entry_location: int, start_block: int, size: int) -> None:
+        """Class constructor."""
+        self._vfs = vfs
+        self._name = filename
+        self._entry_location = entry_location
+        self._start_block = start_block
+        self._size = size
+        self._position: int = 0
+        self._dirty: bool = False
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.close()
+        return False
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def size(self) -> int:
+        """Size of the file, in bytes."""
+        return self._size
+
+    @property
+    def closed(self) -> bool:
+        return self._vfs is None
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, address: int, whence: int = os.SEEK_SET) -> int:
+        """Move to `address`, relative to the start of the file, the current position or the end of the file."""
+        base: int = { os.SEEK_SET : 0, os.SEEK_CUR : self._position, os.SEEK_END : self._size }[whence]
+        if base + address < 0:
+            raise ValueError('Can not seek to before the start of the file.')
+        self._position = base + address
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to `size` bytes (or the rest of the file, if negative) from the current position."""
+        vfs: PvfsFile = self._open_vfs()
+        end: int = self._size if size < 0 else min(self._size, self._position + size)
+        if end <= self._position:
+            return b''
+
+        blocks: list[int] = vfs._file_data_blocks(self._start_block)
+        chunk: int = vfs.data_block_size
+        data_offset: int = PVFS_BLOCK_HEADER_SIZE + _LOCATION.size
+
+        pieces: list = []
+        position: int = self._position
+        while position < end:
+            idx, offset = divmod(position, chunk)
+            count: int = min(chunk - offset, end - position)
+            start: int = blocks[idx] + data_offset + offset
+            pieces.append(vfs._map[start:start + count])
+            position += count
+
+        self._position = end
+        return pieces[0] if len(pieces) == 1 else b''.join(pieces)
+
+    def write(self, data: bytes) -> int:
+        """Write `data` at the current position, growing the file if needed, and return the number of bytes written."""
+        vfs: PvfsFile = self._open_vfs()
+        vfs._check_writable()
+        if self._position > self._size:
+            #fill any hole left by seeking past the end with zeroes.
+            hole, self._position = self._position - self._size, self._size
+            self.write(bytes(hole))
+
+        view = memoryview(data).cast('B')
+        blocks: list[int] = vfs._file_data_blocks(self._start_block)
+        chunk: int = vfs.data_block_size
+        data_offset: int = PVFS_BLOCK_HEADER_SIZE + _LOCATION.size
+
+        written: int = 0
+        while written < len(view):
+            idx, offset = divmod(self._position, chunk)
+            if idx == len(blocks):
+                vfs._add_data_block(self._start_block)
+
+            count: int = min(chunk - offset, len(view) - written)
+            start: int = blocks[idx] + data_offset + offset
+            vfs._map[start:start + count] = view[written:written + count]
+
+            #a data block's count is the number of bytes in use.
+            block: PvfsBlock = vfs.read_block(blocks[idx])
+            if offset + count > block.count:
+                vfs._write_block(block._replace(count=offset + count))
+
+            written += count
+            self._position += count
+
+        if self._position > self._size:
+            self._size = self._position
+            self._dirty = True
+        return written
+
+    def flush(self) -> None:
+        """Record the file's size in the file table."""
+        if self._dirty:
+            _FILE_ENTRY.pack_into(self._vfs._map, self._entry_location, self._start_block, self._size, self._name.encode('utf-8'))
+            self._dirty = False
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.flush()
+        self._vfs._handles.remove(self)
+        self._vfs = None
+
+    def _open_vfs(self) -> PvfsFile:
+        if self.closed or self._vfs.closed:
+            raise PvfsError(f'"{self._name}" is closed.')
+        return self._vfs
+
+    def read_index_header(self) -> PvfsIndexHeader:
+        """Read the header at the start of an .index file."""
+        self.seek(0)
+        return PvfsIndexHeader.unpack(self.read(PVFS_INDEX_HEADER_SIZE))
+
+    def write_index_header(self, header: PvfsIndexHeader) -> None:
+        """Write the header at the start of an .index file."""
+        self.seek(0)
+        self.write(header.pack())
+
+    def read_index_entries(self) -> list[PvfsIndexEntry]:
+        """Read every entry in an .index file."""
+        self.seek(PVFS_INDEX_HEADER_SIZE)
+        data: bytes = self.read()
+        return [ PvfsIndexEntry.unpack(data, offset) for offset in range(0, len(data) - PVFS_INDEX_ENTRY_SIZE + 1, PVFS_INDEX_ENTRY_SIZE) ]
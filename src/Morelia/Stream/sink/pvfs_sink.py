@@ -0,0 +1,355 @@
+"""Send data to a PVFS file, and read it back."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert', 'Sree Kondi']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import math
+from collections import OrderedDict
+from typing import Self
+
+import numpy as np
+
+from Morelia.Stream.sink import SinkInterface
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+from Morelia.Stream.sink.pvfs import (PvfsFile, PvfsFileHandle, PvfsIndexHeader, PvfsIndexEntry, HighTime, PVFS_DEFAULT_BLOCK_SIZE,
+                                      PVFS_INDEX_HEADER_SIZE, PVFS_INDEX_ENTRY_SIZE, PVFS_INDEX_EXTENSION, PVFS_DATA_EXTENSION)
+from Morelia.packet.data import DataPacket, DataBatch, DataGap
+from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
+
+#samples are stored as little endian 32 bit floats.
+_SAMPLE_DTYPE = np.dtype('<f4')
+
+#an index entry, as stored in an .index file.
+_INDEX_ENTRY_DTYPE = np.dtype([ ('start_seconds', '<i8'), ('start_subseconds', '<f8'), ('end_seconds', '<i8'),
+                                ('end_subseconds', '<f8'), ('my_location', '<i8'), ('data_location', '<i8') ])
+
+#an index entry, as held in memory: times of the first and last samples, in nanoseconds since the epoch, then the
+#number of the first sample and how many samples there are.
+_CHANNEL_INDEX_DTYPE = np.dtype([ ('start', '<i8'), ('end', '<i8'), ('first', '<i8'), ('count', '<i8') ])
+
+class PVFSSink(SinkInterface):
+    """Stream data to a PVFS file, the format Sirenia records to.
+
+    Each channel is stored as a pair of files within the PVFS file: ``<channel>.idat`` holds the channel's samples
+    (in microvolts for analog channels, and 0 or 1 for TTL channels) as 32 bit floats, and ``<channel>.index`` holds
+    a header, with the sample rate and the times of the first and last samples, then one entry for every
+    `timestamp_interval_sec` seconds of samples, giving the time of the first and last sample in that stretch and
+    where it starts in the .idat file. A gap in the data always starts a new entry.
+
+    Whole batches are decoded at once and copied straight into the memory-mapped file.
+
+    :param file_path: Path to the PVFS file to write to.
+    :type file_path: str
+
+    :param pod: POD device data is being streamed from.
+    :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D`
+
+    :param timestamp_interval_sec: Seconds of samples covered by each index entry. Defaults to 1.
+    :type timestamp_interval_sec: int, optional
+
+    :param block_size: Size of the content of each block in the PVFS file, in bytes. Defaults to
+        ``PVFS_DEFAULT_BLOCK_SIZE`` (16 KiB blocks, including their headers).
+    :type block_size: int, optional
+    """
+
+    def __init__(self, file_path: str, pod: AquisitionDevice, timestamp_interval_sec: int = 1, block_size: int = PVFS_DEFAULT_BLOCK_SIZE) -> None:
+        """Class constructor."""
+        if timestamp_interval_sec < 1:
+            raise ValueError('`timestamp_interval_sec` must be at least 1.')
+
+        if not isinstance(pod, (Pod8206HR, Pod8401HR, Pod8274D)):
+            raise ValueError(f'Device "{pod.device_name}" cannot be streamed from!')
+
+        self._file_path = file_path
+        self._pod = pod
+        self._timestamp_interval_sec = timestamp_interval_sec
+        self._block_size = block_size
+
+    def __enter__(self) -> Self:
+        self._schema = ChannelSchema(self._pod)
+        self._sample_rate: int = self._pod.sample_rate
+        self._samples_per_entry: int = max(1, self._sample_rate * self._timestamp_interval_sec)
+
+        self._vfs = PvfsFile.create(self._file_path, self._block_size)
+        self._index: list[PvfsFileHandle] = []
+        self._data: list[PvfsFileHandle] = []
+        for name in self._schema.names:
+            self._index.append(self._vfs.fcreate(name + PVFS_INDEX_EXTENSION))
+            self._data.append(self._vfs.fcreate(name + PVFS_DATA_EXTENSION))
+
+        self._samples: int = 0
+        self._entries: int = 0
+        self._start_time: int | None = None
+        self._end_time: int | None = None
+
+        #the entry being filled: times of its first and last samples, its location, and the sample it starts at.
+        self._entry: list | None = None
+
+        self._write_headers()
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self._write_headers()
+        self._vfs.close()
+        del self._vfs
+        return False
+
+    def _write_headers(self) -> None:
+        start, end = (HighTime.from_ns(time) if time is not None else HighTime() for time in (self._start_time, self._end_time))
+        header: PvfsIndexHeader = PvfsIndexHeader(self._sample_rate, start, end, self._timestamp_interval_sec)
+        for index in self._index:
+            index.write_index_header(header)
+
+    #TODO: check that sink is open
+    def flush(self, timestamp: int, packet: DataPacket) -> None:
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        if not len(batch):
+            return
+
+        for data, values in zip(self._data, self._schema.decode(batch)):
+            data.write(values.astype(_SAMPLE_DTYPE).tobytes())
+
+        first_write: bool = self._start_time is None
+        if first_write:
+            self._start_time = int(batch.timestamps[0])
+        self._end_time = int(batch.timestamps[-1])
+
+        #fill the current index entry, starting new ones every `timestamp_interval_sec` seconds of samples.
+        entries: list[bytes] = []
+        location: int | None = None
+        idx: int = 0
+        while idx < len(batch):
+            if self._entry is None or self._samples - self._entry[3] == self._samples_per_entry:
+                self._entry = [ int(batch.timestamps[idx]), 0, PVFS_INDEX_HEADER_SIZE + self._entries * PVFS_INDEX_ENTRY_SIZE, self._samples ]
+                self._entries += 1
+
+            count: int = min(len(batch) - idx, self._samples_per_entry - (self._samples - self._entry[3]))
+            self._entry[1] = int(batch.timestamps[idx + count - 1])
+            start, end, my_location, sample = self._entry
+            entries.append(PvfsIndexEntry(HighTime.from_ns(start), HighTime.from_ns(end), my_location, sample * _SAMPLE_DTYPE.itemsize).pack())
+            location = my_location if location is None else location
+
+            self._samples += count
+            idx += count
+
+        #entries are written in place, as the first one may have been written before.
+        packed: bytes = b''.join(entries)
+        for index in self._index:
+            index.seek(location)
+            index.write(packed)
+
+        if first_write:
+            self._write_headers()
+
+    def flush_gap(self, gap: DataGap) -> None:
+        """Start a new index entry with the next sample. Nothing is written for the lost samples."""
+        self._entry = None
+
+class PvfsRecording:
+    """Read the channels of a PVFS file written by ``PVFSSink`` (or by Sirenia).
+
+    ``time_range`` pulls a stretch of time out of a channel without reading the rest of it: each channel's index is
+    loaded into a sorted NumPy array the first time the channel is used, and binary searched for the entries that
+    overlap the stretch, then only the samples in those entries are read from the memory-mapped file. Samples are
+    read in blocks of `cache_block_samples`, and the most recently used `cache_blocks` blocks are kept, so nearby
+    queries are served from memory.
+
+    :param file_path: Path to the PVFS file.
+    :type file_path: str
+
+    :param cache_blocks: Number of blocks of samples to keep. Defaults to 256.
+    :type cache_blocks: int, optional
+
+    :param cache_block_samples: Number of samples in each block. Defaults to 4096.
+    :type cache_block_samples: int, optional
+    """
+
+    def __init__(self, file_path: str, cache_blocks: int = 256, cache_block_samples: int = 4096) -> None:
+        """Class constructor."""
+        self._vfs = PvfsFile.open(file_path, readonly=True)
+        self._channels: tuple[str] = tuple(self._vfs.get_channel_list())
+
+        self._cache_blocks = cache_blocks
+        self._cache_block_samples = cache_block_samples
+        self._blocks: OrderedDict[tuple[str, int], np.ndarray] = OrderedDict()
+
+        self._data: dict[str, PvfsFileHandle] = {}
+        self._indices: dict[str, np.ndarray] = {}
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.close()
+        return False
+
+    def close(self) -> None:
+        self._vfs.close()
+        self._blocks.clear()
+
+    @property
+    def channels(self) -> tuple[str]:
+        return self._channels
+
+    def header(self, channel: str) -> PvfsIndexHeader:
+        """Header of a channel's .index file."""
+        with self._vfs.fopen(channel + PVFS_INDEX_EXTENSION) as index:
+            return index.read_index_header()
+
+    def entries(self, channel: str) -> list[PvfsIndexEntry]:
+        """Entries in a channel's .index file."""
+        with self._vfs.fopen(channel + PVFS_INDEX_EXTENSION) as index:
+            return index.read_index_entries()
+
+    @property
+    def sample_rate(self) -> float:
+        return self.header(self._channels[0]).datarate
+
+    def samples(self, channel: str) -> int:
+        """Number of samples in a channel."""
+        return self._data_file(channel).size // _SAMPLE_DTYPE.itemsize
+
+    def __getitem__(self, channel: str) -> np.ndarray:
+        """Every sample in a channel.
+
+        :param channel: Name of the channel.
+        :type channel: str
+
+        :return: The samples.
+        :rtype: numpy.ndarray[numpy.float32]
+        """
+        data: PvfsFileHandle = self._data_file(channel)
+        data.seek(0)
+        return np.frombuffer(data.read(), dtype=_SAMPLE_DTYPE)
+
+    def index(self, channel: str) -> np.ndarray:
+        """A channel's index, sorted by time: one row per entry, with the times of its first and last samples
+        (``start`` and ``end``, in nanoseconds since the epoch), the number of its first sample (``first``) and how
+        many samples it has (``count``). Loaded once, then cached.
+
+        :param channel: Name of the channel.
+        :type channel: str
+
+        :return: The index.
+        :rtype: numpy.ndarray
+        """
+        index: np.ndarray | None = self._indices.get(channel)
+        if index is not None:
+            return index
+
+        with self._vfs.fopen(channel + PVFS_INDEX_EXTENSION) as index_file:
+            index_file.seek(PVFS_INDEX_HEADER_SIZE)
+            data: bytes = index_file.read()
+        entries: np.ndarray = np.frombuffer(data, dtype=_INDEX_ENTRY_DTYPE, count=len(data) // PVFS_INDEX_ENTRY_SIZE)
+
+        #entries are in the order their samples were written, so each runs up to where the next one starts.
+        index = np.empty(len(entries), dtype=_CHANNEL_INDEX_DTYPE)
+        index['start'] = entries['start_seconds'] * 10**9 + np.round(entries['start_subseconds'] * 10**9).astype(np.int64)
+        index['end'] = entries['end_seconds'] * 10**9 + np.round(entries['end_subseconds'] * 10**9).astype(np.int64)
+        index['first'] = entries['data_location'] // _SAMPLE_DTYPE.itemsize
+        index['count'] = np.diff(index['first'], append=self.samples(channel))
+
+        if np.any(np.diff(index['start']) < 0):
+            index = index[np.argsort(index['start'], kind='stable')]
+
+        self._indices[channel] = index
+        return index
+
+    def times(self, channel: str) -> np.ndarray:
+        """Timestamp of every sample in a channel, in nanoseconds since the epoch. Samples between the first and last
+        of each index entry are taken to be evenly spaced.
+
+        :param channel: Name of the channel.
+        :type channel: str
+
+        :return: The timestamps.
+        :rtype: numpy.ndarray[numpy.int64]
+        """
+        index: np.ndarray = self.index(channel)
+        times: np.ndarray = np.empty(self.samples(channel), dtype=np.int64)
+
+        #which entry each sample is in, and where in the entry it is.
+        entry: np.ndarray = np.repeat(np.arange(len(index)), index['count'])
+        position: np.ndarray = np.arange(len(entry)) - (np.cumsum(index['count']) - index['count'])[entry]
+        times[index['first'][entry] + position] = index['start'][entry] + np.round(position * _steps(index)[entry]).astype(np.int64)
+        return times
+
+    def time_range(self, channel: str, start: int, end: int) -> tuple[np.ndarray, np.ndarray]:
+        """Samples in a channel with timestamps from `start` up to (but not including) `end`.
+
+        :param channel: Name of the channel.
+        :type channel: str
+
+        :param start: Timestamp to start at, in nanoseconds since the epoch.
+        :type start: int
+
+        :param end: Timestamp to end before, in nanoseconds since the epoch.
+        :type end: int
+
+        :return: The samples' timestamps, and the samples.
+        :rtype: tuple[numpy.ndarray[numpy.int64], numpy.ndarray[numpy.float32]]
+        """
+        index: np.ndarray = self.index(channel)
+
+        #entries that end at or after `start`, and start before `end`.
+        first: int = int(np.searchsorted(index['end'], start, side='left'))
+        last: int = int(np.searchsorted(index['start'], end, side='left'))
+
+        times: list[np.ndarray] = []
+        values: list[np.ndarray] = []
+        for entry, step in zip(index[first:last], _steps(index[first:last])):
+            #roughly where the range falls within the entry, then exactly, from the samples' timestamps.
+            low: int = max(0, math.floor((start - entry['start']) / step) - 1) if step else 0
+            high: int = min(int(entry['count']), math.ceil((end - entry['start']) / step) + 2) if step else int(entry['count'])
+            entry_times: np.ndarray = entry['start'] + np.round(np.arange(low, high) * step).astype(np.int64)
+
+            first_sample: int = int(entry['first']) + low
+            low, high = int(np.searchsorted(entry_times, start)), int(np.searchsorted(entry_times, end))
+            if high > low:
+                times.append(entry_times[low:high])
+                values.append(self._read(channel, first_sample + low, first_sample + high))
+
+        if not times:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=_SAMPLE_DTYPE)
+        return np.concatenate(times), np.concatenate(values)
+
+    def _data_file(self, channel: str) -> PvfsFileHandle:
+        data: PvfsFileHandle | None = self._data.get(channel)
+        if data is None:
+            data = self._data[channel] = self._vfs.fopen(channel + PVFS_DATA_EXTENSION)
+        return data
+
+    def _read(self, channel: str, first: int, last: int) -> np.ndarray:
+        """Samples `first` up to `last` of a channel, from the block cache."""
+        size: int = self._cache_block_samples
+        blocks: list[np.ndarray] = [ self._block(channel, number) for number in range(first // size, (last - 1) // size + 1) ]
+        values: np.ndarray = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        offset: int = first // size * size
+        return values[first - offset:last - offset]
+
+    def _block(self, channel: str, number: int) -> np.ndarray:
+        """A block of samples, read from the file the first time it is needed."""
+        key: tuple[str, int] = (channel, number)
+        block: np.ndarray | None = self._blocks.get(key)
+        if block is not None:
+            self._blocks.move_to_end(key)
+            return block
+
+        data: PvfsFileHandle = self._data_file(channel)
+        data.seek(number * self._cache_block_samples * _SAMPLE_DTYPE.itemsize)
+        block = np.frombuffer(data.read(self._cache_block_samples * _SAMPLE_DTYPE.itemsize), dtype=_SAMPLE_DTYPE)
+
+        self._blocks[key] = block
+        if len(self._blocks) > self._cache_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+def _steps(index: np.ndarray) -> np.ndarray:
+    """Time between samples in each index entry, in nanoseconds."""
+    return np.divide(index['end'] - index['start'], index['count'] - 1, out=np.zeros(len(index)), where=index['count'] > 1)
@@ -0,0 +1,385 @@
+"""Archive the raw packets streamed from a device, compressed, and decode them later in bulk."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import json
+import lzma
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Iterator, Self
+
+import numpy as np
+
+from Morelia.Stream.sink import SinkInterface
+from Morelia.Stream.sink.channel_schema import ChannelSchema
+from Morelia.Stream.sink.channel_codec import encode_frames, decode_frames
+from Morelia.packet.data import DataPacket, DataBatch, DataGap
+from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
+
+#file header: magic string, format version, then the length of the JSON metadata that follows.
+_HEADER = struct.Struct('<8sHI')
+_MAGIC: bytes = b'MORELIAR'
+_VERSION: int = 1
+
+#block header: magic string, compressed size, packets, first packet's number, timestamps of the first and last
+#packets, and a CRC-32 of the uncompressed packets.
+_BLOCK = struct.Struct('<4sIIqqqI')
+_BLOCK_MAGIC: bytes = b'BLK\0'
+
+#trailer, written when the archive is closed: where the block index starts, how many blocks there are, magic string.
+_TRAILER = struct.Struct('<qq8s')
+_TRAILER_MAGIC: bytes = b'MRAWINDX'
+
+#one entry of the block index: where the block's header is, its compressed size, the number of its first packet, its
+#packet count, and the timestamps of its first and last packets.
+INDEX_DTYPE = np.dtype([ ('offset', '<i8'), ('size', '<i8'), ('first', '<i8'), ('count', '<i8'), ('start', '<i8'), ('end', '<i8') ])
+
+#how to compress a block of packets from a device (given its type), at a level, and how to decompress it.
+_CODECS: dict[str, tuple] = {
+    'zlib'       : (lambda data, level, device: zlib.compress(data, level), lambda data, device: zlib.decompress(data)),
+    'lzma'       : (lambda data, level, device: lzma.compress(data, preset=level), lambda data, device: lzma.decompress(data)),
+    'predictive' : (lambda data, level, device: encode_frames(data, device), decode_frames),
+}
+
+class RawArchiveSink(SinkInterface):
+    """Archive exactly what a device sent: its raw data packets, in compressed blocks, with nothing decoded, scaled
+    or rounded at acquisition time. ``RawArchive`` reads an archive back and decodes it in bulk.
+
+    Packets are gathered into blocks of `block_packets`, which are compressed with `codec` and appended to the file.
+    ``'zlib'`` and ``'lzma'`` are the standard library's; ``'predictive'`` compresses the channels in the packets
+    with ``Morelia.Stream.sink.channel_codec``, which is usually several times smaller than zlib for EEG, and faster. Each block records the timestamps of its first
+    and last packets, and the packets in between are taken to be evenly spaced, so a gap in the data always ends a
+    block. When the archive is closed, an index of every block is appended, so readers can go straight to the blocks
+    covering a time or packet number. If the archive is not closed properly, readers rebuild the index from the blocks.
+
+    The archive starts with the device's settings (gains and channel modes, see ``ChannelSchema.settings``) and
+    sample rate, so it can be decoded without the device.
+
+    :param file_path: Path to the archive to write to.
+    :type file_path: str
+
+    :param pod: POD device data is being streamed from.
+    :type pod: class:`Pod8206HR | Pod8401HR | Pod8274D`
+
+    :param codec: ``'zlib'``, ``'lzma'`` or ``'predictive'``. Defaults to ``'zlib'``.
+    :type codec: str, optional
+
+    :param level: Compression level, from 0 (fastest) to 9 (smallest), for zlib and lzma. Defaults to 6.
+    :type level: int, optional
+
+    :param block_packets: Number of packets in each block. Defaults to 4096.
+    :type block_packets: int, optional
+    """
+
+    def __init__(self, file_path: str, pod: AquisitionDevice, codec: str = 'zlib', level: int = 6, block_packets: int = 4096) -> None:
+        """Class constructor."""
+        if codec not in _CODECS:
+            raise ValueError(f'"{codec}" is not a codec; use one of {", ".join(_CODECS)}.')
+        if not 0 <= level <= 9:
+            raise ValueError('`level` must be from 0 to 9.')
+        if block_packets < 1:
+            raise ValueError('`block_packets` must be positive.')
+
+        if not isinstance(pod, (Pod8206HR, Pod8401HR, Pod8274D)):
+            raise ValueError(f'Device "{pod.device_name}" cannot be streamed from!')
+
+        self._file_path = file_path
+        self._pod = pod
+        self._codec = codec
+        self._level = level
+        self._block_packets = block_packets
+
+    def __enter__(self) -> Self:
+        self._schema = ChannelSchema(self._pod)
+        self._compress = _CODECS[self._codec][0]
+
+        metadata: bytes = json.dumps({
+            'device'        : self._schema.settings['device'],
+            'device_name'   : self._pod.device_name,
+            'sample_rate'   : self._pod.sample_rate,
+            'packet_length' : self._schema.packet_length,
+            'codec'         : self._codec,
+            'level'         : self._level,
+            'settings'      : self._schema.settings,
+        }).encode('utf-8')
+
+        self._file_handle = open(self._file_path, 'wb')
+        self._file_handle.write(_HEADER.pack(_MAGIC, _VERSION, len(metadata)) + metadata)
+
+        self._index: list[tuple] = []
+        self._packets: int = 0
+
+        #the block being filled: its packets, and the timestamps of its first and last packets.
+        self._pending: list[bytes] = []
+        self._pending_count: int = 0
+        self._pending_start: int = 0
+        self._pending_end: int = 0
+
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self._write_block()
+
+        index_offset: int = self._file_handle.tell()
+        self._file_handle.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file_handle.write(_TRAILER.pack(index_offset, len(self._index), _TRAILER_MAGIC))
+        self._file_handle.close()
+        del self._file_handle
+
+        return False
+
+    #TODO: check that sink is open
+    def flush(self, timestamp: int, packet: DataPacket) -> None:
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        if not len(batch):
+            return
+
+        raw: np.ndarray = batch.raw()
+        timestamps: np.ndarray = batch.timestamps
+
+        idx: int = 0
+        while idx < len(batch):
+            count: int = min(len(batch) - idx, self._block_packets - self._pending_count)
+            if not self._pending_count:
+                self._pending_start = int(timestamps[idx])
+            self._pending_end = int(timestamps[idx + count - 1])
+            self._pending.append(raw[idx:idx+count].tobytes())
+            self._pending_count += count
+            idx += count
+
+            if self._pending_count == self._block_packets:
+                self._write_block()
+
+    def flush_gap(self, gap: DataGap) -> None:
+        """End the current block, so packets on either side of the gap are not taken to be evenly spaced."""
+        self._write_block()
+
+    def _write_block(self) -> None:
+        if not self._pending_count:
+            return
+
+        data: bytes = b''.join(self._pending)
+        compressed: bytes = self._compress(data, self._level, self._schema.settings['device'])
+
+        offset: int = self._file_handle.tell()
+        self._file_handle.write(_BLOCK.pack(_BLOCK_MAGIC, len(compressed), self._pending_count, self._packets,
+                                            self._pending_start, self._pending_end, zlib.crc32(data)))
+        self._file_handle.write(compressed)
+        self._index.append((offset, len(compressed), self._packets, self._pending_count, self._pending_start, self._pending_end))
+
+        self._packets += self._pending_count
+        self._pending = []
+        self._pending_count = 0
+
+class RawArchive:
+    """Read an archive written by ``RawArchiveSink``.
+
+    Packets are read as ``DataBatch`` objects built straight from the raw bytes, so they go through the same batch
+    decoders the sinks use (``ChannelSchema.decode``), and can be replayed into any sink. ``decode`` turns a stretch of
+    the archive into one array per channel. The most recently used `cache_blocks` blocks are kept decompressed.
+
+    :param file_path: Path to the archive.
+    :type file_path: str
+
+    :param cache_blocks: Number of decompressed blocks to keep. Defaults to 8.
+    :type cache_blocks: int, optional
+    """
+
+    def __init__(self, file_path: str, cache_blocks: int = 8) -> None:
+        """Class constructor."""
+        self._file_handle = open(file_path, 'rb')
+        self._cache_blocks = cache_blocks
+        self._cache: OrderedDict[int, np.ndarray] = OrderedDict()
+
+        magic, version, length = _HEADER.unpack(self._file_handle.read(_HEADER.size))
+        if magic != _MAGIC:
+            self._file_handle.close()
+            raise ValueError(f'"{file_path}" is not a raw archive.')
+        if version > _VERSION:
+            self._file_handle.close()
+            raise ValueError(f'"{file_path}" was written by a newer version of Morelia (archive version {version}).')
+
+        self._metadata: dict = json.loads(self._file_handle.read(length))
+        self._data_offset: int = _HEADER.size + length
+        self._schema = ChannelSchema.from_settings(self._metadata['settings'])
+        self._decompress = _CODECS[self._metadata['codec']][1]
+        self._index: np.ndarray = self._read_index()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.close()
+        return False
+
+    def close(self) -> None:
+        self._file_handle.close()
+        self._cache.clear()
+
+    def _read_index(self) -> np.ndarray:
+        """The block index from the end of the archive, or, if the archive was not closed properly, rebuilt by
+        reading every block header. A block cut short at the end of the file is ignored."""
+        size: int = self._file_handle.seek(0, 2)
+        if size >= self._data_offset + _TRAILER.size:
+            self._file_handle.seek(size - _TRAILER.size)
+            offset, count, magic = _TRAILER.unpack(self._file_handle.read(_TRAILER.size))
+            if magic == _TRAILER_MAGIC and offset + count * INDEX_DTYPE.itemsize + _TRAILER.size == size:
+                self._file_handle.seek(offset)
+                return np.frombuffer(self._file_handle.read(count * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)
+
+        entries: list[tuple] = []
+        offset = self._data_offset
+        while offset + _BLOCK.size <= size:
+            self._file_handle.seek(offset)
+            magic, compressed_size, count, first, start, end, _ = _BLOCK.unpack(self._file_handle.read(_BLOCK.size))
+            if magic != _BLOCK_MAGIC or offset + _BLOCK.size + compressed_size > size:
+                break
+            entries.append((offset, compressed_size, first, count, start, end))
+            offset += _BLOCK.size + compressed_size
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    @property
+    def metadata(self) -> dict:
+        """What the archive was recorded from: the device type and name, sample rate, packet length, codec and the
+        device's settings."""
+        return self._metadata
+
+    @property
+    def sample_rate(self) -> int:
+        return self._metadata['sample_rate']
+
+    @property
+    def schema(self) -> ChannelSchema:
+        """Channels in the archive, and how to decode them."""
+        return self._schema
+
+    @property
+    def index(self) -> np.ndarray:
+        """One row per block, in order: ``offset`` and ``size`` in the file, the number of its ``first`` packet and
+        how many packets it has (``count``), and the timestamps of its first and last packets (``start``, ``end``).
+
+        :rtype: numpy.ndarray
+        """
+        return self._index
+
+    def __len__(self) -> int:
+        """Number of packets in the archive."""
+        return int(self._index['first'][-1] + self._index['count'][-1]) if len(self._index) else 0
+
+    def _block(self, number: int) -> np.ndarray:
+        """Raw packets in a block, one per row."""
+        block: np.ndarray | None = self._cache.get(number)
+        if block is not None:
+            self._cache.move_to_end(number)
+            return block
+
+        entry = self._index[number]
+        self._file_handle.seek(int(entry['offset']))
+        *_, crc = _BLOCK.unpack(self._file_handle.read(_BLOCK.size))
+        data: bytes = self._decompress(self._file_handle.read(int(entry['size'])), self._metadata['device'])
+        if zlib.crc32(data) != crc:
+            raise ValueError(f'Block {number} of the archive is corrupt.')
+
+        block = np.frombuffer(data, dtype=np.uint8).reshape(int(entry['count']), self._metadata['packet_length'])
+        self._cache[number] = block
+        if len(self._cache) > self._cache_blocks:
+            self._cache.popitem(last=False)
+        return block
+
+    def _timestamps(self, number: int) -> np.ndarray:
+        """Timestamps of the packets in a block, evenly spaced from its first to its last."""
+        entry = self._index[number]
+        count: int = int(entry['count'])
+        step: float = (int(entry['end']) - int(entry['start'])) / (count - 1) if count > 1 else 0.0
+        return int(entry['start']) + np.round(np.arange(count) * step).astype(np.int64)
+
+    def read(self, first: int = 0, last: int | None = None) -> DataBatch:
+        """Packets by number, from `first` up to (but not including) `last`. Only the blocks holding them are read.
+
+        :param first: Number of the first packet. Defaults to 0.
+        :type first: int, optional
+
+        :param last: Number of the packet to stop before, or None to read to the end. Defaults to None.
+        :type last: int | None, optional
+
+        :return: The packets.
+        :rtype: DataBatch
+        """
+        last = len(self) if last is None else min(last, len(self))
+        first = max(0, first)
+
+        blocks = range(0)
+        if first < last:
+            blocks = range(int(np.searchsorted(self._index['first'], first, side='right')) - 1, int(np.searchsorted(self._index['first'], last)))
+        return self._gather(blocks, lambda number: (first, last))
+
+    def time_range(self, start: int, end: int) -> DataBatch:
+        """Packets timestamped from `start` up to (but not including) `end`. Only the blocks covering that time are read.
+
+        :param start: Timestamp to start at, in nanoseconds since the epoch.
+        :type start: int
+
+        :param end: Timestamp to end before, in nanoseconds since the epoch.
+        :type end: int
+
+        :return: The packets.
+        :rtype: DataBatch
+        """
+        blocks = range(int(np.searchsorted(self._index['end'], start, side='left')), int(np.searchsorted(self._index['start'], end, side='left')))
+
+        def packets_in_range(number: int) -> tuple[int, int]:
+            timestamps: np.ndarray = self._timestamps(number)
+            first: int = int(self._index['first'][number])
+            return first + int(np.searchsorted(timestamps, start)), first + int(np.searchsorted(timestamps, end))
+
+        return self._gather(blocks, packets_in_range)
+
+    def _gather(self, blocks: range, packets_in_block) -> DataBatch:
+        """Packets from each of `blocks`, limited to the packet numbers given for each block."""
+        raw: list[np.ndarray] = []
+        timestamps: list[np.ndarray] = []
+        for number in blocks:
+            block_first: int = int(self._index['first'][number])
+            first, last = packets_in_block(number)
+            first, last = max(first, block_first) - block_first, min(last, block_first + int(self._index['count'][number])) - block_first
+            if last > first:
+                raw.append(self._block(number)[first:last])
+                timestamps.append(self._timestamps(number)[first:last])
+
+        if not raw:
+            return DataBatch.from_raw(np.empty(0, dtype=np.int64), np.empty((0, self._metadata['packet_length']), dtype=np.uint8), self._schema.make_packet)
+        return DataBatch.from_raw(np.concatenate(timestamps), np.concatenate(raw), self._schema.make_packet)
+
+    def batches(self) -> Iterator[DataBatch]:
+        """Every packet in the archive, one block at a time, e.g. to replay the archive into a sink.
+
+        :return: One batch per block.
+        :rtype: Iterator[DataBatch]
+        """
+        for number in range(len(self._index)):
+            yield DataBatch.from_raw(self._timestamps(number), self._block(number), self._schema.make_packet)
+
+    def decode(self, first: int = 0, last: int | None = None) -> dict[str, np.ndarray]:
+        """Decode packets `first` up to `last` into one array per channel, with a ``time`` array of timestamps (in
+        nanoseconds since the epoch). Analog channels are decoded to microvolts and TTL channels to 0 or 1, as
+        ``ChannelSchema.decode`` does.
+
+        :param first: Number of the first packet. Defaults to 0.
+        :type first: int, optional
+
+        :param last: Number of the packet to stop before, or None to decode to the end. Defaults to None.
+        :type last: int | None, optional
+
+        :return: Arrays by channel name.
+        :rtype: dict[str, numpy.ndarray]
+        """
+        batch: DataBatch = self.read(first, last)
+        return { 'time' : batch.timestamps } | dict(zip(self._schema.names, self._schema.decode(batch)))
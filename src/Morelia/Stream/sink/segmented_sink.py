@@ -0,0 +1,223 @@
+"""Split a recording into a series of files."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+from typing import Self
+
+import numpy as np
+
+from Morelia.Stream.sink import SinkInterface
+from Morelia.packet.data import DataPacket, DataBatch, DataGap
+
+class SegmentedSink(SinkInterface):
+    """Stream data to a series of files (segments), starting a new one every `interval_sec` seconds or once the
+    current one reaches `max_bytes`. Any file sink can be split into segments, such as ``EDFSink`` or ``CSVSink``.
+
+    Many file formats (EDF included) are only complete once the file is closed, so if a long recording crashes,
+    only the current segment is lost. Finished segments are closed on a background thread while the next one is
+    already receiving data, so streaming never waits for a file to be closed.
+
+    Segments are named after `file_path` with a 5 digit index added, e.g. ``rec.edf`` is split into ``rec_00000.edf``,
+    ``rec_00001.edf``, ... Every sample goes to exactly one segment. A manifest (``rec.manifest.json``) lists each
+    segment's file, the index of its first sample in the whole recording, the timestamps of its first and last
+    samples (in nanoseconds since the epoch), its number of samples, the gaps in its data, and whether it has been
+    closed. The manifest is updated whenever a segment starts, has a gap, or is closed. A gap that arrives between two
+    segments is passed on to (and listed under) the segment after it.
+
+    :param sink_type: Type of sink to write each segment with, such as ``EDFSink``.
+    :type sink_type: type[SinkInterface]
+
+    :param file_path: Path the segments are named after.
+    :type file_path: str
+
+    :param args: Arguments passed to `sink_type` after the path of the segment, such as the device being streamed from.
+
+    :param interval_sec: Start a new segment every `interval_sec` seconds. Segments are aligned to the clock, so an
+        interval of 3600 gives one segment per hour, starting on the hour. Boundaries are sample-exact: the first sample
+        timestamped at or after the boundary starts the next segment.
+    :type interval_sec: float | None, optional
+
+    :param max_bytes: Start a new segment once the current file has grown to `max_bytes` bytes. Checked after each chunk
+        of data, so segments can be larger by up to one chunk (plus whatever the sink has yet to write out).
+    :type max_bytes: int | None, optional
+
+    :param kwargs: Keyword arguments passed to `sink_type`.
+    """
+
+    def __init__(self, sink_type: type[SinkInterface], file_path: str, *args, interval_sec: float | None = None,
+                 max_bytes: int | None = None, **kwargs) -> None:
+
+        if interval_sec is None and max_bytes is None:
+            raise ValueError('Segments need an `interval_sec`, a `max_bytes`, or both.')
+        if interval_sec is not None and interval_sec <= 0:
+            raise ValueError('`interval_sec` must be positive.')
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError('`max_bytes` must be positive.')
+
+        self._sink_type = sink_type
+        self._args = args
+        self._kwargs = kwargs
+
+        self._stem, self._suffix = os.path.splitext(file_path)
+        self._interval_ns: int | None = None if interval_sec is None else int(interval_sec * 10**9)
+        self._max_bytes: int | None = max_bytes
+
+    @property
+    def manifest_path(self) -> str:
+        return f'{self._stem}.manifest.json'
+
+    def segment_path(self, index: int) -> str:
+        """Path of a segment.
+
+        :param index: Index of the segment, starting from 0.
+        :type index: int
+
+        :return: The path.
+        :rtype: str
+        """
+        return f'{self._stem}_{index:05d}{self._suffix}'
+
+    def __enter__(self) -> Self:
+        self._segments: list[dict] = []
+        self._samples: int = 0 #samples received across all segments.
+
+        self._sink = None
+        self._segment: dict | None = None
+        #gaps that arrived while no segment was open, for the next one.
+        self._pending_gaps: list[DataGap] = []
+
+        #one thread, so segments are closed in order.
+        self._closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='segment-closer')
+        self._closing: list[Future] = []
+        #guards the manifest, which both threads update.
+        self._lock = threading.Lock()
+
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        if self._sink is not None:
+            self._close_segment()
+
+        self._closer.shutdown(wait=True)
+        self._raise_close_errors()
+
+        return False
+
+    def _write_manifest(self) -> None:
+        #written to a temporary file first, so the manifest on disk is always complete.
+        temporary_path: str = self.manifest_path + '.tmp'
+        with open(temporary_path, 'w') as manifest:
+            json.dump({ 'segments' : self._segments }, manifest, indent=1)
+        os.replace(temporary_path, self.manifest_path)
+
+    def _open_segment(self, start: int) -> None:
+        path: str = self.segment_path(len(self._segments))
+
+        sink = self._sink_type(path, *self._args, **self._kwargs)
+        sink.__enter__()
+
+        self._sink = sink
+        self._path: str = path
+        self._flush_segment = getattr(sink, 'flush_batch', None) or partial(SinkInterface.flush_batch, sink)
+        self._segment_samples: int = 0
+        self._last_timestamp: int = start
+
+        #first multiple of the interval after the segment's first sample.
+        self._boundary: int | None = None if self._interval_ns is None else (start // self._interval_ns + 1) * self._interval_ns
+
+        self._segment = {
+            'file'         : os.path.basename(path),
+            'first_sample' : self._samples,
+            'start'        : start,
+            'end'          : None,
+            'samples'      : None,
+            'gaps'         : [],
+            'closed'       : False,
+        }
+
+        with self._lock:
+            self._segments.append(self._segment)
+            self._write_manifest()
+
+        pending_gaps, self._pending_gaps = self._pending_gaps, []
+        for gap in pending_gaps:
+            self.flush_gap(gap)
+
+    def _close_segment(self) -> None:
+        sink, segment = self._sink, self._segment
+        self._sink = self._segment = None
+
+        with self._lock:
+            segment['end'] = self._last_timestamp
+            segment['samples'] = self._segment_samples
+
+        def close() -> None:
+            sink.__exit__(None, None, None)
+            with self._lock:
+                segment['closed'] = True
+                self._write_manifest()
+
+        self._closing.append(self._closer.submit(close))
+
+    def _raise_close_errors(self) -> None:
+        """Raise the first error hit while closing a segment in the background, if any."""
+        still_closing: list[Future] = []
+        for future in self._closing:
+            if not future.done():
+                still_closing.append(future)
+            elif future.exception() is not None:
+                raise future.exception()
+        self._closing = still_closing
+
+    def flush(self, timestamp: int, packet: DataPacket) -> None:
+        self.flush_batch(DataBatch(np.array([timestamp], dtype=np.int64), [packet]))
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        self._raise_close_errors()
+
+        timestamps: np.ndarray = batch.timestamps
+        start: int = 0
+
+        while start < len(batch):
+            if self._sink is None:
+                self._open_segment(int(timestamps[start]))
+
+            #samples before the next boundary go in this segment.
+            end: int = len(batch)
+            if self._boundary is not None:
+                end = start + int(np.searchsorted(timestamps[start:], self._boundary))
+
+            if end > start:
+                self._flush_segment(batch if start == 0 and end == len(batch) else batch[start:end])
+                self._segment_samples += end - start
+                self._samples += end - start
+                self._last_timestamp = int(timestamps[end-1])
+
+            if end < len(batch) or (self._max_bytes is not None and os.path.getsize(self._path) >= self._max_bytes):
+                self._close_segment()
+
+            start = end
+
+    def flush_gap(self, gap: DataGap) -> None:
+        if self._sink is None:
+            self._pending_gaps.append(gap)
+            return
+
+        flush_gap = getattr(self._sink, 'flush_gap', None)
+        if flush_gap is not None:
+            flush_gap(gap)
+
+        with self._lock:
+            self._segment['gaps'].append({ 'sample' : self._samples, 'start' : gap.start, 'duration' : gap.duration,
+                                           'lost_samples' : gap.sample_count, 'cause' : gap.cause })
+            self._write_manifest()
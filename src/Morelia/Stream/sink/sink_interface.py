@@ -9,8 +9,7 @@ __email__       = 'sales@pinnaclet.com'
 
 import abc
 
-from Morelia.packet.data import DataPacket
-from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D
+from Morelia.packet.data import DataPacket, DataBatch, DataGap
 
 class SinkInterface(metaclass=abc.ABCMeta):
 
@@ -22,3 +21,17 @@ class SinkInterface(metaclass=abc.ABCMeta):
     def flush(self, timestamp: int, packet: DataPacket) -> None:
         """Send data to destination (e.g. and EDF file)."""
         raise NotImplementedError
+
+    def flush_batch(self, batch: DataBatch) -> None:
+        """Send a chunk of data to destination. Sinks that can do better than handling one packet at a
+        time should override this; by default, each packet in the batch is passed to ``flush``.
+        """
+        flush = self.flush
+        for timestamp, packet in batch:
+            flush(timestamp, packet)
+
+    def flush_gap(self, gap: DataGap) -> None:
+        """Record that data was lost while the connection to the device was re-established. Sinks that can
+        mark gaps in their destination should override this; by default, gaps are ignored.
+        """
+        pass
@@ -0,0 +1,380 @@
+"""Durable queue on disk for network sinks, so data survives the server being slow or down."""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import multiprocessing as mp
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable
+
+#each record is a header (payload length, time it was spooled in ns since the epoch, CRC32 of the payload), then the payload.
+_RECORD_HEADER = struct.Struct('<IqI')
+
+#index of each value in the shared metrics array.
+_PENDING_RECORDS = 0
+_PENDING_BYTES   = 1
+_DISK_BYTES      = 2
+_HEAD_TIME       = 3
+_SENT_RECORDS    = 4
+_SENT_BYTES      = 5
+_EVICTED_RECORDS = 6
+_EVICTED_BYTES   = 7
+_SEND_FAILURES   = 8
+_CONNECTED       = 9
+_METRICS_SIZE    = 10
+
+class Spool:
+    """Durable, in-order queue of payloads (such as batches of line protocol) between a network sink and its server.
+
+    Every payload is appended to a log on disk and sent from a background thread, in the order it was spooled. If
+    sending fails, the same payload is retried (waiting longer after each failure) until it gets through, while new
+    payloads keep being appended to the log, so streaming never waits for the server. Once the server is back, the
+    backlog is replayed in order. A payload is only removed from the log once it has been sent.
+
+    The log is split into segment files of `segment_bytes` bytes, which are deleted once every payload in them has
+    been sent. Disk use is capped at `max_bytes`: once full, either the oldest unsent payloads are dropped to make
+    room (`eviction` ``'oldest'``), or new ones are (``'newest'``). Anything still unsent when the spool is closed
+    stays on disk, and is sent the next time a spool is opened on the same directory.
+
+    Metrics (``metrics``) are kept in shared memory, so they can be read from any process, as long as the spool was
+    created before the sink was handed to ``DataFlow``.
+
+    :param directory: Directory to keep the log in. Created if it does not exist. Only one spool should use it at a time.
+    :type directory: str
+
+    :param max_bytes: Most disk space the log may take up, in bytes. Defaults to 1 GiB.
+    :type max_bytes: int, optional
+
+    :param segment_bytes: Size of each segment file, in bytes. At most a quarter of `max_bytes`. Defaults to 16 MiB.
+    :type segment_bytes: int, optional
+
+    :param eviction: What to drop once the log is full, ``'oldest'`` or ``'newest'``. Defaults to ``'oldest'``.
+    :type eviction: str, optional
+
+    :param retry_interval_sec: How long to wait before retrying a failed send. Doubles after every failure in a row,
+        up to `max_retry_interval_sec`. Defaults to 0.5.
+    :type retry_interval_sec: float, optional
+
+    :param max_retry_interval_sec: Longest wait between retries. Defaults to 30.
+    :type max_retry_interval_sec: float, optional
+
+    :param drain_timeout_sec: How long ``close`` waits for the backlog to be sent. Defaults to 5.
+    :type drain_timeout_sec: float, optional
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30, segment_bytes: int = 16 << 20, eviction: str = 'oldest',
+                 retry_interval_sec: float = 0.5, max_retry_interval_sec: float = 30, drain_timeout_sec: float = 5) -> None:
+        """Class constructor."""
+        if eviction not in ('oldest', 'newest'):
+            raise ValueError(f'Unknown eviction policy "{eviction}", must be "oldest" or "newest".')
+        if segment_bytes <= 0 or segment_bytes * 4 > max_bytes:
+            raise ValueError('`segment_bytes` must be positive, and at most a quarter of `max_bytes`.')
+
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._segment_bytes = segment_bytes
+        self._eviction = eviction
+        self._retry_interval_sec = retry_interval_sec
+        self._max_retry_interval_sec = max_retry_interval_sec
+        self._drain_timeout_sec = drain_timeout_sec
+
+        #no lock: the spool's threads are the only writers, and readers tolerate a value being slightly out of date.
+        self._values = mp.RawArray('d', _METRICS_SIZE)
+
+    def __getstate__(self) -> dict:
+        #shared memory can only be inherited, so a spool sent to a running worker keeps its metrics to itself.
+        state: dict = self.__dict__.copy()
+        state['_values'] = list(self._values)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        values: list[float] = state.pop('_values')
+        self.__dict__.update(state)
+        self._values = mp.RawArray('d', values)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._directory, f'{segment:010d}.log')
+
+    @property
+    def _cursor_path(self) -> str:
+        return os.path.join(self._directory, 'cursor')
+
+    # ------------ LOG ------------
+
+    def _scan(self, segment: int, start: int) -> tuple[int, int, int, int | None]:
+        """Count the complete records in a segment from `start` on, and find where they end.
+
+        :return: ``(records, payload bytes, end offset, time of first record or None)``.
+        """
+        records, payload_bytes, first_time = 0, 0, None
+        offset: int = start
+        with open(self._segment_path(segment), 'rb') as file:
+            file.seek(start)
+            while True:
+                header: bytes = file.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    break
+                length, spooled_at, crc = _RECORD_HEADER.unpack(header)
+                payload: bytes = file.read(length)
+                #anything after a torn or corrupt record is thrown away.
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                if first_time is None:
+                    first_time = spooled_at
+                records += 1
+                payload_bytes += length
+                offset += _RECORD_HEADER.size + length
+        return records, payload_bytes, offset, first_time
+
+    def _recover(self) -> None:
+        """Pick up whatever a previous spool on this directory left unsent."""
+        os.makedirs(self._directory, exist_ok=True)
+
+        segments: list[int] = sorted(int(name[:-4]) for name in os.listdir(self._directory) if name.endswith('.log') and name[:-4].isdigit())
+
+        read_segment, read_offset = (segments[0], 0) if segments else (0, 0)
+        if os.path.exists(self._cursor_path):
+            with open(self._cursor_path) as file:
+                read_segment, read_offset = map(int, file.read().split())
+
+        #unsent records in each segment, oldest segment first.
+        self._segments: dict[int, list[int]] = {}
+        for segment in segments:
+            if segment < read_segment:
+                os.remove(self._segment_path(segment))
+                continue
+
+            start: int = read_offset if segment == read_segment else 0
+            records, payload_bytes, end, first_time = self._scan(segment, start)
+            os.truncate(self._segment_path(segment), end)
+            self._segments[segment] = [records, os.path.getsize(self._segment_path(segment))]
+
+            self._values[_PENDING_RECORDS] += records
+            self._values[_PENDING_BYTES] += payload_bytes
+            if first_time is not None and not self._values[_HEAD_TIME]:
+                self._values[_HEAD_TIME] = first_time / 10**9
+
+        if read_segment not in self._segments:
+            read_segment, read_offset = (min(self._segments), 0) if self._segments else (0, 0)
+
+        self._read_segment: int = read_segment
+        self._read_offset: int = read_offset
+
+        #new records always go in a new segment.
+        self._write_segment: int = max(self._segments, default=read_segment-1) + 1
+        self._segments[self._write_segment] = [0, 0]
+        self._write_file = open(self._segment_path(self._write_segment), 'ab')
+
+        self._values[_DISK_BYTES] = sum(size for _, size in self._segments.values())
+
+    def _save_cursor(self) -> None:
+        temporary_path: str = self._cursor_path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            file.write(f'{self._read_segment} {self._read_offset}')
+        os.replace(temporary_path, self._cursor_path)
+
+    def _drop_segment(self, segment: int) -> None:
+        """Delete a segment, counting whatever was left unsent in it as evicted. Call with the lock held."""
+        records, size = self._segments.pop(segment)
+        os.remove(self._segment_path(segment))
+        self._values[_DISK_BYTES] -= size
+
+        if segment == self._read_segment:
+            #payload bytes of the unsent records, from the read position to the end of the segment.
+            unsent: int = records
+            unsent_bytes: int = size - self._read_offset - unsent * _RECORD_HEADER.size
+            self._read_segment, self._read_offset = min(self._segments), 0
+            self._values[_EVICTED_RECORDS] += unsent
+            self._values[_EVICTED_BYTES] += unsent_bytes
+            self._values[_PENDING_RECORDS] -= unsent
+            self._values[_PENDING_BYTES] -= unsent_bytes
+
+    # ------------ SINK SIDE ------------
+
+    def open(self, send: Callable[[bytes], None]) -> None:
+        """Start sending payloads, beginning with any left unsent by a previous spool on the same directory.
+
+        :param send: Sends one payload, raising an exception if it could not be sent. Called from a background thread.
+        :type send: Callable[[bytes], None]
+        """
+        self._send = send
+        self._lock = threading.Condition()
+        self._closing: bool = False
+        self._drain_deadline: float = float('inf')
+
+        self._recover()
+
+        self._sender = threading.Thread(target=self._run, name='spool-sender', daemon=True)
+        self._sender.start()
+
+    def put(self, payload: bytes) -> None:
+        """Append a payload to the log, to be sent once everything before it has been.
+
+        :param payload: Data to send.
+        :type payload: bytes
+        """
+        record_size: int = _RECORD_HEADER.size + len(payload)
+        spooled_at: int = time.time_ns()
+
+        with self._lock:
+            values = self._values
+
+            while values[_DISK_BYTES] + record_size > self._max_bytes:
+                oldest: int = min(self._segments)
+                if self._eviction == 'newest' or oldest == self._write_segment:
+                    values[_EVICTED_RECORDS] += 1
+                    values[_EVICTED_BYTES] += len(payload)
+                    return
+                self._drop_segment(oldest)
+
+            if self._segments[self._write_segment][1] + record_size > self._segment_bytes and self._segments[self._write_segment][0]:
+                self._write_file.close()
+                self._write_segment += 1
+                self._segments[self._write_segment] = [0, 0]
+                self._write_file = open(self._segment_path(self._write_segment), 'ab')
+
+            self._write_file.write(_RECORD_HEADER.pack(len(payload), spooled_at, zlib.crc32(payload)) + payload)
+            self._write_file.flush()
+
+            self._segments[self._write_segment][0] += 1
+            self._segments[self._write_segment][1] += record_size
+
+            if not values[_PENDING_RECORDS]:
+                values[_HEAD_TIME] = spooled_at / 10**9
+            values[_PENDING_RECORDS] += 1
+            values[_PENDING_BYTES] += len(payload)
+            values[_DISK_BYTES] += record_size
+
+            self._lock.notify()
+
+    def close(self) -> None:
+        """Stop sending, once the backlog has been sent or `drain_timeout_sec` has passed. Anything unsent stays on disk."""
+        with self._lock:
+            self._closing = True
+            self._drain_deadline = time.monotonic() + self._drain_timeout_sec
+            self._lock.notify()
+
+        self._sender.join()
+        self._write_file.close()
+
+    # ------------ SENDER SIDE ------------
+
+    def _next_record(self) -> tuple[int, int, bytes] | None:
+        """Wait for the oldest unsent record. Returns ``(segment, offset after the record, payload)``, or None once closing
+        with nothing left to send."""
+        with self._lock:
+            while True:
+                segment: int = self._read_segment
+                #records before the end of what has been written are complete.
+                if self._segments[segment][0]:
+                    break
+                if segment != self._write_segment:
+                    #every record in this segment has been sent.
+                    self._segments.pop(segment)
+                    os.remove(self._segment_path(segment))
+                    self._read_segment, self._read_offset = min(self._segments), 0
+                    continue
+                if self._closing:
+                    return None
+                self._lock.wait()
+
+            offset: int = self._read_offset
+
+        with open(self._segment_path(segment), 'rb') as file:
+            file.seek(offset)
+            length, spooled_at, _ = _RECORD_HEADER.unpack(file.read(_RECORD_HEADER.size))
+            payload: bytes = file.read(length)
+
+        return segment, offset + _RECORD_HEADER.size + length, payload
+
+    def _run(self) -> None:
+        values = self._values
+        failures: int = 0
+
+        while True:
+            try:
+                record = self._next_record()
+            except FileNotFoundError:
+                #the segment was evicted while being read.
+                continue
+            if record is None:
+                return
+            segment, end, payload = record
+
+            try:
+                self._send(payload)
+
+            except Exception:
+                values[_SEND_FAILURES] += 1
+                values[_CONNECTED] = 0
+                failures += 1
+
+                wait: float = min(self._max_retry_interval_sec, self._retry_interval_sec * 2**(failures-1))
+                with self._lock:
+                    #give up on the backlog once closing and out of time; it is sent next time.
+                    if self._closing and time.monotonic() + wait > self._drain_deadline:
+                        return
+                    self._lock.wait_for(lambda: self._closing and time.monotonic() >= self._drain_deadline, timeout=wait)
+                continue
+
+            failures = 0
+            values[_CONNECTED] = 1
+
+            with self._lock:
+                #skip the bookkeeping if the record was evicted while it was being sent.
+                if segment != self._read_segment:
+                    continue
+
+                self._read_offset = end
+                self._segments[segment][0] -= 1
+                self._save_cursor()
+
+                values[_SENT_RECORDS] += 1
+                values[_SENT_BYTES] += len(payload)
+                values[_PENDING_RECORDS] -= 1
+                values[_PENDING_BYTES] -= len(payload)
+                values[_HEAD_TIME] = self._head_time()
+
+    def _head_time(self) -> float:
+        """When the oldest unsent record was spooled, in seconds since the epoch, or 0 if everything has been sent. Call with the lock held."""
+        segment, offset = self._read_segment, self._read_offset
+        while not self._segments[segment][0]:
+            if segment == self._write_segment:
+                return 0.0
+            segment, offset = min(s for s in self._segments if s > segment), 0
+
+        with open(self._segment_path(segment), 'rb') as file:
+            file.seek(offset)
+            return _RECORD_HEADER.unpack(file.read(_RECORD_HEADER.size))[1] / 10**9
+
+    # ------------ READER SIDE ------------
+
+    def metrics(self) -> dict:
+        """Read the spool's current state.
+
+        :return: ``lag_seconds`` (how long the oldest unsent payload has been waiting), ``pending_records`` and
+            ``pending_bytes`` (unsent payloads), ``disk_bytes`` (size of the log), ``sent_records``, ``sent_bytes``,
+            ``evicted_records``, ``evicted_bytes``, ``send_failures``, and ``connected`` (whether the last send succeeded).
+        :rtype: dict
+        """
+        values = list(self._values)
+        return {
+            'lag_seconds'     : max(0.0, time.time() - values[_HEAD_TIME]) if values[_HEAD_TIME] else 0.0,
+            'pending_records' : int(values[_PENDING_RECORDS]),
+            'pending_bytes'   : int(values[_PENDING_BYTES]),
+            'disk_bytes'      : int(values[_DISK_BYTES]),
+            'sent_records'    : int(values[_SENT_RECORDS]),
+            'sent_bytes'      : int(values[_SENT_BYTES]),
+            'evicted_records' : int(values[_EVICTED_RECORDS]),
+            'evicted_bytes'   : int(values[_EVICTED_BYTES]),
+            'send_failures'   : int(values[_SEND_FAILURES]),
+            'connected'       : bool(values[_CONNECTED]),
+        }
@@ -12,16 +12,36 @@ from multiprocessing import Event
 import time
 from functools import partial
 from contextlib import ExitStack
+from multiprocessing.connection import Connection
+from typing import Callable
+
+import numpy as np
 
 #local imports
-from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, AquisitionDevice
+from Morelia.Devices import Pod8206HR, Pod8401HR, Pod8274D, Pod8480SC, AquisitionDevice, ChecksumError
 
 from Morelia.packet import ControlPacket
+from Morelia.packet.data import DataBatch, DataGap
+from Morelia.Stream.sink.sink_interface import SinkInterface
+from Morelia.Stream.metrics import StreamMetrics
+from Morelia.Stream.tracing import StageTracer
+import Morelia.Stream.tracing as tracing
+from Morelia.Stream.control import PendingCommands, serve as serve_control
+from Morelia.Stream.reconnect import ReconnectPolicy, CONNECTION_ERRORS, reconnect
+from Morelia.Stream.closed_loop import Trigger
+from Morelia.Stream.sync import StreamStart, TimeBase
 
-import reactivex as rx
-from reactivex import operators as ops
+#reactivex is only needed for the 'rx' engine, so it is an optional dependency, imported when that engine starts.
+rx = None
+ops = None
 
-counter = 0
+def _import_reactivex() -> None:
+    global rx, ops
+    try:
+        import reactivex as rx
+        from reactivex import operators as ops
+    except ImportError:
+        raise ImportError('The "rx" streaming engine requires reactivex to be installed (pip install reactivex).') from None
 
 #TODO: __all__ to tell us what to export.
 
@@ -60,13 +80,10 @@ def _timestamp_via_adjusted_sample_rate(starting_sample_rate: int):
     return(_timestamp_via_adjusted_sample_rate_operator)
 
 #TODO: type hints
-#TODO: remove counter
 #function used by reactivex to create an observable from a packet stream from an aquisition device.
 
 def _stream_from_pod_device(pod: AquisitionDevice, duration: float, manual_stop_event: Event):
     def _stream_from_pod_device_observable(observer, scheduler) -> None:
-        
-        global counter
 
         with pod:
             stream_start_time : float = time.perf_counter()
@@ -74,19 +91,392 @@ def _stream_from_pod_device(pod: AquisitionDevice, duration: float, manual_stop_
             while time.perf_counter()-stream_start_time < duration and not manual_stop_event.is_set():
             
                 observer.on_next(pod.ReadPODpacket())
-                counter += 1
 
         observer.on_completed()
     return _stream_from_pod_device_observable
 
-def get_data(duration: float, manual_stop_event: Event, pod: AquisitionDevice, sinks) -> None: 
-    """Streams data from the POD device. The data drops about every 1 second.
-    Streaming will continue until a "stop streaming" packet is recieved. 
+#the lean engine does the same work as the reactivex pipeline (source -> filter -> timestamp -> fan-out),
+#but on chunks of packets with plain function calls, so the per-packet cost is a list append instead of
+#several layers of observer dispatch.
+class _AdjustedSampleRateClock:
+    """Timestamps chunks of packets based on the average observed sample rate. This is the chunked
+    equivalent of the ``_timestamp_via_adjusted_sample_rate`` operator; the observed sample rate is
+    re-estimated at most once a second, at chunk boundaries.
 
-    Args: 
-         fail_tolerance (int): The number of successive failed attempts of reading data before stopping the streaming.
+    :param starting_sample_rate: Sample rate to assume until one has been observed.
+    :type starting_sample_rate: int
+    :param started_at: When streaming started, in nanoseconds since the epoch. Defaults to now, by the wall clock.
+    :type started_at: int | None, optional
     """
 
+    def __init__(self, starting_sample_rate: int, started_at: int | None = None) -> None:
+        self.sample_rate: float = starting_sample_rate
+        self.packet_count: int = 0
+        self.last_timestamp: int = time.time_ns() if started_at is None else started_at
+
+        self._starting_time: float = time.perf_counter()
+        self._time_at_last_update: float = self._starting_time
+
+    def stamp(self, count: int) -> np.ndarray:
+        """Get timestamps for the next ``count`` packets.
+
+        :param count: Number of packets to timestamp.
+        :type count: int
+
+        :return: Nanosecond timestamps, one per packet.
+        :rtype: numpy.ndarray[numpy.int64]
+        """
+        timestamps = self.last_timestamp + (np.arange(1, count+1) * (10**9/self.sample_rate)).astype(np.int64)
+
+        self.last_timestamp = int(timestamps[-1])
+        self.packet_count += count
+
+        now: float = time.perf_counter()
+        if now - self._time_at_last_update > 1:
+            self.sample_rate = self.packet_count/(now-self._starting_time)
+            self._time_at_last_update = now
+
+        return timestamps
+
+    def skip(self, count: int) -> None:
+        """Move past ``count`` packets that were never received, so the next timestamps account for them.
+
+        :param count: Number of missing packets.
+        :type count: int
+        """
+        self.last_timestamp += int(count * (10**9/self.sample_rate))
+        self.packet_count += count
+
+class _ArrivalClock:
+    """Timestamps packets that arrive at no particular rate, such as events, by when they arrived. Timestamps are
+    nanoseconds since the epoch like those of ``_AdjustedSampleRateClock``, counted from the wall clock when
+    streaming started, but measured with the performance counter so that they are precise to well under a millisecond.
+
+    :param time_base: Epoch to count from, such as one shared with other devices. Defaults to a new one.
+    :type time_base: :class: TimeBase | None, optional
+    """
+
+    def __init__(self, time_base: TimeBase | None = None) -> None:
+        self._time_base: TimeBase = time_base or TimeBase()
+
+    def stamp(self, arrived: int) -> int:
+        """Get the timestamp of a packet.
+
+        :param arrived: When the packet's first byte was read, from ``time.perf_counter_ns``.
+        :type arrived: int
+
+        :return: Nanosecond timestamp.
+        :rtype: int
+        """
+        return self._time_base.to_epoch(arrived)
+
+def _read_chunk(read, chunk_size: int, packets: list, on_control: Callable | None = None) -> int:
+    """Source + filter stages of the lean engine. Packets with a bad checksum are dropped rather than ending the stream.
+    Data packets are appended to `packets` as they are read, so they are kept even if reading fails partway through the chunk.
+    Control packets are handed to `on_control` as they are read, or dropped if it is None."""
+    checksum_failures: int = 0
+    for _ in range(chunk_size):
+        try:
+            packet = read()
+        except ChecksumError:
+            checksum_failures += 1
+            continue
+        if not isinstance(packet, ControlPacket): #todo: more strict filtering
+            packets.append(packet)
+        elif on_control is not None:
+            on_control(packet)
+
+    return checksum_failures
+
+def _read_chunk_traced(read_timed, chunk_size: int, packets: list, tracer: StageTracer, on_control: Callable | None = None) -> tuple[int, int | None]:
+    """Same as ``_read_chunk``, but stamps the read, framed, and decoded stages. Also returns the time the first byte of the chunk was read."""
+    raw_packets: list = []
+    checksum_failures: int = 0
+    first_arrival: int | None = None
+    last_arrival: int = 0
+
+    try:
+        for _ in range(chunk_size):
+            try:
+                packet, last_arrival, _ = read_timed()
+            except ChecksumError:
+                checksum_failures += 1
+                continue
+            if first_arrival is None:
+                first_arrival = last_arrival
+            if isinstance(packet, ControlPacket) and on_control is not None:
+                on_control(packet)
+            else:
+                raw_packets.append(packet)
+    except BaseException:
+        #keep what was read before the failure, like ``_read_chunk`` does. the chunk isn't traced.
+        packets.extend(packet for packet in raw_packets if not isinstance(packet, ControlPacket))
+        raise
+
+    framed: int = time.perf_counter_ns()
+
+    packets.extend(packet for packet in raw_packets if not isinstance(packet, ControlPacket)) #todo: more strict filtering
+
+    if first_arrival is not None:
+        tracer.record(tracing.READ, last_arrival-first_arrival)
+        tracer.record(tracing.FRAMED, framed-first_arrival)
+        tracer.record(tracing.DECODED, time.perf_counter_ns()-first_arrival)
+
+    return checksum_failures, first_arrival
+
+def _sink_slots(context_manager_stack: ExitStack, metrics: StreamMetrics | None, tracer: StageTracer | None) -> tuple[dict, Callable, Callable]:
+    """Sinks a worker streams to, by slot, and functions to attach a sink to a slot and detach it, while streaming."""
+
+    #each sink is entered on its own stack, so it can be detached (and exited) while streaming.
+    attached: dict[int, tuple[ExitStack, Callable, Callable | None]] = {}
+
+    def attach(slot: int, sink) -> None:
+        if slot in attached:
+            raise ValueError(f'Sink slot {slot} is already in use.')
+
+        sink_stack: ExitStack = ExitStack()
+        sink_stack.enter_context(sink)
+        context_manager_stack.enter_context(sink_stack)
+
+        #sinks only need a `flush` method to satisfy `SinkInterface`, so fall back to its default batch handling.
+        attached[slot] = (sink_stack, getattr(sink, 'flush_batch', None) or partial(SinkInterface.flush_batch, sink),
+                          getattr(sink, 'flush_gap', None))
+
+        if metrics is not None:
+            metrics.reset_sink(slot)
+        if tracer is not None:
+            tracer.reset_sink(slot)
+
+    def detach(slot: int) -> None:
+        if slot not in attached:
+            raise ValueError(f'No sink is attached in slot {slot}.')
+
+        sink_stack, *_ = attached.pop(slot)
+        sink_stack.close()
+
+    return attached, attach, detach
+
+def _get_data_lean(duration: float, manual_stop_event: Event, pod: AquisitionDevice, sinks, chunk_size: int | None,
+                   metrics: StreamMetrics | None, tracer: StageTracer | None, control: Connection | None,
+                   reconnect_policy: ReconnectPolicy | None, triggers: list[Trigger], start: StreamStart | None) -> None:
+
+    if chunk_size is None:
+        #about a tenth of a second worth of packets per chunk.
+        chunk_size = max(1, pod.sample_rate//10)
+
+    read = pod.ReadPODpacket
+    bytes_waiting = getattr(pod, 'GetBytesWaiting', lambda: 0)
+
+    #devices that can't say when a packet started arriving are traced from when the packet was returned.
+    def read_timed():
+        packet = read()
+        now: int = time.perf_counter_ns()
+        return packet, now, now
+
+    read_timed = getattr(pod, 'ReadPODpacketTimed', read_timed)
+
+    #without a policy, losing the connection ends the stream with an error, as it always has.
+    lost_connection: tuple[type[Exception]] = ()
+    if reconnect_policy is not None:
+        lost_connection = CONNECTION_ERRORS
+        stall_timeout: float = reconnect_policy.stall_timeout(pod.sample_rate)
+        read = partial(pod.ReadPODpacket, timeout_sec=stall_timeout)
+        if hasattr(pod, 'ReadPODpacketTimed'):
+            read_timed = partial(pod.ReadPODpacketTimed, timeout_sec=stall_timeout)
+
+    with ExitStack() as context_manager_stack:
+
+        attached, attach, detach = _sink_slots(context_manager_stack, metrics, tracer)
+
+        for slot, sink in enumerate(sinks):
+            attach(slot, sink)
+
+        #commands sent to the device while streaming, answered as their responses are read.
+        commands: PendingCommands | None = None
+        on_control: Callable | None = None
+        if control is not None:
+            commands = PendingCommands(control, pod)
+            on_control = commands.resolve
+
+        flushes: list[tuple[int, Callable]] = [ (slot, flush) for slot, (_, flush, _) in attached.items() ]
+
+        for trigger in triggers:
+            trigger.start(pod)
+
+        #read before waiting, so nothing is left to ask the device between the start and STREAM 1.
+        sample_rate: int = pod.sample_rate
+
+        if start is not None:
+            start.wait()
+
+        with pod:
+            clock = _AdjustedSampleRateClock(sample_rate, None if start is None else start.started(time.perf_counter_ns()))
+            stream_start_time : float = time.perf_counter()
+
+            while time.perf_counter()-stream_start_time < duration and not manual_stop_event.is_set():
+
+                #sinks only change, and commands are only written, between chunks.
+                if control is not None:
+                    if control.poll() and serve_control(control, pod, attach, detach, commands):
+                        flushes = [ (slot, flush) for slot, (_, flush, _) in attached.items() ]
+                    if commands:
+                        commands.expire()
+
+                #source + filter.
+                packets: list = []
+                checksum_failures: int = 0
+                traced_from: int | None = None
+                lost: Exception | None = None
+                try:
+                    if tracer is not None and tracer.should_trace():
+                        checksum_failures, traced_from = _read_chunk_traced(read_timed, chunk_size, packets, tracer, on_control)
+                    else:
+                        checksum_failures = _read_chunk(read, chunk_size, packets, on_control)
+                except lost_connection as e:
+                    lost = e
+                    lost_at: float = time.perf_counter()
+                read_at: int = time.perf_counter_ns() if triggers else 0
+
+                #timestamp.
+                batch = DataBatch(clock.stamp(len(packets)), packets) if packets else None
+
+                if traced_from is not None:
+                    tracer.record(tracing.TIMESTAMPED, time.perf_counter_ns()-traced_from)
+
+                #closed loop, before the chunk goes anywhere else.
+                if triggers and batch is not None:
+                    for trigger in triggers:
+                        trigger.process(batch, read_at)
+
+                if metrics is not None:
+                    metrics.record_chunk(batch, checksum_failures)
+                    metrics.update(bytes_waiting() if lost is None else 0)
+
+                if batch is not None:
+                    if traced_from is not None:
+                        tracer.record(tracing.ENQUEUED, time.perf_counter_ns()-traced_from)
+
+                    #fan-out.
+                    if metrics is None and traced_from is None:
+                        for _, flush in flushes:
+                            flush(batch)
+                    else:
+                        for sink_index, flush in flushes:
+                            flush_start: int = time.perf_counter_ns()
+                            flush(batch)
+                            flush_end: int = time.perf_counter_ns()
+
+                            if metrics is not None:
+                                metrics.record_flush(sink_index, flush_end-flush_start)
+                            if traced_from is not None:
+                                tracer.record(len(tracing.STAGES)+sink_index, flush_end-traced_from)
+
+                if lost is None:
+                    continue
+
+                #commands written before the device was lost may never be answered.
+                if commands:
+                    commands.fail(lost)
+
+                #supervision: get the device back, then tell the sinks what was missed.
+                if not reconnect(pod, reconnect_policy, lost, manual_stop_event):
+                    break
+                resumed: float = time.perf_counter()
+
+                #a stall is only noticed once the read times out, so data stopped arriving that long before.
+                lost_since: float = lost_at - stall_timeout if isinstance(lost, TimeoutError) else lost_at
+                gap = DataGap(start=clock.last_timestamp + int(10**9/clock.sample_rate),
+                              duration=int((resumed-lost_since)*10**9),
+                              sample_count=round((resumed-lost_since)*clock.sample_rate),
+                              cause=repr(lost),
+                              recovery_time=resumed-lost_at)
+
+                #samples after the gap are timestamped as if the missing ones had arrived.
+                clock.skip(gap.sample_count)
+
+                for _, _, flush_gap in attached.values():
+                    if flush_gap is not None:
+                        flush_gap(gap)
+
+                if metrics is not None:
+                    metrics.record_gap(gap)
+
+            if commands:
+                commands.fail(RuntimeError('Streaming stopped before the device responded.'))
+
+#longest a worker reading events waits for one, before checking whether to stop.
+_EVENT_POLL_SEC = 0.05
+
+#most events handed to sinks at once, when several arrive together.
+_MAX_EVENT_BATCH = 256
+
+def _get_events(duration: float, manual_stop_event: Event, pod: Pod8480SC, sinks, metrics: StreamMetrics | None,
+                control: Connection | None, start: StreamStart | None) -> None:
+    """Event source: each event packet is handed to the sinks as soon as it is read, in a batch of its own unless more
+    were already waiting, and timestamped by when its first byte arrived."""
+
+    bytes_waiting = pod.GetBytesWaiting
+
+    with ExitStack() as context_manager_stack:
+        attached, attach, detach = _sink_slots(context_manager_stack, metrics, None)
+
+        for slot, sink in enumerate(sinks):
+            attach(slot, sink)
+
+        flushes: list[tuple[int, Callable]] = [ (slot, flush) for slot, (_, flush, _) in attached.items() ]
+
+        #responses to commands are picked out from the events, like data packets are for other devices.
+        commands: PendingCommands | None = None if control is None else PendingCommands(control, pod)
+
+        if start is not None:
+            start.wait()
+
+        with pod:
+            clock = _ArrivalClock(None if start is None else start.time_base)
+            if start is not None:
+                start.started(time.perf_counter_ns())
+            stream_start_time: float = time.perf_counter()
+
+            while time.perf_counter()-stream_start_time < duration and not manual_stop_event.is_set():
+
+                if control is not None:
+                    if control.poll() and serve_control(control, pod, attach, detach, commands):
+                        flushes = [ (slot, flush) for slot, (_, flush, _) in attached.items() ]
+                    if commands:
+                        commands.expire()
+
+                timestamps: list[int] = []
+                events: list[ControlPacket] = []
+                try:
+                    #wait for one packet, then take whatever else has already arrived.
+                    timeout: float = _EVENT_POLL_SEC
+                    while len(events) < _MAX_EVENT_BATCH and (timeout or bytes_waiting()):
+                        packet, arrived, _ = pod.ReadPODpacketTimed(timeout_sec=timeout or _EVENT_POLL_SEC)
+                        timeout = 0
+                        if pod.IsEvent(packet):
+                            timestamps.append(clock.stamp(arrived))
+                            events.append(packet)
+                        elif commands is not None and isinstance(packet, ControlPacket):
+                            commands.resolve(packet)
+                except (TimeoutError, ChecksumError):
+                    pass
+
+                if not events:
+                    continue
+
+                batch = DataBatch(np.array(timestamps, dtype=np.int64), events)
+                for sink_index, flush in flushes:
+                    flush_start: int = time.perf_counter_ns()
+                    flush(batch)
+                    if metrics is not None:
+                        metrics.record_flush(sink_index, time.perf_counter_ns()-flush_start)
+
+            if commands:
+                commands.fail(RuntimeError('Streaming stopped before the device responded.'))
+
+def _get_data_rx(duration: float, manual_stop_event: Event, pod: AquisitionDevice, sinks) -> None:
+    _import_reactivex()
+
     device = rx.create(_stream_from_pod_device(pod, duration, manual_stop_event))
 
     data = device.pipe(
@@ -110,6 +500,79 @@ def get_data(duration: float, manual_stop_event: Event, pod: AquisitionDevice, s
 
         stream.connect()
 
-    global counter
+def check_streamable(pod: AquisitionDevice | Pod8480SC) -> None:
+    """Make sure data can be streamed from a device.
+
+    :param pod: Device to stream from.
+    :type pod: :class: AquisitionDevice | :class: Pod8480SC
+
+    :raises NotImplementedError: The device is an 8274D that was not opened with ``experimental_streaming=True``. The
+        layout of its data packets is unverified (see ``DataPacket8274D``), so its data may be recorded wrong.
+    """
+    if isinstance(pod, Pod8274D) and not pod.experimental_streaming:
+        raise NotImplementedError(f'Streaming from an 8274D ("{pod.device_name}") is experimental, since the layout of its data packets is unverified. '
+                                  'Open it with Pod8274D(..., experimental_streaming=True) to stream from it anyway.')
+
+def get_data(duration: float, manual_stop_event: Event, pod: AquisitionDevice | Pod8480SC, sinks, engine: str = 'lean', chunk_size: int | None = None,
+             metrics: StreamMetrics | None = None, tracer: StageTracer | None = None, control: Connection | None = None,
+             reconnect_policy: ReconnectPolicy | None = None, triggers: list[Trigger] | None = None, start: StreamStart | None = None) -> None: 
+    """Streams data from the POD device. The data drops about every 1 second.
+    Streaming will continue until a "stop streaming" packet is recieved. 
+
+    :param duration: How long to stream for, in seconds.
+    :type duration: float
+    :param manual_stop_event: Event that stops streaming early once set.
+    :type manual_stop_event: multiprocessing.Event
+    :param pod: Device to stream from. An 8480-SC is streamed from as an event source: each event it sends is handed to the
+        sinks as soon as it arrives, in a ``DataBatch`` of ``ControlPacket`` objects timestamped by when they arrived.
+    :type pod: :class: AquisitionDevice | :class: Pod8480SC
+    :param sinks: Sinks to send data to.
+    :type sinks: list[:class: SinkInterface]
+    :param engine: Pipeline used to move packets from the device to the sinks. ``'lean'`` (the default) works on chunks of packets
+        and hands them to ``SinkInterface.flush_batch``. ``'rx'`` is the original reactivex pipeline, which calls ``SinkInterface.flush``
+        once per packet and requires reactivex to be installed.
+    :type engine: str, optional
+    :param chunk_size: Number of packets read per chunk by the lean engine. Defaults to about a tenth of a second of samples.
+    :type chunk_size: int | None, optional
+    :param metrics: Where to record runtime metrics. Only the lean engine records metrics.
+    :type metrics: :class: StreamMetrics | None, optional
+    :param tracer: Where to record per-stage latencies of traced chunks. Tracing is off when this is None. Only the lean engine traces.
+    :type tracer: :class: StageTracer | None, optional
+    :param control: Worker's end of a control channel, used to attach and detach sinks and to send commands to the device while streaming
+        (see ``Morelia.Stream.control``). The sinks in `sinks` are attached in slots 0, 1, 2, ... Only the lean engine has a control channel.
+    :type control: multiprocessing.connection.Connection | None, optional
+    :param reconnect_policy: Supervise the stream: when the device stops sending data or its port fails, reconnect and keep streaming into
+        the same sinks, which are told about the gap through ``SinkInterface.flush_gap``. Without a policy, losing the device ends the stream
+        with an error. Only the lean engine reconnects.
+    :type reconnect_policy: :class: ReconnectPolicy | None, optional
+    :param triggers: Closed-loop triggers watching this device's data, run on each chunk before it is sent to the sinks
+        (see ``Morelia.Stream.closed_loop``). Only the lean engine runs triggers.
+    :type triggers: list[:class: Trigger] | None, optional
+    :param start: This device's part in starting several devices together, on one time base (see ``Morelia.Stream.sync``).
+        The device is started once every other one is ready, and its data is timestamped from when it was started. Only the
+        lean engine and event sources take part.
+    :type start: :class: StreamStart | None, optional
+
+    :raises NotImplementedError: The device is an 8274D that was not opened with ``experimental_streaming=True``.
+    """
+
+    try:
+        check_streamable(pod)
+
+        #event sources only send packets when something happens, so they are read a packet at a time with either engine.
+        if isinstance(pod, Pod8480SC):
+            _get_events(duration, manual_stop_event, pod, sinks, metrics, control, start)
+            return
 
-    print(pod.device_name, counter)
+        match engine:
+            case 'lean':
+                _get_data_lean(duration, manual_stop_event, pod, sinks, chunk_size, metrics, tracer, control, reconnect_policy, triggers or [], start)
+            case 'rx':
+                _get_data_rx(duration, manual_stop_event, pod, sinks)
+            case _:
+                raise ValueError(f'Unknown streaming engine "{engine}", must be "lean" or "rx".')
+    except BaseException:
+        #a device that fails before starting would otherwise keep every other one waiting for it.
+        if start is not None:
+            start.abort()
+        raise
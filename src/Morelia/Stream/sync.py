@@ -0,0 +1,171 @@
+"""Start streaming from several devices together, on one time base. Every worker gets ready to stream (sinks entered,
+triggers started), waits for the others at a barrier, and then writes ``STREAM 1`` at the same moment, picked by the
+last worker to arrive. When each device was actually started is recorded in shared memory, and every worker
+timestamps its data from one reference epoch, so recordings from several devices can be lined up sample by sample.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+#environment imports
+import multiprocessing as mp
+from multiprocessing.synchronize import Barrier
+import threading
+import time
+from functools import partial
+from typing import Self
+
+#how long before the scheduled start a waiting worker stops sleeping and spins, in ns. sleeping any closer to the
+#start could overshoot it by a scheduler tick.
+_SPIN_NS = 1_000_000
+
+class TimeBase:
+    """Reference epoch shared by every worker. The wall clock is read once, in the process that creates the time base,
+    and every later time is measured from it with the performance counter, which is the same monotonic clock in every
+    process on the machine. Timestamps from different workers are then on the same scale, whatever the wall clock
+    does while streaming.
+    """
+
+    def __init__(self) -> None:
+        self.epoch_ns: int = time.time_ns()
+        self.counter_ns: int = time.perf_counter_ns()
+
+    def to_epoch(self, counter_ns: int) -> int:
+        """Convert a time from the performance counter to nanoseconds since the epoch.
+
+        :param counter_ns: Time from ``time.perf_counter_ns``.
+        :type counter_ns: int
+
+        :return: Nanoseconds since the epoch.
+        :rtype: int
+        """
+        return self.epoch_ns + counter_ns - self.counter_ns
+
+    def now(self) -> int:
+        """Nanoseconds since the epoch, right now."""
+        return self.to_epoch(time.perf_counter_ns())
+
+def _schedule_start(times, lead_ns: int) -> None:
+    """Barrier action, run by the last worker to get ready: start everyone a little from now."""
+    times[0] = time.perf_counter_ns() + lead_ns
+
+class StreamStart:
+    """One device's part in starting a collection. Make them with ``StreamStart.create``, one per device, and hand
+    each to the worker of its device (see ``Morelia.Stream.source.get_data``).
+
+    :param time_base: Reference epoch shared by every device.
+    :type time_base: :class: TimeBase
+    :param times: Shared memory holding the scheduled start, then when each device started, from ``time.perf_counter_ns``.
+    :type times: multiprocessing.sharedctypes.RawArray
+    :param slot: Position of this device in `times`, after the scheduled start.
+    :type slot: int
+    :param barrier: Barrier every device waits at, or None to start as soon as ready.
+    :type barrier: multiprocessing.Barrier | None
+    :param timeout_sec: Longest to wait at the barrier for every other device to get ready.
+    :type timeout_sec: float
+    """
+
+    def __init__(self, time_base: TimeBase, times, slot: int, barrier: Barrier | None, timeout_sec: float) -> None:
+        self.time_base: TimeBase = time_base
+        self._times = times
+        self._slot: int = slot
+        self._barrier: Barrier | None = barrier
+        self._timeout_sec: float = timeout_sec
+
+    @classmethod
+    def create(cls, count: int, synchronized: bool = True, lead_sec: float = 0.005, timeout_sec: float = 30) -> list[Self]:
+        """Make the starts for every device in a collection.
+
+        :param count: Number of devices.
+        :type count: int
+        :param synchronized: Start every device together if True. Otherwise each starts as soon as it is ready, but start
+            times are still recorded, and timestamps still share one time base. Defaults to True.
+        :type synchronized: bool, optional
+        :param lead_sec: How long after the last device is ready the devices are started, so every waiting worker has
+            time to wake up. Defaults to 5 ms.
+        :type lead_sec: float, optional
+        :param timeout_sec: Longest a device waits for the others to get ready. Defaults to 30.
+        :type timeout_sec: float, optional
+
+        :return: One start per device, in order.
+        :rtype: list[:class: StreamStart]
+        """
+        #no lock: each slot has exactly one writer, and the scheduled start is written before anyone reads it.
+        times = mp.RawArray('q', 1 + count)
+        barrier: Barrier | None = None
+        if synchronized:
+            barrier = mp.Barrier(count, action=partial(_schedule_start, times, int(lead_sec * 10**9)))
+
+        time_base: TimeBase = TimeBase()
+        return [ cls(time_base, times, slot, barrier, timeout_sec) for slot in range(count) ]
+
+    # ------------ WORKER SIDE ------------
+
+    def wait(self) -> None:
+        """Wait for every other device to be ready, then until the moment they are all to start. Returns right away
+        if the start is not synchronized.
+
+        :raises RuntimeError: Another device failed before getting ready, or did not get ready in time.
+        """
+        if self._barrier is None:
+            return
+
+        try:
+            self._barrier.wait(self._timeout_sec)
+        except threading.BrokenBarrierError:
+            raise RuntimeError(f'Streaming did not start: another device failed, or was not ready within {self._timeout_sec} seconds.') from None
+
+        start: int = self._times[0]
+        remaining: int = start - time.perf_counter_ns()
+        if remaining > _SPIN_NS:
+            time.sleep((remaining - _SPIN_NS) / 10**9)
+        #yielding while spinning, so workers sharing a CPU don't hold it from each other.
+        while time.perf_counter_ns() < start:
+            time.sleep(0)
+
+    def started(self, counter_ns: int) -> int:
+        """Record when this device started streaming.
+
+        :param counter_ns: When ``STREAM 1`` was written, from ``time.perf_counter_ns``.
+        :type counter_ns: int
+
+        :return: The same time, in nanoseconds since the epoch of the shared time base, to timestamp data from.
+        :rtype: int
+        """
+        self._times[1 + self._slot] = counter_ns
+        return self.time_base.to_epoch(counter_ns)
+
+    def abort(self) -> None:
+        """Give up on starting, so the other devices stop waiting for this one rather than timing out."""
+        if self._barrier is not None:
+            self._barrier.abort()
+
+    # ------------ READER SIDE ------------
+
+    def start_time(self) -> int | None:
+        """When every device was to start, in nanoseconds since the epoch of the shared time base. Without a
+        synchronized start, when the first device started.
+
+        :return: The start time, or None until it is known.
+        :rtype: int | None
+        """
+        times: list[int] = list(self._times)
+        if self._barrier is not None:
+            reference: int = times[0]
+        else:
+            reference = min(( started for started in times[1:] if started ), default=0)
+        return self.time_base.to_epoch(reference) if reference else None
+
+    def offsets(self) -> list[float | None]:
+        """How long after the start time each device started streaming.
+
+        :return: For each device, in order, its offset in seconds, or None if it has not started yet.
+        :rtype: list[float | None]
+        """
+        start: int | None = self.start_time()
+        return [ None if not started or start is None else (self.time_base.to_epoch(started) - start) / 10**9
+                 for started in list(self._times)[1:] ]
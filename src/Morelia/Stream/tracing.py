@@ -0,0 +1,202 @@
+"""Opt-in latency tracing for streaming workers. A sample of chunks is stamped as it moves through each
+stage of the streaming pipeline, and the time from a chunk's first byte being read to the end of each stage
+is kept in a histogram in shared memory, so the parent process can produce a report at any time.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+#environment imports
+import multiprocessing as mp
+
+#local imports
+from Morelia.Stream.metrics import LATENCY_BUCKETS, _latency_bucket
+
+#stages a traced chunk passes through, in order. sinks are flushed after the last of these, and each sink gets its own stage.
+READ        = 0 #the first byte of the last packet in the chunk has been read from the serial port.
+FRAMED      = 1 #every packet in the chunk has been completely read and its checksum validated.
+DECODED     = 2 #packets have been classified, and anything that isn't data dropped.
+TIMESTAMPED = 3 #data packets have been timestamped.
+ENQUEUED    = 4 #the batch is built and ready to be handed to sinks.
+
+STAGES: tuple[str] = ('read', 'framed', 'decoded', 'timestamped', 'enqueued')
+
+#each stage gets a count, a sum (in ns), a max (in ns), and one slot per bucket.
+_STAGE_SIZE = 3 + len(LATENCY_BUCKETS)
+
+class StageTracer:
+    """Latency histograms for a single device being streamed from, kept in shared memory. Latencies are measured
+    with ``time.perf_counter_ns`` from the moment the first byte of a chunk's oldest packet is read from the serial
+    port, to the end of each stage of the pipeline (see ``STAGES``), and to the moment each sink finishes flushing
+    the chunk.
+
+    Only one in every ``sample_every`` chunks is traced, so tracing costs a few timer reads per traced chunk. When
+    tracing is off, no tracer is passed to the worker at all.
+
+    :param device_name: Name of the device being streamed from.
+    :type device_name: str
+
+    :param sink_names: Names of the sinks the device streams to.
+    :type sink_names: list[str]
+
+    :param sink_slots: Number of sinks to make room for, so sinks can be attached while streaming. Defaults to one slot per sink in `sink_names`.
+    :type sink_slots: int | None, optional
+
+    :param sample_every: Trace one chunk out of every ``sample_every``. Defaults to 1 (every chunk).
+    :type sample_every: int, optional
+    """
+
+    def __init__(self, device_name: str, sink_names: list[str], sample_every: int = 1, sink_slots: int | None = None) -> None:
+        if sample_every < 1:
+            raise ValueError('Must trace at least one out of every `sample_every` chunks, so it must be at least 1.')
+
+        sink_slots = max(len(sink_names), sink_slots or 0)
+
+        self._device_name: str = device_name
+        #None marks a free slot.
+        self._sink_names: list[str | None] = list(sink_names) + [None]*(sink_slots-len(sink_names))
+        self._sample_every: int = sample_every
+
+        #no lock: there is exactly one writer.
+        self._values = mp.RawArray('d', _STAGE_SIZE*(len(STAGES)+sink_slots))
+
+        #worker-local chunk counter.
+        self._chunks: int = 0
+
+    @property
+    def device_name(self) -> str:
+        return self._device_name
+
+    @property
+    def stage_names(self) -> list[str]:
+        """Names of the stages being traced, including one for each sink."""
+        return list(STAGES) + [ f'flushed:{name}' for name in self._sink_names if name is not None ]
+
+    def name_sink(self, slot: int, name: str | None) -> None:
+        """Label a sink slot in this process's view of the latencies. Pass None to free the slot.
+
+        :param slot: Slot of the sink.
+        :type slot: int
+        :param name: Name to report the sink's latencies under.
+        :type name: str | None
+        """
+        self._sink_names[slot] = name
+
+    # ------------ WORKER SIDE ------------
+
+    def should_trace(self) -> bool:
+        """Called by the worker once per chunk, before reading it.
+
+        :return: Whether to trace the next chunk.
+        :rtype: bool
+        """
+        self._chunks += 1
+        return self._chunks % self._sample_every == 0
+
+    def record(self, stage: int, latency_ns: int) -> None:
+        """Record the latency of a traced chunk at the end of a stage.
+
+        :param stage: Index of the stage in ``STAGES``. The sink in slot ``i`` is stage ``len(STAGES)+i``.
+        :type stage: int
+        :param latency_ns: Time since the first byte of the chunk was read, in nanoseconds.
+        :type latency_ns: int
+        """
+        offset: int = stage*_STAGE_SIZE
+        values = self._values
+
+        values[offset] += 1
+        values[offset+1] += latency_ns
+        if latency_ns > values[offset+2]:
+            values[offset+2] = latency_ns
+        values[offset+3+_latency_bucket(latency_ns)] += 1
+
+    def reset_sink(self, slot: int) -> None:
+        """Clear a sink slot's latency histogram, before a new sink starts using it.
+
+        :param slot: Slot of the sink.
+        :type slot: int
+        """
+        offset: int = (len(STAGES)+slot)*_STAGE_SIZE
+        self._values[offset:offset+_STAGE_SIZE] = [0.0]*_STAGE_SIZE
+
+    # ------------ READER SIDE ------------
+
+    def snapshot(self) -> dict[str, dict]:
+        """Read the current latency histograms.
+
+        :return: For each stage (in pipeline order), the number of traced chunks, the mean and max latency in seconds,
+            and histogram buckets as ``(upper bound in seconds, count)`` pairs.
+        :rtype: dict[str, dict]
+        """
+        values = list(self._values)
+        stages: dict[str, dict] = {}
+
+        names: list[str | None] = list(STAGES) + [ None if name is None else f'flushed:{name}' for name in self._sink_names ]
+
+        for idx, name in enumerate(names):
+            if name is None:
+                continue
+            offset: int = idx*_STAGE_SIZE
+            count: int = int(values[offset])
+            stages[name] = {
+                'count'        : count,
+                'mean_seconds' : values[offset+1] / count / 10**9 if count else 0.0,
+                'max_seconds'  : values[offset+2] / 10**9,
+                'buckets'      : [ (bound, int(n)) for bound, n in zip(LATENCY_BUCKETS, values[offset+3:offset+_STAGE_SIZE]) ],
+            }
+
+        return stages
+
+def latency_percentile(buckets: list[tuple[float, int]], percentile: float) -> float:
+    """Estimate a percentile from a latency histogram. The estimate is the upper bound of the bucket the percentile
+    falls in, so it is never lower than the true value.
+
+    :param buckets: Histogram buckets as ``(upper bound in seconds, count)`` pairs, as found in ``StageTracer.snapshot``.
+    :type buckets: list[tuple[float, int]]
+    :param percentile: Percentile to estimate, from 0 to 100.
+    :type percentile: float
+
+    :return: Upper bound on the percentile, in seconds. NaN if the histogram is empty.
+    :rtype: float
+    """
+    total: int = sum(count for _, count in buckets)
+    if total == 0:
+        return float('nan')
+
+    target: float = total*percentile/100
+    cumulative: int = 0
+    for bound, count in buckets:
+        cumulative += count
+        if cumulative >= target:
+            return bound
+
+    return buckets[-1][0]
+
+def format_trace_report(snapshots: dict[str, dict[str, dict]]) -> str:
+    """Format latency snapshots as a plain text table, one block per device.
+
+    :param snapshots: Snapshots keyed by device name, as returned by ``DataFlow.traces``.
+    :type snapshots: dict[str, dict[str, dict]]
+
+    :return: The report.
+    :rtype: str
+    """
+
+    as_ms = lambda seconds: '>max' if seconds == float('inf') else f'{seconds*1000:.3f}'
+
+    lines: list[str] = []
+    for device, stages in snapshots.items():
+        lines.append(f'{device}: latency from first byte read to end of stage, in ms (percentiles are rounded up to a histogram bucket)')
+        lines.append(f'{"stage":<30}{"chunks":>10}{"mean":>10}{"p50":>10}{"p90":>10}{"p99":>10}{"max":>10}')
+
+        for stage, latency in stages.items():
+            percentiles: list[str] = [ as_ms(latency_percentile(latency['buckets'], p)) if latency['count'] else '-' for p in (50, 90, 99) ]
+            lines.append(f'{stage:<30}{latency["count"]:>10}{as_ms(latency["mean_seconds"]):>10}'
+                         + ''.join(f'{p:>10}' for p in percentiles) + f'{as_ms(latency["max_seconds"]):>10}')
+        lines.append('')
+
+    return '\n'.join(lines)
@@ -1,7 +1,13 @@
-# package access
-from Morelia import Commands
-from Morelia import packet
-from Morelia import signal
-from Morelia import Devices
-from Morelia import Parameters
-from Morelia import Stream
+# package access. subpackages are imported the first time they are used (see Morelia._lazy), so that, for example,
+# a script that only talks to an 8229 does not pay for importing the streaming sinks and their dependencies.
+from Morelia._lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'Commands'   : None,
+    'packet'     : None,
+    'signal'     : None,
+    'Devices'    : None,
+    'Parameters' : None,
+    'Stream'     : None,
+    'testing'    : None,
+})
@@ -0,0 +1,54 @@
+"""Lazy package exports (PEP 562), so importing a package does not import everything in it.
+
+Importing the streaming sinks alone pulls in InfluxDB's client, pyEDFlib and NumPy; a package's ``__init__`` lists
+what it exports instead, and each name is imported the first time it is used::
+
+    __getattr__, __dir__, __all__ = lazy_exports(__name__, {
+        'CSVSink' : 'Morelia.Stream.sink.csv_sink',
+        'sink'    : None,                       # a subpackage or submodule
+    })
+
+``from package import name`` and ``package.name`` then work just as if the name had been imported eagerly.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import importlib
+import sys
+from typing import Any, Callable
+
+def lazy_exports(package: str, exports: dict[str, str | None]) -> tuple[Callable[[str], Any], Callable[[], list[str]], list[str]]:
+    """Module ``__getattr__`` and ``__dir__`` functions, and ``__all__``, for a package whose exports are imported on
+    first use.
+
+    :param package: Name of the package (its ``__name__``).
+    :type package: str
+
+    :param exports: Each name the package exports, and the module it is defined in, or None if the name is a
+        subpackage or submodule of the package.
+    :type exports: dict[str, str | None]
+
+    :return: ``__getattr__``, ``__dir__`` and ``__all__``.
+    :rtype: tuple
+    """
+
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f'module {package!r} has no attribute {name!r}')
+
+        module_name: str | None = exports[name]
+        value = importlib.import_module(f'{package}.{name}') if module_name is None else getattr(importlib.import_module(module_name), name)
+
+        #cache it in the package, so this is only called once per name.
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted(set(vars(sys.modules[package])) | set(exports))
+
+    return __getattr__, __dir__, list(exports)
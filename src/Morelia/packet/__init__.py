@@ -1,8 +1,13 @@
-import Morelia.packet.conversion
-
-from Morelia.packet.pod_packet import PodPacket
-from Morelia.packet.channel_mode import PrimaryChannelMode, SecondaryChannelMode
-from Morelia.packet.control_packet import ControlPacket
-
-import Morelia.packet.data
+# module access, imported on first use (see Morelia._lazy).
+from Morelia._lazy import lazy_exports
 
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'PodPacket'            : 'Morelia.packet.pod_packet',
+    'PrimaryChannelMode'   : 'Morelia.packet.channel_mode',
+    'SecondaryChannelMode' : 'Morelia.packet.channel_mode',
+    'ControlPacket'        : 'Morelia.packet.control_packet',
+    # sub-module and sub-package access
+    'conversion'           : None,
+    'data'                 : None,
+    'legacy'               : None,
+})
@@ -1,3 +1,11 @@
-from Morelia.packet.data.data_packet import DataPacket
-from Morelia.packet.data.data_packet_8206hr import DataPacket8206HR
-from Morelia.packet.data.data_packet_8401hr import DataPacket8401HR
+# module access, imported on first use (see Morelia._lazy). the data packets and batches need NumPy.
+from Morelia._lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'DataPacket'       : 'Morelia.packet.data.data_packet',
+    'DataPacket8206HR' : 'Morelia.packet.data.data_packet_8206hr',
+    'DataPacket8401HR' : 'Morelia.packet.data.data_packet_8401hr',
+    'DataPacket8274D'  : 'Morelia.packet.data.data_packet_8274d',
+    'DataBatch'        : 'Morelia.packet.data.data_batch',
+    'DataGap'          : 'Morelia.packet.data.data_gap',
+})
@@ -0,0 +1,105 @@
+from typing import Callable
+
+import numpy as np
+
+from Morelia.packet.data.data_packet import DataPacket
+
+class DataBatch:
+    """A chunk of consecutive, timestamped data packets read from a single device. Batches are what
+    the streaming pipeline hands to sinks, so that per-packet work (dispatch, formatting, writing) can
+    be amortized over a whole chunk.
+
+    :param timestamps: Timestamp (in nanoseconds since the epoch) of each packet, in order.
+    :type timestamps: numpy.ndarray[numpy.int64]
+
+    :param packets: Data packets, in the order they were read from the device.
+    :type packets: list[DataPacket]
+    """
+
+    __slots__ = ('_timestamps', '_packets', '_raw', '_make_packet')
+    def __init__(self, timestamps: np.ndarray, packets: list[DataPacket]) -> None:
+        if len(timestamps) != len(packets):
+            raise ValueError('A batch must have exactly one timestamp per packet.')
+
+        self._timestamps = timestamps
+        self._packets = packets
+        self._raw = None
+        self._make_packet = None
+
+    @classmethod
+    def from_raw(cls, timestamps: np.ndarray, raw: np.ndarray, make_packet: Callable[[bytes], DataPacket]) -> 'DataBatch':
+        """A batch of packets that have not been parsed yet, such as ones read back from an archive. Batch decoders
+        only need the raw bytes, so packet objects are only made if something asks for them.
+
+        :param timestamps: Timestamp (in nanoseconds since the epoch) of each packet, in order.
+        :type timestamps: numpy.ndarray[numpy.int64]
+
+        :param raw: Raw packets, with shape (number of packets, packet length).
+        :type raw: numpy.ndarray[numpy.uint8]
+
+        :param make_packet: Makes a packet object from a packet's raw bytes.
+        :type make_packet: Callable[[bytes], DataPacket]
+
+        :return: The batch.
+        :rtype: DataBatch
+        """
+        if len(timestamps) != len(raw):
+            raise ValueError('A batch must have exactly one timestamp per packet.')
+
+        batch = cls.__new__(cls)
+        batch._timestamps = timestamps
+        batch._packets = None
+        batch._raw = raw
+        batch._make_packet = make_packet
+        return batch
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps
+
+    @property
+    def packets(self) -> list[DataPacket]:
+        if self._packets is None:
+            self._packets = [ self._make_packet(packet) for packet in map(bytes, self._raw) ]
+        return self._packets
+
+    def raw(self) -> np.ndarray:
+        """The raw bytes of every packet, one packet per row, for decoding a whole batch at once. Every packet
+        in a batch comes from the same device, so they all have the same length. Built on first use and shared
+        by every sink the batch is sent to.
+
+        :return: Raw packets, with shape (number of packets, packet length).
+        :rtype: numpy.ndarray[numpy.uint8]
+        """
+        if self._raw is None:
+            self._raw = np.frombuffer(b''.join([ packet.raw_packet for packet in self._packets ]), dtype=np.uint8).reshape(len(self._packets), -1)
+        return self._raw
+
+    def __getitem__(self, index: slice) -> 'DataBatch':
+        """A batch of consecutive packets from this one. Raw bytes already built for this batch are shared.
+
+        :param index: Packets to take.
+        :type index: slice
+
+        :return: The smaller batch.
+        :rtype: DataBatch
+        """
+        if not isinstance(index, slice):
+            raise TypeError('Batches can only be indexed with slices; iterate over a batch to get individual packets.')
+
+        if self._packets is None:
+            return DataBatch.from_raw(self._timestamps[index], self._raw[index], self._make_packet)
+
+        batch = DataBatch(self._timestamps[index], self._packets[index])
+        if self._raw is not None:
+            batch._raw = self._raw[index]
+        return batch
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def __iter__(self):
+        """Iterate over ``(timestamp, packet)`` pairs, with timestamps as python integers so they behave
+        exactly like the timestamps passed to ``SinkInterface.flush``.
+        """
+        return zip(self._timestamps.tolist(), self.packets)
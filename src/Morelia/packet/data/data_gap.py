@@ -0,0 +1,56 @@
+class DataGap:
+    """A stretch of time in which no data was received from a device, because the connection to it was lost
+    and had to be re-established. Sinks get one of these in place of the missing samples, so that timestamps
+    on either side of the gap stay correct.
+
+    :param start: Timestamp (in nanoseconds since the epoch) the first missing sample would have had.
+    :type start: int
+
+    :param duration: How long no data was received for, in nanoseconds.
+    :type duration: int
+
+    :param sample_count: Number of samples missing, estimated from the duration and sample rate.
+    :type sample_count: int
+
+    :param cause: Description of what went wrong, such as the error raised when reading from the device.
+    :type cause: str
+
+    :param recovery_time: Seconds from noticing the problem to streaming again.
+    :type recovery_time: float
+    """
+
+    __slots__ = ('_start', '_duration', '_sample_count', '_cause', '_recovery_time')
+    def __init__(self, start: int, duration: int, sample_count: int, cause: str, recovery_time: float) -> None:
+        self._start = start
+        self._duration = duration
+        self._sample_count = sample_count
+        self._cause = cause
+        self._recovery_time = recovery_time
+
+    @property
+    def start(self) -> int:
+        return self._start
+
+    @property
+    def end(self) -> int:
+        """Timestamp of the first sample after the gap."""
+        return self._start + self._duration
+
+    @property
+    def duration(self) -> int:
+        return self._duration
+
+    @property
+    def sample_count(self) -> int:
+        return self._sample_count
+
+    @property
+    def cause(self) -> str:
+        return self._cause
+
+    @property
+    def recovery_time(self) -> float:
+        return self._recovery_time
+
+    def __repr__(self) -> str:
+        return f'DataGap(start={self._start}, duration={self._duration}, sample_count={self._sample_count}, cause={self._cause!r})'
@@ -1,3 +1,5 @@
+import numpy as np
+
 from Morelia.packet.data.data_packet import DataPacket
 from Morelia.signal import DigitalSignal
 
@@ -70,3 +72,39 @@ class DataPacket8206HR(DataPacket):
         real_voltage = ( voltage_adc - 2.048 ) / total_gain
         return round(real_voltage * 1E6, 12)
 
+    @staticmethod
+    def channel_codes(raw: np.ndarray) -> np.ndarray:
+        """Raw ADC values of the primary channels of many packets at once.
+
+        :param raw: Raw packets, one per row, as returned by ``DataBatch.raw``.
+        :type raw: numpy.ndarray[numpy.uint8]
+
+        :return: Unsigned 16 bit ADC values, with one row per packet and one column per channel (ch0, ch1, ch2).
+        :rtype: numpy.ndarray[numpy.uint16]
+        """
+        return np.ascontiguousarray(raw[:, 7:13]).view('<u2')
+
+    @staticmethod
+    def ttl_bits(raw: np.ndarray) -> np.ndarray:
+        """TTL inputs of many packets at once.
+
+        :param raw: Raw packets, one per row, as returned by ``DataBatch.raw``.
+        :type raw: numpy.ndarray[numpy.uint8]
+
+        :return: 0 or 1 for each TTL input, with one row per packet and one column per input (ttl1, ttl2, ttl3, ttl4).
+        :rtype: numpy.ndarray[numpy.uint8]
+        """
+        return (raw[:, 6, None] >> np.array([7, 6, 5, 4], dtype=np.uint8)) & 1
+
+    @staticmethod
+    def channel_scale(preamp_gain: int) -> tuple[float, float]:
+        """Linear conversion from the raw ADC value of a primary channel to microvolts, as done by ``get_primary_channel_value``.
+
+        :param preamp_gain: Gain of the preamplifier, 10 or 100.
+        :type preamp_gain: int
+
+        :return: ``(scale, offset)``, such that microvolts = ADC value * scale + offset.
+        :rtype: tuple[float, float]
+        """
+        total_gain = preamp_gain * 50.2918
+        return 4.096 / 65535.0 / total_gain * 1E6, -2.048 / total_gain * 1E6
@@ -0,0 +1,94 @@
+import numpy as np
+
+from Morelia.packet.data.data_packet import DataPacket
+
+import Morelia.packet.conversion as conv
+
+class DataPacket8274D(DataPacket):
+    """One sample from the remote device connected to an 8274D, as forwarded by the receiver.
+
+    .. warning::
+        The layout of these packets and the gain of the remote device are **unverified placeholders**: there is no
+        specification of the 8274D's stream packets to check them against. The layout is borrowed from the 8206-HR's
+        Binary4 packets, with the connection slot the sample came from in place of the TTL byte, and three 16 bit
+        channels (EEG1, EEG2 and EMG). The simulated 8274D sends packets in this same layout, so it cannot confirm it.
+        Until the layout and gain are confirmed against the firmware, streaming from an 8274D is only done when it is
+        opened with ``experimental_streaming=True``, channels are given as raw ADC codes, and the sinks record them
+        uncalibrated (or, for ``CSVSink``, as the packets' bytes).
+    """
+
+    # UNVERIFIED: byte offsets of the fields, borrowed from the 8206-HR's Binary4 packet. see _Read_Binary() of Pod8274D.
+    PACKET_NUMBER_BYTE: int = 5
+    CONNECTION_BYTE: int = 6
+    CHANNEL_BYTES: slice = slice(7, 13)
+
+    # UNVERIFIED: placeholder for the gain of the remote device's front end, only used by ``channel_scale``.
+    GAIN: float = 500.0
+
+    __slots__ = ('_ch0', '_ch1', '_ch2')
+    def __init__(self, raw_packet: bytes) -> None:
+        super().__init__(raw_packet, 16)
+
+        self._ch0 = None
+        self._ch1 = None
+        self._ch2 = None
+
+    @property
+    def packet_number(self) -> int:
+        return self._raw_packet[DataPacket8274D.PACKET_NUMBER_BYTE]
+
+    @property
+    def connection(self) -> int:
+        """Connection slot (0-3) of the remote device the sample came from."""
+        return self._raw_packet[DataPacket8274D.CONNECTION_BYTE]
+
+    @property
+    def ch0(self) -> int:
+        """Raw ADC code of channel 0 (EEG1)."""
+        if self._ch0 is None:
+            self._ch0 = DataPacket8274D.get_channel_value(self._channel_bytes(0))
+        return self._ch0
+
+    @property
+    def ch1(self) -> int:
+        """Raw ADC code of channel 1 (EEG2)."""
+        if self._ch1 is None:
+            self._ch1 = DataPacket8274D.get_channel_value(self._channel_bytes(1))
+        return self._ch1
+
+    @property
+    def ch2(self) -> int:
+        """Raw ADC code of channel 2 (EMG)."""
+        if self._ch2 is None:
+            self._ch2 = DataPacket8274D.get_channel_value(self._channel_bytes(2))
+        return self._ch2
+
+    def _channel_bytes(self, channel: int) -> bytes:
+        start: int = DataPacket8274D.CHANNEL_BYTES.start + 2*channel
+        return self._raw_packet[start:start+2]
+
+    @staticmethod
+    def get_channel_value(raw_value: bytes) -> int:
+        return conv.binary_bytes_to_int(raw_value, conv.Endianness.LITTLE)
+
+    @staticmethod
+    def channel_codes(raw: np.ndarray) -> np.ndarray:
+        """Raw ADC values of the channels of many packets at once.
+
+        :param raw: Raw packets, one per row, as returned by ``DataBatch.raw``.
+        :type raw: numpy.ndarray[numpy.uint8]
+
+        :return: Unsigned 16 bit ADC values, with one row per packet and one column per channel (ch0, ch1, ch2).
+        :rtype: numpy.ndarray[numpy.uint16]
+        """
+        return np.ascontiguousarray(raw[:, DataPacket8274D.CHANNEL_BYTES]).view('<u2')
+
+    @staticmethod
+    def channel_scale() -> tuple[float, float]:
+        """Linear conversion from the raw ADC value of a channel to microvolts, assuming the ADC spans 4.096 V,
+        centered on 0. **Unverified**: this uses the placeholder ``GAIN``, so the sinks do not use it.
+
+        :return: ``(scale, offset)``, such that microvolts = ADC value * scale + offset.
+        :rtype: tuple[float, float]
+        """
+        return 4.096 / 65535.0 / DataPacket8274D.GAIN * 1E6, -2.048 / DataPacket8274D.GAIN * 1E6
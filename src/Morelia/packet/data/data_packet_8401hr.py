@@ -1,3 +1,5 @@
+import numpy as np
+
 from Morelia.packet.data.data_packet import DataPacket
 from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
 from Morelia.signal import DigitalSignal
@@ -144,4 +146,65 @@ class DataPacket8401HR(DataPacket):
 
         raise ValueError('Inavlid channel mode!')
 
+    @staticmethod
+    def channel_codes(raw: np.ndarray) -> np.ndarray:
+        """Raw ADC values of the primary channels of many packets at once.
+
+        :param raw: Raw packets, one per row, as returned by ``DataBatch.raw``.
+        :type raw: numpy.ndarray[numpy.uint8]
+
+        :return: Unsigned 18 bit ADC values, with one row per packet and one column per channel (ch0, ch1, ch2, ch3).
+        :rtype: numpy.ndarray[numpy.int32]
+        """
+        #the four channels are packed into bytes 7-15, most significant bit first, from ch3 down to ch0.
+        b = raw[:, 7:16].astype(np.int32)
+        codes = np.empty((len(raw), 4), dtype=np.int32)
+        codes[:, 3] = (b[:, 0] << 10) | (b[:, 1] << 2) | (b[:, 2] >> 6)
+        codes[:, 2] = ((b[:, 2] & 0x3F) << 12) | (b[:, 3] << 4) | (b[:, 4] >> 4)
+        codes[:, 1] = ((b[:, 4] & 0x0F) << 14) | (b[:, 5] << 6) | (b[:, 6] >> 2)
+        codes[:, 0] = ((b[:, 6] & 0x03) << 16) | (b[:, 7] << 8) | b[:, 8]
+        return codes
+
+    @staticmethod
+    def secondary_bits(raw: np.ndarray) -> np.ndarray:
+        """Secondary channels of many packets at once, for channels in digital mode.
+
+        :param raw: Raw packets, one per row, as returned by ``DataBatch.raw``.
+        :type raw: numpy.ndarray[numpy.uint8]
+
+        :return: 0 or 1 for each channel, with one row per packet and one column per channel (ext0, ext1, ttl1, ttl2, ttl3, ttl4).
+        :rtype: numpy.ndarray[numpy.uint8]
+        """
+        return (raw[:, 6, None] >> np.array([7, 6, 0, 1, 2, 3], dtype=np.uint8)) & 1
+
+    @staticmethod
+    def secondary_codes(raw: np.ndarray) -> np.ndarray:
+        """Secondary channels of many packets at once, for channels in analog mode.
+
+        :param raw: Raw packets, one per row, as returned by ``DataBatch.raw``.
+        :type raw: numpy.ndarray[numpy.uint8]
+
+        :return: Raw analog values, with one row per packet and one column per channel (ext0, ext1, ttl1, ttl2, ttl3, ttl4).
+        :rtype: numpy.ndarray[numpy.uint16]
+        """
+        return np.ascontiguousarray(raw[:, 16:28]).view('>u2').astype(np.uint16)
+
+    @staticmethod
+    def primary_channel_scale(channel_mode: PrimaryChannelMode, preamp_gain: int, ss_gain: int) -> tuple[float, float]:
+        """Linear conversion from the raw ADC value of a primary channel to microvolts, as done by ``get_primary_channel_value``.
+
+        :return: ``(scale, offset)``, such that microvolts = ADC value * scale + offset.
+        :rtype: tuple[float, float]
+        """
+        match channel_mode:
+            case PrimaryChannelMode.EEG_EMG:
+                total_gain = 10.0 * ss_gain * preamp_gain
+            case PrimaryChannelMode.BIOSENSOR:
+                total_gain = 1.557 * ss_gain * 1E7
+            case _:
+                raise ValueError('Inavlid channel mode!')
+
+        return 4.096 / 262144.0 / total_gain * 1E6, -2.048 / total_gain * 1E6
 
+    #linear conversion from the raw value of a secondary channel in analog mode to microvolts, as done by ``get_secondary_channel_value``.
+    SECONDARY_CHANNEL_SCALE: tuple[float, float] = (3.3 / 4096.0 * 1E6, 0.0)
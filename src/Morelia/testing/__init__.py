@@ -0,0 +1,24 @@
+"""Stand-ins for hardware and servers, for testing and benchmarking Morelia without any attached.
+
+* ``protocol_sim``: simulated POD devices, opened with ``sim://`` URLs in place of a port name, once
+  ``enable_simulated_devices`` has been called.
+* ``influx_sim``: a stand-in for an InfluxDB server.
+
+Nothing here is used by the rest of Morelia, and importing Morelia does not import it.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+def enable_simulated_devices() -> None:
+    """Let devices be opened on ``sim://`` URLs (see ``Morelia.testing.protocol_sim``), by adding this package to
+    pyserial's ``serial.protocol_handler_packages``. Calling it again does nothing.
+    """
+    import serial
+
+    if __name__ not in serial.protocol_handler_packages:
+        serial.protocol_handler_packages.append(__name__)
@@ -0,0 +1,92 @@
+"""A stand-in for an InfluxDB server, for testing and benchmarking network sinks without a database.
+
+The stand-in accepts writes on the same HTTP endpoint InfluxDB 2 does (``POST /api/v2/write``), gzip compressed or
+not, and keeps every line it receives::
+
+    with InfluxStandIn() as server:
+        with InfluxSink(server.url, 'token', 'org', 'bucket', 'eeg', pod) as sink:
+            ...
+        print(len(server.lines), server.bytes_received)
+
+It can be stopped and started again on the same port, to test how sinks cope with a server going away.
+"""
+
+__author__      = 'James Hurd'
+__maintainer__  = 'James Hurd'
+__credits__     = ['James Hurd', 'Sam Groth', 'Thresa Kelly', 'Seth Gabbert']
+__license__     = 'New BSD License'
+__copyright__   = 'Copyright (c) 2024, James Hurd'
+__email__       = 'sales@pinnaclet.com'
+
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Self
+
+class InfluxStandIn:
+    """Minimal InfluxDB 2 write endpoint, served from a background thread.
+
+    :param port: Port to listen on, or 0 to pick a free one. Defaults to 0.
+    :type port: int, optional
+    """
+
+    def __init__(self, port: int = 0) -> None:
+        """Class constructor."""
+        self._port: int = port
+        self._server: ThreadingHTTPServer | None = None
+        self._lock = threading.Lock()
+
+        self.lines: list[str] = []
+        self.requests: int = 0
+        self.bytes_received: int = 0
+        self.compressed_requests: int = 0
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._port}'
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def start(self) -> None:
+        """Start listening. The port is kept between restarts."""
+        stand_in = self
+
+        class WriteHandler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body: bytes = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                compressed: bool = self.headers.get('Content-Encoding') == 'gzip'
+                text: str = (gzip.decompress(body) if compressed else body).decode('utf-8')
+
+                with stand_in._lock:
+                    stand_in.requests += 1
+                    stand_in.bytes_received += len(body)
+                    stand_in.compressed_requests += compressed
+                    stand_in.lines.extend(line for line in text.split('\n') if line)
+
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args) -> None:
+                pass
+
+        ThreadingHTTPServer.allow_reuse_address = True
+        self._server = ThreadingHTTPServer(('127.0.0.1', self._port), WriteHandler)
+        self._port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, kwargs={ 'poll_interval' : 0.05 }, daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop listening, refusing any new connections."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.stop()
+        return False
@@ -0,0 +1,534 @@
+"""Simulated POD devices, for testing and benchmarking without any hardware attached.
+
+A simulated device is opened like any other serial port, with a URL in place of a port name::
+
+    pod = Pod8206HR('sim://8206hr/rig1?sample_rate=2000', 10)
+
+The URL is ``sim://<model>[/<name>][?<option>=<value>&...]``, where model is one of ``MODELS``. The model and name
+identify the simulated hardware, so closing and reopening the same URL (in the same process) reconnects to the
+same device. Options only take effect when the device is first opened:
+
+* ``sample_rate``: Sample rate the device powers on with, in Hz.
+* ``realtime``: ``1`` (the default) to send data packets at the sample rate, ``0`` to send them as fast as they are read.
+* ``latency``: Seconds the device takes to respond to each command, 0 by default. A real device at 9600 baud takes
+  around 10 ms.
+* ``unplug_at``, ``unplug_for``: Seconds after the device is first opened to unplug it, and for how long. While
+  unplugged, the port raises ``SerialException`` and cannot be reopened. Plugging back in resets the device,
+  like cutting its power.
+* ``stall_at``, ``stall_for``: Seconds after the device is first opened to stop responding, and for how long. The
+  port stays open but the device sends nothing, and any data it should have sent is lost.
+* ``ttl_event_rate``: 8480-SC only. TTL input events the device sends per second, 0 by default.
+
+pyserial finds this module through ``serial.protocol_handler_packages``, which
+``Morelia.testing.enable_simulated_devices`` adds this package to.
+"""
+
+# enviornment imports
+import time
+import urllib.parse
+
+import numpy as np
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError, to_bytes
+
+# authorship
+__author__      = "James Hurd"
+__maintainer__  = "James Hurd"
+__credits__     = ["James Hurd", "Thresa Kelly", "Seth Gabbert"]
+__license__     = "New BSD License"
+__copyright__   = "Copyright (c) 2024, James Hurd"
+__email__       = "sales@pinnaclet.com"
+
+STX: int = 0x02
+ETX: int = 0x03
+
+# ASCII hex digits, for vectorized checksums.
+_HEX = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+
+def _ascii_hex(value: int, num_chars: int) -> bytes :
+    return(f'{value & (16**num_chars - 1):0{num_chars}X}'.encode('ascii'))
+
+def _standard_packet(command_number: int, payload: bytes = b'') -> bytes :
+    body: bytes = _ascii_hex(command_number, 4) + payload
+    return(bytes([STX]) + body + _ascii_hex(~sum(body), 2) + bytes([ETX]))
+
+
+class SimulatedPod :
+    """Firmware of a simulated POD device. Subclasses describe the data packets of a particular model.
+
+    Args:
+        sample_rate (int | None, optional): Sample rate the device powers on with, in Hz. Defaults to \
+            the model's default sample rate.
+        realtime (bool, optional): Send data packets at the sample rate if True, or as fast as they \
+            are read if False. Defaults to True.
+        unplug_at (float | None, optional): Seconds after creation to unplug the device. Defaults to None (never).
+        unplug_for (float, optional): Seconds to stay unplugged. Defaults to 0.
+        stall_at (float | None, optional): Seconds after creation to stop responding. Defaults to None (never).
+        stall_for (float, optional): Seconds to stay unresponsive. Defaults to 0.
+        latency (float, optional): Seconds taken to respond to each command. Defaults to 0.
+    """
+
+    DATA_COMMAND: int = None
+    PACKET_LENGTH: int = None
+    DEFAULT_SAMPLE_RATE: int = 1000
+    # commands that get and set the sample rate in Hz, or None if the model has no such commands.
+    GET_SAMPLE_RATE: int|None = 100
+    SET_SAMPLE_RATE: int|None = 101
+
+    # number of ASCII hex characters in the response payload of commands answered with one. every other
+    # command is answered with just its command number, and STREAM is echoed.
+    RESPONSE_CHARS: dict[int,int] = { 4 : 2, 8 : 2, 12 : 8, 100 : 4 }
+
+    # packets generated at a time when not running in realtime.
+    _BURST: int = 256
+
+    def __init__(self, sample_rate: int|None = None, realtime: bool = True,
+                 unplug_at: float|None = None, unplug_for: float = 0,
+                 stall_at: float|None = None, stall_for: float = 0, latency: float = 0) -> None :
+        self._power_on_sample_rate: int = int(sample_rate) if sample_rate else self.DEFAULT_SAMPLE_RATE
+        self.realtime: bool = realtime
+        self._created: float = time.perf_counter()
+
+        self.unplug_at: float|None = unplug_at
+        self.unplug_for: float = unplug_for
+        self.stall_at: float|None = stall_at
+        self.stall_for: float = stall_for
+        self.latency: float = latency
+        # commands the device has answered, over its lifetime.
+        self.commands_handled: int = 0
+
+        self._power_on()
+
+    def _power_on(self) -> None :
+        self.sample_rate: int = self._power_on_sample_rate
+        self.streaming: bool = False
+        self.packets_sent: int = 0
+        self._stream_start: float = 0.0
+        self._powered: bool = True
+
+    # ------------ FAULTS ------------
+
+    def _now(self) -> float :
+        return(time.perf_counter() - self._created)
+
+    def unplug(self, duration: float) -> None :
+        """Unplug the device now, for `duration` seconds."""
+        self.unplug_at, self.unplug_for = self._now(), duration
+
+    def stall(self, duration: float) -> None :
+        """Make the device stop responding now, for `duration` seconds."""
+        self.stall_at, self.stall_for = self._now(), duration
+
+    @property
+    def plugged_in(self) -> bool :
+        now: float = self._now()
+        plugged: bool = self.unplug_at is None or not (self.unplug_at <= now < self.unplug_at + self.unplug_for)
+        # losing power stops streaming and forgets all settings.
+        if(not plugged) :
+            self._powered = False
+        elif(not self._powered) :
+            self._power_on()
+        return(plugged)
+
+    @property
+    def stalled(self) -> bool :
+        now: float = self._now()
+        return(self.stall_at is not None and self.stall_at <= now < self.stall_at + self.stall_for)
+
+    # ------------ COMMUNICATION ------------
+
+    def handle(self, packet: bytes) -> bytes :
+        """Respond to a standard POD packet sent by the host.
+
+        Args:
+            packet (bytes): Complete packet, STX to ETX.
+
+        Returns:
+            bytes: Response packet, or nothing if the device is not responding.
+        """
+        if(self.stalled) :
+            return(b'')
+        try :
+            command: int = int(packet[1:5], 16)
+        except ValueError :
+            return(_standard_packet(1)) # NACK
+        payload: bytes = packet[5:-3]
+        self.commands_handled += 1
+
+        if(command == 6) : # STREAM
+            self.streaming = payload != b'00'
+            if(self.streaming) :
+                self._stream_start = time.perf_counter()
+                self.packets_sent = 0
+            return(_standard_packet(command, payload))
+        if(command == self.GET_SAMPLE_RATE) :
+            return(_standard_packet(command, _ascii_hex(self.sample_rate, 4)))
+        if(command == self.SET_SAMPLE_RATE) :
+            self.sample_rate = int(payload, 16)
+            return(_standard_packet(command))
+        if(command in self.RESPONSE_CHARS) :
+            return(_standard_packet(command, b'0'*self.RESPONSE_CHARS[command]))
+        return(_standard_packet(command))
+
+    def data(self) -> bytes :
+        """Data packets that are ready to be sent.
+
+        Returns:
+            bytes: Zero or more complete data packets.
+        """
+        if(not self.streaming) :
+            return(b'')
+        if(self.realtime) :
+            # at most one second of data at a time.
+            due: int = int((time.perf_counter() - self._stream_start) * self.sample_rate)
+            count: int = min(due - self.packets_sent, self.sample_rate)
+        else :
+            count: int = self._BURST
+        if(count <= 0) :
+            return(b'')
+        first: int = self.packets_sent
+        self.packets_sent += count
+        # a stalled device loses the data it should have sent.
+        if(self.stalled) :
+            return(b'')
+        return(self.data_packets(first, count))
+
+    def seconds_until_data(self) -> float :
+        """Time until the next data packet is due, in seconds."""
+        if(not self.streaming or not self.realtime) :
+            return(0.001)
+        return(max(0.0, (self.packets_sent + 1) / self.sample_rate - (time.perf_counter() - self._stream_start)))
+
+    def data_packets(self, first: int, count: int) -> bytes :
+        """Build consecutive data packets.
+
+        Args:
+            first (int): Index of the first packet since streaming started.
+            count (int): Number of packets to build.
+
+        Returns:
+            bytes: Data packets.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _finish_packets(packets: np.ndarray, command: bytes) -> bytes :
+        """Fill in the framing and checksum of data packets whose binary fields are already filled in."""
+        packets[:,0] = STX
+        packets[:,1:5] = np.frombuffer(command, dtype=np.uint8)
+        checksum = ~packets[:,1:-3].sum(axis=1, dtype=np.int64) & 0xFF
+        packets[:,-3] = _HEX[checksum >> 4]
+        packets[:,-2] = _HEX[checksum & 0xF]
+        packets[:,-1] = ETX
+        return(packets.tobytes())
+
+    def _signal(self, first: int, count: int, channels: int, amplitude: float) -> np.ndarray :
+        """Sine waves of different frequencies for each channel, with shape (count, channels)."""
+        t = (first + np.arange(count)) / self.sample_rate
+        frequencies = np.arange(1, channels+1) * 5.0
+        return(amplitude * np.sin(2 * np.pi * t[:,None] * frequencies[None,:]))
+
+
+class Simulated8206HR(SimulatedPod) :
+    """Simulated 8206-HR, streaming Binary4 packets (command 180)."""
+
+    DATA_COMMAND: int = 180
+    PACKET_LENGTH: int = 16
+    DEFAULT_SAMPLE_RATE: int = 2000
+    RESPONSE_CHARS: dict[int,int] = { **SimulatedPod.RESPONSE_CHARS, 102 : 4, 105 : 2, 106 : 2, 107 : 2 }
+
+    def data_packets(self, first: int, count: int) -> bytes :
+        packets = np.zeros((count, self.PACKET_LENGTH), dtype=np.uint8)
+        packets[:,5] = (first + np.arange(count)) & 0xFF
+        channels = (32768 + self._signal(first, count, 3, 3000)).astype('<u2')
+        packets[:,7:13] = channels.view(np.uint8).reshape(count, 6)
+        return(self._finish_packets(packets, b'00B4'))
+
+
+class Simulated8229(SimulatedPod) :
+    """Simulated 8229 sleep deprivation system, which only answers commands."""
+
+    RESPONSE_CHARS: dict[int,int] = { **SimulatedPod.RESPONSE_CHARS, 128 : 4, 129 : 4, 132 : 2, 133 : 2, 136 : 4, 137 : 4,
+                                      140 : 14, 142 : 48, 145 : 8, 146 : 4, 147 : 4, 151 : 2 }
+
+
+class Simulated8480SC(SimulatedPod) :
+    """Simulated 8480-SC stimulus controller. Running a stimulus sends 133 EVENT STIM START right after the \
+    response, and 134 EVENT STIM STOP once the stimulus is over. A stimulus lasts its repeat count times its \
+    period, as set by SET STIMULUS, or 10 ms if none was set. TTL input events (132 EVENT TTL, on input 0) can \
+    also be sent at a steady rate.
+
+    Args:
+        ttl_event_rate (float, optional): TTL input events to send per second. Defaults to 0 (none).
+    """
+
+    RESPONSE_CHARS: dict[int,int] = { **SimulatedPod.RESPONSE_CHARS, 101 : 28, 108 : 4, 109 : 4, 110 : 2, 116 : 8, 118 : 8,
+                                      124 : 4, 126 : 2 }
+
+    DEFAULT_STIMULUS_SEC: float = 0.01
+
+    def __init__(self, *args, ttl_event_rate: float = 0, **kwargs) -> None :
+        self.ttl_event_rate: float = ttl_event_rate
+        super().__init__(*args, **kwargs)
+
+    def _power_on(self) -> None :
+        super()._power_on()
+        # length of the stimulus on each channel, and events still to be sent, in order.
+        self._stimulus_sec: dict[int,float] = {}
+        self._events: list[tuple[float,bytes]] = []
+        self.ttl_events_sent: int = 0
+        self._ttl_start: float = time.perf_counter()
+
+    def handle(self, packet: bytes) -> bytes :
+        response: bytes = super().handle(packet)
+        if(not response or response[1:5] == b'0001') :
+            return(response)
+        command: int = int(packet[1:5], 16)
+        payload: bytes = packet[5:-3]
+        if(command == 102 and len(payload) == 28) : # SET STIMULUS: channel, period ms, period us, width ms, width us, repeat, config
+            period_ms, period_us, repeat = int(payload[2:6], 16), int(payload[6:10], 16), int(payload[18:26], 16)
+            self._stimulus_sec[int(payload[:2], 16)] = repeat * (period_ms / 1000 + period_us / 10**6)
+        elif(command == 100 and len(payload) == 2) : # RUN STIMULUS
+            channel: int = int(payload, 16)
+            start: float = time.perf_counter() + self.latency
+            stop: float = start + self._stimulus_sec.get(channel, self.DEFAULT_STIMULUS_SEC)
+            self._events += [ (start, _standard_packet(133, payload)), (stop, _standard_packet(134, payload)) ]
+            self._events.sort(key=lambda event: event[0])
+        return(response)
+
+    def data(self) -> bytes :
+        now: float = time.perf_counter()
+        events: list[bytes] = []
+        if(self.ttl_event_rate) :
+            # at most one second of events at a time.
+            due: int = int((now - self._ttl_start) * self.ttl_event_rate)
+            count: int = min(due - self.ttl_events_sent, max(1, int(self.ttl_event_rate)))
+            if(count > 0) :
+                events.append(_standard_packet(132, b'00') * count)
+                self.ttl_events_sent = due
+        while(self._events and self._events[0][0] <= now) :
+            events.append(self._events.pop(0)[1])
+        # a stalled device loses the events it should have sent.
+        if(self.stalled) :
+            return(b'')
+        return(b''.join(events))
+
+    def seconds_until_data(self) -> float :
+        now: float = time.perf_counter()
+        waits: list[float] = [ when - now for when, _ in self._events[:1] ]
+        if(self.ttl_event_rate) :
+            waits.append((self.ttl_events_sent + 1) / self.ttl_event_rate - (now - self._ttl_start))
+        return(max(0.0, min(waits, default=0.001)))
+
+
+class Simulated8401HR(SimulatedPod) :
+    """Simulated 8401-HR, streaming Binary5 packets (command 181)."""
+
+    DATA_COMMAND: int = 181
+    PACKET_LENGTH: int = 31
+    DEFAULT_SAMPLE_RATE: int = 2000
+    RESPONSE_CHARS: dict[int,int] = { **SimulatedPod.RESPONSE_CHARS, 102 : 2, 104 : 4, 106 : 2, 112 : 4, 114 : 4, 115 : 4,
+                                      122 : 2, 128 : 4, 130 : 2, 133 : 2, 134 : 4 }
+
+    def data_packets(self, first: int, count: int) -> bytes :
+        packets = np.zeros((count, self.PACKET_LENGTH), dtype=np.uint8)
+        packets[:,5] = (first + np.arange(count)) & 0xFF
+        # four 18 bit channels, packed MSb first from channel 3 down to channel 0.
+        ch0, ch1, ch2, ch3 = (2**17 + self._signal(first, count, 4, 20000)).astype(np.int64).T
+        packets[:,7]  = ch3 >> 10
+        packets[:,8]  = ch3 >> 2
+        packets[:,9]  = (ch3 << 6) | (ch2 >> 12)
+        packets[:,10] = ch2 >> 4
+        packets[:,11] = (ch2 << 4) | (ch1 >> 14)
+        packets[:,12] = ch1 >> 6
+        packets[:,13] = (ch1 << 2) | (ch0 >> 16)
+        packets[:,14] = ch0 >> 8
+        packets[:,15] = ch0
+        return(self._finish_packets(packets, b'00B5'))
+
+
+class Simulated8274D(SimulatedPod) :
+    """Simulated 8274D receiver with a remote device connected, streaming its data packets (command 180). \
+    Commands relayed to the remote device are answered with a status, then 211 PROCEDURE COMPLETE, then \
+    the remote device's reply, if any. The sample rate is set and reported as a code (0 = 1024 Hz, \
+    1 = 512 Hz, 2 = 256 Hz, 3 = 128 Hz). Data packets follow DataPacket8274D's layout, which is an \
+    unverified placeholder, so the simulator cannot confirm it.
+    """
+
+    DATA_COMMAND: int = 180
+    PACKET_LENGTH: int = 16
+    DEFAULT_SAMPLE_RATE: int = 1024
+    GET_SAMPLE_RATE: int|None = None
+    SET_SAMPLE_RATE: int|None = None
+    SAMPLE_RATES: tuple[int] = (1024, 512, 256, 128)
+    RESPONSE_CHARS: dict[int,int] = { **SimulatedPod.RESPONSE_CHARS, 100 : 4, 103 : 2, 104 : 2, 131 : 4, 204 : 4, 206 : 4,
+                                      214 : 4, 218 : 4, 220 : 4 }
+
+    def handle(self, packet: bytes) -> bytes :
+        response: bytes = super().handle(packet)
+        if(not response or response[1:5] == b'0001') :
+            return(response)
+        command: int = int(packet[1:5], 16)
+        payload: bytes = packet[5:-3]
+        status: bytes = _ascii_hex(0, 4)
+        match command :
+            case 208 : # GET SAMPLE RATE
+                code: int = self.SAMPLE_RATES.index(self.sample_rate)
+                return(_standard_packet(command, status) + _standard_packet(211) + _standard_packet(209, _ascii_hex(code, 2)))
+            case 210 : # SET SAMPLE RATE
+                code: int = int(payload, 16)
+                if(code >= len(self.SAMPLE_RATES)) :
+                    return(_standard_packet(command, _ascii_hex(0x21, 4)) + _standard_packet(211))
+                self.sample_rate = self.SAMPLE_RATES[code]
+                return(_standard_packet(command, status) + _standard_packet(211))
+        return(response)
+
+    def data_packets(self, first: int, count: int) -> bytes :
+        packets = np.zeros((count, self.PACKET_LENGTH), dtype=np.uint8)
+        packets[:,5] = (first + np.arange(count)) & 0xFF
+        channels = (32768 + self._signal(first, count, 3, 3000)).astype('<u2')
+        packets[:,7:13] = channels.view(np.uint8).reshape(count, 6)
+        return(self._finish_packets(packets, b'00B4'))
+
+
+MODELS: dict[str, type[SimulatedPod]] = {
+    '8206hr' : Simulated8206HR,
+    '8401hr' : Simulated8401HR,
+    '8274d'  : Simulated8274D,
+    '8229'   : Simulated8229,
+    '8480sc' : Simulated8480SC,
+}
+
+# simulated hardware in this process, by model and name.
+_devices: dict[str, SimulatedPod] = {}
+
+def GetSimulatedDevice(url: str) -> SimulatedPod :
+    """Gets the simulated hardware behind a ``sim://`` URL, creating it if it has not been opened yet.
+
+    Args:
+        url (str): URL of the simulated device.
+
+    Raises:
+        SerialException: The URL is not a valid simulated device.
+
+    Returns:
+        SimulatedPod: The simulated device.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if(parts.scheme != 'sim' or parts.netloc.lower() not in MODELS) :
+        raise SerialException(f'Expected a URL like "sim://<model>[/<name>][?options]" with a model in {list(MODELS)}, got "{url}".')
+    key: str = parts.netloc.lower() + parts.path
+    if(key not in _devices) :
+        options: dict[str,str] = dict(urllib.parse.parse_qsl(parts.query))
+        try :
+            _devices[key] = MODELS[parts.netloc.lower()](
+                sample_rate = int(options.pop('sample_rate', 0)) or None,
+                realtime    = options.pop('realtime', '1') != '0',
+                unplug_at   = float(options['unplug_at']) if 'unplug_at' in options else None,
+                unplug_for  = float(options.pop('unplug_for', 0)),
+                stall_at    = float(options['stall_at']) if 'stall_at' in options else None,
+                stall_for   = float(options.pop('stall_for', 0)),
+                latency     = float(options.pop('latency', 0)),
+                # options of a single model.
+                **({ 'ttl_event_rate' : float(options.pop('ttl_event_rate')) } if 'ttl_event_rate' in options and parts.netloc.lower() == '8480sc' else {}),
+            )
+        except ValueError as e :
+            raise SerialException(f'Invalid option in "{url}": {e}')
+        options.pop('unplug_at', None)
+        options.pop('stall_at', None)
+        if(options) :
+            raise SerialException(f'Unknown options for "{url}": {list(options)}.')
+    return(_devices[key])
+
+
+class Serial(SerialBase) :
+    """Serial port connected to a simulated POD device."""
+
+    def open(self) -> None :
+        if(self.is_open) :
+            raise SerialException('Port is already open.')
+        if(self._port is None) :
+            raise SerialException('Port must be configured before it can be used.')
+        self._device: SimulatedPod = GetSimulatedDevice(self._port)
+        if(not self._device.plugged_in) :
+            raise SerialException(f'Could not open port {self._port}: device is not connected.')
+        self._rx = bytearray()
+        self._tx = bytearray()
+        # responses still being "sent" by the device, and when each will have arrived.
+        self._responses: list[tuple[float,bytes]] = []
+        self.is_open = True
+
+    def close(self) -> None :
+        self.is_open = False
+        super().close()
+
+    def _reconfigure_port(self) -> None :
+        pass
+
+    def _update_break_state(self) -> None :
+        pass
+
+    def _update_rts_state(self) -> None :
+        pass
+
+    def _update_dtr_state(self) -> None :
+        pass
+
+    def _check(self) -> None :
+        if(not self.is_open) :
+            raise PortNotOpenError()
+        if(not self._device.plugged_in) :
+            raise SerialException('Device disconnected.')
+
+    def _pump(self) -> None :
+        """Move data the device has sent into the input buffer."""
+        # when not running in realtime, the device only sends more once the host has caught up.
+        if(self._device.realtime or len(self._rx) < 4096) :
+            self._rx += self._device.data()
+        while(self._responses and self._responses[0][0] <= time.perf_counter()) :
+            self._rx += self._responses.pop(0)[1]
+
+    @property
+    def in_waiting(self) -> int :
+        self._check()
+        self._pump()
+        return(len(self._rx))
+
+    def read(self, size: int = 1) -> bytes :
+        self._check()
+        deadline: float|None = None if self._timeout is None else time.perf_counter() + self._timeout
+        self._pump()
+        while(len(self._rx) < size) :
+            if(deadline is not None and time.perf_counter() >= deadline) :
+                break
+            time.sleep(min(0.001, self._device.seconds_until_data()))
+            self._check()
+            self._pump()
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return(data)
+
+    def write(self, data: bytes) -> int :
+        self._check()
+        data = to_bytes(data)
+        self._tx += data
+        # respond to every complete packet, after any data already sent.
+        while(STX in self._tx and ETX in self._tx[self._tx.index(STX):]) :
+            start: int = self._tx.index(STX)
+            end: int = self._tx.index(ETX, start) + 1
+            self._pump()
+            response: bytes = self._device.handle(bytes(self._tx[start:end]))
+            if(self._device.latency) :
+                self._responses.append((time.perf_counter() + self._device.latency, response))
+            else :
+                self._rx += response
+            del self._tx[:end]
+        return(len(data))
+
+    def reset_input_buffer(self) -> None :
+        self._check()
+        self._pump()
+        self._rx.clear()
+
+    def reset_output_buffer(self) -> None :
+        self._check()
+        self._tx.clear()
@@ -0,0 +1,10 @@
+import os
+import sys
+
+from Morelia.testing import enable_simulated_devices
+
+#tests are imported with --import-mode=importlib, which leaves this directory off the path, so the shared helpers could not be imported.
+sys.path.insert(0, os.path.dirname(__file__))
+
+#the tests open simulated devices on sim:// URLs.
+enable_simulated_devices()
@@ -0,0 +1,104 @@
+"""Packets, devices and sinks shared by the streaming and sink tests."""
+
+import numpy as np
+
+from Morelia.Devices import ChecksumError, Pod8206HR, Pod8401HR, Preamp
+from Morelia.packet.data import DataPacket8206HR, DataPacket8401HR, DataBatch
+from Morelia.testing.protocol_sim import Simulated8206HR, Simulated8401HR
+import Morelia.packet.conversion as conv
+
+def split(raw: bytes, length: int) -> list[bytes]:
+    """Splits a run of fixed-length packets, such as a simulator's `data_packets`, into single packets."""
+    return [ raw[i:i+length] for i in range(0, len(raw), length) ]
+
+def build_8206hr_packet(packet_number: int) -> DataPacket8206HR:
+    """Builds an 8206-HR data packet with the given packet number and zeroed channels."""
+    body: bytes = conv.int_to_ascii_bytes(180, 4) + bytes([packet_number % 256, 0]) + bytes(6)
+    return DataPacket8206HR(b'\x02' + body + conv.int_to_ascii_bytes(~sum(body) & 0xFF, 2) + b'\x03', 10)
+
+def simulated_timestamps(count: int, start: int = 10**18) -> np.ndarray:
+    """Timestamps 10 ms apart, as for a device sampling at 100 Hz."""
+    return np.arange(count, dtype=np.int64) * 10**7 + start
+
+def simulated_8206hr_batch(name: str, count: int, start: int = 10**18, **kwargs) -> tuple[Pod8206HR, DataBatch]:
+    """A simulated 8206-HR sampling at 100 Hz, and a batch of the first `count` packets it sends. Extra keyword
+    arguments are passed on to `Pod8206HR`.
+    """
+    pod = Pod8206HR(f'sim://8206hr/{name}?sample_rate=100', 10, **kwargs)
+    packets = [ DataPacket8206HR(raw, 10) for raw in split(Simulated8206HR(100).data_packets(0, count), 16) ]
+    return pod, DataBatch(simulated_timestamps(count, start), packets)
+
+def simulated_8401hr_batch(name: str, count: int, primary: tuple, secondary: tuple, ss_gain: tuple, preamp_gain: tuple,
+                           start: int = 10**18) -> tuple[Pod8401HR, DataBatch]:
+    """A simulated 8401-HR with an 8407-SE preamplifier sampling at 100 Hz, and a batch of the first `count` packets it sends."""
+    pod = Pod8401HR(f'sim://8401hr/{name}?sample_rate=100', Preamp.Preamp8407_SE, primary, secondary, ss_gain, preamp_gain)
+    packets = [ DataPacket8401HR(preamp_gain, ss_gain, primary, secondary, raw) for raw in split(Simulated8401HR(100).data_packets(0, count), 31) ]
+    return pod, DataBatch(simulated_timestamps(count, start), packets)
+
+class ReplayDevice:
+    """Stands in for an aquisition device by replaying packets from memory."""
+
+    def __init__(self, packets: list, stop_event) -> None:
+        self._packets = packets
+        self._stop_event = stop_event
+        self._index = 0
+        self.sample_rate = 1000
+        self.device_name = 'replay'
+        self.entered = False
+
+    def __enter__(self):
+        self.entered = True
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def ReadPODpacket(self):
+        packet = self._packets[self._index % len(self._packets)]
+        self._index += 1
+        if self._index >= len(self._packets):
+            self._stop_event.set()
+        return packet
+
+class CorruptingReplayDevice(ReplayDevice):
+    """Replays packets from memory, raising a checksum error in place of every `None`."""
+
+    def GetBytesWaiting(self) -> int:
+        return 42
+
+    def ReadPODpacket(self):
+        packet = super().ReadPODpacket()
+        if packet is None:
+            raise ChecksumError('Bad checksum for binary POD packet read.')
+        return packet
+
+class NullSink:
+    """Discards everything flushed to it."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        pass
+
+class RecordingSink:
+    """Keeps every flushed timestamp and packet, checking that it was opened first."""
+
+    def __init__(self) -> None:
+        self.flushed = []
+        self.open = False
+
+    def __enter__(self):
+        self.open = True
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self.open = False
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        assert self.open
+        self.flushed.append((timestamp, packet))
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from Morelia.testing.protocol_sim import SimulatedPod, Simulated8206HR, Simulated8401HR
+from Morelia.Stream.sink.channel_codec import encode_samples, decode_samples, encode_runs, decode_runs, encode_frames, decode_frames
+
+class TestChannelCodec:
+
+    @pytest.mark.parametrize('order', [0, 1, 2])
+    def test_samples(self, order):
+        rng = np.random.default_rng(0)
+        channels = (
+            np.cumsum(rng.integers(-40, 40, 10_000)).astype(np.int32) + 2**17,
+            rng.integers(0, 2**16, 1000, dtype=np.uint16),
+            np.full(300, 7, dtype=np.int8),
+            np.array([np.iinfo(np.int64).min, np.iinfo(np.int64).max, 0, -1]),
+            np.array([42], dtype=np.uint16),
+            np.array([], dtype=np.int16),
+        )
+        for samples in channels:
+            decoded = decode_samples(encode_samples(samples, order=order, block_size=64))
+            assert decoded.dtype == samples.dtype and decoded.tolist() == samples.tolist()
+
+        #a slowly changing channel only takes the bits its changes need.
+        if order:
+            assert len(encode_samples(channels[0], order=order)) < channels[0].nbytes / 3
+
+    def test_runs(self):
+        ttl = np.zeros(100_000, dtype=np.uint8)
+        ttl[1000:1500] = 1
+        ttl[70_000:] = 1
+        encoded = encode_runs(ttl)
+        assert len(encoded) < 100
+        assert decode_runs(encoded).tolist() == ttl.tolist()
+        assert decode_runs(encode_runs(np.array([], dtype=bool))).dtype == bool
+
+    @pytest.mark.parametrize('device, simulator', [('8206HR', Simulated8206HR), ('8401HR', Simulated8401HR)])
+    def test_frames(self, device, simulator):
+        packets = np.frombuffer(simulator(1000).data_packets(0, 5000), dtype=np.uint8).reshape(5000, -1).copy()
+        #noisy channels, toggling TTL inputs, and a dropped packet.
+        rng = np.random.default_rng(1)
+        packets[:, 9:11] ^= rng.integers(0, 4, (5000, 2), dtype=np.uint8)
+        packets[2000:3000, 6] ^= 0x80
+        packets = np.delete(packets, 1234, axis=0)
+        raw = SimulatedPod._finish_packets(packets, bytes(packets[0, 1:5]))
+        #and one packet with a bad checksum.
+        raw = raw[:100] + b'\x00' + raw[101:]
+
+        encoded = encode_frames(raw, device)
+        assert decode_frames(encoded, device) == raw
+        assert len(encoded) < len(raw) / 2
+        assert decode_frames(encode_frames(b'', device), device) == b''
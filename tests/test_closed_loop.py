@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from Morelia.Devices import Pod8206HR, Pod8480SC
+from Morelia.Stream.closed_loop import BandPowerDetector, ThresholdDetector, Trigger
+from Morelia.Stream.data_flow import DataFlow
+from helpers import NullSink
+
+class TestDetectors:
+
+    def test_threshold(self):
+        detector = ThresholdDetector('EEG1', 1.0)
+        detector.start(1000)
+        signal = np.array([0, 2, 2, 0, 0, 3, 0, 0, 0, 5], dtype=float)
+
+        #crossings are found wherever the chunks are split, including between two chunks.
+        found = [ 3*i + detector.detect(chunk) for i, chunk in enumerate(np.split(signal, [3, 6, 9])) ]
+        assert np.concatenate(found).tolist() == [1, 5, 9]
+
+        falling = ThresholdDetector('EEG1', 1.0, rising=False)
+        falling.start(1000)
+        assert falling.detect(signal).tolist() == [3, 6]
+
+    def test_band_power(self):
+        sample_rate = 1000
+        detector = BandPowerDetector('EEG1', (8, 12), threshold=10.0, window_sec=0.25)
+        detector.start(sample_rate)
+
+        t = np.arange(2*sample_rate) / sample_rate
+        signal = np.where(t < 1, 0.1*np.sin(2*np.pi*30*t), 50*np.sin(2*np.pi*10*t))
+
+        events = [ i for i, chunk in enumerate(np.split(signal, 40)) if len(detector.detect(chunk)) ]
+        #fires once, in the first chunk after the burst starts whose window has enough of it.
+        assert len(events) == 1 and 20 <= events[0] <= 24
+
+class TestTrigger:
+
+    def test_triggers_while_streaming(self):
+        pod = Pod8206HR('sim://8206hr/closed-loop?sample_rate=2000', 10)
+        stimulator = Pod8480SC('sim://8480sc/closed-loop')
+
+        #the simulated channels are 5 and 10 Hz sine waves.
+        ttl = Trigger(pod, ThresholdDetector('EEG1', 0), pod, 'SET TTL OUT', (0, 1))
+        stimulus = Trigger(pod.device_name, ThresholdDetector('EEG2', 0, rising=False), stimulator, 'RUN STIMULUS', 0,
+                           refractory_sec=0.15, name='stimulus')
+
+        flowgraph = DataFlow([(pod, [NullSink()])], chunk_size=4, triggers=[ttl, stimulus])
+        flowgraph.collect_for_seconds(1.1)
+
+        summary = flowgraph.triggers()
+        assert 4 <= summary['SET TTL OUT']['count'] <= 6
+        #the refractory period skips every other falling edge.
+        assert 4 <= summary['stimulus']['count'] <= 6
+        assert 0 < summary['stimulus']['p50_seconds'] <= summary['stimulus']['max_seconds'] < 0.1
+
+        timestamps = [ timestamp for timestamp, _ in ttl.log() ]
+        assert np.allclose(np.diff(timestamps), 0.2e9, rtol=0.01)
+
+    def test_output_to_another_source(self):
+        pod = Pod8206HR('sim://8206hr/closed-loop-source?sample_rate=2000', 10)
+        stimulator = Pod8480SC('sim://8480sc/closed-loop-source')
+        stimulus = Trigger(pod, ThresholdDetector('EEG1', 0), stimulator, 'RUN STIMULUS', 0)
+
+        #the stimulator's worker reads its port, so the trigger can't drain it too.
+        with pytest.raises(ValueError):
+            DataFlow([(pod, [NullSink()]), (stimulator, [NullSink()])], triggers=[stimulus])
+
+        #a trigger may still command the device it watches.
+        ttl = Trigger(pod, ThresholdDetector('EEG1', 0), pod, 'SET TTL OUT', (0, 1))
+        DataFlow([(pod, [NullSink()]), (stimulator, [NullSink()])], triggers=[ttl])
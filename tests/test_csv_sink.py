@@ -0,0 +1,60 @@
+import pytest
+
+from Morelia.Devices import Pod8206HR
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.Stream.sink import CSVSink, ChannelSchema
+from helpers import simulated_8206hr_batch, simulated_8401hr_batch
+
+def read_csv(file_path: str) -> tuple[list[str], list[list[str]]]:
+    with open(file_path) as file:
+        lines = file.read().splitlines()
+    return lines[0].split(','), [ line.split(',') for line in lines[1:] ]
+
+class TestCSVSink:
+
+    def test_8206hr(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('csv-sink', 150, start=1_700_000_000 * 10**9)
+        timestamps, packets = batch.timestamps, batch.packets
+
+        file_path: str = str(tmp_path / 'test.csv')
+        with CSVSink(file_path, pod) as sink:
+            sink.flush_batch(batch[:100])
+            sink.flush(int(timestamps[100]), packets[100])
+            sink.flush_batch(batch[101:])
+
+        header, rows = read_csv(file_path)
+
+        #one column in the header for every column of data.
+        assert header == ['time', 'EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTL2', 'TTL3', 'TTL4']
+        assert all(len(row) == len(header) for row in rows)
+
+        assert [ int(row[0]) for row in rows ] == timestamps.tolist()
+        for row, packet in zip(rows, packets):
+            assert [ float(value) for value in row[1:4] ] == pytest.approx([packet.ch0, packet.ch1, packet.ch2], abs=1e-6)
+            assert row[4:] == [ str(packet.ttl1), str(packet.ttl2), str(packet.ttl3), str(packet.ttl4) ]
+
+    def test_8401hr(self, tmp_path):
+        primary = (PrimaryChannelMode.EEG_EMG, PrimaryChannelMode.EEG_EMG, PrimaryChannelMode.BIOSENSOR, PrimaryChannelMode.EEG_EMG)
+        secondary = (SecondaryChannelMode.ANALOG, SecondaryChannelMode.ANALOG) + (SecondaryChannelMode.DIGITAL,)*4
+        preamp_gain, ss_gain = (10, 100, None, 10), (5, 1, 1, 1)
+
+        pod, batch = simulated_8401hr_batch('csv-sink', 100, primary, secondary, ss_gain, preamp_gain)
+        packets = batch.packets
+
+        file_path: str = str(tmp_path / 'test.csv')
+        with CSVSink(file_path, pod, float_format='%r') as sink:
+            sink.flush_batch(batch)
+
+        header, rows = read_csv(file_path)
+        assert header == ['time'] + list(ChannelSchema(pod).names[:4]) + ['aEXT0', 'aEXT1', 'aTTL1', 'aTTL2', 'aTTL3', 'aTTL4']
+        assert all(len(row) == 11 for row in rows)
+
+        for row, packet in zip(rows, packets):
+            expected = (packet.ch0, packet.ch1, packet.ch3, packet.ext0, packet.ext1)
+            assert [ float(row[idx]) for idx in (1, 2, 4, 5, 6) ] == pytest.approx(expected, rel=1e-9)
+            assert row[7:] == [ str(packet.ttl1), str(packet.ttl2), str(packet.ttl3), str(packet.ttl4) ]
+
+    def test_invalid_float_format(self, tmp_path):
+        pod = Pod8206HR('sim://8206hr/csv-sink-format', 10)
+        with pytest.raises(ValueError):
+            CSVSink(str(tmp_path / 'test.csv'), pod, float_format='%s %s')
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+import pytest
+
+from Morelia.Devices import Pod8206HR
+from Morelia.Stream.data_flow import DataFlow
+from helpers import build_8206hr_packet
+
+class EndlessDevice:
+    """Stands in for an aquisition device, producing numbered packets at about 5 kHz forever."""
+
+    def __init__(self) -> None:
+        self._packets = [ build_8206hr_packet(i) for i in range(256) ]
+        self._index = 0
+        self.sample_rate = 5000
+        self.device_name = 'endless'
+        #like a real device, this can't be pickled.
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def ReadPODpacket(self):
+        time.sleep(0.0002)
+        self._index += 1
+        return self._packets[self._index % 256]
+
+class PacketNumberSink:
+    """Writes the timestamp and packet number of each sample to a file, and 'closed' once it is exited."""
+
+    def __init__(self, path: str, pod) -> None:
+        self._path = path
+        self._pod = pod
+
+    def __enter__(self):
+        self._file = open(self._path, 'w')
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self._file.write('closed\n')
+        self._file.close()
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        self._file.write(f'{timestamp},{packet.raw_packet[5]}\n')
+
+    @staticmethod
+    def read(path: str) -> tuple[list[tuple[int, int]], bool]:
+        with open(path) as file:
+            lines = file.read().split()
+        closed = bool(lines) and lines[-1] == 'closed'
+        return [ tuple(map(int, line.split(','))) for line in lines if line != 'closed' ], closed
+
+def wait_for_samples(path: str, count: int) -> None:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if os.path.exists(path) and os.path.getsize(path) > 25*count:
+            return
+        time.sleep(0.01)
+
+class TestDataFlow:
+
+    def test_sinks_change_while_collecting(self, tmp_path):
+        device = EndlessDevice()
+        first = PacketNumberSink(str(tmp_path / 'first.txt'), device)
+        second = PacketNumberSink(str(tmp_path / 'second.txt'), device)
+
+        flowgraph = DataFlow([(device, [first])], chunk_size=10)
+
+        flowgraph.collect()
+        try:
+            wait_for_samples(first._path, 50)
+            flowgraph.add_sink('endless', second)
+
+            wait_for_samples(second._path, 50)
+            flowgraph.remove_sink(first)
+
+            first_samples, first_closed = PacketNumberSink.read(first._path)
+            assert first_closed
+
+            time.sleep(0.05)
+        finally:
+            flowgraph.stop_collection()
+
+        second_samples, second_closed = PacketNumberSink.read(second._path)
+        assert second_closed
+
+        #the second sink starts on a chunk boundary, sees every sample from then on, and keeps going after the first is removed.
+        overlap: int = len(first_samples) - first_samples.index(second_samples[0])
+        assert overlap % 10 == 0
+        assert first_samples[-overlap:] == second_samples[:overlap]
+        assert len(second_samples) > overlap
+
+        packet_numbers: list[int] = [ number for _, number in second_samples ]
+        assert all((b - a) % 256 == 1 for a, b in zip(packet_numbers, packet_numbers[1:]))
+
+        #sinks are kept in the network for the next collection.
+        assert flowgraph._network[0][1] == [second]
+
+        metrics = flowgraph.metrics()['endless']
+        assert list(metrics['sinks']) == ['PacketNumberSink#1']
+        assert metrics['sinks']['PacketNumberSink#1']['flush_count'] > 0
+
+    def test_change_sinks_while_stopped(self):
+        device = EndlessDevice()
+        sink = PacketNumberSink('unused', device)
+        flowgraph = DataFlow([(device, [])])
+
+        flowgraph.add_sink(device, sink)
+        assert flowgraph._network[0][1] == [sink]
+
+        flowgraph.remove_sink(sink)
+        assert flowgraph._network[0][1] == []
+
+        with pytest.raises(ValueError):
+            flowgraph.remove_sink(sink)
+        with pytest.raises(ValueError):
+            flowgraph.add_sink('nope', sink)
+
+    def test_commands_while_collecting(self, tmp_path):
+        pod = Pod8206HR('sim://8206hr/data-flow-commands?sample_rate=1000', 10)
+        sink = PacketNumberSink(str(tmp_path / 'samples.txt'), pod)
+        flowgraph = DataFlow([(pod, [sink])], chunk_size=20)
+
+        flowgraph.collect()
+        try:
+            wait_for_samples(sink._path, 50)
+            futures = [ flowgraph.send_command(pod, 'SET LOWPASS', (1, 40)),
+                        flowgraph.send_command(pod, 'GET SAMPLE RATE', use_cache=False),
+                        flowgraph.send_command(pod.device_name, 'PING') ]
+            responses = [ future.result(5) for future in futures ]
+
+            #responses are matched to their commands, and the device in this process learns what was set.
+            assert [ response.command_number for response in responses ] == [103, 100, 2]
+            assert responses[1].payload == (1000,)
+            assert flowgraph.send_command(pod, 'GET LOWPASS', 1).result(0).payload == (40,)
+
+            wait_for_samples(sink._path, 500)
+        finally:
+            flowgraph.stop_collection()
+
+        #no samples were lost to the commands.
+        samples, _ = PacketNumberSink.read(sink._path)
+        packet_numbers: list[int] = [ number for _, number in samples ]
+        assert len(packet_numbers) > 500
+        assert all((b - a) % 256 == 1 for a, b in zip(packet_numbers, packet_numbers[1:]))
+
+        #once stopped, commands are sent right away.
+        assert flowgraph.send_command(pod, 'PING').result(0).command_number == 2
@@ -0,0 +1,76 @@
+import numpy as np
+import pyedflib
+import pytest
+
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataGap
+from Morelia.Stream.sink import EDFSink
+from helpers import simulated_8206hr_batch, simulated_8401hr_batch
+
+def read_signals(file_path: str) -> list[np.ndarray]:
+    with pyedflib.EdfReader(file_path) as reader:
+        return [ reader.readSignal(idx) for idx in range(reader.signals_in_file) ]
+
+class TestEDFSink:
+
+    def test_8206hr(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('edf-sink', 230)
+        packets = batch.packets
+
+        file_path: str = str(tmp_path / 'test.edf')
+        with EDFSink(file_path, pod, record_duration=0.5) as sink:
+            sink.flush_batch(batch[:200])
+            sink.flush(int(batch.timestamps[200]), packets[200])
+            sink.flush_batch(batch[201:])
+
+        signals = read_signals(file_path)
+        with pyedflib.EdfReader(file_path) as reader:
+            assert reader.getSignalLabels() == ['EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTl2', 'TTL3', 'TTl4']
+
+        #the last record is padded to be complete.
+        assert all(len(signal) == 250 for signal in signals)
+
+        resolution: float = 8192/65535
+        for signal, channel in zip(signals, ('ch0', 'ch1', 'ch2')):
+            assert np.abs(signal[:230] - [ getattr(packet, channel) for packet in packets ]).max() < resolution
+
+        for signal, ttl in zip(signals[3:], ('ttl1', 'ttl2', 'ttl3', 'ttl4')):
+            assert list(signal[:230]) == [ float(getattr(packet, ttl)) for packet in packets ]
+
+    def test_gap_is_padded(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('edf-sink-gap', 100)
+        packets = batch.packets
+
+        file_path: str = str(tmp_path / 'test.edf')
+        with EDFSink(file_path, pod) as sink:
+            sink.flush_batch(batch[:50])
+            sink.flush_gap(DataGap(int(batch.timestamps[50]), 10**9, 100, 'unplugged', 0.1))
+            sink.flush_batch(batch[50:])
+
+        with pyedflib.EdfReader(file_path) as reader:
+            ch0 = reader.readSignal(0)
+            onsets, durations, descriptions = reader.readAnnotations()
+
+        assert len(ch0) == 200
+        assert np.abs(ch0[50:150]).max() < 1
+        assert np.abs(ch0[150:] - [ packet.ch0 for packet in packets[50:] ]).max() < 1
+        assert list(descriptions) == ['Data gap'] and onsets[0] == pytest.approx(0.5)
+
+    def test_8401hr_bdf(self, tmp_path):
+        primary = (PrimaryChannelMode.EEG_EMG, PrimaryChannelMode.EEG_EMG, PrimaryChannelMode.BIOSENSOR, PrimaryChannelMode.EEG_EMG)
+        secondary = (SecondaryChannelMode.DIGITAL,)*6
+        preamp_gain, ss_gain = (10, 100, None, 10), (5, 1, 1, 1)
+
+        pod, batch = simulated_8401hr_batch('edf-sink', 100, primary, secondary, ss_gain, preamp_gain)
+        packets = batch.packets
+
+        file_path: str = str(tmp_path / 'test.bdf')
+        with EDFSink(file_path, pod) as sink:
+            sink.flush_batch(batch)
+
+        signals = read_signals(file_path)
+
+        #no bits are dropped in a BDF file, so values match up to rounding of the header.
+        for idx, channel in ((0, 'ch0'), (1, 'ch1'), (3, 'ch3')):
+            expected = np.array([ getattr(packet, channel) for packet in packets ])
+            assert np.abs(signals[idx] - expected).max() < np.abs(expected).max() * 1e-5
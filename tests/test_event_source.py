@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+from Morelia.Devices import Pod8206HR, Pod8480SC
+from Morelia.Stream.data_flow import DataFlow
+from Morelia.Stream.sink import CSVSink
+
+def read_events(file_path: str) -> tuple[list[str], list[tuple[int, str, int]]]:
+    with open(file_path) as file:
+        lines = file.read().splitlines()
+    rows = [ line.split(',') for line in lines[1:] ]
+    return lines[0].split(','), [ (int(time), event, int(value)) for time, event, value in rows ]
+
+class TestEventSource:
+
+    def test_events_alongside_data(self, tmp_path):
+        stimulator = Pod8480SC('sim://8480sc/event-source?ttl_event_rate=100')
+        #a stimulus of 3 pulses, 20 ms apart.
+        stimulator.WriteRead('SET STIMULUS', (0, 20, 0, 5, 0, 3, 0))
+        pod = Pod8206HR('sim://8206hr/event-source?sample_rate=1000', 10)
+
+        events_path: str = str(tmp_path / 'events.csv')
+        flowgraph = DataFlow([(pod, [CSVSink(str(tmp_path / 'eeg.csv'), pod)]), (stimulator, [CSVSink(events_path, stimulator)])])
+
+        flowgraph.collect()
+        try:
+            time.sleep(0.3)
+            #the worker reading events also answers commands.
+            assert flowgraph.send_command(stimulator, 'RUN STIMULUS', 0).result(2).command_number == 100
+            time.sleep(0.3)
+        finally:
+            flowgraph.stop_collection()
+
+        header, events = read_events(events_path)
+        assert header == ['time', 'event', 'value']
+
+        #events are timestamped by when they arrived, well within a millisecond.
+        ttl = np.array([ timestamp for timestamp, event, _ in events if event == 'EVENT TTL' ])
+        assert len(ttl) > 40
+        assert abs(np.median(np.diff(ttl)) - 10**7) < 2*10**5
+
+        stimulus = [ (timestamp, event, channel) for timestamp, event, channel in events if event.startswith('EVENT STIM') ]
+        assert [ (event, channel) for _, event, channel in stimulus ] == [('EVENT STIM START', 0), ('EVENT STIM STOP', 0)]
+        assert abs(stimulus[1][0] - stimulus[0][0] - 60 * 10**6) < 2 * 10**6
+
+        #and on the same time base as the data, give or take when each worker started.
+        with open(tmp_path / 'eeg.csv') as file:
+            samples = [ int(line.split(',')[0]) for line in file.read().splitlines()[1:] ]
+        assert samples[0] - 5*10**7 < ttl[0] < ttl[-1] < samples[-1] + 5*10**7
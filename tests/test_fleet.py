@@ -0,0 +1,100 @@
+import pytest
+
+from Morelia.Devices import Fleet, FleetError, Pod8206HR, Pod8401HR, Pod8229, Pod8480SC, UnexpectedResponseError
+from Morelia.testing.protocol_sim import GetSimulatedDevice
+from Morelia.Parameters import Params8206HR, Params8401HR, Params8229, Params8480SC
+
+def rig(name: str) -> list:
+    """One of each device, with parameters that set everything their commands can."""
+    return [
+        Params8206HR(f'sim://8206hr/{name}-a?latency=0.01', 2000, 10, (40, 40, 40), checkForValidParams=False),
+        Params8401HR(f'sim://8401hr/{name}-b?latency=0.01', '8407-SE', 1000, False, (10, 10, 10, 10), (1, 1, 1, 1),
+                     (0.5, 0.5, 0.5, 0.5), (100, 100, 100, 100), (0.6, 0.6, 0.6, 0.6), ('VBIAS',)*4, checkForValidParams=False),
+        Params8229(f'sim://8229/{name}-c?latency=0.01', 1, False, 50, True, 1, 10, 5,
+                   {'Monday' : (1,)*12 + (0,)*12}, checkForValidParams=False),
+        Params8480SC(f'sim://8480sc/{name}-d?latency=0.01', (0, 1000, 500, 500, 1, 10, 0), 0, (100, 100), 1, (50, 50), 0,
+                     (0, 0, 10), checkForValidParams=False),
+    ]
+
+class TestFleet:
+
+    def test_open(self):
+        params = rig('fleet-open')
+        with Fleet() as fleet:
+            results = fleet.Open(params, raise_errors=True)
+            assert len(fleet) == 4
+            assert [ type(results[p.port].value) for p in params ] == [Pod8206HR, Pod8401HR, Pod8229, Pod8480SC]
+            assert all(result.retries == 0 for result in results.values())
+
+            assert all(result.ok and result.value >= 0.01 for result in fleet.PingAll().values())
+            assert all(result.ok for result in fleet.FirmwareVersionAll().values())
+
+            #only devices that stream data have a sample rate.
+            rates = fleet.SampleRateAll()
+            assert { name : result.value for name, result in rates.items() } == { params[0].port : 2000, params[1].port : 1000 }
+            assert all(result.ok for result in fleet.SampleRateAll(500).values())
+            assert fleet[params[0].port].sample_rate == 500
+
+    def test_errors(self):
+        params = rig('fleet-errors')[:1] + [ Params8206HR('sim://nothing/here', 2000, 10, (40, 40, 40), checkForValidParams=False) ]
+        with Fleet() as fleet:
+            results = fleet.Open(params)
+            assert results[params[0].port].ok and not results[params[1].port].ok
+            assert list(fleet.devices) == [params[0].port]
+
+        with Fleet() as fleet:
+            with pytest.raises(FleetError) as error:
+                fleet.Open(params, raise_errors=True)
+            assert error.value.results[params[1].port].error is not None
+
+    def test_retries(self):
+        #the device stops answering for a moment while it is being configured.
+        params = Params8206HR('sim://8206hr/fleet-retries?stall_at=0&stall_for=0.3', 2000, 10, (40, 40, 40), checkForValidParams=False)
+        with Fleet(retries=3, timeout_sec=0.2) as fleet:
+            result = fleet.Open([params])[params.port]
+            assert result.ok and result.retries > 0
+
+        with Fleet(retries=0, timeout_sec=0.2) as fleet:
+            params.port = 'sim://8206hr/fleet-no-retries?stall_at=0&stall_for=0.3'
+            result = fleet.Open([params])[params.port]
+            assert isinstance(result.error, TimeoutError) and result.retries == 0
+
+    def test_reapply(self):
+        params = rig('fleet-reapply')
+        with Fleet() as fleet:
+            fleet.Open(params, raise_errors=True)
+            devices = [ GetSimulatedDevice(p.port) for p in params ]
+            handled = [ device.commands_handled for device in devices ]
+
+            #only settings the cache does not know are sent again: the 8229's clock and motor speed.
+            fleet.Configure(params, raise_errors=True)
+            assert [ device.commands_handled - before for device, before in zip(devices, handled) ] == [1, 1, 3, 1]
+
+            handled = [ device.commands_handled for device in devices ]
+            fleet.Configure(params, raise_errors=True, force=True)
+            assert all(device.commands_handled - before > 3 for device, before in zip(devices, handled))
+
+    def test_configure_named_devices(self):
+        #devices added with a name of their own are still found by their parameters' port.
+        params = Params8206HR('sim://8206hr/fleet-named?latency=0.01', 2000, 10, (40, 40, 40), checkForValidParams=False)
+        with Fleet() as fleet:
+            fleet.Add(Pod8206HR(params.port, 10, device_name='rig 1'))
+            results = fleet.Configure([params], raise_errors=True)
+            assert list(results) == [params.port] and fleet['rig 1'].sample_rate == 2000
+
+            missing = Params8206HR('sim://8206hr/fleet-missing', 2000, 10, (40, 40, 40), checkForValidParams=False)
+            assert isinstance(fleet.Configure([missing])[missing.port].error, KeyError)
+
+    def test_response_to_another_command(self):
+        pod = Pod8206HR('sim://8206hr/fleet-late?latency=0.01', 10)
+        with Fleet(retries=1) as fleet:
+            fleet.Add(pod)
+            #the response to this command arrives while the fleet waits for the ping's.
+            pod.WritePacket('FIRMWARE VERSION')
+            result = fleet.Run(lambda pod: fleet.Command(pod, 'PING'))[pod.device_name]
+            assert result.ok and result.retries == 1 and result.value.command_number == 2
+
+            pod.WritePacket('FIRMWARE VERSION')
+            with Fleet(retries=0) as strict:
+                strict.Add(pod)
+                assert isinstance(strict.Run(lambda pod: strict.Command(pod, 'PING'))[pod.device_name].error, UnexpectedResponseError)
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+import pytest
+
+#dependencies that only some parts of Morelia need.
+HEAVY = ('numpy', 'influxdb_client', 'pyedflib', 'reactivex', 'pyarrow', 'cppyy')
+
+def imported_after(statement: str) -> set[str]:
+    """Heavy dependencies imported by running `statement` in a fresh interpreter."""
+    code = f'import sys\n{statement}\nprint(" ".join(name for name in {HEAVY!r} if name in sys.modules))'
+    return set(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split())
+
+class TestLazyImports:
+
+    @pytest.mark.parametrize('statement, allowed', [
+        ('import Morelia', set()),
+        ('from Morelia.Devices import Pod8229', set()),
+        ('from Morelia.Stream.sink import CSVSink', {'numpy'}),
+        ('import Morelia.Stream.sink.pvfs', set()),
+        ('from Morelia.Stream.data_flow import DataFlow', {'numpy'}),
+    ])
+    def test_dependencies_load_on_first_use(self, statement, allowed):
+        assert imported_after(statement) <= allowed
+
+    def test_exports(self):
+        import Morelia
+        from Morelia.Stream.sink.influx_sink import InfluxSink
+
+        assert Morelia.Stream.sink.InfluxSink is InfluxSink
+        assert 'PVFSSink' in dir(Morelia.Stream.sink)
+        with pytest.raises(AttributeError):
+            Morelia.Stream.sink.NoSuchSink
+
+    def test_simulators_are_opt_in(self):
+        #importing the serial port code does not register the simulated devices, or import them.
+        code = 'import serial, sys\nimport Morelia.Devices.SerialPorts.SerialComm\nprint("Morelia.testing" in serial.protocol_handler_packages, "Morelia.testing.protocol_sim" in sys.modules)'
+        assert subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split() == ['False', 'False']
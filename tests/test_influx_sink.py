@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from Morelia.Stream.sink import InfluxSink, Spool
+from Morelia.testing.influx_sim import InfluxStandIn
+from helpers import simulated_8206hr_batch
+
+class TestInfluxSink:
+
+    @pytest.mark.parametrize('gzip', [True, False])
+    def test_8206hr(self, gzip):
+        pod, batch = simulated_8206hr_batch('influx-sink', 250, device_name='rig 1')
+        timestamps, packets = batch.timestamps, batch.packets
+
+        with InfluxStandIn() as server:
+            with InfluxSink(server.url, 'token', 'org', 'bucket', 'eeg', pod, batch_size=100, gzip=gzip) as sink:
+                for start in range(0, 240, 30):
+                    sink.flush_batch(batch[start:start+30])
+                for timestamp, packet in zip(timestamps[240:].tolist(), packets[240:]):
+                    sink.flush(timestamp, packet)
+
+        #batches of at least 100 lines, and whatever was left when the sink closed.
+        assert server.requests == 3
+        assert server.compressed_requests == (3 if gzip else 0)
+
+        #one line per sample, with every channel as a field.
+        assert len(server.lines) == 250
+        series, fields, timestamp = server.lines[7].rsplit(' ', 2)
+        assert series == 'eeg,name=rig\\ 1'
+        assert int(timestamp) == timestamps[7]
+
+        values = dict(field.split('=') for field in fields.split(','))
+        assert list(values) == ['EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTL2', 'TTL3', 'TTL4']
+        assert float(values['EEG2']) == pytest.approx(packets[7].ch1, abs=1e-6)
+        assert values['TTL1'] == f'{packets[7].ttl1}i'
+
+    def test_send_errors_are_raised(self):
+        pod, batch = simulated_8206hr_batch('influx-sink-error', 10)
+
+        #nothing is listening.
+        server = InfluxStandIn()
+        server.start()
+        server.stop()
+
+        with pytest.raises(Exception):
+            with InfluxSink(server.url, 'token', 'org', 'bucket', 'eeg', pod, batch_size=1) as sink:
+                sink.flush_batch(batch)
+
+    def test_spool_rides_out_server_restart(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('influx-sink-spool', 300)
+        timestamps = batch.timestamps
+
+        server = InfluxStandIn()
+        server.start()
+
+        spool = Spool(str(tmp_path / 'spool'), retry_interval_sec=0.05, max_retry_interval_sec=0.1)
+        with InfluxSink(server.url, 'token', 'org', 'bucket', 'eeg', pod, batch_size=50, spool=spool) as sink:
+            sink.flush_batch(batch[:100])
+
+            #streaming carries on while the server is down.
+            server.stop()
+            start: float = time.perf_counter()
+            sink.flush_batch(batch[100:200])
+            assert time.perf_counter() - start < 0.1
+
+            time.sleep(0.2)
+            assert spool.metrics()['pending_records'] > 0 and spool.metrics()['lag_seconds'] > 0
+
+            server.start()
+            sink.flush_batch(batch[200:])
+
+        #nothing is lost or repeated, and it all arrives in order.
+        assert [ int(line.rsplit(' ', 1)[1]) for line in server.lines ] == timestamps.tolist()
+        assert spool.metrics()['pending_records'] == 0
+        server.stop()
@@ -0,0 +1,86 @@
+from multiprocessing import Event
+from urllib.request import urlopen
+
+from Morelia.Stream.source import get_data
+from Morelia.Stream.metrics import StreamMetrics, LATENCY_BUCKETS, format_prometheus, MetricsServer
+from Morelia.packet.data import DataBatch
+
+import numpy as np
+
+from helpers import build_8206hr_packet, CorruptingReplayDevice, NullSink
+
+def build_batch(packet_numbers) -> DataBatch:
+    return DataBatch(np.arange(len(packet_numbers), dtype=np.int64), [ build_8206hr_packet(i) for i in packet_numbers ])
+
+class TestMetrics:
+
+    def test_counts_and_gaps(self):
+        metrics = StreamMetrics('dev', ['sink'])
+
+        metrics.record_chunk(build_batch([250, 251, 252]))
+        #253 and 254 are missing, then the packet number wraps around.
+        metrics.record_chunk(build_batch([255, 0, 1, 3]), checksum_failures=2)
+        metrics.record_chunk(None, checksum_failures=1)
+
+        snapshot = metrics.snapshot()
+        assert snapshot['samples'] == 7
+        assert snapshot['bytes'] == 7*16
+        assert snapshot['packet_gaps'] == 3
+        assert snapshot['checksum_failures'] == 3
+
+    def test_flush_histogram(self):
+        metrics = StreamMetrics('dev', ['a', 'b'])
+
+        metrics.record_flush(1, 0)        # <= 1us
+        metrics.record_flush(1, 1)        # <= 1us
+        metrics.record_flush(1, 1500)     # <= 2us
+        metrics.record_flush(1, 3000)     # <= 4us
+        metrics.record_flush(1, 10**10)   # slower than every finite bucket
+
+        sinks = metrics.snapshot()['sinks']
+        assert sinks['a']['flush_count'] == 0
+
+        buckets = dict(sinks['b']['flush_buckets'])
+        assert sinks['b']['flush_count'] == 5
+        assert buckets[LATENCY_BUCKETS[0]] == 2
+        assert buckets[LATENCY_BUCKETS[1]] == 1
+        assert buckets[LATENCY_BUCKETS[2]] == 1
+        assert buckets[float('inf')] == 1
+
+    def test_lean_engine_records_metrics(self):
+        stop_event = Event()
+        packets = [ build_8206hr_packet(i) for i in range(10) ]
+        #drop packet 4 and corrupt packet 7.
+        packets = packets[:4] + packets[5:7] + [None] + packets[8:]
+
+        metrics = StreamMetrics('replay', ['NullSink#0'])
+        get_data(float('inf'), stop_event, CorruptingReplayDevice(packets, stop_event), [NullSink()], chunk_size=3, metrics=metrics)
+
+        snapshot = metrics.snapshot()
+        assert snapshot['samples'] == 8
+        assert snapshot['checksum_failures'] == 1
+        assert snapshot['packet_gaps'] == 2
+        assert snapshot['queue_depth'] == 42
+        assert snapshot['sinks']['NullSink#0']['flush_count'] == 3
+
+    def test_prometheus_endpoint(self):
+        metrics = StreamMetrics('dev "1"', ['sink'])
+        metrics.record_chunk(build_batch([0, 1]))
+        metrics.record_flush(0, 5000)
+
+        text: str = format_prometheus({ metrics.device_name : metrics.snapshot() })
+        assert 'morelia_samples_total{device="dev \\"1\\""} 2' in text
+        assert 'morelia_sink_flush_seconds_bucket{device="dev \\"1\\"",sink="sink",le="+Inf"} 1' in text
+
+        with MetricsServer(lambda: { metrics.device_name : metrics.snapshot() }, 0) as server:
+            with urlopen(f'http://127.0.0.1:{server.port}/metrics') as response:
+                assert response.read().decode('utf-8') == text
+
+    def test_prometheus_spool(self):
+        metrics = StreamMetrics('dev', ['InfluxSink#0'])
+        snapshot = metrics.snapshot()
+        snapshot['sinks']['InfluxSink#0']['spool'] = { 'lag_seconds' : 1.5, 'pending_bytes' : 10, 'disk_bytes' : 20, 'sent_bytes' : 30, 'evicted_bytes' : 0, 'send_failures' : 2 }
+
+        text: str = format_prometheus({ 'dev' : snapshot })
+        assert 'morelia_spool_lag_seconds{device="dev",sink="InfluxSink#0"} 1.5' in text
+        assert 'morelia_spool_send_failures_total{device="dev",sink="InfluxSink#0"} 2' in text
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataGap
+from Morelia.Stream.sink import NumpySink, NumpyRecording
+from helpers import simulated_8206hr_batch, simulated_8401hr_batch
+
+class TestNumpySink:
+
+    def test_read_while_recording(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('numpy-sink', 350)
+        timestamps, packets = batch.timestamps, batch.packets
+
+        file_path: str = str(tmp_path / 'rec.npy')
+        #extents of 1 second, so the file has to grow a few times.
+        with NumpySink(file_path, pod, extent_sec=1, commit_interval_sec=0) as sink:
+            sink.flush_batch(batch[:150])
+
+            recording = NumpyRecording(file_path)
+            assert len(recording) == 150 and not recording.complete
+            assert recording.channels == ('EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTL2', 'TTL3', 'TTL4')
+            assert recording.units['EEG1'] == 'uV' and recording.sample_rate == 100
+            assert recording.start_time == 10**18
+
+            sink.flush_gap(DataGap(int(timestamps[150]), 10**9, 100, 'unplugged', 0.1))
+            sink.flush_batch(batch[150:])
+
+            #views taken before the file grew stay valid.
+            first = recording['EEG1']
+            assert recording.refresh() == 350
+            assert first.tolist() == recording['EEG1'][:150].tolist()
+
+        recording.refresh()
+        assert recording.complete
+        assert recording.gaps[0]['sample'] == 150 and recording.gaps[0]['lost_samples'] == 100
+
+        assert recording['time'].tolist() == timestamps.tolist()
+        assert recording['EEG2'] == pytest.approx([ packet.ch1 for packet in packets ], abs=1e-6)
+        assert recording['TTL3'].tolist() == [ int(float(packet.ttl3)) for packet in packets ]
+
+        #a time range is a view of the file, not a copy.
+        window = recording.time_range(int(timestamps[100]), int(timestamps[200]))
+        assert window['time'].tolist() == timestamps[100:200].tolist()
+        assert not window.flags.owndata
+
+        #once closed, it is an ordinary .npy file.
+        data = np.load(file_path, mmap_mode='r')
+        assert data.shape == (350,) and data.dtype == recording.data.dtype
+        assert data['EEG3/EMG'].tolist() == recording['EEG3/EMG'].tolist()
+
+    def test_8401hr(self, tmp_path):
+        primary = (PrimaryChannelMode.EEG_EMG,)*4
+        secondary = (SecondaryChannelMode.ANALOG,) + (SecondaryChannelMode.DIGITAL,)*5
+        preamp_gain, ss_gain = (10, 10, 10, 10), (1, 1, 1, 1)
+
+        pod, batch = simulated_8401hr_batch('numpy-sink', 100, primary, secondary, ss_gain, preamp_gain)
+        packets = batch.packets
+
+        file_path: str = str(tmp_path / 'rec.npy')
+        with NumpySink(file_path, pod) as sink:
+            sink.flush_batch(batch)
+
+        recording = NumpyRecording(file_path)
+        assert recording.units['EXT0'] == 'uV' and recording.units['EXT1'] == ''
+        assert recording['EXT0'] == pytest.approx([ packet.ext0 for packet in packets ])
+        assert recording[recording.channels[0]] == pytest.approx([ packet.ch0 for packet in packets ])
@@ -0,0 +1,43 @@
+import json
+
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq
+
+from Morelia.Devices import Pod8206HR
+from Morelia.Stream.sink import ParquetSink
+from helpers import simulated_8206hr_batch
+
+class TestParquetSink:
+
+    @pytest.mark.parametrize('file_name, compression', [('rec.parquet', 'zstd'), ('rec.parquet', None), ('rec.feather', 'lz4')])
+    def test_8206hr(self, tmp_path, file_name, compression):
+        pod, batch = simulated_8206hr_batch('parquet-sink', 250)
+        timestamps, packets = batch.timestamps, batch.packets
+
+        file_path: str = str(tmp_path / file_name)
+        with ParquetSink(file_path, pod, compression=compression, row_group_size=100) as sink:
+            for start in range(0, 250, 30):
+                sink.flush_batch(batch[start:start+30])
+
+        frame = pd.read_parquet(file_path) if file_name.endswith('.parquet') else pd.read_feather(file_path)
+
+        assert list(frame.columns) == ['time', 'EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTL2', 'TTL3', 'TTL4']
+        assert frame['time'].dt.tz is not None and frame['time'].astype('int64').tolist() == timestamps.tolist()
+        assert frame['EEG3/EMG'].to_numpy() == pytest.approx([ packet.ch2 for packet in packets ], abs=1e-6)
+        assert frame['TTL1'].tolist() == [ int(float(packet.ttl1)) for packet in packets ]
+
+        if file_name.endswith('.parquet'):
+            metadata = pq.ParquetFile(file_path).metadata
+            assert metadata.num_row_groups == 3 and metadata.row_group(2).num_rows == 50
+
+            schema = pq.read_schema(file_path)
+            assert schema.field('EEG1').metadata[b'unit'] == b'uV'
+            assert json.loads(schema.metadata[b'morelia'])['sample_rate'] == 100
+
+    def test_invalid_format(self, tmp_path):
+        pod = Pod8206HR('sim://8206hr/parquet-sink-format', 10)
+        with pytest.raises(ValueError):
+            ParquetSink(str(tmp_path / 'rec.csv'), pod, file_format='csv')
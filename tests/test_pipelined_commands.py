@@ -0,0 +1,49 @@
+import time
+
+from Morelia.Devices import Pod8206HR
+from Morelia.testing.protocol_sim import GetSimulatedDevice
+from Morelia.packet import ControlPacket
+
+class TestWriteReadMany:
+
+    def test_matches_responses(self):
+        pod = Pod8206HR('sim://8206hr/pipelined?latency=0.02', 10)
+
+        commands = [ ('SET LOWPASS', (channel, 40)) for channel in range(3) ] + ['PING', ('GET LOWPASS', 0), 'FIRMWARE VERSION']
+        start = time.perf_counter()
+        responses = pod.WriteReadMany(commands, useCache=False)
+        elapsed = time.perf_counter() - start
+
+        assert [ response.command_number for response in responses ] == [103, 103, 103, 2, 102, 12]
+        #one round trip, not one per command.
+        assert elapsed < 0.02 * 3
+
+        #settings that were set are kept by the state cache, and answered without writing anything.
+        assert pod.WriteReadMany([('GET LOWPASS', 2)])[0].payload == (40,)
+
+    def test_timeouts(self):
+        url = 'sim://8206hr/pipelined-timeouts'
+        pod = Pod8206HR(url, 10)
+        GetSimulatedDevice(url).stall(0.3)
+
+        responses = pod.WriteReadMany([('PING', None, 0.05), 'PING'], timeout_sec=0.5)
+        assert isinstance(responses[0], TimeoutError)
+        #the second command waited longer than the device stalled, but its response was lost.
+        assert isinstance(responses[1], TimeoutError)
+        assert pod.WriteReadMany(['PING'])[0].command_number == 2
+
+    def test_unsolicited(self):
+        pod = Pod8206HR('sim://8206hr/pipelined-unsolicited?sample_rate=2000', 10)
+        pod.WritePacket('STREAM', 1)
+        time.sleep(0.05)
+
+        unsolicited = []
+        responses = pod.WriteReadMany(['PING', ('GET LOWPASS', 1)], onUnsolicited=unsolicited.append, useCache=False)
+        pod.WritePacket('STREAM', 0)
+        time.sleep(0.01)
+        pod.FlushPort()
+
+        assert [ response.command_number for response in responses ] == [2, 102]
+        #the response to STREAM and the data packets that followed it went elsewhere.
+        assert isinstance(unsolicited[0], ControlPacket) and unsolicited[0].command_number == 6
+        assert len(unsolicited) > 10 and all(packet.command_number == 180 for packet in unsolicited[1:])
@@ -0,0 +1,83 @@
+import time
+from multiprocessing import Event
+
+import numpy as np
+import pyedflib
+import pytest
+
+from Morelia.Devices import Pod8274D
+from Morelia.testing.protocol_sim import GetSimulatedDevice, Simulated8274D
+from Morelia.packet.data import DataPacket8274D
+from Morelia.Stream.data_flow import DataFlow
+from Morelia.Stream.source import get_data
+from Morelia.Stream.sink import CSVSink, EDFSink, RawArchiveSink, RawArchive
+
+class TestPod8274D:
+
+    def test_sample_rate(self):
+        url = 'sim://8274d/sample-rate'
+        pod = Pod8274D(url)
+        device = GetSimulatedDevice(url)
+
+        assert pod.sample_rate == 1024
+        for rate in (512, 256, 128):
+            pod.sample_rate = rate
+            assert device.sample_rate == rate
+
+        #answered by the state cache, from the code the rate was set with.
+        handled = device.commands_handled
+        assert pod.sample_rate == 128 and device.commands_handled == handled
+
+        with pytest.raises(ValueError):
+            pod.sample_rate = 1000
+
+    def test_packets(self):
+        raw = Simulated8274D().data_packets(0, 4)
+        packets = [ DataPacket8274D(raw[i:i+16]) for i in range(0, len(raw), 16) ]
+        assert [ packet.packet_number for packet in packets ] == [0, 1, 2, 3]
+        #the simulated channels start at mid-scale.
+        assert packets[0].ch0 == 32768 and packets[1].ch2 > packets[1].ch0 > 32768
+
+        codes = DataPacket8274D.channel_codes(np.frombuffer(raw, dtype=np.uint8).reshape(4, 16))
+        assert codes[3].tolist() == [packets[3].ch0, packets[3].ch1, packets[3].ch2]
+
+    def test_streaming_is_opt_in(self, tmp_path):
+        pod = Pod8274D('sim://8274d/opt-in')
+        with pytest.raises(NotImplementedError):
+            DataFlow([(pod, [CSVSink(str(tmp_path / 'rec.csv'), pod)])])
+        with pytest.raises(NotImplementedError):
+            get_data(1, Event(), pod, [])
+
+    def test_stream_to_sinks(self, tmp_path):
+        pod = Pod8274D('sim://8274d/stream-to-sinks', experimental_streaming=True)
+        csv_path, edf_path, archive_path = str(tmp_path / 'rec.csv'), str(tmp_path / 'rec.edf'), str(tmp_path / 'rec.mraw')
+        flowgraph = DataFlow([(pod, [CSVSink(csv_path, pod), EDFSink(edf_path, pod, record_duration=0.25),
+                                     RawArchiveSink(archive_path, pod, codec='predictive')])])
+
+        flowgraph.collect()
+        time.sleep(1)
+        flowgraph.stop_collection()
+
+        #the packets are written as they are, since their layout is unverified.
+        with open(csv_path) as file:
+            lines = file.read().splitlines()
+        assert lines[0] == 'time,length_in_bytes,data'
+        rows = [ line.split(',') for line in lines[1:] ]
+        assert len(rows) > 800 and all(length == '16' for _, length, _ in rows)
+        times = np.array([ int(timestamp) for timestamp, _, _ in rows ])
+        #about 1024 samples a second.
+        assert abs(np.median(np.diff(times)) - 10**9/1024) < 10**5
+        codes = DataPacket8274D.channel_codes(np.array([ list(bytes.fromhex(data)) for _, _, data in rows ], dtype=np.uint8))
+
+        #the other sinks record the channels' raw ADC codes.
+        with RawArchive(archive_path) as archive:
+            assert archive.sample_rate == 1024
+            columns = archive.decode()
+            assert list(columns) == ['time', 'EEG1', 'EEG2', 'EMG']
+            assert columns['EMG'][:len(rows)].tolist() == codes[:, 2].tolist()
+
+        with pyedflib.EdfReader(edf_path) as reader:
+            assert reader.getSignalLabels() == ['EEG1', 'EEG2', 'EMG']
+            assert reader.getPhysicalDimension(0) == 'ADC'
+            eeg1 = reader.readSignal(0)
+        assert eeg1[:len(rows)//256*256] == pytest.approx(codes[:len(rows)//256*256, 0], abs=0.01)
@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from Morelia.packet.data import DataGap
+from Morelia.Stream.sink import PVFSSink, PvfsRecording
+from Morelia.Stream.sink.pvfs import PvfsFile, PvfsError, PVFS_BLOCK_HEADER_SIZE, PVFS_HEADER_SIZE
+from helpers import simulated_8206hr_batch
+
+class TestPvfsFile:
+
+    def test_round_trip(self, tmp_path):
+        file_path: str = str(tmp_path / 'test.pvfs')
+        contents = { f'file{idx}.dat' : os.urandom(size) for idx, size in enumerate((0, 100, 20_000, 50_000)) }
+
+        #small blocks, so files span many data blocks and tree blocks, and the file table spans several blocks.
+        with PvfsFile.create(file_path, block_size=512, grow_blocks=4) as vfs:
+            for name, data in contents.items():
+                with vfs.fcreate(name) as handle:
+                    for idx in range(0, len(data), 777):
+                        handle.write(data[idx:idx+777])
+
+            with vfs.fopen('file2.dat') as handle:
+                handle.seek(1000)
+                handle.write(b'overwritten')
+            contents['file2.dat'] = contents['file2.dat'][:1000] + b'overwritten' + contents['file2.dat'][1011:]
+
+            vfs.delete_file('file1.dat')
+            del contents['file1.dat']
+
+        #trimmed to the blocks in use.
+        assert (os.path.getsize(file_path) - PVFS_HEADER_SIZE) % (PVFS_BLOCK_HEADER_SIZE + 512) == 0
+
+        with PvfsFile.open(file_path, readonly=True) as vfs:
+            assert vfs.get_file_list() == list(contents)
+            for name, data in contents.items():
+                with vfs.fopen(name) as handle:
+                    assert handle.size == len(data)
+                    assert handle.read() == data
+
+            with vfs.fopen('file3.dat') as handle:
+                handle.seek(12_345)
+                assert handle.read(10_000) == contents['file3.dat'][12_345:22_345]
+
+            with pytest.raises(FileNotFoundError):
+                vfs.fopen('file1.dat')
+            with pytest.raises(PvfsError):
+                vfs.fcreate('new.dat')
+
+    def test_not_pvfs(self, tmp_path):
+        file_path = tmp_path / 'other.bin'
+        file_path.write_bytes(b'\0' * 4096)
+        with pytest.raises(PvfsError):
+            PvfsFile.open(str(file_path))
+
+class TestPVFSSink:
+
+    def test_round_trip(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('pvfs-sink', 350)
+        timestamps, packets = batch.timestamps, batch.packets
+        #a second of samples lost after the first 150.
+        timestamps[150:] += 10**9
+
+        file_path: str = str(tmp_path / 'rec.pvfs')
+        with PVFSSink(file_path, pod, block_size=1024) as sink:
+            for start in range(0, 150, 40):
+                sink.flush_batch(batch[start:min(start+40, 150)])
+            sink.flush_gap(DataGap(int(timestamps[149]) + 10**7, 10**9, 100, 'unplugged', 0.1))
+            sink.flush_batch(batch[150:])
+
+        with PvfsRecording(file_path) as recording:
+            assert recording.channels == ('EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTL2', 'TTL3', 'TTL4')
+            assert recording.sample_rate == 100
+
+            header = recording.header('EEG1')
+            assert header.startTime.to_ns() == timestamps[0] and header.endTime.to_ns() == timestamps[-1]
+
+            #an entry per second of samples, and a new one after the gap.
+            entries = recording.entries('EEG1')
+            assert [ entry.dataLocation // 4 for entry in entries ] == [0, 100, 150, 250]
+            assert recording.times('EEG1').tolist() == timestamps.tolist()
+
+            assert recording['EEG2'] == pytest.approx([ packet.ch1 for packet in packets ], rel=1e-6)
+            assert recording['TTL3'].tolist() == [ int(float(packet.ttl3)) for packet in packets ]
+
+    def test_time_range(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('pvfs-range', 1000)
+        timestamps = batch.timestamps
+        timestamps[500:] += 10**9
+
+        file_path: str = str(tmp_path / 'rec.pvfs')
+        with PVFSSink(file_path, pod) as sink:
+            sink.flush_batch(batch[:500])
+            sink.flush_gap(DataGap(int(timestamps[499]) + 10**7, 10**9, 100, 'unplugged', 0.1))
+            sink.flush_batch(batch[500:])
+
+        #tiny cache blocks, so ranges span several of them and the cache fills up.
+        with PvfsRecording(file_path, cache_blocks=3, cache_block_samples=64) as recording:
+            everything = recording['EEG1']
+            assert len(recording.index('EEG1')) == 10
+
+            for first, last in ((0, 1000), (123, 456), (450, 650), (999, 1000), (200, 201)):
+                times, values = recording.time_range('EEG1', int(timestamps[first]), int(timestamps[last - 1]) + 1)
+                assert times.tolist() == timestamps[first:last].tolist()
+                assert values.tolist() == everything[first:last].tolist()
+
+            #nothing during the gap, or outside the recording.
+            assert len(recording.time_range('EEG1', int(timestamps[499]) + 1, int(timestamps[500]))[0]) == 0
+            assert len(recording.time_range('EEG1', 0, int(timestamps[0]))[1]) == 0
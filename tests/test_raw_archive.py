@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from Morelia.packet import PrimaryChannelMode, SecondaryChannelMode
+from Morelia.packet.data import DataBatch, DataGap
+from Morelia.Stream.sink import RawArchiveSink, RawArchive, ChannelSchema
+from Morelia.Stream.sink.raw_archive import _TRAILER, INDEX_DTYPE
+from helpers import simulated_8206hr_batch, simulated_8401hr_batch
+
+def record(file_path: str, pod, batch: DataBatch, **kwargs) -> tuple[np.ndarray, list]:
+    """Record a batch into an archive in uneven batches, with a second lost after the first 150 packets."""
+    timestamps, packets = batch.timestamps, batch.packets
+    timestamps[150:] += 10**9
+
+    with RawArchiveSink(file_path, pod, **kwargs) as sink:
+        for start in range(0, 150, 37):
+            sink.flush_batch(batch[start:min(start+37, 150)])
+        sink.flush_gap(DataGap(int(timestamps[149]) + 10**7, 10**9, 100, 'unplugged', 0.1))
+        sink.flush_batch(batch[150:])
+    return timestamps, packets
+
+class TestRawArchive:
+
+    @pytest.mark.parametrize('codec', ['zlib', 'lzma', 'predictive'])
+    def test_round_trip_8206hr(self, tmp_path, codec):
+        file_path: str = str(tmp_path / 'rec.mraw')
+        timestamps, packets = record(file_path, *simulated_8206hr_batch('raw-archive', 400), codec=codec, block_packets=64)
+
+        with RawArchive(file_path) as archive:
+            assert archive.sample_rate == 100 and len(archive) == 400
+            #blocks end at the gap.
+            assert archive.index['first'].tolist() == [0, 64, 128, 150, 214, 278, 342]
+
+            batch = archive.read()
+            assert batch.timestamps.tolist() == timestamps.tolist()
+            assert batch.raw().tobytes() == b''.join(packet.raw_packet for packet in packets)
+            assert batch.packets[10].ch1 == packets[10].ch1
+
+            columns = archive.decode()
+            assert list(columns) == ['time', 'EEG1', 'EEG2', 'EEG3/EMG', 'TTL1', 'TTL2', 'TTL3', 'TTL4']
+            assert columns['EEG2'] == pytest.approx([ packet.ch1 for packet in packets ])
+
+            #by packet number, and by time, across blocks and the gap.
+            assert archive.read(100, 300).timestamps.tolist() == timestamps[100:300].tolist()
+            assert archive.read(63, 64).raw().tobytes() == packets[63].raw_packet
+            assert archive.time_range(int(timestamps[120]), int(timestamps[260])).timestamps.tolist() == timestamps[120:260].tolist()
+            assert len(archive.time_range(int(timestamps[149]) + 1, int(timestamps[150]))) == 0
+            assert len(archive.read(500, 600)) == 0
+
+    def test_round_trip_8401hr(self, tmp_path):
+        primary = (PrimaryChannelMode.EEG_EMG,)*4
+        secondary = (SecondaryChannelMode.ANALOG,) + (SecondaryChannelMode.DIGITAL,)*5
+        pod, batch = simulated_8401hr_batch('raw-archive', 300, primary, secondary, (1, 1, 1, 1), (10, 10, 10, 10))
+        schema = ChannelSchema(pod)
+        file_path: str = str(tmp_path / 'rec.mraw')
+        timestamps, packets = record(file_path, pod, batch)
+
+        with RawArchive(file_path) as archive:
+            assert archive.schema.names == schema.names
+            columns = archive.decode()
+            expected = schema.decode(DataBatch(timestamps, packets))
+            for name, values in zip(schema.names, expected):
+                assert columns[name].tolist() == values.tolist()
+
+    def test_recover_without_index(self, tmp_path):
+        file_path = tmp_path / 'rec.mraw'
+        timestamps, packets = record(str(file_path), *simulated_8206hr_batch('raw-recover', 400), block_packets=64)
+
+        #as if the recording stopped partway through writing the last block, before the index was written.
+        with RawArchive(str(file_path)) as archive:
+            last_block = int(archive.index['offset'][-1])
+        index_size = len(archive.index) * INDEX_DTYPE.itemsize + _TRAILER.size
+        data = file_path.read_bytes()
+        file_path.write_bytes(data[:-index_size][:last_block + 40])
+
+        with RawArchive(str(file_path)) as archive:
+            assert len(archive.index) == 6 and len(archive) == 342
+            assert archive.read().timestamps.tolist() == timestamps[:342].tolist()
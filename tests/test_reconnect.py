@@ -0,0 +1,74 @@
+from multiprocessing import Event
+
+import pytest
+
+from Morelia.Devices import Pod8206HR
+from Morelia.testing.protocol_sim import GetSimulatedDevice
+from Morelia.Stream.source import get_data
+from Morelia.Stream.metrics import StreamMetrics
+from Morelia.Stream.reconnect import ReconnectPolicy
+
+class GapSink:
+    """Records every batch and gap it is sent."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.gaps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        pass
+
+    def flush_batch(self, batch) -> None:
+        self.batches.append(batch)
+
+    def flush_gap(self, gap) -> None:
+        self.gaps.append((len(self.batches), gap))
+
+def stream(url: str, duration: float, policy: ReconnectPolicy | None) -> tuple[GapSink, StreamMetrics]:
+    pod = Pod8206HR(url, 10)
+    #the device forgets this when it loses power, so it has to be set again after reconnecting.
+    pod.sample_rate = 500
+
+    sink = GapSink()
+    metrics = StreamMetrics(pod.device_name, ['GapSink'])
+    get_data(duration, Event(), pod, [sink], chunk_size=25, metrics=metrics, reconnect_policy=policy)
+    return sink, metrics
+
+class TestReconnect:
+
+    @pytest.mark.parametrize('fault', ['unplug', 'stall'])
+    def test_recovers(self, fault: str):
+        url: str = f'sim://8206hr/reconnect-{fault}?{fault}_at=0.5&{fault}_for=0.4'
+        sink, metrics = stream(url, 2, ReconnectPolicy(stall_periods=50, poll_interval_sec=0.05))
+
+        assert len(sink.gaps) == 1
+        index, gap = sink.gaps[0]
+
+        #the gap is at least as long as the fault, and the samples missed match its length.
+        assert 0.4 <= gap.duration/10**9 < 2
+        assert gap.sample_count == pytest.approx(gap.duration/10**9 * 500, rel=0.2)
+
+        #data arrives on both sides of the gap, and timestamps after it leave room for the missing samples.
+        assert 0 < index < len(sink.batches)
+        before, after = sink.batches[index-1], sink.batches[index]
+        assert after.timestamps[0] - before.timestamps[-1] >= gap.duration * 0.8
+
+        assert GetSimulatedDevice(url).sample_rate == 500
+
+        snapshot: dict = metrics.snapshot()
+        assert snapshot['reconnects'] == 1
+        assert snapshot['lost_samples'] == gap.sample_count
+
+    def test_unsupervised_stream_fails(self):
+        with pytest.raises(OSError):
+            stream('sim://8206hr/reconnect-unsupervised?unplug_at=0.2&unplug_for=0.5', 1, None)
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            ReconnectPolicy(stall_periods=0)
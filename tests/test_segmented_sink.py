@@ -0,0 +1,131 @@
+import json
+import os
+import time
+
+import numpy as np
+import pyedflib
+import pytest
+
+from Morelia.packet.data import DataPacket8206HR, DataBatch, DataGap
+from Morelia.Stream.sink import SegmentedSink, EDFSink
+from helpers import simulated_8206hr_batch
+
+class TimestampSink:
+    """Writes one timestamp per line."""
+
+    def __init__(self, file_path: str) -> None:
+        self._file_path = file_path
+
+    def __enter__(self):
+        self._file = open(self._file_path, 'w', buffering=1)
+        return self
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        self._file.close()
+        return False
+
+    def flush(self, timestamp: int, packet) -> None:
+        self._file.write(f'{timestamp}\n')
+
+class SlowClosingSink(TimestampSink):
+    def __exit__(self, *args, **kwargs) -> bool:
+        time.sleep(0.5)
+        return super().__exit__(*args, **kwargs)
+
+class GapSink(TimestampSink):
+    """Also writes a line for each gap."""
+
+    def flush_gap(self, gap) -> None:
+        self._file.write(f'gap {gap.cause}\n')
+
+def build_batches(count: int, batch_size: int, period_ns: int) -> list[DataBatch]:
+    packets = [ DataPacket8206HR(bytes(16), 10) for _ in range(batch_size) ]
+    return [ DataBatch(np.arange(i*batch_size, (i+1)*batch_size, dtype=np.int64)*period_ns, packets) for i in range(count) ]
+
+def read_timestamps(file_path: str) -> list[int]:
+    with open(file_path) as file:
+        return [ int(line) for line in file ]
+
+class TestSegmentedSink:
+
+    def test_interval(self, tmp_path):
+        #1 ms between samples, 1 second segments, and batches that straddle the boundaries.
+        batches = build_batches(35, 70, 10**6)
+
+        with SegmentedSink(TimestampSink, str(tmp_path / 'rec.txt'), interval_sec=1) as sink:
+            for batch in batches:
+                sink.flush_batch(batch)
+
+        with open(tmp_path / 'rec.manifest.json') as manifest:
+            segments = json.load(manifest)['segments']
+
+        assert [ segment['file'] for segment in segments ] == ['rec_00000.txt', 'rec_00001.txt', 'rec_00002.txt']
+        assert all(segment['closed'] for segment in segments)
+        assert [ segment['first_sample'] for segment in segments ] == [0, 1000, 2000]
+        assert [ segment['samples'] for segment in segments ] == [1000, 1000, 450]
+
+        #every sample is written exactly once, and each segment starts on a boundary.
+        timestamps = [ read_timestamps(tmp_path / segment['file']) for segment in segments ]
+        assert sum(timestamps, []) == list(range(0, 2450*10**6, 10**6))
+        assert [ segment['start'] for segment in segments ] == [0, 10**9, 2*10**9]
+        assert [ segment['end'] for segment in segments ] == [ segment_timestamps[-1] for segment_timestamps in timestamps ]
+
+    def test_max_bytes(self, tmp_path):
+        with SegmentedSink(TimestampSink, str(tmp_path / 'rec.txt'), max_bytes=1000) as sink:
+            for batch in build_batches(10, 50, 10**6):
+                sink.flush_batch(batch)
+
+        segments = sorted(os.listdir(tmp_path))
+        assert len(segments) > 2
+        assert 'rec.manifest.json' in segments
+
+    def test_edf_segments(self, tmp_path):
+        pod, batch = simulated_8206hr_batch('segmented-sink', 500, start=0)
+
+        with SegmentedSink(EDFSink, str(tmp_path / 'rec.edf'), pod, interval_sec=2) as sink:
+            for start in range(0, 500, 30):
+                sink.flush_batch(batch[start:start+30])
+
+        #every segment is a complete EDF file.
+        for index, samples in enumerate((200, 200, 100)):
+            with pyedflib.EdfReader(str(tmp_path / f'rec_{index:05d}.edf')) as reader:
+                assert reader.getNSamples()[0] == samples
+
+    def test_gaps(self, tmp_path):
+        #a rollover after the first batch closes the segment, so the gap after it arrives with no segment open.
+        batches = build_batches(3, 50, 10**6)
+        gaps = [ DataGap(50*10**6, 10**6, 1, 'unplugged', 0.1), DataGap(100*10**6, 10**6, 1, 'stalled', 0.1) ]
+
+        with SegmentedSink(GapSink, str(tmp_path / 'rec.txt'), max_bytes=1) as sink:
+            sink.flush_batch(batches[0])
+            sink.flush_gap(gaps[0])
+            sink.flush_batch(batches[1])
+            sink.flush_gap(gaps[1])
+            sink.flush_batch(batches[2])
+
+        with open(tmp_path / 'rec.manifest.json') as manifest:
+            segments = json.load(manifest)['segments']
+
+        assert [ len(segment['gaps']) for segment in segments ] == [0, 1, 1]
+        assert [ segment['gaps'][0]['cause'] for segment in segments[1:] ] == ['unplugged', 'stalled']
+        assert [ segment['gaps'][0]['sample'] for segment in segments[1:] ] == [50, 100]
+
+        #and each gap is passed on to the segment after it, ahead of its data.
+        for segment, cause in zip(segments[1:], ('unplugged', 'stalled')):
+            with open(tmp_path / segment['file']) as file:
+                assert file.readline() == f'gap {cause}\n'
+
+    def test_close_in_background(self, tmp_path):
+        with SegmentedSink(SlowClosingSink, str(tmp_path / 'rec.txt'), interval_sec=1) as sink:
+            start: float = time.perf_counter()
+            for batch in build_batches(3, 1000, 10**6):
+                sink.flush_batch(batch)
+            #two segments were finished, but neither close was waited for.
+            assert time.perf_counter() - start < 0.4
+
+        with open(tmp_path / 'rec.manifest.json') as manifest:
+            assert [ segment['closed'] for segment in json.load(manifest)['segments'] ] == [True]*3
+
+    def test_needs_a_limit(self, tmp_path):
+        with pytest.raises(ValueError):
+            SegmentedSink(TimestampSink, str(tmp_path / 'rec.txt'))
@@ -0,0 +1,33 @@
+import threading
+import time
+
+import pytest
+
+from Morelia.Devices.SerialPorts.SerialComm import PortIO
+
+class TestPortIO:
+
+    def test_short_read_times_out(self):
+        port = PortIO('TEST')
+        port.Write(b'ab')
+
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            port.Read(5, timeout_sec=0.05)
+        assert time.perf_counter() - start < 1
+
+    def test_read_line_after_read(self):
+        port = PortIO('TEST')
+        port.Write(b'xy')
+        assert port.Read(2, timeout_sec=0.05) == b'xy'
+
+        #the rest of the line arrives well after the earlier Read's timeout, and is still waited for.
+        port.Write(b'ab')
+        writer = threading.Timer(0.3, port.Write, (b'c\n',))
+        writer.start()
+        assert port.ReadLine() == b'abc\n'
+
+        port.Write(b'de')
+        writer = threading.Timer(0.3, port.Write, (b'f;',))
+        writer.start()
+        assert port.ReadUntil(b';') == b'def;'
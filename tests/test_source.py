@@ -0,0 +1,56 @@
+from multiprocessing import Event
+
+import pytest
+
+from Morelia.Stream.source import get_data, _AdjustedSampleRateClock
+from Morelia.packet import ControlPacket
+from Morelia.packet.data import DataBatch
+from Morelia.Commands import CommandSet
+import Morelia.packet.conversion as conv
+from helpers import build_8206hr_packet, ReplayDevice, RecordingSink
+
+class TestSource:
+
+    @pytest.mark.parametrize('engine', ['lean', 'rx'])
+    def test_engines_filter_and_timestamp(self, engine):
+        stop_event = Event()
+        data_packets = [ build_8206hr_packet(i) for i in range(41) ]
+        control_packet = ControlPacket(CommandSet(), b'\x02' + conv.int_to_ascii_bytes(6, 4) + b'0154\x03')
+        #42 packets, so the lean engine reads exactly six chunks.
+        packets = data_packets[:20] + [control_packet] + data_packets[20:]
+
+        pod = ReplayDevice(packets, stop_event)
+        sink = RecordingSink()
+
+        get_data(float('inf'), stop_event, pod, [sink], engine=engine, chunk_size=7)
+
+        assert pod.entered
+        assert not sink.open
+        assert [ packet for _, packet in sink.flushed ] == data_packets
+
+        timestamps = [ timestamp for timestamp, _ in sink.flushed ]
+        assert all(isinstance(timestamp, int) for timestamp in timestamps)
+        assert timestamps == sorted(timestamps)
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            get_data(1, Event(), ReplayDevice([None], Event()), [], engine='nope')
+
+    def test_clock_spacing(self):
+        clock = _AdjustedSampleRateClock(1000)
+        start: int = clock.last_timestamp
+        timestamps = clock.stamp(10)
+
+        assert len(timestamps) == 10
+        assert timestamps[0] - start == 10**6
+        assert timestamps[-1] - start == 10**7
+
+    def test_batch_iteration(self):
+        packets = [ build_8206hr_packet(i) for i in range(3) ]
+        batch = DataBatch(_AdjustedSampleRateClock(100).stamp(3), packets)
+
+        assert len(batch) == 3
+        assert [ packet for _, packet in batch ] == packets
+
+        with pytest.raises(ValueError):
+            DataBatch(batch.timestamps[:2], packets)
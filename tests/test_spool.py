@@ -0,0 +1,107 @@
+import os
+import time
+
+import pytest
+
+from Morelia.Stream.sink import Spool
+
+class Server:
+    """Stands in for a network destination that can go down."""
+
+    def __init__(self) -> None:
+        self.up: bool = True
+        self.received: list[bytes] = []
+
+    def send(self, payload: bytes) -> None:
+        if not self.up:
+            raise ConnectionError('server is down')
+        self.received.append(payload)
+
+def wait_for(condition, timeout_sec: float = 5) -> None:
+    deadline: float = time.monotonic() + timeout_sec
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def payloads(count: int, start: int = 0) -> list[bytes]:
+    return [ f'payload {idx:05d} '.encode() * 5 for idx in range(start, start+count) ]
+
+class TestSpool:
+
+    def test_replay_after_outage(self, tmp_path):
+        server = Server()
+        spool = Spool(str(tmp_path), retry_interval_sec=0.01, max_retry_interval_sec=0.05)
+        spool.open(server.send)
+
+        for payload in payloads(10):
+            spool.put(payload)
+        wait_for(lambda: spool.metrics()['pending_records'] == 0)
+
+        server.up = False
+        for payload in payloads(40, 10):
+            spool.put(payload)
+        time.sleep(0.1)
+
+        metrics: dict = spool.metrics()
+        assert metrics['pending_records'] > 0 and metrics['pending_bytes'] > 0
+        assert metrics['lag_seconds'] > 0.05 and metrics['send_failures'] > 0 and not metrics['connected']
+
+        server.up = True
+        wait_for(lambda: spool.metrics()['pending_records'] == 0)
+        spool.close()
+
+        #everything arrives exactly once, in order.
+        assert server.received == payloads(50)
+        assert spool.metrics()['lag_seconds'] == 0 and spool.metrics()['sent_records'] == 50
+
+    def test_backlog_survives_restart(self, tmp_path):
+        server = Server()
+        server.up = False
+
+        spool = Spool(str(tmp_path), segment_bytes=1000, max_bytes=10**6, retry_interval_sec=0.01, drain_timeout_sec=0.1)
+        spool.open(server.send)
+        for payload in payloads(30):
+            spool.put(payload)
+        spool.close()
+
+        assert len([ name for name in os.listdir(tmp_path) if name.endswith('.log') ]) > 1
+
+        #a new spool on the same directory picks up where the last one stopped.
+        server.up = True
+        spool = Spool(str(tmp_path), segment_bytes=1000, max_bytes=10**6)
+        spool.open(server.send)
+        assert spool.metrics()['pending_records'] == 30
+        spool.put(payloads(1, 30)[0])
+        wait_for(lambda: spool.metrics()['pending_records'] == 0)
+        spool.close()
+
+        assert server.received == payloads(31)
+        #sent segments are deleted.
+        assert len([ name for name in os.listdir(tmp_path) if name.endswith('.log') ]) == 1
+
+    @pytest.mark.parametrize('eviction', ['oldest', 'newest'])
+    def test_eviction(self, tmp_path, eviction):
+        server = Server()
+        server.up = False
+
+        spool = Spool(str(tmp_path), segment_bytes=1000, max_bytes=4000, eviction=eviction, retry_interval_sec=0.01, max_retry_interval_sec=0.01)
+        spool.open(server.send)
+        for payload in payloads(100):
+            spool.put(payload)
+
+        metrics: dict = spool.metrics()
+        assert metrics['disk_bytes'] <= 4000
+        assert metrics['evicted_records'] > 0 and metrics['evicted_records'] + metrics['pending_records'] <= 100
+
+        server.up = True
+        wait_for(lambda: spool.metrics()['pending_records'] == 0)
+        spool.close()
+
+        #what is left is sent in order, without duplicates, and it is the newest (or oldest) data.
+        assert server.received == sorted(set(server.received))
+        assert (server.received[-1] == payloads(1, 99)[0]) == (eviction == 'oldest')
+        assert (server.received[0] == payloads(1)[0]) == (eviction == 'newest')
+
+    def test_invalid_segment_size(self, tmp_path):
+        with pytest.raises(ValueError):
+            Spool(str(tmp_path), segment_bytes=1000, max_bytes=2000)
@@ -0,0 +1,82 @@
+from Morelia.Devices import Pod8206HR, Pod8480SC
+from Morelia.testing.protocol_sim import GetSimulatedDevice
+
+class TestStateCache:
+
+    def test_write_through(self):
+        url = 'sim://8206hr/state-cache'
+        pod, device = Pod8206HR(url, 10), GetSimulatedDevice(url)
+
+        pod.sample_rate = 1000
+        pod.WriteRead('SET LOWPASS', (1, 40))
+        handled: int = device.commands_handled
+
+        #settings that were set are answered without asking the device, and for the right key.
+        assert pod.sample_rate == 1000
+        assert pod.WriteRead('GET LOWPASS', 1).payload == (40,)
+        assert device.commands_handled == handled
+        assert not pod.IsCached('GET LOWPASS', 0)
+
+        #unless asked not to, and the device's answer replaces what was known.
+        assert pod.WriteRead('GET LOWPASS', 1, useCache=False).payload == (0,)
+        assert device.commands_handled == handled + 1
+        assert pod.WriteRead('GET LOWPASS', 1).payload == (0,)
+
+        #settings read from the device are kept too.
+        pod.WriteRead('GET LOWPASS', 2)
+        assert pod.IsCached('GET LOWPASS', 2)
+
+        #a reset device forgets everything.
+        pod.WriteRead('RESET')
+        assert not pod.IsCached('GET SAMPLE RATE') and not pod.IsCached('GET LOWPASS', 1)
+
+    def test_diff(self):
+        url = 'sim://8206hr/state-cache-diff'
+        pod, device = Pod8206HR(url, 10), GetSimulatedDevice(url)
+
+        assert pod.ApplySetting('SET LOWPASS', (0, 40)) is not None
+        assert pod.IsSettingCurrent('SET LOWPASS', (0, 40)) and not pod.IsSettingCurrent('SET LOWPASS', (0, 41))
+
+        handled: int = device.commands_handled
+        assert pod.ApplySetting('SET LOWPASS', (0, 40)) is None
+        assert device.commands_handled == handled
+        assert pod.ApplySetting('SET LOWPASS', (0, 40), force=True) is not None
+        assert pod.ApplySetting('SET LOWPASS', (0, 41)) is not None
+        assert device.commands_handled == handled + 2
+
+    def test_response_layouts(self):
+        pod = Pod8480SC('sim://8480sc/state-cache')
+
+        #the response to GET STIMULUS starts with the channel.
+        stimulus = (1, 1000, 500, 500, 1, 10, 3)
+        pod.WriteRead('SET STIMULUS', stimulus)
+        assert pod.IsCached('GET STIMULUS', 1) and not pod.IsCached('GET STIMULUS', 0)
+        cached = pod.WriteRead('GET STIMULUS', 1).payload
+        assert cached[:6] == stimulus[:6] and cached[6] == {'optoElec' : 1, 'monoBiphasic' : 1, 'Simul' : 0}
+
+        #GET LED CURRENT responds with both channels, so it is only known once both have been set.
+        pod.WriteRead('SET LED CURRENT', (1, 250))
+        assert not pod.IsCached('GET LED CURRENT')
+        pod.WriteRead('SET LED CURRENT', (0, 100))
+        assert pod.WriteRead('GET LED CURRENT').payload == (100, 250)
+
+        #and setting one channel after reading both only changes that channel.
+        pod.WriteRead('GET LED CURRENT', useCache=False)
+        pod.WriteRead('SET LED CURRENT', (1, 300))
+        assert pod.WriteRead('GET LED CURRENT').payload == (0, 300)
+
+    def test_responses_read_elsewhere(self):
+        pod = Pod8206HR('sim://8206hr/state-cache-elsewhere', 10)
+
+        #as when a command is written here, and its response is read by another process.
+        written = pod.WritePacket('SET LOWPASS', (0, 40))
+        response = pod.ParseControlPacket(pod.ReadPODpacket().raw_packet)
+        pod.RecordResponse(written, response)
+        assert pod.IsSettingCurrent('SET LOWPASS', (0, 40))
+        assert pod.CachedResponse('GET LOWPASS', 0).payload == (40,)
+
+        #without a response, the device may or may not have the setting.
+        pod.RecordResponse(pod.WritePacket('SET LOWPASS', (0, 80)), None)
+        assert pod.CachedResponse('GET LOWPASS', 0) is None
+        pod.DiscardWaiting()
+        assert pod.GetBytesWaiting() == 0 and pod.GetPort() == 'sim://8206hr/state-cache-elsewhere'
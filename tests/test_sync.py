@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from Morelia.Devices import Pod8206HR
+from Morelia.Stream.data_flow import DataFlow
+from Morelia.Stream.sink import CSVSink
+
+class BrokenSink:
+    """Fails to open, so its worker never gets ready to stream."""
+
+    def __enter__(self):
+        raise OSError('disk full')
+
+    def __exit__(self, *args, **kwargs) -> bool:
+        return False
+
+def first_timestamp(path: str) -> int:
+    with open(path) as file:
+        return int(float(file.read().splitlines()[1].split(',')[0]))
+
+class TestSynchronizedStart:
+
+    def test_devices_start_together(self, tmp_path):
+        pods = [ Pod8206HR(f'sim://8206hr/sync-{i}?sample_rate=1000', 10) for i in range(4) ]
+        paths = [ str(tmp_path / f'{i}.csv') for i in range(4) ]
+
+        flowgraph = DataFlow([ (pod, [CSVSink(path, pod)]) for pod, path in zip(pods, paths) ], synchronized_start=True)
+        before = time.time_ns()
+        flowgraph.collect_for_seconds(0.5)
+
+        start = flowgraph.start_time()
+        assert before < start < before + 5 * 10**9
+
+        offsets = flowgraph.start_offsets()
+        assert list(offsets) == [ pod.device_name for pod in pods ]
+        #the devices are all told to start within a few milliseconds, even on a busy machine with one CPU.
+        assert all(0 <= offset < 0.01 for offset in offsets.values())
+
+        #each device's data starts one sample after it did, on the shared time base.
+        for path, offset in zip(paths, offsets.values()):
+            assert first_timestamp(path) == pytest.approx(start + offset * 10**9 + 10**6, abs=1000)
+
+    def test_failed_device_releases_others(self, tmp_path):
+        pods = [ Pod8206HR(f'sim://8206hr/sync-failed-{i}', 10) for i in range(3) ]
+        network = [ (pod, [CSVSink(str(tmp_path / f'{i}.csv'), pod)]) for i, pod in enumerate(pods[:2]) ] + [(pods[2], [BrokenSink()])]
+
+        flowgraph = DataFlow(network, synchronized_start=True)
+        started = time.monotonic()
+        flowgraph.collect_for_seconds(60)
+
+        #every worker gives up right away, rather than waiting out the timeout or streaming for a minute.
+        assert time.monotonic() - started < 10
+        assert flowgraph.start_time() is None
+        assert list(flowgraph.start_offsets().values()) == [None, None, None]
+
+    def test_unsynchronized_by_default(self, tmp_path):
+        pods = [ Pod8206HR(f'sim://8206hr/sync-default-{i}?sample_rate=1000', 10) for i in range(2) ]
+        paths = [ str(tmp_path / f'{i}.csv') for i in range(2) ]
+
+        flowgraph = DataFlow([ (pod, [CSVSink(path, pod)]) for pod, path in zip(pods, paths) ])
+        flowgraph.collect_for_seconds(0.5)
+
+        #each device starts on its own, but start times are still recorded on the shared time base.
+        start = flowgraph.start_time()
+        offsets = flowgraph.start_offsets()
+        assert start is not None and min(offsets.values()) == 0
+        for path, offset in zip(paths, offsets.values()):
+            assert first_timestamp(path) == pytest.approx(start + offset * 10**9 + 10**6, abs=1000)
@@ -0,0 +1,52 @@
+from multiprocessing import Event
+
+import pytest
+
+from Morelia.Devices import Pod
+from Morelia.Stream.source import get_data
+from Morelia.Stream.tracing import StageTracer, STAGES, latency_percentile, format_trace_report
+from helpers import build_8206hr_packet, ReplayDevice, NullSink
+
+class TestTracing:
+
+    def test_sampled_chunks_are_traced(self):
+        stop_event = Event()
+        tracer = StageTracer('replay', ['a', 'b'], sample_every=2)
+
+        #six chunks of five packets, every other one traced.
+        get_data(float('inf'), stop_event, ReplayDevice([ build_8206hr_packet(i) for i in range(30) ], stop_event),
+                 [NullSink(), NullSink()], chunk_size=5, tracer=tracer)
+
+        stages = tracer.snapshot()
+        assert list(stages) == list(STAGES) + ['flushed:a', 'flushed:b']
+        assert all(stage['count'] == 3 for stage in stages.values())
+
+        #latencies are measured from the same point, so they can only grow from one stage to the next.
+        means = [ stage['mean_seconds'] for stage in stages.values() ]
+        assert means == sorted(means)
+
+        report: str = format_trace_report({ tracer.device_name : stages })
+        assert report.startswith('replay:')
+        assert 'flushed:b' in report
+
+    def test_invalid_sample_rate(self):
+        with pytest.raises(ValueError):
+            StageTracer('replay', [], sample_every=0)
+
+    def test_percentile(self):
+        buckets = [(0.001, 50), (0.002, 40), (0.004, 10), (float('inf'), 0)]
+
+        assert latency_percentile(buckets, 50) == 0.001
+        assert latency_percentile(buckets, 90) == 0.002
+        assert latency_percentile(buckets, 99) == 0.004
+        assert latency_percentile([(0.001, 0)], 50) != latency_percentile([(0.001, 0)], 50) #NaN
+
+    def test_timed_read(self):
+        #the "TEST" port is a serial loopback.
+        pod = Pod('TEST')
+        pod.WritePacket('PING')
+
+        packet, arrived, framed = pod.ReadPODpacketTimed()
+
+        assert packet.command_number == 2
+        assert 0 < arrived <= framed